@@ -0,0 +1,72 @@
+"""
+Benchmark clôture trimestrielle REM - portefeuille synthétique en base SQLite temporaire
+Usage : python benchmarks/bench_cloture_rem.py [nb_operations] [taille_lot]
+"""
+
+import os
+import sys
+import tempfile
+from datetime import date
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+os.chdir(RACINE)
+
+import numpy as np
+from sqlalchemy import insert
+
+from opcopilot.cloture_rem import cloture_trimestre
+from opcopilot.persistence import Operation, RemTrimestre, create_db_engine, get_sessionmaker, init_db
+
+
+def peupler(session, nb_operations, rng):
+    """Opérations actives : T1 2023 → T2 2024 saisis, T3 2024 saisi pour 60 % d'entre elles, pas de T4"""
+    session.execute(insert(Operation), [
+        {'id': i, 'nom': f"OPERATION {i}", 'type_operation': 'OPP', 'statut': 'EN_COURS'}
+        for i in range(1, nb_operations + 1)
+    ])
+    trimestres = []
+    for operation_id in range(1, nb_operations + 1):
+        projete = float(rng.integers(10, 60)) * 1000
+        for annee, numero in [(2023, 1), (2023, 2), (2023, 3), (2023, 4), (2024, 1), (2024, 2), (2024, 3)]:
+            saisi = (annee, numero) != (2024, 3) or rng.random() < 0.6
+            trimestres.append({
+                'operation_id': operation_id, 'trimestre': f"T{numero} {annee}", 'annee': annee, 'numero': numero,
+                'rem_projetee': projete, 'depenses_projetees': projete * 8,
+                'rem_realisee': projete * rng.uniform(0.7, 1.1) if saisi else 0.0,
+                'depenses_facturees': projete * 8 * rng.uniform(0.8, 1.1) if saisi else 0.0
+            })
+    session.execute(insert(RemTrimestre), trimestres)
+    session.commit()
+
+
+def main():
+    nb_operations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    taille_lot = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    with tempfile.TemporaryDirectory() as dossier:
+        moteur = create_db_engine(f"sqlite:///{os.path.join(dossier, 'bench.db')}")
+        init_db(moteur)
+        Session = get_sessionmaker(moteur)
+        with Session() as session:
+            peupler(session, nb_operations, np.random.default_rng(0))
+
+        print(f"{nb_operations} opérations, lots de {taille_lot}")
+        print(f"{'Mode':<32}{'Lots':>6}{'Processus':>11}{'Trimestres':>12}{'Alertes':>10}{'Durée s':>10}")
+        workers = max(2, os.cpu_count() or 1)
+        for libelle, annee, numero, jour, nb_workers, dry_run in [
+            ("T3 calcul seul, 1 processus", 2024, 3, date(2024, 10, 3), 1, True),
+            (f"T3 calcul seul, {workers} processus", 2024, 3, date(2024, 10, 3), workers, True),
+            ("T3 écriture", 2024, 3, date(2024, 10, 3), workers, False),
+            ("T4 écriture (création)", 2024, 4, date(2025, 1, 10), workers, False),
+            ("T4 relance (idempotente)", 2024, 4, date(2025, 1, 10), workers, False)
+        ]:
+            with Session() as session:
+                bilan = cloture_trimestre(session, annee, numero, jour, taille_lot, nb_workers, dry_run=dry_run)
+            print(f"{libelle:<32}{bilan['lots']:>6}{bilan['workers']:>11}{bilan['trimestres_crees']:>12}"
+                  f"{bilan['alertes_en_file'] if not dry_run else sum(bilan['alertes'].values()):>10}"
+                  f"{bilan['duree_s']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark démarrage à froid - temps d'import et premier rendu par page
+Chaque mesure est faite dans un interpréteur neuf (comme un nouveau réplica) ;
+la base SQLite est créée une fois avant les mesures, dans un répertoire temporaire.
+
+Usage : python benchmarks/bench_cold_start.py [nb_repetitions] [--json resultats.json]
+                                              [--baseline reference.json] [--tolerance 25]
+Avec --baseline, le script sort en erreur si une médiane dépasse la référence de plus de tolerance %.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPLICATION = os.path.join(RACINE, 'opcopilot_v4.py')
+
+PAGES = ['login', 'dashboard', 'portefeuille', 'operation_details', 'planning_echeances', 'gestion_freins', 'admin']
+
+# Bibliothèques lourdes dont on suit le chargement
+MODULES_SUIVIS = ['pandas', 'numpy', 'pyarrow', 'sqlalchemy', 'docx', 'openpyxl', 'xlsxwriter']
+
+UTILISATEUR = {"nom": "Administrateur SPIC", "role": "ADMIN", "secteur": "Tous secteurs", "operations": 0}
+
+
+def worker(scenario):
+    """Mesure dans le processus courant (appelé par le parent via --worker)"""
+    sys.path.insert(0, RACINE)
+    os.chdir(RACINE)
+
+    debut = time.perf_counter()
+    if scenario == 'import':
+        import opcopilot_v4  # noqa: F401 - exécution du module sans main()
+        exceptions = []
+    else:
+        from streamlit.testing.v1 import AppTest
+
+        at = AppTest.from_file(APPLICATION, default_timeout=120)
+        if scenario != 'login':
+            at.session_state["authenticated"] = True
+            at.session_state["aco_user"] = "admin"
+            at.session_state["user_data"] = UTILISATEUR
+            at.session_state["page"] = scenario
+        debut = time.perf_counter()
+        at.run()
+        exceptions = [str(e.value) for e in at.exception]
+
+    print(json.dumps({
+        'ms': (time.perf_counter() - debut) * 1000,
+        'modules': [module for module in MODULES_SUIVIS if module in sys.modules],
+        'exceptions': exceptions
+    }))
+
+
+def mesurer(scenario, env):
+    """Lance un interpréteur neuf et retourne (mesure worker, durée totale du processus en ms)"""
+    debut = time.perf_counter()
+    sortie = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', scenario],
+        cwd=RACINE, env=env, capture_output=True, text=True, check=True
+    )
+    duree_processus = (time.perf_counter() - debut) * 1000
+    return json.loads(sortie.stdout.strip().splitlines()[-1]), duree_processus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark démarrage à froid OPCOPILOT")
+    parser.add_argument('repetitions', nargs='?', type=int, default=3)
+    parser.add_argument('--json', help="Fichier de sortie des médianes (référence pour --baseline)")
+    parser.add_argument('--baseline', help="Fichier de référence produit par --json")
+    parser.add_argument('--tolerance', type=float, default=25.0, help="Régression tolérée en %% (défaut 25)")
+    parser.add_argument('--pages', nargs='*', default=PAGES)
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker)
+        return 0
+
+    with tempfile.TemporaryDirectory() as dossier:
+        env = dict(os.environ, OPCOPILOT_DB_URL=f"sqlite:///{os.path.join(dossier, 'bench.db')}")
+        mesurer('dashboard', env)  # Création et import initial de la base, hors mesures
+
+        resultats = {}
+        print(f"{'Scénario':<22}{'Rendu ms':>10}{'Processus ms':>14}  Modules chargés")
+        for scenario in ['import'] + args.pages:
+            mesures = [mesurer(scenario, env) for _ in range(args.repetitions)]
+            rendu = statistics.median(m['ms'] for m, _ in mesures)
+            processus = statistics.median(d for _, d in mesures)
+            worker_resultat = mesures[-1][0]
+            resultats[scenario] = {'rendu_ms': round(rendu, 1), 'processus_ms': round(processus, 1),
+                                   'modules': worker_resultat['modules']}
+
+            modules = ', '.join(worker_resultat['modules']) or '-'
+            print(f"{scenario:<22}{rendu:>10.0f}{processus:>14.0f}  {modules}")
+            for exception in worker_resultat['exceptions']:
+                print(f"{'':<22}⚠️ {exception}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            reference = json.load(f)
+        regressions = [
+            (scenario, reference[scenario]['processus_ms'], mesure['processus_ms'])
+            for scenario, mesure in resultats.items()
+            if scenario in reference
+            and mesure['processus_ms'] > reference[scenario]['processus_ms'] * (1 + args.tolerance / 100)
+        ]
+        for scenario, avant, apres in regressions:
+            print(f"RÉGRESSION {scenario}: {avant:.0f} ms → {apres:.0f} ms")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
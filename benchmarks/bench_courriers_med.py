@@ -0,0 +1,52 @@
+"""
+Benchmark lettres MED - lot de fin de mois rendu séquentiellement puis dans le pool de processus
+Usage : python benchmarks/bench_courriers_med.py [nb_lettres] [workers]
+"""
+
+import json
+import os
+import sys
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+os.chdir(RACINE)
+
+from opcopilot.courriers import MedLetterGenerator, lettres_du_mois, meds_demo, mois_disponibles
+
+
+def lot(nb_lettres):
+    """Lettres du mois de démonstration dupliquées jusqu'à nb_lettres (références uniques)"""
+    with open(os.path.join('data', 'demo_data.json'), 'r', encoding='utf-8') as f:
+        demo_data = json.load(f)
+    meds = meds_demo(demo_data)
+    annee, mois = mois_disponibles(meds)[0]
+    modeles = lettres_du_mois(meds, demo_data['operations_demo'], annee, mois)
+    return [dict(modeles[i % len(modeles)], reference=f"MED-{annee}-{i + 1:04d}") for i in range(nb_lettres)]
+
+
+def main():
+    nb_lettres = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else max(2, os.cpu_count() or 1)
+    with open(os.path.join('data', 'workflow_modules.json'), 'r', encoding='utf-8') as f:
+        definitions = json.load(f)['workflow_med'].get('templates_med', [])
+    lettres = lot(nb_lettres)
+
+    print(f"{nb_lettres} lettres")
+    print(f"{'Mode':<36}{'Durée s':>10}{'Zip Ko':>10}")
+    for libelle, generateur in [
+        ("Séquentiel (1 tâche)", MedLetterGenerator(definitions=definitions, taille_lot=nb_lettres)),
+        (f"Pool {workers} processus (démarrage)", MedLetterGenerator(definitions=definitions, workers=workers))
+    ]:
+        debut = time.perf_counter()
+        archive = generateur.generer_lot(lettres)
+        print(f"{libelle:<36}{time.perf_counter() - debut:>10.2f}{len(archive) // 1024:>10}")
+        if generateur.workers > 1:
+            debut = time.perf_counter()
+            generateur.generer_lot(lettres)
+            print(f"{f'Pool {workers} processus (modèles chargés)':<36}{time.perf_counter() - debut:>10.2f}")
+        generateur.shutdown()
+
+
+if __name__ == "__main__":
+    main()
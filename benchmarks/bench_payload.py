@@ -0,0 +1,96 @@
+"""
+Benchmark volume envoyé au navigateur - taille sérialisée des éléments par page
+Mesure la somme des messages protobuf de l'arbre rendu (total et part st.markdown)
+pour un rerun, après le premier rendu.
+
+Usage : python benchmarks/bench_payload.py [--pages login dashboard ...] [--json resultats.json]
+                                          [--baseline reference.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPLICATION = os.path.join(RACINE, 'opcopilot_v4.py')
+
+PAGES = ['login', 'dashboard', 'portefeuille', 'operation_details', 'planning_echeances', 'gestion_freins', 'admin']
+
+UTILISATEUR = {"nom": "Administrateur SPIC", "role": "ADMIN", "secteur": "Tous secteurs", "operations": 0}
+
+
+def elements(noeud):
+    """Parcours récursif des éléments de l'arbre AppTest"""
+    enfants = getattr(noeud, 'children', None)
+    if enfants:
+        for enfant in enfants.values():
+            yield from elements(enfant)
+    elif getattr(noeud, 'proto', None) is not None:
+        yield noeud
+
+
+def mesurer(page):
+    """(octets total, octets markdown, nb éléments) d'un rerun de la page"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APPLICATION, default_timeout=120)
+    if page != 'login':
+        at.session_state["authenticated"] = True
+        at.session_state["aco_user"] = "admin"
+        at.session_state["user_data"] = UTILISATEUR
+        at.session_state["page"] = page
+    at.run()
+    at.run()  # Rerun : ressources en cache, seul le rendu de la page est mesuré
+
+    total = markdown = nombre = 0
+    for element in elements(at._tree):
+        taille = len(element.proto.SerializeToString())
+        total += taille
+        nombre += 1
+        if element.type == 'markdown':
+            markdown += taille
+    return total, markdown, nombre, [str(e.value) for e in at.exception]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark volume par page OPCOPILOT")
+    parser.add_argument('--pages', nargs='*', default=PAGES)
+    parser.add_argument('--json', help="Fichier de sortie (référence pour --baseline)")
+    parser.add_argument('--baseline', help="Fichier de référence produit par --json")
+    args = parser.parse_args()
+
+    sys.path.insert(0, RACINE)
+    os.chdir(RACINE)
+
+    reference = {}
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            reference = json.load(f)
+
+    resultats = {}
+    with tempfile.TemporaryDirectory() as dossier:
+        os.environ['OPCOPILOT_DB_URL'] = f"sqlite:///{os.path.join(dossier, 'bench.db')}"
+        print(f"{'Page':<22}{'Total Ko':>10}{'Markdown Ko':>13}{'Éléments':>10}  Référence")
+        for page in args.pages:
+            total, markdown, nombre, exceptions = mesurer(page)
+            resultats[page] = {'total_ko': round(total / 1024, 1), 'markdown_ko': round(markdown / 1024, 1),
+                               'elements': nombre}
+
+            comparaison = ''
+            if page in reference:
+                avant = reference[page]['total_ko']
+                comparaison = f"{avant:.1f} Ko ({(total / 1024 - avant) / avant * 100:+.0f} %)" if avant else ''
+            print(f"{page:<22}{total / 1024:>10.1f}{markdown / 1024:>13.1f}{nombre:>10}  {comparaison}")
+            for exception in exceptions:
+                print(f"{'':<22}⚠️ {exception}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
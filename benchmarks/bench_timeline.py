@@ -0,0 +1,278 @@
+"""
+Benchmark timeline - construction historique (phase par phase, conservée ici comme référence)
+vs construction vectorisée de l'application
+Usage : python benchmarks/bench_timeline.py [nb_repetitions]
+"""
+
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+os.chdir(RACINE)
+
+import pandas as pd
+import plotly.graph_objects as go
+
+from opcopilot import timeline
+from opcopilot_v4 import create_timeline_horizontal
+
+
+def phases_depuis_template(type_operation, date_debut='2024-01-01'):
+    """Phases datées à partir d'un template (durées chaînées)"""
+    with open('data/templates_phases.json', 'r', encoding='utf-8') as f:
+        template = json.load(f)[type_operation]['phases']
+    debut = pd.Timestamp(date_debut)
+    phases = []
+    for phase in template:
+        fin = debut + pd.Timedelta(days=phase['duree_jours'])
+        phases.append({
+            'nom': phase['nom'],
+            'date_debut_prevue': debut.strftime('%Y-%m-%d'),
+            'date_fin_prevue': fin.strftime('%Y-%m-%d'),
+            'statut': 'NON_DEMARREE'
+        })
+        debut = fin
+    return phases
+
+
+def create_timeline_historique(operation_data, phases_data, messages):
+    """Construction historique de la timeline, phase par phase (~5 traces par phase), référence du benchmark"""
+    # PRÉPARATION DONNÉES SÉCURISÉE
+    fig = go.Figure()
+
+    # Validation et préparation des dates
+    dates_debut = []
+    dates_fin = []
+    phases_valides = []
+
+    for i, phase in enumerate(phases_data):
+        try:
+            # Vérification que phase est un dict
+            if not isinstance(phase, dict):
+                continue
+
+            # Gestion sécurisée des dates
+            date_debut_str = phase.get('date_debut_prevue')
+            date_fin_str = phase.get('date_fin_prevue')
+
+            # Dates par défaut si manquantes
+            if not date_debut_str:
+                debut = datetime.now() + timedelta(days=i*30)
+            else:
+                debut = pd.to_datetime(date_debut_str)
+
+            if not date_fin_str:
+                fin = debut + timedelta(days=30)
+            else:
+                fin = pd.to_datetime(date_fin_str)
+
+            # Validation cohérence dates
+            if fin < debut:
+                fin = debut + timedelta(days=30)
+
+            dates_debut.append(debut)
+            dates_fin.append(fin)
+            phases_valides.append(phase)
+
+        except Exception as e:
+            # Log de l'erreur mais continue avec les autres phases
+            messages.append(('warning', f"⚠️ Erreur phase {i+1}: {str(e)}"))
+            continue
+
+    # Vérification qu'on a au moins une phase valide
+    if not phases_valides:
+        messages.append(('error', "❌ Aucune phase valide trouvée"))
+        return create_fallback_timeline("Aucune phase valide")
+
+    # Calcul des bornes temporelles
+    date_min = min(dates_debut)
+    date_max = max(dates_fin)
+
+    # BARRE HORIZONTALE AVEC ESPACEMENT ÉGAL - Timeline chronologique
+    if len(phases_valides) > 1:
+        # Positions équidistantes (chronologie simple, pas durées)
+        x_positions = list(range(len(phases_valides)))
+
+        # Couleurs du dégradé (jaune → orange → rouge → violet → bleu)
+        couleurs_degrade = [
+            "#FFD54F",  # Jaune
+            "#FF9800",  # Orange  
+            "#F44336",  # Rouge
+            "#E91E63",  # Rose/Violet
+            "#673AB7",  # Violet
+            "#2E7D32"   # Bleu-vert foncé
+        ]
+
+        # Segments de la barre avec espacement égal
+        for i in range(len(phases_valides) - 1):
+            debut = x_positions[i]
+            fin = x_positions[i + 1]
+
+            # Couleur du segment
+            couleur_segment = couleurs_degrade[i % len(couleurs_degrade)]
+
+            # Segment de barre coloré
+            fig.add_trace(go.Scatter(
+                x=[debut, fin],
+                y=[0, 0],
+                mode='lines',
+                line=dict(width=20, color=couleur_segment),
+                showlegend=False,
+                hoverinfo='skip'
+            ))
+
+            # Triangle/flèche sur la barre (style modèle)
+            milieu_segment = debut + (fin - debut) / 2
+            y_triangle = 0.15 if i % 2 == 0 else -0.15
+            fig.add_trace(go.Scatter(
+                x=[milieu_segment],
+                y=[y_triangle],
+                mode='markers',
+                marker=dict(
+                    size=15,
+                    color=couleur_segment,
+                    symbol='triangle-up' if i % 2 == 0 else 'triangle-down'
+                ),
+                showlegend=False,
+                hoverinfo='skip'
+            ))
+
+    # CERCLES AVEC DATES MM/YY - Espacement chronologique égal
+    for i, phase in enumerate(phases_valides):
+        try:
+            debut_date = dates_debut[i]  # Date réelle pour format MM/YY
+            x_pos = i  # Position équidistante (chronologique)
+            statut = phase.get('statut', 'NON_DEMARREE')
+            nom_phase = phase.get('nom', f'Phase {i+1}')
+
+            # Couleur assortie au dégradé
+            couleurs_cercles = [
+                "#FFD54F", "#FF9800", "#F44336", 
+                "#E91E63", "#673AB7", "#2E7D32"
+            ]
+            couleur = couleurs_cercles[i % len(couleurs_cercles)]
+
+            # Position alternée (PRÉSERVER espacement qui fonctionne)
+            est_en_haut = i % 2 == 0
+            y_cercle = 0.8 if est_en_haut else -0.8
+            y_ligne_debut = 0.15 if est_en_haut else -0.15
+
+            # LIGNE VERTICALE DE CONNEXION (PRÉSERVÉE)
+            fig.add_trace(go.Scatter(
+                x=[x_pos, x_pos],
+                y=[y_ligne_debut, y_cercle - (0.25 if est_en_haut else -0.25)],
+                mode='lines',
+                line=dict(width=3, color=couleur),
+                showlegend=False,
+                hoverinfo='skip'
+            ))
+
+            # FORMAT DATE MM/YY pour cercle
+            date_formatted = debut_date.strftime('%m/%y')  # Format 07/25, 01/26, etc.
+
+            # CERCLE PRINCIPAL avec DATE INTÉGRÉE
+            fig.add_trace(go.Scatter(
+                x=[x_pos],
+                y=[y_cercle],
+                mode='markers+text',
+                marker=dict(
+                    size=80,  # Gros pour date complète
+                    color=couleur,
+                    symbol='circle',
+                    line=dict(width=5, color='white')
+                ),
+                text=[date_formatted],  # DATE MM/YY dans cercle
+                textfont=dict(size=16, color='white', family='Arial Bold'),
+                textposition='middle center',
+                showlegend=False,
+                hovertemplate=f"<b>Phase {i+1}</b><br>{nom_phase}<br>Date: {debut_date.strftime('%d/%m/%Y')}<extra></extra>"
+            ))
+
+            # TITRE ET DESCRIPTION (ESPACEMENT PRÉSERVÉ)
+            # Afficher nom complet (non tronqué)
+            nom_complet = nom_phase  # Texte complet
+
+            # Titre principal (position préservée)
+            y_titre = y_cercle + (0.4 if est_en_haut else -0.4)
+            fig.add_trace(go.Scatter(
+                x=[x_pos],
+                y=[y_titre],
+                mode='text',
+                text=[f"<b>PHASE {i+1:02d}</b>"],
+                textfont=dict(size=15, color='#333333', family='Arial Black'),
+                textposition='middle center',
+                showlegend=False,
+                hoverinfo='skip'
+            ))
+
+            # Description complète (espacement préservé, texte complet)
+            y_desc = y_cercle + (0.6 if est_en_haut else -0.6)
+            fig.add_trace(go.Scatter(
+                x=[x_pos],
+                y=[y_desc],
+                mode='text',
+                text=[f"{nom_complet}<br><span style='color:#999999;font-size:10px'>Statut: {statut}</span>"],
+                textfont=dict(size=12, color='#666666', family='Arial'),
+                textposition='middle center',
+                showlegend=False,
+                hoverinfo='skip'
+            ))
+
+        except Exception as e:
+            messages.append(('warning', f"⚠️ Erreur phase {i+1}: {str(e)}"))
+            continue
+
+    # LAYOUT TIMELINE CHRONOLOGIQUE (espacement égal, pas durées)
+    operation_nom = operation_data.get('nom', 'Opération') if isinstance(operation_data, dict) else 'Opération'
+
+    fig.update_layout(**timeline.timeline_layout(operation_nom, len(phases_valides)))
+
+    # Configuration outils
+    config = timeline.timeline_config(operation_nom)
+
+    return fig, config
+
+
+def points_visibles(fig):
+    """Ensemble des marqueurs et textes affichés (pour vérifier l'équivalence visuelle)"""
+    points = set()
+    for trace in fig.data:
+        if 'markers' in trace.mode or 'text' in trace.mode:
+            textes = trace.text if trace.text is not None else [None] * len(trace.x)
+            for x, y, texte in zip(trace.x, trace.y, textes):
+                points.add((round(float(x), 3), round(float(y), 3), texte))
+    return points
+
+
+def mesurer(fonction, repetitions):
+    debut = time.perf_counter()
+    for _ in range(repetitions):
+        resultat = fonction()
+    return (time.perf_counter() - debut) / repetitions * 1000, resultat
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    operation = {'id': 1, 'nom': 'BENCHMARK OPP'}
+
+    print(f"{'Template':<20}{'Phases':>8}{'Mode':>12}{'Traces':>8}{'Build ms':>11}{'JSON ms':>10}{'JSON Ko':>10}")
+    for type_operation in ('OPP', 'VEFA', 'MANDAT_REALISATION'):
+        phases = phases_depuis_template(type_operation)
+        figures = {}
+        for mode, construire in (('historique', create_timeline_historique), ('vectorisé', create_timeline_horizontal)):
+            duree_build, (fig, _) = mesurer(lambda: construire(operation, phases, messages=[]), repetitions)
+            duree_json, payload = mesurer(fig.to_json, repetitions)
+            figures[mode] = fig
+            print(f"{type_operation:<20}{len(phases):>8}{mode:>12}{len(fig.data):>8}"
+                  f"{duree_build:>11.1f}{duree_json:>10.1f}{len(payload) / 1024:>10.1f}")
+
+        identique = points_visibles(figures['historique']) == points_visibles(figures['vectorisé'])
+        print(f"{'':<20}{'':>8}{'rendu identique':>20}: {'oui' if identique else 'NON'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+OPCOPILOT v4.0 - Moteurs métier (hors interface Streamlit)
+Modules importables depuis l'application, les scripts batch et les benchmarks
+"""
@@ -0,0 +1,441 @@
+"""
+Moteur d'alertes - OPCOPILOT v4.0
+Les alertes du tableau de bord sont dérivées des enregistrements (phases, MED, trimestres REM,
+réclamations GPA, instances de workflow) par des règles. Chaque modification d'enregistrement est un événement mis en file :
+seules les règles de sa source sont réévaluées, pour ce seul enregistrement.
+Les alertes sont indexées par règle et dédoublonnées (une alerte visible par clé de regroupement,
+la plus prioritaire). Le passage des jours ne réévalue que les enregistrements dont l'échéance tombe.
+"""
+
+import heapq
+import threading
+from collections import deque
+from datetime import date, timedelta
+
+from opcopilot.persistence import GpaReclamation, Med, Phase, RemTrimestre, get_alertes, iter_par_operation, \
+    list_operations
+
+# Niveaux par priorité décroissante (mêmes valeurs que alertes_demo)
+NIVEAUX = ('CRITIQUE', 'WARNING', 'INFO')
+
+STATUTS_OPERATION_CLOTUREE = ('CLOTUREE', 'ARCHIVEE')
+STATUTS_PHASE_TERMINEE = ('VALIDEE', 'TERMINEE', 'CLOTUREE')
+STATUTS_RESOLUS = ('RESOLU', 'CLOS', 'CLOTURE', 'ANNULE')
+
+HORIZON_ECHEANCE_PHASE = 7  # jours
+HORIZON_ECHEANCE_MED = 3  # jours
+SEUIL_ECART_REM = 0.10  # REM réalisée inférieure de plus de 10 % à la projection
+SEUIL_ECART_REM_CRITIQUE = 0.25
+
+# Section de demo_data → source des règles
+SECTIONS = {
+    'phases_demo': 'phase',
+    'med_demo': 'med',
+    'rem_demo': 'rem',
+    'gpa_demo': 'gpa'
+}
+
+# Table → source des règles (chargement depuis la base, trié par opération puis par ces colonnes)
+TABLES = {
+    'phase': (Phase, Phase.ordre),
+    'med': (Med, Med.date_envoi),
+    'rem': (RemTrimestre, RemTrimestre.annee, RemTrimestre.numero),
+    'gpa': (GpaReclamation, GpaReclamation.date)
+}
+
+# Clé d'un enregistrement dans sa source (enregistrement, position)
+CLES = {
+    'phase': lambda phase, i: phase.get('ordre', i),
+    'med': lambda med, i: med.get('reference') or i,
+    'rem': lambda trimestre, i: trimestre.get('trimestre') or i,
+    'gpa': lambda reclamation, i: f"{reclamation.get('date')}-{reclamation.get('logement')}-{i}",
+    'file': lambda alerte, i: alerte.get('id') or i,
+    'workflow': lambda instance, i: (instance.get('workflow'), instance.get('objet'))
+}
+
+
+def _date(valeur):
+    if not valeur:
+        return None
+    if isinstance(valeur, date):
+        return valeur
+    try:
+        return date.fromisoformat(str(valeur)[:10])
+    except ValueError:
+        return None
+
+
+def _alerte(niveau, message, action, date_alerte, regroupement=None, retard=0):
+    return {
+        'type': niveau,
+        'message': message,
+        'action_requise': action,
+        'date': date_alerte.isoformat() if date_alerte else '',
+        'retard_jours': retard,
+        'regroupement': regroupement
+    }
+
+
+# ==============================================================================
+# RÈGLES : (enregistrement, aujourd'hui) → (alerte ou None, date de réévaluation ou None)
+# ==============================================================================
+
+def regle_phase_retard(phase, aujourd_hui):
+    """Phase non terminée dont la fin prévue est dépassée (une alerte par opération : la plus en retard)"""
+    fin_prevue = _date(phase.get('date_fin_prevue'))
+    if fin_prevue is None or phase.get('date_fin_reelle') or phase.get('statut') in STATUTS_PHASE_TERMINEE:
+        return None, None
+    if fin_prevue >= aujourd_hui:
+        return None, fin_prevue + timedelta(days=1)
+
+    retard = (aujourd_hui - fin_prevue).days
+    niveau = 'CRITIQUE' if phase.get('est_critique') else 'WARNING'
+    alerte = _alerte(niveau, f"Retard {retard} jours sur phase {phase.get('nom', '')}",
+                     f"Relance {phase.get('responsable') or 'responsable'}", fin_prevue, 'phase_retard', retard)
+    return alerte, aujourd_hui + timedelta(days=1)
+
+
+def regle_phase_echeance(phase, aujourd_hui):
+    """Fin de phase prévue dans les prochains jours"""
+    fin_prevue = _date(phase.get('date_fin_prevue'))
+    if fin_prevue is None or phase.get('date_fin_reelle') or phase.get('statut') in STATUTS_PHASE_TERMINEE:
+        return None, None
+    debut_horizon = fin_prevue - timedelta(days=HORIZON_ECHEANCE_PHASE)
+    if aujourd_hui < debut_horizon:
+        return None, debut_horizon
+    if aujourd_hui > fin_prevue:
+        return None, None
+
+    jours = (fin_prevue - aujourd_hui).days
+    alerte = _alerte('INFO', f"Échéance phase {phase.get('nom', '')} dans {jours} jours",
+                     "Préparer la validation de phase", fin_prevue, 'phase_echeance')
+    return alerte, aujourd_hui + timedelta(days=1)
+
+
+def regle_phase_validation(phase, aujourd_hui):
+    """Phase en attente de validation"""
+    if phase.get('statut') != 'VALIDATION_REQUISE':
+        return None, None
+    return _alerte('WARNING', f"Validation requise : {phase.get('nom', '')}", "Validation hiérarchique",
+                   _date(phase.get('date_fin_prevue')) or aujourd_hui), None
+
+
+def regle_med_delai(med, aujourd_hui):
+    """Mise en demeure non résolue : délai de conformité proche ou dépassé"""
+    envoi = _date(med.get('date_envoi'))
+    if envoi is None or med.get('statut') in STATUTS_RESOLUS or med.get('date_resolution'):
+        return None, None
+
+    echeance = envoi + timedelta(days=med.get('delai_conformite') or 0)
+    debut_horizon = echeance - timedelta(days=HORIZON_ECHEANCE_MED)
+    destinataire = med.get('destinataire') or 'destinataire'
+    if aujourd_hui < debut_horizon:
+        return None, debut_horizon
+    if aujourd_hui <= echeance:
+        jours = (echeance - aujourd_hui).days
+        alerte = _alerte('WARNING', f"MED {med.get('reference', '')} : délai de conformité dans {jours} jours",
+                         f"Vérifier la mise en conformité {destinataire}", echeance)
+        return alerte, aujourd_hui + timedelta(days=1)
+
+    retard = (aujourd_hui - echeance).days
+    action = "Constat de carence / suite contentieuse" if med.get('relance_effectuee') else f"Relance {destinataire}"
+    alerte = _alerte('CRITIQUE', f"MED {med.get('reference', '')} : délai de conformité dépassé de {retard} jours",
+                     action, echeance, retard=retard)
+    return alerte, aujourd_hui + timedelta(days=1)
+
+
+def regle_rem_ecart(trimestre, aujourd_hui):
+    """Trimestre REM saisi nettement sous la projection (une alerte par opération : le dernier trimestre)"""
+    projetee = trimestre.get('rem_projetee') or 0
+    realisee = trimestre.get('rem_realisee') or 0
+    if not projetee or not realisee:
+        return None, None
+
+    ecart = (realisee - projetee) / projetee
+    if ecart > -SEUIL_ECART_REM:
+        return None, None
+
+    libelle = trimestre.get('trimestre', '')
+    niveau = 'CRITIQUE' if ecart <= -SEUIL_ECART_REM_CRITIQUE else 'WARNING'
+    alerte = _alerte(niveau, f"REM {libelle} : {realisee - projetee:,.0f} € ({ecart:.0%}) vs projection",
+                     "Analyse de l'écart et révision du prévisionnel", _fin_trimestre(libelle), 'rem_ecart')
+    return alerte, None
+
+
+def regle_gpa_intervention(reclamation, aujourd_hui):
+    """Réclamation GPA non résolue au-delà du délai d'intervention"""
+    signalement = _date(reclamation.get('date'))
+    if signalement is None or reclamation.get('statut') in STATUTS_RESOLUS or reclamation.get('date_resolution'):
+        return None, None
+
+    echeance = signalement + timedelta(days=reclamation.get('delai_intervention') or 0)
+    if aujourd_hui <= echeance:
+        return None, echeance + timedelta(days=1)
+
+    retard = (aujourd_hui - echeance).days
+    entreprise = reclamation.get('entreprise') or 'entreprise'
+    alerte = _alerte('WARNING', f"GPA logement {reclamation.get('logement', '')} ({reclamation.get('type', '')}) : "
+                                f"intervention en retard de {retard} jours",
+                     f"Relance {entreprise}", echeance, retard=retard)
+    return alerte, aujourd_hui + timedelta(days=1)
+
+
+def regle_alerte_file(alerte, aujourd_hui):
+    """Alerte mise en file par un traitement de masse (table alertes), visible tant qu'elle n'est pas traitée"""
+    if alerte.get('statut') == 'TRAITEE':
+        return None, None
+    return _alerte(alerte.get('niveau') or 'INFO', alerte.get('message', ''), alerte.get('action_requise', ''),
+                   _date(alerte.get('date')), f"file_{alerte.get('type')}"), None
+
+
+def regle_workflow_retard(instance, aujourd_hui):
+    """Instance de workflow en cours dont l'échéance de l'étape courante est dépassée"""
+    echeance = _date(instance.get('echeance'))
+    if echeance is None or instance.get('termine'):
+        return None, None
+    if aujourd_hui <= echeance:
+        return None, echeance + timedelta(days=1)
+
+    retard = (aujourd_hui - echeance).days
+    objet = instance.get('objet') or instance.get('workflow', '')
+    alerte = _alerte('WARNING', f"Workflow {objet} : étape {instance.get('etape', '')} en retard de {retard} jours",
+                     f"Relance {instance.get('responsable') or 'responsable'}", echeance, retard=retard)
+    return alerte, aujourd_hui + timedelta(days=1)
+
+
+def _fin_trimestre(libelle):
+    """'T3 2024' → 2024-09-30"""
+    try:
+        numero, annee = libelle.split()
+        mois = 3 * int(numero.lstrip('T'))
+        return date(int(annee) + mois // 12, mois % 12 + 1, 1) - timedelta(days=1)
+    except (ValueError, AttributeError):
+        return None
+
+
+# Règles par source d'enregistrement
+REGLES = {
+    'phase': (regle_phase_retard, regle_phase_echeance, regle_phase_validation),
+    'med': (regle_med_delai,),
+    'rem': (regle_rem_ecart,),
+    'gpa': (regle_gpa_intervention,),
+    'file': (regle_alerte_file,),
+    'workflow': (regle_workflow_retard,)
+}
+
+
+# ==============================================================================
+# MOTEUR INCRÉMENTAL
+# ==============================================================================
+
+class AlertEngine:
+    """
+    Alertes matérialisées du portefeuille
+    - submit() : événement (source, opération, clé, enregistrement ou None si supprimé) mis en file
+    - process() : dépile les événements et réévalue les seules règles concernées
+    - set_today() : réévalue uniquement les enregistrements dont la date de réévaluation est atteinte
+    - alertes() : lecture triée par priorité (recalculée seulement après changement)
+    """
+
+    def __init__(self, operations, aujourd_hui=None, regles=REGLES):
+        self.regles = regles
+        self.aujourd_hui = aujourd_hui or date.today()
+        self._lock = threading.Lock()
+        self._operations = {op['id']: op for op in operations}
+        self._file = deque()
+        self._records = {}  # (source, opération, clé) → enregistrement
+        self._par_operation = {}  # opération → {(source, opération, clé)}
+        self._index = {regle.__name__: {} for regles_source in regles.values() for regle in regles_source}
+        self._groupes = {}  # clé de regroupement → {(règle, enregistrement)}
+        self._visibles = {}  # clé de regroupement → alerte affichée
+        self._reveils = []  # tas (date, (source, opération, clé))
+        self._prochaines = {}  # (source, opération, clé) → date de réévaluation en vigueur
+        self._tri = None
+        self.evaluations = 0
+
+    @classmethod
+    def from_demo_data(cls, demo_data, aujourd_hui=None):
+        """Moteur chargé depuis demo_data.json (un événement par enregistrement)"""
+        engine = cls(demo_data.get('operations_demo', []), aujourd_hui)
+        for section, source in SECTIONS.items():
+            for cle_operation, enregistrements in (demo_data.get(section) or {}).items():
+                engine.replace_records(source, int(cle_operation.rsplit('_', 1)[-1]), enregistrements)
+        engine.process()
+        return engine
+
+    @classmethod
+    def from_session(cls, session, aujourd_hui=None):
+        """Moteur chargé depuis la base : tables lues en flux par opération, puis alertes en file"""
+        engine = cls(list_operations(session), aujourd_hui)
+        for source, (modele, *ordre) in TABLES.items():
+            for operation_id, enregistrements in iter_par_operation(session, modele, *ordre):
+                engine.replace_records(source, operation_id, enregistrements)
+        file_alertes = {}
+        for alerte in get_alertes(session):
+            file_alertes.setdefault(alerte['operation_id'], []).append(alerte)
+        for operation_id, enregistrements in file_alertes.items():
+            engine.replace_records('file', operation_id, enregistrements)
+        engine.process()
+        return engine
+
+    # --- Événements -----------------------------------------------------------
+
+    def submit(self, source, operation_id, cle, record):
+        """Met en file la création/modification (record) ou la suppression (None) d'un enregistrement"""
+        with self._lock:
+            self._file.append((source, operation_id, cle, record))
+
+    def replace_records(self, source, operation_id, records):
+        """Remplace tous les enregistrements d'une source pour une opération (suppressions comprises)"""
+        nouvelles = {CLES[source](record, i): record for i, record in enumerate(records or [])}
+        with self._lock:
+            anciennes = [k[2] for k in self._par_operation.get(operation_id, ()) if k[0] == source]
+        for ancienne in anciennes:
+            if ancienne not in nouvelles:
+                self.submit(source, operation_id, ancienne, None)
+        for k, record in nouvelles.items():
+            self.submit(source, operation_id, k, record)
+
+    def update_operation(self, operation):
+        """Opération créée ou modifiée (nom, ACO, statut) : ses alertes sont réévaluées"""
+        with self._lock:
+            self._operations[operation['id']] = operation
+            self._file.extend((*cle_record, self._records[cle_record])
+                              for cle_record in self._par_operation.get(operation['id'], ()))
+
+    def process(self):
+        """Traite les événements en file - retourne le nombre d'événements traités"""
+        with self._lock:
+            traites = 0
+            while self._file:
+                self._evaluer(*self._file.popleft())
+                traites += 1
+            return traites
+
+    def set_today(self, aujourd_hui):
+        """Avance la date courante : seuls les enregistrements arrivés à échéance sont réévalués"""
+        with self._lock:
+            if aujourd_hui == self.aujourd_hui:
+                return 0
+            recul = aujourd_hui < self.aujourd_hui
+            self.aujourd_hui = aujourd_hui
+            if recul:
+                dus = list(self._records)
+                self._reveils = []
+                self._prochaines = {}
+            else:
+                dus = set()
+                while self._reveils and self._reveils[0][0] <= aujourd_hui:
+                    echeance, cle_record = heapq.heappop(self._reveils)
+                    # Entrées périmées (enregistrement réévalué depuis) ignorées
+                    if self._prochaines.get(cle_record) == echeance:
+                        dus.add(cle_record)
+            for cle_record in dus:
+                if cle_record in self._records:
+                    self._evaluer(*cle_record, self._records[cle_record])
+            return len(dus)
+
+    def _evaluer(self, source, operation_id, cle, record):
+        """Réévalue les règles de la source pour un enregistrement (verrou détenu)"""
+        cle_record = (source, operation_id, cle)
+        if record is None:
+            self._records.pop(cle_record, None)
+            self._par_operation.get(operation_id, set()).discard(cle_record)
+        else:
+            self._records[cle_record] = record
+            self._par_operation.setdefault(operation_id, set()).add(cle_record)
+
+        operation = self._operations.get(operation_id)
+        active = record is not None and operation is not None \
+            and operation.get('statut') not in STATUTS_OPERATION_CLOTUREE
+
+        prochaine = None
+        for regle in self.regles.get(source, ()):
+            alerte, revoir_le = regle(record, self.aujourd_hui) if active else (None, None)
+            self.evaluations += active
+            if revoir_le is not None and (prochaine is None or revoir_le < prochaine):
+                prochaine = revoir_le
+
+            index = self._index[regle.__name__]
+            ancienne = index.pop(cle_record, None)
+            if ancienne is not None:
+                self._retirer(ancienne['_groupe'], (regle.__name__, cle_record))
+            if alerte is not None:
+                alerte.update({
+                    'operation_id': operation_id,
+                    'operation': operation.get('nom', ''),
+                    'type_operation': operation.get('type_operation'),
+                    'aco': operation.get('aco_responsable'),
+                    'regle': regle.__name__,
+                    # Regroupement par opération (ex. une seule alerte "retard" par opération), sinon par enregistrement
+                    '_groupe': (operation_id, alerte['regroupement']) if alerte['regroupement']
+                    else (operation_id, regle.__name__, cle)
+                })
+                index[cle_record] = alerte
+                self._ajouter(alerte['_groupe'], (regle.__name__, cle_record))
+
+        if prochaine is None:
+            self._prochaines.pop(cle_record, None)
+        elif self._prochaines.get(cle_record) != prochaine:
+            self._prochaines[cle_record] = prochaine
+            heapq.heappush(self._reveils, (prochaine, cle_record))
+
+    # --- Dédoublonnage ----------------------------------------------------------
+
+    def _ajouter(self, groupe, membre):
+        self._groupes.setdefault(groupe, set()).add(membre)
+        self._elire(groupe)
+
+    def _retirer(self, groupe, membre):
+        membres = self._groupes.get(groupe)
+        if membres is not None:
+            membres.discard(membre)
+            if not membres:
+                del self._groupes[groupe]
+        self._elire(groupe)
+
+    def _elire(self, groupe):
+        """Alerte visible d'un groupe : la plus prioritaire, les autres sont comptées"""
+        membres = self._groupes.get(groupe)
+        self._tri = None
+        if not membres:
+            self._visibles.pop(groupe, None)
+            return
+        candidates = [self._index[regle][cle_record] for regle, cle_record in membres]
+        meilleure = min(candidates, key=_priorite)
+        self._visibles[groupe] = dict(meilleure, occurrences=len(candidates))
+
+    # --- Lecture --------------------------------------------------------------
+
+    def alertes(self, aco=None, limite=None):
+        """Alertes visibles par priorité (niveau, retard, date) - tout le portefeuille si aco est None"""
+        with self._lock:
+            if self._tri is None:
+                self._tri = sorted(self._visibles.values(), key=_priorite)
+            alertes = self._tri
+        if aco is not None:
+            alertes = [alerte for alerte in alertes if alerte['aco'] == aco]
+        return alertes[:limite]
+
+    def compteurs(self, aco=None):
+        """Nombre d'alertes visibles par niveau"""
+        compteurs = dict.fromkeys(NIVEAUX, 0)
+        for alerte in self.alertes(aco):
+            compteurs[alerte['type']] = compteurs.get(alerte['type'], 0) + 1
+        return compteurs
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enregistrements': len(self._records),
+                'alertes': len(self._visibles),
+                'candidates': sum(len(index) for index in self._index.values()),
+                'en_file': len(self._file),
+                'reveils': len(self._reveils),
+                'evaluations': self.evaluations
+            }
+
+
+def _priorite(alerte):
+    rang = NIVEAUX.index(alerte['type']) if alerte['type'] in NIVEAUX else len(NIVEAUX)
+    return rang, -alerte.get('retard_jours', 0), alerte.get('date', '')
@@ -0,0 +1,101 @@
+"""
+Cache de données versionné - OPCOPILOT v4.0
+Les jeux de données JSON (data/*.json) sont indexés sur chemin + mtime + empreinte SHA-256
+et ne sont re-parsés que lorsque le fichier change réellement sur disque.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+
+def file_fingerprint(path):
+    """Empreinte rapide d'un fichier (chemin absolu, mtime, taille) - un seul stat()"""
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+def content_digest(raw):
+    """Empreinte SHA-256 du contenu brut"""
+    return hashlib.sha256(raw).hexdigest()
+
+
+class DataCache:
+    """
+    Cache partagé entre sessions des jeux de données JSON
+    - HIT : mtime et taille inchangés → aucun accès au contenu
+    - mtime modifié mais contenu identique → ré-horodatage sans re-parsing
+    - contenu modifié → re-parsing et nouvelle version
+    Les données retournées sont partagées : elles doivent être traitées en lecture seule.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def get(self, path, parser=json.loads):
+        """Retourne les données du fichier, re-parsées uniquement si le contenu a changé"""
+        abs_path, mtime_ns, size = file_fingerprint(path)
+
+        with self._lock:
+            entry = self._entries.get(abs_path)
+
+            if entry and entry['mtime_ns'] == mtime_ns and entry['size'] == size:
+                self.hits += 1
+                return entry['data']
+
+            with open(abs_path, 'rb') as f:
+                raw = f.read()
+            digest = content_digest(raw)
+
+            # Fichier touché mais contenu identique : pas de re-parsing
+            if entry and entry['digest'] == digest:
+                entry['mtime_ns'] = mtime_ns
+                entry['size'] = size
+                self.hits += 1
+                return entry['data']
+
+            data = parser(raw.decode('utf-8'))
+            self.misses += 1
+            if entry:
+                self.reloads += 1
+
+            self._entries[abs_path] = {
+                'mtime_ns': mtime_ns,
+                'size': size,
+                'digest': digest,
+                'data': data
+            }
+            return data
+
+    def version(self, path):
+        """Version courante (empreinte courte du contenu) d'un fichier déjà chargé"""
+        entry = self._entries.get(os.path.abspath(path))
+        return entry['digest'][:12] if entry else None
+
+    def invalidate(self, path=None):
+        """Invalide un fichier, ou tout le cache si aucun chemin n'est fourni"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+
+    def stats(self):
+        """Compteurs hit/miss et versions des fichiers en cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+                'hit_ratio': round(self.hits / total * 100, 1) if total else 0.0,
+                'fichiers': {
+                    os.path.basename(path): entry['digest'][:12]
+                    for path, entry in self._entries.items()
+                }
+            }
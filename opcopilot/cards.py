@@ -0,0 +1,137 @@
+"""
+Composants cartes - OPCOPILOT v4.0
+Gabarits HTML précompilés (alertes, actions réalisées, opérations) rendus à partir des données :
+une section entière produit une seule chaîne HTML, envoyée en un seul st.markdown,
+quel que soit le nombre de cartes.
+"""
+
+import html
+from string import Formatter
+
+# Niveau d'alerte (type des données) → classe CSS
+NIVEAUX_ALERTE = {
+    'CRITIQUE': 'critique',
+    'WARNING': 'attention',
+    'ATTENTION': 'attention',
+    'INFO': 'info'
+}
+
+ICONES_OPERATION = {
+    'VEFA': '🏠'
+}
+ICONE_OPERATION_DEFAUT = '🏗️'
+
+
+class CardTemplate:
+    """
+    Gabarit compilé une fois : segments littéraux et champs sont découpés à la construction,
+    le rendu n'est plus qu'une jointure. Les champs sont échappés, sauf ceux déclarés `brut`.
+    """
+
+    def __init__(self, source, brut=()):
+        # Une seule ligne : une ligne blanche (champ vide) couperait le bloc HTML côté Markdown
+        source = ''.join(ligne.strip() for ligne in source.strip().splitlines())
+        self.segments = []
+        for litteral, champ, _, _ in Formatter().parse(source):
+            if litteral:
+                self.segments.append((litteral, None))
+            if champ is not None:
+                self.segments.append((None, champ))
+        self.brut = frozenset(brut)
+
+    def render(self, valeurs):
+        parties = []
+        for litteral, champ in self.segments:
+            if champ is None:
+                parties.append(litteral)
+            elif champ in self.brut:
+                parties.append(str(valeurs.get(champ, '')))
+            else:
+                parties.append(html.escape(str(valeurs.get(champ, ''))))
+        return ''.join(parties)
+
+
+ALERTE = CardTemplate("""
+<div class="alert-card {classe}">
+    <div class="alert-card-title">{icone} {operation}</div>
+    <div class="alert-card-message">{message}</div>
+    <div class="alert-card-action">Action: {action_requise}</div>
+</div>
+""")
+
+ACTION = CardTemplate("""
+<div class="action-card">
+    <div class="action-card-icon">{icone}</div>
+    <div class="action-card-body">
+        <div class="action-card-title">{titre}</div>
+        <div class="action-card-detail">{detail}</div>
+    </div>
+</div>
+""")
+
+OPERATION = CardTemplate("""
+<div class="operation-card">
+    <div class="operation-card-body">
+        <div>
+            <h4>{icone} {nom} - {type_operation}</h4>
+            <p><strong>📍 {commune}</strong> • {nb_logements_total} logements • {budget_total} €</p>
+            <p><em>Créé le {date_creation} • Fin prévue {date_fin_prevue}</em></p>
+        </div>
+        <div class="operation-card-side">
+            <p><strong>Avancement: {avancement}%</strong></p>
+            <p>Statut: <span class="{classe_statut}">{statut}</span></p>
+            {frein}
+        </div>
+    </div>
+</div>
+""", brut=('frein',))
+
+FREIN = CardTemplate("""<p class="frein-badge">⚠️ {freins_actifs} frein(s)</p>""")
+
+
+def icone_operation(type_operation):
+    return ICONES_OPERATION.get(type_operation, ICONE_OPERATION_DEFAUT)
+
+
+def _section(cartes, vide):
+    """Cartes regroupées dans un seul bloc (message si la section est vide)"""
+    if not cartes:
+        return f'<div class="card-empty">{html.escape(vide)}</div>'
+    return f'<div class="card-stack">{"".join(cartes)}</div>'
+
+
+def alert_cards(alertes, limite=None, vide="Aucune alerte en cours"):
+    """HTML de la section alertes, dans l'ordre reçu ({operation, type, message, action_requise, [type_operation]})"""
+    cartes = []
+    for alerte in alertes[:limite]:
+        # Alertes regroupées par le moteur (ex. plusieurs phases en retard sur une opération)
+        autres = (alerte.get('occurrences') or 1) - 1
+        cartes.append(ALERTE.render({
+            **alerte,
+            'classe': NIVEAUX_ALERTE.get(alerte.get('type'), 'info'),
+            'icone': icone_operation(alerte.get('type_operation')),
+            'message': f"{alerte.get('message', '')} (+{autres} autre(s))" if autres else alerte.get('message', '')
+        }))
+    return _section(cartes, vide)
+
+
+def action_cards(actions, limite=None, vide="Aucune action réalisée"):
+    """HTML de la section actions réalisées ({titre, detail, [icone]})"""
+    cartes = [ACTION.render({'icone': '✅', **action}) for action in actions[:limite]]
+    return _section(cartes, vide)
+
+
+def operation_cards(operations, vide="Aucune opération"):
+    """HTML des cartes opération du portefeuille"""
+    cartes = []
+    for op in operations:
+        freins = op.get('freins_actifs', 0) or 0
+        cartes.append(OPERATION.render({
+            **op,
+            'icone': icone_operation(op.get('type_operation')),
+            'nb_logements_total': op.get('nb_logements_total', 0),
+            'budget_total': f"{op.get('budget_total', 0) or 0:,}",
+            'classe_statut': 'statut-en-cours' if op.get('statut') == 'EN_COURS' else 'statut-autre',
+            'frein': FREIN.render({'freins_actifs': freins}) if freins > 0 else ''
+        }))
+    return _section(cartes, vide)
@@ -0,0 +1,223 @@
+"""
+Clôture trimestrielle REM - OPCOPILOT v4.0
+Traitement de masse hors Streamlit (étape 1 du workflow_rem « Alerte fin de trimestre ») :
+pour chaque opération active, le trimestre clos est créé s'il manque (projections reprises du
+dernier trimestre connu), puis les alertes sont mises en file (saisie attendue ou en retard,
+écart REM / travaux). Les opérations sont découpées en lots calculés dans un pool de processus,
+en colonnes ; les écritures restent dans le processus principal (une transaction par lot).
+
+Usage CLI :
+    python -m opcopilot.cloture_rem [--trimestre "T3 2024"] [--date 2024-10-01] [--lot 1000] [--workers 4]
+                                    [--dry-run]
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, select
+
+from opcopilot.persistence import (
+    Operation, RemTrimestre, bump_db_version, create_db_engine, get_sessionmaker, init_db, parse_trimestre,
+    queue_alertes
+)
+from opcopilot.workflows import trimestre_echu
+
+WORKFLOW_MODULES_PATH = os.path.join('data', 'workflow_modules.json')
+
+STATUTS_OPERATION_CLOTUREE = ('CLOTUREE', 'ARCHIVEE')
+
+PROJECTIONS = ['rem_projetee', 'depenses_projetees']
+REALISATIONS = ['rem_realisee', 'depenses_facturees']
+
+# Seuils par défaut (surchargés par workflow_rem.alertes de workflow_modules.json)
+SEUILS_DEFAUT = {
+    'ECART_CRITIQUE': 15,  # points d'écart entre avancement REM et avancement travaux
+    'RETARD_SAISIE': 7  # jours après la fin du trimestre
+}
+
+TAILLE_LOT = 1000
+
+
+def seuils_alertes(definitions):
+    """Seuils des alertes REM déclarés dans workflow_modules.json"""
+    seuils = dict(SEUILS_DEFAUT)
+    for alerte in (definitions.get('workflow_rem') or {}).get('alertes', []):
+        if alerte.get('type') in seuils and alerte.get('seuil') is not None:
+            seuils[alerte['type']] = alerte['seuil']
+    return seuils
+
+
+def _fin_trimestre(annee, numero):
+    return (pd.Timestamp(annee, 3 * numero, 1) + pd.offsets.MonthEnd(0)).date()
+
+
+# ==============================================================================
+# CALCUL D'UN LOT (processus du pool : aucune entrée/sortie)
+# ==============================================================================
+
+def traiter_lot(operations, historique, annee, numero, jour, seuils):
+    """
+    Un lot d'opérations actives (DataFrame id, nom) et leurs trimestres REM jusqu'au trimestre clos inclus
+    → (trimestres à créer, alertes à mettre en file), calculés en colonnes
+    """
+    libelle = f"T{numero} {annee}"
+    source = f"REM {libelle}"
+    fin = _fin_trimestre(annee, numero)
+    ids = operations['id'].to_numpy()
+
+    historique = historique.sort_values(['operation_id', 'annee', 'numero'])
+    clos = historique['annee'].eq(annee) & historique['numero'].eq(numero)
+    courant = historique[clos].set_index('operation_id').reindex(ids)
+
+    # Trimestres manquants : projections du dernier trimestre antérieur (0 si aucun)
+    precedent = historique[~clos].groupby('operation_id')[PROJECTIONS].last().reindex(ids).fillna(0.0)
+    manquant = courant['trimestre'].isna().to_numpy()
+    nouveaux = precedent[manquant].reset_index(names='operation_id')
+    nouveaux = nouveaux.assign(trimestre=libelle, annee=annee, numero=numero,
+                               rem_realisee=0.0, depenses_facturees=0.0)
+
+    # Avancements du trimestre clos (non saisi : aucune réalisation)
+    realise = courant[REALISATIONS].fillna(0.0).to_numpy()
+    projete = courant[PROJECTIONS].fillna(0.0).to_numpy()
+    saisi = (realise > 0).any(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avancement = np.where(projete > 0, 100 * realise / projete, 0.0)
+    ecart = np.abs(avancement[:, 0] - avancement[:, 1])
+
+    retard = (jour - fin).days - seuils['RETARD_SAISIE']
+    alertes = []
+    for operation_id, est_saisi, ecart_points in zip(ids.tolist(), saisi.tolist(), ecart.tolist()):
+        if not est_saisi and retard > 0:
+            alertes.append(_alerte(operation_id, 'RETARD_SAISIE', 'WARNING',
+                                   f"Saisie REM {libelle} en retard de {retard} jours",
+                                   "Saisir la REM réalisée et les dépenses facturées", jour, source))
+        elif not est_saisi:
+            echeance = pd.Timestamp(fin) + pd.Timedelta(days=seuils['RETARD_SAISIE'])
+            alertes.append(_alerte(operation_id, 'FIN_TRIMESTRE', 'INFO',
+                                   f"Fin de trimestre {libelle} : saisie REM attendue avant le "
+                                   f"{echeance.strftime('%d/%m/%Y')}",
+                                   "Saisir la REM réalisée et les dépenses facturées", jour, source))
+        elif ecart_points > seuils['ECART_CRITIQUE']:
+            alertes.append(_alerte(operation_id, 'ECART_CRITIQUE', 'CRITIQUE',
+                                   f"Écart REM / travaux {libelle} : {ecart_points:.0f} points",
+                                   "Alerte ACO et hiérarchie : analyse de l'écart", jour, source))
+
+    return nouveaux[['operation_id', 'trimestre', 'annee', 'numero', *PROJECTIONS, *REALISATIONS]] \
+        .to_dict('records'), alertes
+
+
+def _alerte(operation_id, type_alerte, niveau, message, action, jour, source):
+    return {'operation_id': operation_id, 'type': type_alerte, 'niveau': niveau, 'message': message,
+            'action_requise': action, 'date': jour, 'source': source}
+
+
+# ==============================================================================
+# TRAITEMENT DE MASSE
+# ==============================================================================
+
+def _lots(session, annee, numero, taille):
+    """Opérations actives et historique REM (deux requêtes), découpés en lots d'opérations"""
+    operations = pd.DataFrame(session.execute(
+        select(Operation.id, Operation.nom)
+        .where(Operation.statut.is_(None) | Operation.statut.notin_(STATUTS_OPERATION_CLOTUREE))
+        .order_by(Operation.id)
+    ).all(), columns=['id', 'nom'])
+
+    colonnes = ['operation_id', 'trimestre', 'annee', 'numero', *PROJECTIONS, *REALISATIONS]
+    historique = pd.DataFrame(session.execute(
+        select(*(getattr(RemTrimestre, colonne) for colonne in colonnes))
+        .where((RemTrimestre.annee < annee) | ((RemTrimestre.annee == annee) & (RemTrimestre.numero <= numero)))
+        .order_by(RemTrimestre.operation_id)
+    ).all(), columns=colonnes)
+    historique[colonnes[4:]] = historique[colonnes[4:]].fillna(0.0).astype(float)
+
+    # Historique trié par opération : tranche de chaque lot par recherche dichotomique
+    ids_historique = historique['operation_id'].to_numpy()
+    for debut in range(0, len(operations), taille):
+        lot = operations.iloc[debut:debut + taille]
+        bas = np.searchsorted(ids_historique, lot['id'].iloc[0], side='left')
+        haut = np.searchsorted(ids_historique, lot['id'].iloc[-1], side='right')
+        yield lot, historique.iloc[bas:haut]
+
+
+def cloture_trimestre(session, annee, numero, jour=None, taille_lot=TAILLE_LOT, workers=None, seuils=None,
+                      dry_run=False):
+    """
+    Clôture REM du trimestre pour tout le portefeuille actif
+    Retourne {operations, lots, trimestres_crees, alertes: {type: nombre}, alertes_en_file, duree_s}
+    """
+    debut = time.perf_counter()
+    jour = jour or date.today()
+    seuils = seuils or dict(SEUILS_DEFAUT)
+    lots = list(_lots(session, annee, numero, taille_lot))
+    workers = workers if workers is not None else min(len(lots), os.cpu_count() or 1)
+
+    if workers > 1 and len(lots) > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        resultats = executor.map(traiter_lot, *zip(*((lot, historique, annee, numero, jour, seuils)
+                                                     for lot, historique in lots)))
+    else:
+        executor = None
+        resultats = (traiter_lot(lot, historique, annee, numero, jour, seuils) for lot, historique in lots)
+
+    bilan = {'operations': sum(len(lot) for lot, _ in lots), 'lots': len(lots), 'workers': max(workers, 1),
+             'trimestres_crees': 0, 'alertes': {}, 'alertes_en_file': 0}
+    try:
+        # Résultats écrits dans l'ordre des lots, au fil de leur calcul
+        for trimestres, alertes in resultats:
+            bilan['trimestres_crees'] += len(trimestres)
+            for alerte in alertes:
+                bilan['alertes'][alerte['type']] = bilan['alertes'].get(alerte['type'], 0) + 1
+            if dry_run:
+                continue
+            if trimestres:
+                session.execute(insert(RemTrimestre), trimestres)
+                bump_db_version(session, 'rem')
+            bilan['alertes_en_file'] += queue_alertes(session, alertes)
+            session.commit()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    bilan['duree_s'] = round(time.perf_counter() - debut, 3)
+    return bilan
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clôture trimestrielle REM du portefeuille")
+    parser.add_argument('--trimestre', help='Trimestre clos, ex. "T3 2024" (défaut : dernier trimestre échu)')
+    parser.add_argument('--date', type=date.fromisoformat, help='Date de traitement (défaut : aujourd\'hui)')
+    parser.add_argument('--lot', type=int, default=TAILLE_LOT, help='Opérations par lot')
+    parser.add_argument('--workers', type=int, help='Processus de calcul (défaut : un par lot, borné aux CPU)')
+    parser.add_argument('--db', help='URL de la base (défaut : OPCOPILOT_DB_URL)')
+    parser.add_argument('--dry-run', action='store_true', help='Calcule sans écrire')
+    args = parser.parse_args(argv)
+
+    jour = args.date or date.today()
+    libelle = args.trimestre or trimestre_echu(jour)[0]
+    numero, annee = parse_trimestre(libelle)
+
+    seuils = dict(SEUILS_DEFAUT)
+    if os.path.exists(WORKFLOW_MODULES_PATH):
+        with open(WORKFLOW_MODULES_PATH, 'r', encoding='utf-8') as f:
+            seuils = seuils_alertes(json.load(f))
+
+    moteur = create_db_engine(args.db)
+    init_db(moteur)
+    with get_sessionmaker(moteur)() as session:
+        bilan = cloture_trimestre(session, annee, numero, jour, args.lot, args.workers, seuils, args.dry_run)
+
+    alertes = ', '.join(f"{nb} {type_alerte}" for type_alerte, nb in sorted(bilan['alertes'].items())) or 'aucune'
+    print(f"{'🔎' if args.dry_run else '✅'} Clôture REM T{numero} {annee} : {bilan['operations']} opération(s) "
+          f"en {bilan['lots']} lot(s) / {bilan['workers']} processus • {bilan['trimestres_crees']} trimestre(s) créé(s) "
+          f"• alertes : {alertes} ({bilan['alertes_en_file']} mise(s) en file) • {bilan['duree_s']} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Matrice d'avancement concessionnaires - OPCOPILOT v4.0
+Toutes les étapes de raccordement du portefeuille (EDF, EAU, FIBRE...) sont aplaties dans un seul
+DataFrame colonnes (opération × concessionnaire × étape), trié par opération, concessionnaire puis
+ordre : étape courante, opérations en attente d'une étape et délais moyens par étape se calculent
+par group-by vectorisés, sans parcourir les opérations une à une.
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from opcopilot.deadlines import STATUTS_ETAPE_TERMINEE
+from opcopilot.persistence import ConcessionnaireEtape
+
+CLES = ['operation_id', 'concessionnaire']
+COLONNES_ETAPES = ['operation_id', 'concessionnaire', 'ordre', 'etape', 'statut', 'date_libelle']
+
+# Code numérique des statuts d'étape (valeurs de la heatmap)
+CODES_STATUT = {'EN_ATTENTE': 0, 'PLANIFIE': 1, 'EN_COURS': 2, 'VALIDEE': 3, 'TERMINEE': 3}
+LIBELLES_CODE = {0: "En attente", 1: "Planifiée", 2: "En cours", 3: "Validée"}
+COULEURS_CODE = {0: '#e0e0e0', 1: '#90caf9', 2: '#ffb74d', 3: '#66bb6a'}
+
+
+class ConcessionnaireMatrix:
+    """Étapes concessionnaires de tout le portefeuille (lecture seule, partagée entre sessions)"""
+
+    def __init__(self, etapes, definitions=None, operations=None):
+        frame = pd.DataFrame(etapes, columns=COLONNES_ETAPES)
+        frame['operation_id'] = frame['operation_id'].astype(int)
+        frame['ordre'] = frame['ordre'].astype(int)
+        frame = frame.sort_values(['operation_id', 'concessionnaire', 'ordre'], ignore_index=True)
+        frame['code'] = frame['statut'].map(CODES_STATUT).fillna(0).astype('int8')
+        frame['terminee'] = frame['statut'].isin(STATUTS_ETAPE_TERMINEE)
+        frame['date'] = _dates(frame)
+        frame = frame.merge(_reference(definitions), on=['concessionnaire', 'etape'], how='left')
+        # Rang de l'étape dans le concessionnaire : ordre du workflow de référence, sinon ordre médian constaté
+        frame['rang'] = frame['ordre_reference'].fillna(
+            frame.groupby(['concessionnaire', 'etape'])['ordre'].transform('median'))
+        self.frame = frame
+        self.noms = {op['id']: op.get('nom', '') for op in operations or []}
+
+        colonnes = (frame[['concessionnaire', 'rang', 'etape']].drop_duplicates()
+                    .sort_values(['concessionnaire', 'rang', 'etape']))
+        self.colonnes = list(zip(colonnes['concessionnaire'], colonnes['etape']))
+        self.courantes = _courantes(frame)
+
+        # Bornes de chaque opération dans la matrice triée : lecture d'une opération en O(1)
+        ids, debuts, nombres = np.unique(frame['operation_id'].to_numpy(), return_index=True, return_counts=True)
+        self._bornes = {int(i): (int(d), int(d + n)) for i, d, n in zip(ids, debuts, nombres)}
+
+    @classmethod
+    def from_records(cls, concessionnaires_data, definitions=None, operations=None):
+        """Matrice depuis concessionnaires_demo ({'operation_<id>': {concessionnaire: {etapes}}})"""
+        lignes = []
+        for cle, concessionnaires in (concessionnaires_data or {}).items():
+            operation_id = int(cle.rsplit('_', 1)[-1])
+            for concessionnaire, suivi in (concessionnaires or {}).items():
+                for ordre, etape in enumerate((suivi or {}).get('etapes', []), 1):
+                    lignes.append([operation_id, concessionnaire, etape.get('ordre', ordre), etape.get('nom', ''),
+                                   etape.get('statut', ''), etape.get('date')])
+        return cls(lignes, definitions, operations)
+
+    @classmethod
+    def from_demo_data(cls, demo_data, definitions=None):
+        return cls.from_records(demo_data.get('concessionnaires_demo'), definitions, demo_data.get('operations_demo', []))
+
+    @classmethod
+    def from_session(cls, session, definitions=None, operations=None):
+        """Matrice depuis la table concessionnaire_etapes (une requête)"""
+        query = select(ConcessionnaireEtape.operation_id, ConcessionnaireEtape.concessionnaire,
+                       ConcessionnaireEtape.ordre, ConcessionnaireEtape.nom, ConcessionnaireEtape.statut,
+                       ConcessionnaireEtape.date)
+        return cls(session.execute(query).all(), definitions, operations)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def operation_ids(self):
+        return sorted(self._bornes)
+
+    def concessionnaires(self):
+        return list(dict.fromkeys(concessionnaire for concessionnaire, _ in self.colonnes))
+
+    def etapes(self, concessionnaire):
+        """Étapes d'un concessionnaire dans l'ordre du workflow"""
+        return [etape for nom, etape in self.colonnes if nom == concessionnaire]
+
+    def operation(self, operation_id):
+        """Étapes d'une opération (tranche de la matrice)"""
+        debut, fin = self._bornes.get(int(operation_id), (0, 0))
+        return self.frame.iloc[debut:fin]
+
+    def matrice(self, operation_ids=None):
+        """Codes statut (0-3) opération × (concessionnaire, étape) ; NaN si l'étape n'existe pas pour l'opération"""
+        frame = self.frame if operation_ids is None else self.frame[self.frame['operation_id'].isin(operation_ids)]
+        matrice = frame.pivot_table(index='operation_id', columns=['concessionnaire', 'etape'], values='code',
+                                    aggfunc='max')
+        return matrice.reindex(columns=pd.MultiIndex.from_tuples(self.colonnes, names=['concessionnaire', 'etape']))
+
+    def en_attente(self, concessionnaire, etape, jour=None):
+        """
+        Opérations dont l'étape n'est pas validée (ex. EDF « Mise en service »), avec l'étape où elles
+        en sont et l'attente depuis la dernière validation - plus longues attentes d'abord
+        """
+        jour = pd.Timestamp(jour or date.today())
+        frame = self.frame
+        lignes = frame[(frame['concessionnaire'] == concessionnaire) & (frame['etape'] == etape) & ~frame['terminee']]
+        attente = (lignes[CLES + ['statut', 'date']]
+                   .join(self.courantes, on=CLES, rsuffix='_courante')
+                   .rename(columns={'date': 'date_prevue'}))
+        attente['operation'] = attente['operation_id'].map(self.noms).fillna('')
+        attente['attente_jours'] = (jour - attente['derniere_validation']).dt.days
+        attente['bloquee_ici'] = attente['etape'] == etape
+        return attente.sort_values(['attente_jours', 'operation_id'], ascending=[False, True],
+                                   na_position='last', ignore_index=True)
+
+    def delais_moyens(self):
+        """
+        Délai constaté de chaque étape (jours depuis la validation de l'étape précédente), agrégé
+        par concessionnaire et étape et comparé au délai standard du workflow
+        """
+        validees = self.frame[self.frame['terminee'] & self.frame['date'].notna()]
+        validees = validees.assign(delai=validees.groupby(CLES)['date'].diff().dt.days)
+        delais = validees[validees['delai'].notna()].groupby(['concessionnaire', 'etape'], sort=False).agg(
+            rang=('rang', 'first'),
+            operations=('operation_id', 'nunique'),
+            delai_moyen=('delai', 'mean'),
+            delai_median=('delai', 'median'),
+            delai_max=('delai', 'max'),
+            delai_standard=('delai_standard', 'first')
+        ).reset_index()
+        delais['ecart_standard'] = delais['delai_moyen'] - delais['delai_standard']
+        return delais.sort_values(['concessionnaire', 'rang'], ignore_index=True).drop(columns='rang')
+
+    def synthese(self):
+        """Par concessionnaire : opérations suivies, raccordées, avancement moyen et étape la plus fréquente"""
+        courantes = self.courantes.reset_index()
+        synthese = courantes.groupby('concessionnaire', sort=True).agg(
+            operations=('operation_id', 'nunique'),
+            raccordees=('raccordee', 'sum'),
+            avancement_moyen=('avancement', 'mean')
+        )
+        en_cours = courantes[~courantes['raccordee']]
+        synthese['etape_frequente'] = en_cours.groupby('concessionnaire')['etape'].agg(
+            lambda etapes: etapes.value_counts().index[0])
+        synthese['avancement_moyen'] = synthese['avancement_moyen'].round().astype(int)
+        return synthese.reset_index()
+
+
+def _dates(frame):
+    """Dates d'étape : ISO, ou « Semaine NN » (vendredi de la semaine, année des autres étapes du concessionnaire)"""
+    libelles = frame['date_libelle'].astype('string')
+    dates = pd.to_datetime(libelles.str.slice(0, 10), format='%Y-%m-%d', errors='coerce')
+    semaines = libelles.str.extract(r'(?i)semaine\s+(\d{1,2})', expand=False)
+    annees = dates.groupby([frame['operation_id'], frame['concessionnaire']]).transform('max').dt.year
+    hebdo = dates.isna() & semaines.notna() & annees.notna()
+    if hebdo.any():
+        dates[hebdo] = pd.to_datetime(
+            annees[hebdo].astype(int).astype(str) + '-W' + semaines[hebdo].str.zfill(2) + '-5',
+            format='%G-W%V-%u', errors='coerce')
+    return dates
+
+
+def _reference(definitions):
+    """Étapes de référence (workflow_concessionnaires) : ordre, délai standard, responsable"""
+    lignes = [[concessionnaire, etape.get('nom', ''), etape.get('ordre'), etape.get('delai_standard'),
+               etape.get('responsable', '')]
+              for concessionnaire, workflow in (definitions or {}).items()
+              for etape in workflow.get('etapes', [])]
+    reference = pd.DataFrame(lignes, columns=['concessionnaire', 'etape', 'ordre_reference', 'delai_standard',
+                                              'responsable'])
+    reference[['ordre_reference', 'delai_standard']] = reference[['ordre_reference', 'delai_standard']].astype(float)
+    return reference.drop_duplicates(['concessionnaire', 'etape'])
+
+
+def _courantes(frame):
+    """Étape courante (première non validée) et avancement de chaque couple opération × concessionnaire"""
+    par_couple = frame.groupby(CLES, sort=True)
+    courantes = pd.DataFrame({
+        'etapes': par_couple.size(),
+        'validees': par_couple['terminee'].sum(),
+        'derniere_validation': frame['date'].where(frame['terminee']).groupby([frame[c] for c in CLES]).max()
+    })
+    courantes['avancement'] = courantes['validees'] / courantes['etapes'] * 100
+    courantes['raccordee'] = courantes['validees'] == courantes['etapes']
+    premiere = frame[~frame['terminee']].groupby(CLES, sort=False).head(1).set_index(CLES)
+    return courantes.join(premiere[['etape', 'statut', 'code']])
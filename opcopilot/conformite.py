@@ -0,0 +1,254 @@
+"""
+Suivi des délais de conformité MED - OPCOPILOT v4.0
+Les mises en demeure non résolues du portefeuille sont tenues dans un tas (min-heap) trié par
+échéance de conformité (date d'envoi + délai) : « en retard » et « à échéance dans N jours » se
+lisent en parcourant le tas dans l'ordre jusqu'à la date limite, sans balayer les MED de chaque
+opération. Un second tas programme les relances à partir des échéances : relance du destinataire
+le lendemain de l'échéance, puis escalade (constat de carence) si le manquement persiste.
+Les entrées périmées (MED résolue, relance effectuée) sont ignorées à la lecture et purgées
+quand elles deviennent majoritaires.
+"""
+
+import heapq
+import threading
+from datetime import date, datetime, timedelta
+
+from opcopilot.persistence import get_all_meds
+
+STATUTS_RESOLUS = ('RESOLU', 'CLOS', 'CLOTURE', 'ANNULE')
+STATUT_ESCALADE = 'ESCALADEE'
+
+RELANCE_APRES = 1  # jours après l'échéance de conformité
+ESCALADE_APRES = 15  # jours après la relance
+
+NIVEAUX_RELANCE = {
+    'RELANCE': "Relance du destinataire",
+    'ESCALADE': "Escalade : constat de carence / suite contentieuse"
+}
+
+
+def _date(valeur):
+    if not valeur:
+        return None
+    if isinstance(valeur, datetime):
+        return valeur.date()
+    if isinstance(valeur, date):
+        return valeur
+    try:
+        return date.fromisoformat(str(valeur)[:10])
+    except ValueError:
+        return None
+
+
+def _parcourir(tas, limite):
+    """Entrées d'un tas jusqu'à `limite` incluse, dans l'ordre, sans le modifier (O(k log k) pour k entrées)"""
+    frontiere = [(tas[0], 0)] if tas else []
+    while frontiere:
+        entree, position = heapq.heappop(frontiere)
+        if entree[0] > limite:
+            return
+        yield entree
+        for enfant in (2 * position + 1, 2 * position + 2):
+            if enfant < len(tas):
+                heapq.heappush(frontiere, (tas[enfant], enfant))
+
+
+class MedTracker:
+    """Échéances de conformité et relances programmées des MED du portefeuille"""
+
+    def __init__(self, meds, operations):
+        self._lock = threading.Lock()
+        self._operations = {op['id']: op for op in operations}
+        self._meds = {}  # référence → MED
+        self._par_operation = {}  # opération → [références] (ordre d'envoi)
+        self._echeances = []  # tas (échéance, référence) des MED ouvertes
+        self._relances = []  # tas (date prévue, référence, niveau)
+        self._programmees = {}  # référence → (date prévue, niveau) en vigueur
+        self._ouvertes = set()  # références des MED ouvertes
+        for med in meds:
+            self._ajouter(dict(med))
+
+    @classmethod
+    def from_session(cls, session, operations):
+        """Suivi depuis la table med (une requête)"""
+        return cls(get_all_meds(session), operations)
+
+    @classmethod
+    def from_demo_data(cls, demo_data):
+        """Suivi depuis med_demo"""
+        meds = [{**med, 'operation_id': int(cle.rsplit('_', 1)[-1])}
+                for cle, liste in (demo_data.get('med_demo') or {}).items() for med in liste or []]
+        return cls(meds, demo_data.get('operations_demo', []))
+
+    # --- Index ------------------------------------------------------------------
+
+    @staticmethod
+    def _ouverte(med):
+        return med['echeance'] is not None and med.get('statut') not in STATUTS_RESOLUS \
+            and med['date_resolution'] is None
+
+    @staticmethod
+    def _prochaine_relance(med):
+        """(date, niveau) de la prochaine relance d'une MED ouverte, None si escaladée"""
+        if med.get('statut') == STATUT_ESCALADE:
+            return None
+        if not med.get('relance_effectuee'):
+            return med['echeance'] + timedelta(days=RELANCE_APRES), 'RELANCE'
+        return (med['date_relance'] or med['echeance']) + timedelta(days=ESCALADE_APRES), 'ESCALADE'
+
+    def _ajouter(self, med):
+        """Indexe une MED (verrou détenu ou construction)"""
+        for champ in ('date_envoi', 'date_relance', 'date_resolution'):
+            med[champ] = _date(med.get(champ))
+        med['echeance'] = med['date_envoi'] + timedelta(days=med.get('delai_conformite') or 0) \
+            if med['date_envoi'] else None
+        op = self._operations.get(med['operation_id'], {})
+        med['operation'] = op.get('nom', '')
+        med['aco'] = op.get('aco_responsable') or ''
+
+        reference = med['reference']
+        ancienne = self._meds.get(reference)
+        if ancienne is None:
+            self._par_operation.setdefault(med['operation_id'], []).append(reference)
+        self._meds[reference] = med
+        # Entrée du tas conservée si la MED était déjà ouverte avec la même échéance
+        if self._ouverte(med) and not (ancienne is not None and self._ouverte(ancienne)
+                                       and ancienne['echeance'] == med['echeance']):
+            heapq.heappush(self._echeances, (med['echeance'], reference))
+        self._programmer(med)
+
+    def _programmer(self, med):
+        """(Re)programme la prochaine relance ; l'ancienne entrée du tas devient périmée"""
+        ouverte = self._ouverte(med)
+        if ouverte:
+            self._ouvertes.add(med['reference'])
+        else:
+            self._ouvertes.discard(med['reference'])
+        prochaine = self._prochaine_relance(med) if ouverte else None
+        if prochaine is None:
+            self._programmees.pop(med['reference'], None)
+        elif self._programmees.get(med['reference']) != prochaine:
+            self._programmees[med['reference']] = prochaine
+            heapq.heappush(self._relances, (prochaine[0], med['reference'], prochaine[1]))
+        self._compacter()
+
+    def _echeance_valide(self, entree):
+        med = self._meds.get(entree[1])
+        return med is not None and self._ouverte(med) and med['echeance'] == entree[0]
+
+    def _compacter(self):
+        """Purge les entrées périmées dès qu'elles sont majoritaires (coût amorti)"""
+        if len(self._relances) > 2 * len(self._programmees) + 16:
+            self._relances = [(jour, reference, niveau) for reference, (jour, niveau) in self._programmees.items()]
+            heapq.heapify(self._relances)
+        if len(self._echeances) > 2 * len(self._ouvertes) + 16:
+            self._echeances = list(dict.fromkeys(entree for entree in self._echeances if self._echeance_valide(entree)))
+            heapq.heapify(self._echeances)
+
+    def _vue(self, med, jour):
+        prochaine = self._programmees.get(med['reference'])
+        ouverte = self._ouverte(med)
+        return {
+            **med,
+            'ouverte': ouverte,
+            'jours_restants': (med['echeance'] - jour).days if ouverte else None,
+            'retard_jours': max((jour - med['echeance']).days, 0) if ouverte else 0,
+            'prochaine_relance': prochaine[0] if prochaine else None,
+            'niveau_relance': prochaine[1] if prochaine else None
+        }
+
+    # --- Mises à jour incrémentales -------------------------------------------------
+
+    def ajouter(self, med):
+        """Ajoute (ou remplace) une MED émise (dict au format med_demo avec operation_id)"""
+        with self._lock:
+            self._ajouter(dict(med))
+
+    def marquer_relance(self, reference, niveau='RELANCE', jour=None):
+        """Relance (ou escalade) effectuée : la suivante est programmée - retourne la MED ou None"""
+        with self._lock:
+            med = self._meds.get(reference)
+            if med is None or not self._ouverte(med):
+                return None
+            if niveau == 'ESCALADE':
+                med['statut'] = STATUT_ESCALADE
+            else:
+                med['relance_effectuee'] = True
+                med['date_relance'] = _date(jour) or date.today()
+            self._programmer(med)
+            return dict(med)
+
+    def resoudre(self, reference, jour=None):
+        """Mise en conformité constatée : MED retirée des échéances et des relances"""
+        with self._lock:
+            med = self._meds.get(reference)
+            if med is None or not self._ouverte(med):
+                return None
+            med['statut'] = 'RESOLU'
+            med['date_resolution'] = _date(jour) or date.today()
+            self._programmer(med)
+            return dict(med)
+
+    # --- Lecture --------------------------------------------------------------
+
+    def _jusqu_a(self, limite, jour, aco):
+        """MED ouvertes d'échéance ≤ limite, par échéance croissante"""
+        resultat, vues = [], set()
+        for entree in _parcourir(self._echeances, limite):
+            med = self._meds[entree[1]]
+            # Une MED close puis rouverte à la même échéance peut avoir deux entrées valides
+            if self._echeance_valide(entree) and entree[1] not in vues and (aco is None or med['aco'] == aco):
+                vues.add(entree[1])
+                resultat.append(self._vue(med, jour))
+        return resultat
+
+    def en_retard(self, jour=None, aco=None):
+        """MED ouvertes dont le délai de conformité est dépassé (plus anciennes échéances d'abord)"""
+        jour = jour or date.today()
+        with self._lock:
+            return self._jusqu_a(jour - timedelta(days=1), jour, aco)
+
+    def a_echeance(self, jours, jour=None, aco=None):
+        """MED ouvertes arrivant à échéance dans les N prochains jours (aujourd'hui compris)"""
+        jour = jour or date.today()
+        with self._lock:
+            return [med for med in self._jusqu_a(jour + timedelta(days=jours), jour, aco)
+                    if med['echeance'] >= jour]
+
+    def relances_dues(self, jour=None, aco=None):
+        """Relances programmées arrivées à date (niveau RELANCE ou ESCALADE), plus anciennes d'abord"""
+        jour = jour or date.today()
+        dues = []
+        with self._lock:
+            vues = set()
+            for prevue, reference, niveau in _parcourir(self._relances, jour):
+                med = self._meds[reference]
+                if self._programmees.get(reference) == (prevue, niveau) and reference not in vues \
+                        and (aco is None or med['aco'] == aco):
+                    vues.add(reference)
+                    dues.append(self._vue(med, jour))
+        return dues
+
+    def meds(self):
+        """Toutes les MED suivies (copies avec operation_id, ordre d'envoi par opération)"""
+        with self._lock:
+            return [dict(self._meds[reference]) for references in self._par_operation.values()
+                    for reference in references]
+
+    def operation(self, operation_id, jour=None):
+        """MED d'une opération (ordre d'envoi) avec échéance et prochaine relance"""
+        jour = jour or date.today()
+        with self._lock:
+            return [self._vue(self._meds[reference], jour) for reference in self._par_operation.get(operation_id, [])]
+
+    def stats(self, jour=None, horizon=7, aco=None):
+        """Compteurs pour le tableau de bord : ouvertes, en retard, à échéance (horizon), relances dues"""
+        jour = jour or date.today()
+        with self._lock:
+            ouvertes = sum(1 for reference in self._ouvertes if aco is None or self._meds[reference]['aco'] == aco)
+        return {
+            'ouvertes': ouvertes,
+            'en_retard': len(self.en_retard(jour, aco)),
+            'a_echeance': len(self.a_echeance(horizon, jour, aco)),
+            'relances_dues': len(self.relances_dues(jour, aco))
+        }
@@ -0,0 +1,353 @@
+"""
+Courriers de mise en demeure - OPCOPILOT v4.0
+Lettres MED produites depuis des modèles Word (python-docx) : un modèle par type de MED
+(workflow_med.templates_med de workflow_modules.json, fichiers de data/templates_med/),
+ou le modèle intégré si le fichier est absent. Les champs {{ champ }} du corps du document
+(tableaux compris) sont remplis depuis les enregistrements au format med_demo.
+Chaque processus analyse ses modèles une seule fois ; les lots (fin de mois) sont rendus
+dans un pool de processus persistant, assemblés en archive zip dans un thread dédié :
+la page n'attend pas la génération.
+"""
+
+import copy
+import io
+import multiprocessing
+import os
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from docx import Document
+from docx.oxml.ns import qn
+from docx.shared import Pt
+from docx.text.paragraph import Paragraph
+
+DOSSIER_MODELES = os.path.join('data', 'templates_med')
+
+CHAMP = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+# Qualité du destinataire et cahier des clauses applicable, par type de MED
+TYPES_MED = {
+    'MED_MOE': {'libelle': "Maîtrise d'œuvre", 'qualite': "maître d'œuvre", 'ccag': 'CCAG-PI'},
+    'MED_ENTREPRISE': {'libelle': 'Entreprise', 'qualite': 'titulaire du marché de travaux', 'ccag': 'CCAG-Travaux'},
+    'MED_OPC': {'libelle': 'OPC', 'qualite': "titulaire de la mission d'ordonnancement, pilotage et coordination",
+                'ccag': 'CCAG-PI'},
+    'MED_SPS': {'libelle': 'SPS', 'qualite': 'coordonnateur sécurité et protection de la santé', 'ccag': 'CCAG-PI'},
+    'MED_CT': {'libelle': 'Contrôle technique', 'qualite': 'contrôleur technique', 'ccag': 'CCAG-PI'}
+}
+
+TAILLE_LOT = 25  # Lettres par tâche du pool
+
+
+def _date(valeur):
+    if not valeur:
+        return None
+    if isinstance(valeur, datetime):
+        return valeur.date()
+    if isinstance(valeur, date):
+        return valeur
+    try:
+        return date.fromisoformat(str(valeur)[:10])
+    except ValueError:
+        return None
+
+
+# ==============================================================================
+# MODÈLES
+# ==============================================================================
+
+def modele_par_defaut():
+    """Modèle intégré (utilisé pour les types sans fichier .docx)"""
+    document = Document()
+    document.styles['Normal'].font.name = 'Calibri'
+    document.styles['Normal'].font.size = Pt(11)
+
+    document.add_paragraph('SPIC Guadeloupe').runs[0].bold = True
+    document.add_paragraph('Suivi : {{ aco }}')
+    document.add_paragraph('{{ destinataire }}').paragraph_format.left_indent = Pt(260)
+    document.add_paragraph('Le {{ date_envoi }}').paragraph_format.left_indent = Pt(260)
+    document.add_paragraph('LETTRE RECOMMANDÉE AVEC ACCUSÉ DE RÉCEPTION').runs[0].bold = True
+
+    references = document.add_table(rows=3, cols=2)
+    for ligne, (libelle, valeur) in enumerate([
+        ('Référence', '{{ reference }}'),
+        ('Opération', '{{ operation }} - {{ commune }}'),
+        ('Objet', 'Mise en demeure - {{ motif }}')
+    ]):
+        references.cell(ligne, 0).text = libelle
+        references.cell(ligne, 1).text = valeur
+
+    for texte in [
+        '',
+        'Madame, Monsieur,',
+        "En votre qualité de {{ qualite }} de l'opération {{ operation }}, nous constatons le manquement "
+        "suivant : {{ motif }}.",
+        "Par la présente, nous vous mettons en demeure d'y remédier dans un délai de {{ delai_conformite }} "
+        "jours à compter de la réception de ce courrier, soit au plus tard le {{ date_limite }}.",
+        "À défaut, le maître d'ouvrage se réserve la possibilité d'appliquer les pénalités prévues au marché "
+        "et de faire exécuter les prestations à vos frais et risques, conformément au {{ ccag }}.",
+        "Nous vous prions d'agréer, Madame, Monsieur, l'expression de nos salutations distinguées.",
+        '',
+        '{{ aco }}',
+        "Chargé(e) d'opérations"
+    ]:
+        document.add_paragraph(texte)
+    return document
+
+
+def _texte(paragraphe):
+    return ''.join(noeud.text or '' for noeud in paragraphe.iter(qn('w:t')))
+
+
+class MedTemplate:
+    """Modèle analysé une fois : positions des paragraphes à champs repérées à la compilation"""
+
+    def __init__(self, document):
+        self.document = document
+        self._corps = document.element.body
+        self._lock = threading.Lock()
+        self._champs = [position for position, paragraphe in enumerate(self._corps.iter(qn('w:p')))
+                        if CHAMP.search(_texte(paragraphe))]
+
+    @classmethod
+    def charger(cls, chemin=None):
+        return cls(Document(chemin) if chemin else modele_par_defaut())
+
+    def render(self, valeurs):
+        """Lettre remplie (octets .docx) ; le modèle analysé n'est pas modifié"""
+        corps = copy.deepcopy(self._corps)
+        paragraphes = list(corps.iter(qn('w:p')))
+        for position in self._champs:
+            _remplir(Paragraph(paragraphes[position], None), valeurs)
+
+        # Corps rempli substitué le temps de l'enregistrement (styles et en-têtes partagés)
+        sortie = io.BytesIO()
+        with self._lock:
+            self._corps.getparent().replace(self._corps, corps)
+            try:
+                self.document.save(sortie)
+            finally:
+                corps.getparent().replace(corps, self._corps)
+        return sortie.getvalue()
+
+
+def _remplir(paragraphe, valeurs):
+    """Champs d'un paragraphe remplacés ; texte regroupé dans le premier segment (Word découpe les champs)"""
+    texte = CHAMP.sub(lambda champ: str(valeurs.get(champ.group(1), champ.group(0))), paragraphe.text)
+    segments = paragraphe.runs
+    if not segments:
+        return
+    segments[0].text = texte
+    for segment in segments[1:]:
+        segment.text = ''
+
+
+# Modèles analysés du processus courant : {type: MedTemplate}
+_MODELES = {}
+_MODELES_LOCK = threading.Lock()
+
+
+def _fichiers_modeles(definitions):
+    return {modele['type']: modele.get('template') for modele in definitions or [] if modele.get('type')}
+
+
+def precharger_modeles(dossier=DOSSIER_MODELES, definitions=None):
+    """Analyse tous les modèles déclarés (initialisation des processus du pool)"""
+    for type_med in set(TYPES_MED) | set(_fichiers_modeles(definitions)):
+        modele(type_med, dossier, definitions)
+
+
+def modele(type_med, dossier=DOSSIER_MODELES, definitions=None):
+    """Modèle analysé du type de MED (fichier déclaré s'il existe, sinon modèle intégré), mis en cache"""
+    with _MODELES_LOCK:
+        if type_med not in _MODELES:
+            fichier = _fichiers_modeles(definitions).get(type_med)
+            chemin = os.path.join(dossier, fichier) if fichier else None
+            _MODELES[type_med] = MedTemplate.charger(chemin if chemin and os.path.exists(chemin) else None)
+        return _MODELES[type_med]
+
+
+# ==============================================================================
+# LETTRES
+# ==============================================================================
+
+def valeurs_lettre(med, operation, aco=None):
+    """Champs d'une lettre depuis une MED (format med_demo) et son opération"""
+    type_med = TYPES_MED.get(med.get('type'), {})
+    envoi = _date(med.get('date_envoi')) or date.today()
+    delai = med.get('delai_conformite') or 0
+    return {
+        'type': med.get('type', ''),
+        'type_libelle': type_med.get('libelle', med.get('type', '')),
+        'qualite': type_med.get('qualite', 'titulaire du marché'),
+        'ccag': type_med.get('ccag', 'CCAG applicable au marché'),
+        'reference': med.get('reference', ''),
+        'destinataire': med.get('destinataire', ''),
+        'motif': med.get('motif', ''),
+        'delai_conformite': delai,
+        'date_envoi': envoi.strftime('%d/%m/%Y'),
+        'date_limite': (envoi + timedelta(days=delai)).strftime('%d/%m/%Y'),
+        'operation': operation.get('nom', ''),
+        'commune': operation.get('commune', ''),
+        'adresse': operation.get('adresse', ''),
+        'aco': aco or operation.get('aco_responsable', '')
+    }
+
+
+def nom_fichier(valeurs):
+    nom = re.sub(r'[^A-Za-z0-9-]+', '_', f"{valeurs['reference']}_{valeurs['destinataire']}").strip('_')
+    return f"{nom or 'MED'}.docx"
+
+
+def meds_demo(demo_data):
+    """MED de med_demo à plat, avec operation_id (format get_all_meds / MedTracker.meds)"""
+    return [{**med, 'operation_id': int(cle.rsplit('_', 1)[-1])}
+            for cle, meds in (demo_data.get('med_demo') or {}).items() for med in meds or []]
+
+
+def lettres_du_mois(meds, operations, annee, mois, aco=None):
+    """Champs des lettres de toutes les MED envoyées dans le mois (opérations de l'ACO si précisé)"""
+    operations = {op['id']: op for op in operations if aco is None or op.get('aco_responsable') == aco}
+    lettres = []
+    for med in meds:
+        operation = operations.get(med.get('operation_id'))
+        envoi = _date(med.get('date_envoi'))
+        if operation is not None and envoi is not None and (envoi.year, envoi.month) == (annee, mois):
+            lettres.append(valeurs_lettre(med, operation))
+    return sorted(lettres, key=lambda lettre: lettre['reference'])
+
+
+def mois_disponibles(meds):
+    """(année, mois) des MED envoyées, du plus récent au plus ancien"""
+    mois = {(envoi.year, envoi.month) for med in meds if (envoi := _date(med.get('date_envoi'))) is not None}
+    return sorted(mois, reverse=True)
+
+
+def _rendre_lot(lettres, dossier, definitions):
+    """Tâche du pool : [(nom de fichier, octets .docx | None, erreur | None)] (modèles du processus)"""
+    resultats = []
+    for valeurs in lettres:
+        try:
+            resultats.append((nom_fichier(valeurs), modele(valeurs['type'], dossier, definitions).render(valeurs),
+                              None))
+        except Exception as erreur:  # Lettre en échec : signalée, le lot continue
+            resultats.append((nom_fichier(valeurs), None, str(erreur) or type(erreur).__name__))
+    return resultats
+
+
+# ==============================================================================
+# GÉNÉRATION PAR LOTS
+# ==============================================================================
+
+class MedLetterGenerator:
+    """Générateur de lettres MED : rendu unitaire en processus, lots dans un pool de processus persistant"""
+
+    def __init__(self, dossier=DOSSIER_MODELES, definitions=None, workers=None, taille_lot=TAILLE_LOT):
+        self.dossier = dossier
+        self.definitions = definitions or []
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.taille_lot = max(1, taille_lot)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        """Pool créé au premier lot ; processus lancés par spawn (serveur Streamlit multi-thread),
+        modèles analysés une fois à leur démarrage"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=precharger_modeles, initargs=(self.dossier, self.definitions)
+                )
+            return self._executor
+
+    def generer(self, valeurs):
+        """Une lettre (nom de fichier, octets .docx), rendue dans le processus courant"""
+        return nom_fichier(valeurs), modele(valeurs['type'], self.dossier, self.definitions).render(valeurs)
+
+    def generer_lot(self, lettres, suivi=None):
+        """Archive zip (octets) des lettres ; rendu réparti dans le pool, assemblage au fil des résultats"""
+        taches = [lettres[debut:debut + self.taille_lot] for debut in range(0, len(lettres), self.taille_lot)]
+        if len(taches) > 1:
+            pool = self._pool()
+            resultats = (futur.result() for futur in as_completed(
+                [pool.submit(_rendre_lot, tache, self.dossier, self.definitions) for tache in taches]
+            ))
+        else:
+            resultats = (_rendre_lot(tache, self.dossier, self.definitions) for tache in taches)
+
+        archive, noms = io.BytesIO(), set()
+        # .docx déjà compressés : stockés tels quels
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zip_lettres:
+            for lot in resultats:
+                for nom, contenu, erreur in lot:
+                    if contenu is not None:
+                        nom = _nom_unique(nom, noms)
+                        zip_lettres.writestr(nom, contenu)
+                    if suivi is not None:
+                        suivi.enregistrer(nom, erreur)
+        return archive.getvalue()
+
+    def start(self, lettres):
+        """Lance le lot dans un thread dédié et retourne immédiatement le suivi (MedBatchJob)"""
+        job = MedBatchJob(len(lettres))
+        thread = threading.Thread(target=job.executer, args=(self, lettres), name='opcopilot-courriers', daemon=True)
+        thread.start()
+        return job
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+def _nom_unique(nom, noms):
+    base, extension = os.path.splitext(nom)
+    candidat, suffixe = nom, 2
+    while candidat in noms:
+        candidat = f"{base}_{suffixe}{extension}"
+        suffixe += 1
+    noms.add(candidat)
+    return candidat
+
+
+class MedBatchJob:
+    """Suivi d'un lot de lettres en arrière-plan (lu par la page pendant la génération)"""
+
+    def __init__(self, total):
+        self._lock = threading.Lock()
+        self.total = total
+        self.generees = 0
+        self.echecs = []
+        self.archive = None
+        self.debut = time.perf_counter()
+        self.duree = None
+        self.erreur = None
+
+    def enregistrer(self, nom, erreur=None):
+        with self._lock:
+            if erreur is None:
+                self.generees += 1
+            else:
+                self.echecs.append({'lettre': nom, 'erreur': erreur})
+
+    def executer(self, generateur, lettres):
+        try:
+            self.archive = generateur.generer_lot(lettres, suivi=self)
+        except Exception as erreur:  # Erreur inattendue (pool interrompu...) : conservée pour affichage
+            self.erreur = str(erreur) or type(erreur).__name__
+        finally:
+            self.duree = time.perf_counter() - self.debut
+
+    @property
+    def termine(self):
+        return self.duree is not None
+
+    def progression(self):
+        """(traitées, générées, échecs)"""
+        with self._lock:
+            return self.generees + len(self.echecs), self.generees, len(self.echecs)
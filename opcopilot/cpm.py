@@ -0,0 +1,261 @@
+"""
+Méthode du chemin critique (CPM) - OPCOPILOT v4.0
+Calcul des dates au plus tôt / au plus tard, marges totales et chemin critique en O(V+E)
+sur les phases d'une opération, et traitement en masse du portefeuille.
+
+Dépendances entre phases :
+- liste explicite `predecesseurs` (numéros d'ordre) si présente sur la phase
+- sinon déduites du planning prévisionnel : une phase dépend des phases qui se terminent
+  au plus tard avant son début (les phases qui se chevauchent sont parallèles)
+"""
+
+import heapq
+from collections import deque
+from datetime import date, datetime
+
+import pandas as pd
+
+STATUTS_TERMINES = ('VALIDEE', 'TERMINEE', 'CLOTUREE')
+STATUTS_DEMARRES = ('EN_COURS', 'RETARD', 'CRITIQUE', 'VALIDATION_REQUISE', 'EN_REVISION')
+
+
+class CpmSchedule:
+    """Réseau de phases d'une opération et résultat du calcul CPM (dates en ordinaux de jours)"""
+
+    def __init__(self, phases, date_limite=None, aujourd_hui=None):
+        # Copies : les phases reçues sont souvent celles des données partagées en cache
+        self.phases = [dict(phase) for phase in phases if isinstance(phase, dict)]
+        self.aujourd_hui = _ordinal(aujourd_hui) or date.today().toordinal()
+        self.date_limite = _ordinal(date_limite)
+
+        n = len(self.phases)
+        self.debut_prevu = [0] * n
+        self.fin_prevue = [0] * n
+        self.duree = [0] * n
+        self.debut_reel = [None] * n
+        self.fin_reelle = [None] * n
+
+        for i, phase in enumerate(self.phases):
+            debut = _ordinal(phase.get('date_debut_prevue')) or self.aujourd_hui
+            fin = _ordinal(phase.get('date_fin_prevue')) or debut
+            self.debut_prevu[i] = debut
+            self.fin_prevue[i] = max(fin, debut)
+            self.duree[i] = self.fin_prevue[i] - debut
+            self._dates_reelles(i)
+
+        self.predecesseurs, self.successeurs = self._build_graph()
+        self.ordre_topo = self._topological_order()
+
+        self.es = [0] * n
+        self.ef = [0] * n
+        self.ls = [0] * n
+        self.lf = [0] * n
+        self.fin_projet = None
+        self.compute()
+
+    def _dates_reelles(self, i):
+        """Dates réelles ; à défaut, le statut fait foi (phase démarrée / terminée aux dates prévues)"""
+        phase = self.phases[i]
+        statut = phase.get('statut')
+        self.debut_reel[i] = _ordinal(phase.get('date_debut_reelle'))
+        self.fin_reelle[i] = _ordinal(phase.get('date_fin_reelle'))
+
+        if self.debut_reel[i] is None and (statut in STATUTS_DEMARRES or statut in STATUTS_TERMINES):
+            self.debut_reel[i] = self.debut_prevu[i]
+        if self.fin_reelle[i] is None and statut in STATUTS_TERMINES:
+            self.fin_reelle[i] = self.fin_prevue[i]
+
+    # ------------------------------------------------------------------
+    # Graphe
+    # ------------------------------------------------------------------
+
+    def _build_graph(self):
+        """Arcs explicites (predecesseurs) ou déduits des dates prévues - O(n log n)"""
+        n = len(self.phases)
+        predecesseurs = [[] for _ in range(n)]
+        successeurs = [[] for _ in range(n)]
+        index_par_ordre = {phase.get('ordre', i + 1): i for i, phase in enumerate(self.phases)}
+
+        def ajouter_arc(i, j):
+            predecesseurs[j].append(i)
+            successeurs[i].append(j)
+
+        implicites = []
+        for j, phase in enumerate(self.phases):
+            explicites = phase.get('predecesseurs')
+            if explicites is None:
+                implicites.append(j)
+                continue
+            for ordre in explicites:
+                if ordre in index_par_ordre:
+                    ajouter_arc(index_par_ordre[ordre], j)
+
+        # Balayage par date de début : les prédécesseurs sont les phases terminées
+        # à la date de fin la plus tardive avant le début de la phase
+        par_debut = sorted(range(n), key=lambda k: (self.debut_prevu[k], self.fin_prevue[k]))
+        en_cours = []
+        fin_max, derniers = None, []
+        implicite = set(implicites)
+
+        for j in par_debut:
+            while en_cours and en_cours[0][0] <= self.debut_prevu[j]:
+                fin, i = heapq.heappop(en_cours)
+                if fin_max is None or fin > fin_max:
+                    fin_max, derniers = fin, [i]
+                elif fin == fin_max:
+                    derniers.append(i)
+            if j in implicite:
+                for i in derniers:
+                    ajouter_arc(i, j)
+            heapq.heappush(en_cours, (self.fin_prevue[j], j))
+
+        return predecesseurs, successeurs
+
+    def _topological_order(self):
+        """Tri topologique de Kahn - O(V+E)"""
+        degres = [len(preds) for preds in self.predecesseurs]
+        file = deque(i for i, degre in enumerate(degres) if degre == 0)
+        ordre = []
+        while file:
+            i = file.popleft()
+            ordre.append(i)
+            for j in self.successeurs[i]:
+                degres[j] -= 1
+                if degres[j] == 0:
+                    file.append(j)
+        if len(ordre) != len(self.phases):
+            raise ValueError("Dépendances circulaires entre phases")
+        return ordre
+
+    # ------------------------------------------------------------------
+    # Calcul
+    # ------------------------------------------------------------------
+
+    def compute(self):
+        """Calcul complet : passe avant puis passe arrière"""
+        for i in self.ordre_topo:
+            self._forward(i)
+        self._backward(self.ordre_topo)
+
+    def _forward(self, i):
+        """Dates au plus tôt d'une phase (réel si connu, projection sinon)"""
+        es = self.debut_prevu[i]
+        for p in self.predecesseurs[i]:
+            es = max(es, self.ef[p])
+
+        if self.debut_reel[i] is not None:
+            es = self.debut_reel[i]
+        elif self.fin_reelle[i] is None:
+            es = max(es, self.aujourd_hui)  # Une phase non démarrée ne peut démarrer dans le passé
+
+        if self.fin_reelle[i] is not None:
+            ef = self.fin_reelle[i]
+        else:
+            ef = es + self.duree[i]
+            if self.debut_reel[i] is not None:
+                ef = max(ef, self.aujourd_hui)  # Phase en cours qui déborde
+
+        self.es[i], self.ef[i] = es, ef
+
+    def _backward(self, noeuds_topo):
+        """Dates au plus tard des noeuds fournis (en ordre topologique)"""
+        self.fin_projet = max(self.ef, default=self.aujourd_hui)
+        fin_reference = self.date_limite if self.date_limite is not None else self.fin_projet
+
+        for i in reversed(noeuds_topo):
+            lf = fin_reference
+            for s in self.successeurs[i]:
+                lf = min(lf, self.ls[s])
+            self.lf[i] = lf
+            self.ls[i] = lf - (self.ef[i] - self.es[i])
+
+    # ------------------------------------------------------------------
+    # Résultats
+    # ------------------------------------------------------------------
+
+    def marge(self, i):
+        """Marge totale (jours) - négative si la phase compromet la date limite"""
+        return self.ls[i] - self.es[i]
+
+    def est_terminee(self, i):
+        return self.fin_reelle[i] is not None or self.phases[i].get('statut') in STATUTS_TERMINES
+
+    def retard(self, i):
+        """Glissement projeté de la fin de phase par rapport au prévisionnel (jours)"""
+        return max(0, self.ef[i] - self.fin_prevue[i])
+
+    def chemin_critique(self):
+        """Indices des phases critiques non terminées (marge minimale), en ordre topologique"""
+        marge_min = min((self.marge(i) for i in range(len(self.phases)) if not self.est_terminee(i)), default=0)
+        return [i for i in self.ordre_topo if not self.est_terminee(i) and self.marge(i) <= marge_min]
+
+    def results(self):
+        """Résultat par phase (dates ISO)"""
+        critiques = set(self.chemin_critique())
+        return [
+            {
+                'ordre': phase.get('ordre', i + 1),
+                'nom': phase.get('nom', f'Phase {i + 1}'),
+                'statut': phase.get('statut', 'NON_DEMARREE'),
+                'responsable': phase.get('responsable', ''),
+                'date_debut_prevue': _iso(self.debut_prevu[i]),
+                'date_fin_prevue': _iso(self.fin_prevue[i]),
+                'debut_au_plus_tot': _iso(self.es[i]),
+                'fin_au_plus_tot': _iso(self.ef[i]),
+                'debut_au_plus_tard': _iso(self.ls[i]),
+                'fin_au_plus_tard': _iso(self.lf[i]),
+                'marge_totale': self.marge(i),
+                'critique': i in critiques,
+                'retard_jours': self.retard(i),
+                'terminee': self.est_terminee(i)
+            }
+            for i, phase in enumerate(self.phases)
+        ]
+
+
+def portfolio_cpm(operations, phases_par_operation, aujourd_hui=None):
+    """
+    CPM sur tout le portefeuille en une passe
+    phases_par_operation : {operation_id: [phases]}
+    Retourne un DataFrame (une ligne par phase) avec operation_id / operation / aco_responsable
+    """
+    lignes = []
+    for op in operations:
+        phases = phases_par_operation.get(op['id'], [])
+        if not phases:
+            continue
+        try:
+            cpm = CpmSchedule(phases, date_limite=op.get('date_fin_prevue'), aujourd_hui=aujourd_hui)
+        except ValueError:
+            continue
+        for resultat in cpm.results():
+            resultat['operation_id'] = op['id']
+            resultat['operation'] = op.get('nom', '')
+            resultat['aco_responsable'] = op.get('aco_responsable', '')
+            lignes.append(resultat)
+
+    resultats = pd.DataFrame(lignes)
+    if not resultats.empty:
+        for colonne in ('date_fin_prevue', 'fin_au_plus_tot', 'fin_au_plus_tard'):
+            resultats[colonne] = pd.to_datetime(resultats[colonne])
+    return resultats
+
+
+def _ordinal(valeur):
+    """Date ISO / date / datetime → ordinal de jour (None si vide ou invalide)"""
+    if not valeur:
+        return None
+    if isinstance(valeur, datetime):
+        return valeur.date().toordinal()
+    if isinstance(valeur, date):
+        return valeur.toordinal()
+    if hasattr(valeur, 'date'):  # pandas.Timestamp
+        return valeur.date().toordinal()
+    try:
+        return date.fromisoformat(str(valeur)[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def _iso(ordinal):
+    return date.fromordinal(ordinal).isoformat() if ordinal is not None else None
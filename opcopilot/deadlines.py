@@ -0,0 +1,212 @@
+"""
+Index des échéances - OPCOPILOT v4.0
+Toutes les échéances ouvertes du portefeuille (fins de phases projetées par le CPM, délais de
+conformité MED, interventions GPA, étapes concessionnaires) sont triées une fois par date,
+globalement et par ACO. Une fenêtre [début, fin] se résout par deux recherches dichotomiques :
+O(log n + k) au lieu d'un parcours des phases de toutes les opérations.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+
+from opcopilot.persistence import GpaReclamation, Med, iter_concessionnaires, iter_par_operation
+
+# Types d'échéance → (icône, libellé)
+TYPES_ECHEANCE = {
+    'PHASE': ('🏗️', 'Phase'),
+    'PHASE_CRITIQUE': ('🔴', 'Phase critique'),
+    'MED': ('📨', 'Délai MED'),
+    'GPA': ('🔧', 'Intervention GPA'),
+    'CONCESSIONNAIRE': ('🔌', 'Concessionnaire')
+}
+
+VUES = ('Semaine', 'Mois', 'Trimestre')
+
+STATUTS_RESOLUS = ('RESOLU', 'CLOS', 'CLOTURE', 'ANNULE')
+STATUTS_ETAPE_TERMINEE = ('VALIDEE', 'TERMINEE')
+
+_SEMAINE = re.compile(r'semaine\s+(\d{1,2})', re.I)
+
+
+def _date(valeur):
+    if not valeur:
+        return None
+    if isinstance(valeur, datetime):  # datetime et pandas.Timestamp
+        return valeur.date()
+    if isinstance(valeur, date):
+        return valeur
+    try:
+        return date.fromisoformat(str(valeur)[:10])
+    except ValueError:
+        return None
+
+
+def bornes_periode(vue, jour):
+    """(début, fin) inclus de la semaine (lundi-dimanche), du mois ou du trimestre contenant jour"""
+    if vue == 'Semaine':
+        debut = jour - timedelta(days=jour.weekday())
+        return debut, debut + timedelta(days=6)
+    if vue == 'Mois':
+        debut = jour.replace(day=1)
+    elif vue == 'Trimestre':
+        debut = date(jour.year, 3 * ((jour.month - 1) // 3) + 1, 1)
+    else:
+        raise KeyError(f"Vue inconnue: {vue}")
+    mois_suivant = debut.month + (3 if vue == 'Trimestre' else 1)
+    fin = date(debut.year + (mois_suivant - 1) // 12, (mois_suivant - 1) % 12 + 1, 1) - timedelta(days=1)
+    return debut, fin
+
+
+def periode_voisine(vue, jour, sens):
+    """Jour de référence de la période précédente (sens=-1) ou suivante (sens=1)"""
+    debut, fin = bornes_periode(vue, jour)
+    return fin + timedelta(days=1) if sens > 0 else debut - timedelta(days=1)
+
+
+class DeadlineIndex:
+    """Échéances triées par date (lecture seule, reconstruite par version de données et par jour)"""
+
+    def __init__(self, echeances):
+        self.echeances = sorted(echeances, key=lambda e: (e['date'], e['operation'], e['libelle']))
+        self._jours = [e['date'].toordinal() for e in self.echeances]
+
+        # Index secondaire par ACO : positions dans l'index global, dans l'ordre des dates
+        self._par_aco = {}
+        for position, echeance in enumerate(self.echeances):
+            jours, positions = self._par_aco.setdefault(echeance['aco'], ([], []))
+            jours.append(self._jours[position])
+            positions.append(position)
+
+    def __len__(self):
+        return len(self.echeances)
+
+    def acos(self):
+        return sorted(aco for aco in self._par_aco if aco)
+
+    def _fenetre(self, debut, fin, aco):
+        if aco is None:
+            jours, positions = self._jours, None
+        else:
+            jours, positions = self._par_aco.get(aco, ([], []))
+        bas = 0 if debut is None else bisect_left(jours, debut.toordinal())
+        haut = len(jours) if fin is None else bisect_right(jours, fin.toordinal())
+        return positions, bas, haut
+
+    def query(self, debut=None, fin=None, aco=None):
+        """Échéances dont la date tombe dans [début, fin] (bornes incluses, None = ouverte)"""
+        positions, bas, haut = self._fenetre(debut, fin, aco)
+        if positions is None:
+            return self.echeances[bas:haut]
+        return [self.echeances[p] for p in positions[bas:haut]]
+
+    def count(self, debut=None, fin=None, aco=None):
+        """Nombre d'échéances dans [début, fin] - O(log n)"""
+        _, bas, haut = self._fenetre(debut, fin, aco)
+        return haut - bas
+
+    def periode(self, vue, jour, aco=None):
+        """Échéances de la semaine / du mois / du trimestre contenant jour, groupées par jour"""
+        debut, fin = bornes_periode(vue, jour)
+        par_jour = {}
+        for echeance in self.query(debut, fin, aco):
+            par_jour.setdefault(echeance['date'], []).append(echeance)
+        return debut, fin, par_jour
+
+    @classmethod
+    def from_demo_data(cls, cpm_resultats, operations, demo_data):
+        """Index depuis le résultat CPM du portefeuille et les sections MED / GPA / concessionnaires du JSON"""
+        return cls.from_sources(cpm_resultats, operations, _par_operation(demo_data, 'med_demo'),
+                                _par_operation(demo_data, 'gpa_demo'),
+                                _par_operation(demo_data, 'concessionnaires_demo'))
+
+    @classmethod
+    def from_session(cls, cpm_resultats, operations, session):
+        """Index depuis le résultat CPM du portefeuille et les tables MED, GPA et concessionnaires (lues en flux)"""
+        return cls.from_sources(cpm_resultats, operations, iter_par_operation(session, Med, Med.date_envoi),
+                                iter_par_operation(session, GpaReclamation, GpaReclamation.date),
+                                iter_concessionnaires(session))
+
+    @classmethod
+    def from_sources(cls, cpm_resultats, operations, meds, reclamations, concessionnaires):
+        """
+        Index depuis le résultat CPM du portefeuille (phases) et les enregistrements MED / GPA /
+        concessionnaires, chacun en (operation_id, enregistrements) par opération
+        """
+        operations = {op['id']: op for op in operations}
+        echeances = []
+
+        def ajouter(jour, type_echeance, operation_id, libelle, detail='', marge=None, retard=None):
+            op = operations.get(operation_id)
+            if jour is None or op is None:
+                return
+            echeances.append({
+                'date': jour,
+                'type': type_echeance,
+                'operation_id': operation_id,
+                'operation': op.get('nom', ''),
+                'aco': op.get('aco_responsable') or '',
+                'libelle': libelle,
+                'detail': detail,
+                'marge': marge,
+                'retard': retard
+            })
+
+        # Phases ouvertes : fin projetée (au plus tôt) du CPM, marge totale et retard
+        if cpm_resultats is not None and not cpm_resultats.empty:
+            ouvertes = cpm_resultats[~cpm_resultats['terminee']]
+            for operation_id, nom, fin, critique, responsable, marge, retard in zip(
+                ouvertes['operation_id'], ouvertes['nom'], ouvertes['fin_au_plus_tot'],
+                ouvertes['critique'], ouvertes['responsable'], ouvertes['marge_totale'], ouvertes['retard_jours']
+            ):
+                ajouter(_date(fin), 'PHASE_CRITIQUE' if critique else 'PHASE', int(operation_id), nom,
+                        responsable or '', int(marge), int(retard))
+
+        for operation_id, meds_operation in meds:
+            for med in meds_operation:
+                envoi = _date(med.get('date_envoi'))
+                if envoi is None or med.get('statut') in STATUTS_RESOLUS or med.get('date_resolution'):
+                    continue
+                ajouter(envoi + timedelta(days=med.get('delai_conformite') or 0), 'MED', operation_id,
+                        f"Conformité {med.get('reference', '')}", med.get('destinataire', ''))
+
+        for operation_id, reclamations_operation in reclamations:
+            for reclamation in reclamations_operation:
+                signalement = _date(reclamation.get('date'))
+                if signalement is None or reclamation.get('statut') in STATUTS_RESOLUS \
+                        or reclamation.get('date_resolution'):
+                    continue
+                ajouter(signalement + timedelta(days=reclamation.get('delai_intervention') or 0), 'GPA',
+                        operation_id, f"Logement {reclamation.get('logement', '')} - {reclamation.get('type', '')}",
+                        reclamation.get('entreprise', ''))
+
+        for operation_id, suivis in concessionnaires:
+            for concessionnaire, suivi in (suivis or {}).items():
+                etapes = suivi.get('etapes', [])
+                annee = max((d.year for d in (_date(e.get('date')) for e in etapes) if d), default=None)
+                for etape in etapes:
+                    if etape.get('statut') in STATUTS_ETAPE_TERMINEE:
+                        continue
+                    ajouter(_date_etape(etape.get('date'), annee), 'CONCESSIONNAIRE', operation_id,
+                            f"{concessionnaire} - {etape.get('nom', '')}", etape.get('statut', ''))
+
+        return cls(echeances)
+
+
+def _date_etape(valeur, annee):
+    """Date d'étape concessionnaire : ISO, ou « Semaine NN » (vendredi de la semaine, année des autres étapes)"""
+    jour = _date(valeur)
+    if jour is not None or not valeur or annee is None:
+        return jour
+    semaine = _SEMAINE.search(str(valeur))
+    if semaine is None:
+        return None
+    try:
+        return date.fromisocalendar(annee, int(semaine.group(1)), 5)
+    except ValueError:
+        return None
+
+
+def _par_operation(demo_data, cle):
+    for cle_operation, enregistrements in (demo_data.get(cle) or {}).items():
+        yield int(cle_operation.rsplit('_', 1)[-1]), enregistrements or []
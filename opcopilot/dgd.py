@@ -0,0 +1,433 @@
+"""
+Décompte général définitif (DGD) - OPCOPILOT v4.0
+Tous les lots DGD du portefeuille sont tenus dans un seul DataFrame colonnes, montants en centimes
+entiers (int64) : plus/moins-values (quantités réelles en % du marché), pénalités plafonnées et
+montant final sont recalculés en colonnes, au centime exact, sans flottant ni boucle par lot.
+Les montants entrent et sortent en Decimal (arrondi au centime, moitié au-dessus).
+Le rapprochement par opération applique les avenants validés et compare le DGD au budget.
+
+Règlement annuel du portefeuille (traitement de masse hors Streamlit) :
+    python -m opcopilot.dgd [--annee 2024] [--rapport rapport_dgd_2024.xlsx] [--date 2024-12-31] [--dry-run]
+"""
+
+import argparse
+import io
+import threading
+import time
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+from sqlalchemy import select, update
+
+from opcopilot.persistence import Avenant, DgdLot, Operation, bump_db_version, create_db_engine, get_sessionmaker, \
+    init_db, queue_alertes
+
+CENTIME = Decimal('0.01')
+
+STATUTS_AVENANT_VALIDE = ('VALIDE',)
+STATUTS_AVENANT_ABANDONNE = ('REJETE', 'ANNULE')
+
+# Plafond des pénalités d'un lot, en % de son marché initial (CCAG-Travaux 2021, art. 19.2.3)
+PLAFOND_PENALITES = 10
+
+COLONNES_LOTS = ['id', 'operation_id', 'nom', 'statut', 'marche_initial', 'quantites_reelles', 'plus_moins_value',
+                 'penalites', 'montant_final']
+MONTANTS_LOT = ['marche_initial', 'plus_moins_value', 'penalites', 'montant_final']
+MONTANTS_CALCULES = ['plus_moins_value_calculee', 'plafond_penalites', 'penalites_retenues', 'montant_final_calcule',
+                     'ecart_saisie']
+
+# Montants du rapprochement (centimes dans le calcul, Decimal en sortie)
+MONTANTS_RAPPROCHEMENT = [
+    'marche_initial', 'plus_moins_values', 'penalites', 'montant_lots', 'avenants_valides', 'montant_dgd',
+    'montant_saisi', 'ecart_saisie', 'ecart_marche', 'budget_total', 'marge_budget', 'avenants_en_attente',
+    'marge_apres_avenants'
+]
+
+
+# ==============================================================================
+# MONTANTS
+# ==============================================================================
+
+def montant(valeur):
+    """Montant exact au centime (Decimal) ; un flottant passe par sa représentation décimale la plus courte"""
+    if valeur is None or valeur == '' or (isinstance(valeur, float) and np.isnan(valeur)):
+        return Decimal('0.00')
+    return Decimal(str(valeur)).quantize(CENTIME, rounding=ROUND_HALF_UP)
+
+
+def euros(centimes):
+    """Centimes entiers → Decimal en euros"""
+    return Decimal(int(centimes)).scaleb(-2)
+
+
+def _centimes(valeurs):
+    """Montants → centimes entiers (int64) : arithmétique exacte et vectorisée"""
+    return np.array([int(montant(valeur).scaleb(2)) for valeur in valeurs], dtype=np.int64)
+
+
+def _arrondi(numerateur, diviseur):
+    """Division entière arrondie au plus proche, moitié en s'éloignant de zéro (comme ROUND_HALF_UP)"""
+    return np.sign(numerateur) * ((np.abs(numerateur) + diviseur // 2) // diviseur)
+
+
+def _en_euros(frame, colonnes):
+    return frame.assign(**{colonne: frame[colonne].map(euros) for colonne in colonnes})
+
+
+# ==============================================================================
+# REGISTRE DGD
+# ==============================================================================
+
+class DgdLedger:
+    """Lots DGD et avenants de tout le portefeuille (lecture seule, partagé entre sessions)"""
+
+    def __init__(self, lots, avenants, operations):
+        frame = pd.DataFrame(lots, columns=COLONNES_LOTS)
+        frame['operation_id'] = frame['operation_id'].astype(int)
+        for colonne in MONTANTS_LOT:
+            frame[colonne] = _centimes(frame[colonne])
+        # Quantités réelles en % du marché, au centième de point (100 % → 10 000)
+        frame['quantites_reelles'] = _centimes(frame['quantites_reelles'].fillna(100))
+        self.frame = _compute(frame.sort_values(['operation_id', 'id'], kind='stable', ignore_index=True))
+
+        avenants = pd.DataFrame(avenants, columns=['operation_id', 'numero', 'date', 'motif', 'impact_budget', 'statut'])
+        avenants['operation_id'] = avenants['operation_id'].astype(int)
+        avenants['date'] = pd.to_datetime(avenants['date'].astype('string').str.slice(0, 10), format='%Y-%m-%d',
+                                          errors='coerce')
+        avenants['impact_budget'] = _centimes(avenants['impact_budget'])
+        self.avenants = avenants.sort_values(['operation_id', 'date', 'numero'], ignore_index=True)
+
+        self.operations = pd.DataFrame(
+            [(op['id'], op.get('nom', ''), op.get('budget_total')) for op in operations],
+            columns=['operation_id', 'operation', 'budget_total']
+        ).drop_duplicates('operation_id').set_index('operation_id')
+        self.operations['budget_total'] = _centimes(self.operations['budget_total'])
+
+        # Bornes de chaque opération dans les registres triés : lecture d'une opération en O(1)
+        self._bornes = _bornes(self.frame)
+        self._bornes_avenants = _bornes(self.avenants)
+
+        # Rapprochements du portefeuille déjà calculés, par exercice (registre en lecture seule)
+        self._rapprochements = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_records(cls, dgd_data, avenants_data, operations):
+        """Registre depuis dgd_demo ({'operation_<id>': {'lots': [...]}}) et avenants_demo"""
+        lots = [[None, int(cle.rsplit('_', 1)[-1]), *(lot.get(colonne) for colonne in COLONNES_LOTS[2:])]
+                for cle, dgd in (dgd_data or {}).items() for lot in (dgd or {}).get('lots', [])]
+        avenants = [[int(cle.rsplit('_', 1)[-1]), avenant.get('numero'), avenant.get('date'), avenant.get('motif'),
+                     avenant.get('impact_budget'), avenant.get('statut')]
+                    for cle, liste in (avenants_data or {}).items() for avenant in liste or []]
+        return cls(lots, avenants, operations)
+
+    @classmethod
+    def from_demo_data(cls, demo_data):
+        return cls.from_records(demo_data.get('dgd_demo'), demo_data.get('avenants_demo'),
+                                demo_data.get('operations_demo', []))
+
+    @classmethod
+    def from_session(cls, session):
+        """Registre depuis les tables dgd_lots, avenants et operations (trois requêtes)"""
+        lots = session.execute(select(*(getattr(DgdLot, colonne) for colonne in COLONNES_LOTS))).all()
+        avenants = session.execute(select(Avenant.operation_id, Avenant.numero, Avenant.date, Avenant.motif,
+                                          Avenant.impact_budget, Avenant.statut)).all()
+        operations = [{'id': i, 'nom': nom, 'budget_total': budget}
+                      for i, nom, budget in session.execute(select(Operation.id, Operation.nom, Operation.budget_total))]
+        return cls(lots, avenants, operations)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def operation_ids(self):
+        return sorted(self._bornes)
+
+    def lots(self, operation_id):
+        """Lots d'une opération, montants saisis et recalculés en Decimal"""
+        debut, fin = self._bornes.get(int(operation_id), (0, 0))
+        return _en_euros(self.frame.iloc[debut:fin], MONTANTS_LOT + MONTANTS_CALCULES)
+
+    def avenants_operation(self, operation_id, annee=None):
+        """Avenants d'une opération ; `applique` : validé et daté au plus tard en fin d'exercice"""
+        avenants = self._avenants(operation_id)
+        return _en_euros(avenants.assign(applique=_appliques(avenants, annee)), ['impact_budget'])
+
+    def _avenants(self, operation_id):
+        debut, fin = self._bornes_avenants.get(int(operation_id), (0, 0))
+        return self.avenants.iloc[debut:fin]
+
+    def corrections(self):
+        """Lots dont le montant saisi diffère du recalcul (écart de quantités ou pénalités au-delà du plafond)"""
+        return _en_euros(self.frame[self.frame['incoherent']], MONTANTS_LOT + MONTANTS_CALCULES)
+
+    def rapprochement(self, annee=None):
+        """
+        Rapprochement par opération : lots recalculés + avenants validés (jusqu'à la fin de l'exercice
+        `annee`) = DGD, comparé au marché initial, aux montants saisis et au budget - plus ligne TOTAL
+        Calculé une fois par exercice (DataFrame partagé : ne pas le modifier)
+        """
+        with self._lock:
+            if annee not in self._rapprochements:
+                self._rapprochements[annee] = self._rapprocher(annee)
+            return self._rapprochements[annee]
+
+    def synthese_operation(self, operation_id, annee=None):
+        """Ligne de rapprochement d'une opération (tranches de l'opération seules) - None si aucun lot"""
+        debut, fin = self._bornes.get(int(operation_id), (0, 0))
+        if debut == fin:
+            return None
+        rapport = _par_operation(self.frame.iloc[debut:fin], self._avenants(operation_id), self.operations, annee)
+        return _en_euros(_indicateurs(rapport), MONTANTS_RAPPROCHEMENT).iloc[0]
+
+    def _rapprocher(self, annee):
+        if self.frame.empty:
+            return pd.DataFrame()
+        rapport = _par_operation(self.frame, self.avenants, self.operations, annee)
+        total = rapport.drop(columns=['operation_id', 'operation']).sum()
+        rapport.loc[len(rapport)] = {'operation_id': 'TOTAL', 'operation': 'Portefeuille', **total.to_dict()}
+        return _en_euros(_indicateurs(rapport), MONTANTS_RAPPROCHEMENT)
+
+
+def _bornes(frame):
+    """Bornes [début, fin) de chaque opération dans un registre trié par opération"""
+    ids, debuts, nombres = np.unique(frame['operation_id'].to_numpy(), return_index=True, return_counts=True)
+    return {int(i): (int(d), int(d + n)) for i, d, n in zip(ids, debuts, nombres)}
+
+
+def _par_operation(lots, avenants, operations, annee):
+    """Montants rapprochés par opération (centimes) pour des lots et avenants donnés"""
+    par_operation = lots.groupby('operation_id', sort=True).agg(
+        lots=('nom', 'size'),
+        lots_valides=('valide', 'sum'),
+        lots_incoherents=('incoherent', 'sum'),
+        penalites_plafonnees=('penalites_plafonnees', 'sum'),
+        marche_initial=('marche_initial', 'sum'),
+        plus_moins_values=('plus_moins_value_calculee', 'sum'),
+        penalites=('penalites_retenues', 'sum'),
+        montant_lots=('montant_final_calcule', 'sum'),
+        montant_saisi=('montant_final', 'sum')
+    )
+
+    appliques = _appliques(avenants, annee)
+    en_attente = ~avenants['statut'].isin(STATUTS_AVENANT_VALIDE + STATUTS_AVENANT_ABANDONNE)
+    rapport = par_operation.join([
+        avenants[appliques].groupby('operation_id')['impact_budget'].sum().rename('avenants_valides'),
+        avenants[en_attente].groupby('operation_id')['impact_budget'].sum().rename('avenants_en_attente'),
+        operations
+    ], how='left')
+    entiers = [colonne for colonne in rapport.columns if colonne != 'operation']
+    rapport[entiers] = rapport[entiers].fillna(0).astype(np.int64)
+    rapport['operation'] = rapport['operation'].fillna('')
+
+    rapport['montant_dgd'] = rapport['montant_lots'] + rapport['avenants_valides']
+    rapport['ecart_saisie'] = rapport['montant_saisi'] - rapport['montant_lots']
+    rapport['ecart_marche'] = rapport['montant_dgd'] - rapport['marche_initial']
+    rapport['marge_budget'] = rapport['budget_total'] - rapport['montant_dgd']
+    rapport['marge_apres_avenants'] = rapport['marge_budget'] - rapport['avenants_en_attente']
+    return rapport.reset_index()
+
+
+def _indicateurs(rapport):
+    rapport['ecart_pourcentage'] = (100 * rapport['ecart_marche'] / rapport['marche_initial'].replace(0, np.nan)) \
+        .round(1).fillna(0.0)
+    rapport['depassement_budget'] = (rapport['budget_total'] > 0) & (rapport['marge_budget'] < 0)
+    return rapport
+
+
+def _compute(frame):
+    """Montants recalculés de chaque lot, en une passe vectorisée sur tout le registre (centimes)"""
+    marche = frame['marche_initial'].to_numpy()
+    frame['plus_moins_value_calculee'] = _arrondi(marche * (frame['quantites_reelles'].to_numpy() - 10_000), 10_000)
+    frame['plafond_penalites'] = _arrondi(marche * PLAFOND_PENALITES, 100)
+    frame['penalites_retenues'] = np.minimum(frame['penalites'], frame['plafond_penalites'])
+    frame['penalites_plafonnees'] = frame['penalites'] > frame['plafond_penalites']
+    frame['montant_final_calcule'] = marche + frame['plus_moins_value_calculee'] - frame['penalites_retenues']
+    frame['ecart_saisie'] = frame['montant_final'] - frame['montant_final_calcule']
+    frame['incoherent'] = (frame['ecart_saisie'] != 0) \
+        | (frame['plus_moins_value'] != frame['plus_moins_value_calculee']) | frame['penalites_plafonnees']
+    frame['valide'] = frame['statut'].fillna('').str.startswith('VALIDE')
+    return frame
+
+
+def _appliques(avenants, annee):
+    """Avenants pris dans le DGD : validés, datés au plus tard le 31/12 de l'exercice (tous si annee=None)"""
+    appliques = avenants['statut'].isin(STATUTS_AVENANT_VALIDE)
+    if annee is not None:
+        appliques &= avenants['date'].notna() & (avenants['date'].dt.year <= annee)
+    return appliques
+
+
+# ==============================================================================
+# RAPPORT DE RAPPROCHEMENT
+# ==============================================================================
+
+# Colonnes (clé, en-tête, type) ; types : texte, montant, nombre, pourcentage
+COLONNES_RAPPORT = [
+    ('operation_id', 'N°', 'texte'),
+    ('operation', 'Opération', 'texte'),
+    ('lots', 'Lots', 'nombre'),
+    ('lots_valides', 'Lots validés', 'nombre'),
+    ('marche_initial', 'Marché initial', 'montant'),
+    ('plus_moins_values', 'Plus/moins-values', 'montant'),
+    ('penalites', 'Pénalités', 'montant'),
+    ('montant_lots', 'Montant lots', 'montant'),
+    ('avenants_valides', 'Avenants validés', 'montant'),
+    ('montant_dgd', 'DGD', 'montant'),
+    ('ecart_marche', 'Écart / marché', 'montant'),
+    ('ecart_pourcentage', 'Écart %', 'pourcentage'),
+    ('montant_saisi', 'Montant saisi', 'montant'),
+    ('ecart_saisie', 'Écart saisie', 'montant'),
+    ('lots_incoherents', 'Lots à corriger', 'nombre'),
+    ('budget_total', 'Budget', 'montant'),
+    ('marge_budget', 'Marge budget', 'montant'),
+    ('avenants_en_attente', 'Avenants en attente', 'montant'),
+    ('marge_apres_avenants', 'Marge après avenants', 'montant')
+]
+
+COLONNES_CORRECTIONS = [
+    ('operation_id', 'N° opération', 'texte'),
+    ('nom', 'Lot', 'texte'),
+    ('statut', 'Statut', 'texte'),
+    ('marche_initial', 'Marché initial', 'montant'),
+    ('plus_moins_value', 'PMV saisie', 'montant'),
+    ('plus_moins_value_calculee', 'PMV recalculée', 'montant'),
+    ('penalites', 'Pénalités saisies', 'montant'),
+    ('penalites_retenues', 'Pénalités retenues', 'montant'),
+    ('montant_final', 'Montant saisi', 'montant'),
+    ('montant_final_calcule', 'Montant recalculé', 'montant'),
+    ('ecart_saisie', 'Écart', 'montant')
+]
+
+
+def rapport_excel(rapport, corrections, annee=None, sortie=None):
+    """Classeur xlsx du rapprochement (une ligne par opération + TOTAL) et des lots corrigés"""
+    sortie = sortie if sortie is not None else io.BytesIO()
+    workbook = xlsxwriter.Workbook(sortie, {'strings_to_urls': False})
+    formats = {
+        'titre': workbook.add_format({'bold': True, 'font_size': 14, 'font_color': '#1E3A8A'}),
+        'entete': workbook.add_format({'bold': True, 'bg_color': '#EDE9FE', 'border': 1, 'text_wrap': True}),
+        'texte': None,
+        'montant': workbook.add_format({'num_format': '#,##0.00 €'}),
+        'nombre': workbook.add_format({'num_format': '0'}),
+        'pourcentage': workbook.add_format({'num_format': '0.0"%"'}),
+        'total': workbook.add_format({'bold': True, 'top': 1})
+    }
+    exercice = f"exercice {annee}" if annee else "tous exercices"
+    for nom, titre, colonnes, lignes in [
+        ('Rapprochement', f"Rapprochement DGD / budget - {exercice}", COLONNES_RAPPORT, rapport),
+        ('Lots corrigés', f"Lots dont le montant saisi diffère du recalcul - {exercice}", COLONNES_CORRECTIONS,
+         corrections)
+    ]:
+        feuille = workbook.add_worksheet(nom)
+        feuille.write(0, 0, titre, formats['titre'])
+        feuille.freeze_panes(3, 2)
+        for colonne, (cle, entete, type_colonne) in enumerate(colonnes):
+            feuille.set_column(colonne, colonne, 16 if type_colonne == 'montant' else 12 if cle != 'operation' else 32)
+            feuille.write(2, colonne, entete, formats['entete'])
+        for ligne, enregistrement in enumerate(lignes.to_dict('records') if len(lignes) else [], 3):
+            total = enregistrement.get('operation_id') == 'TOTAL'
+            for colonne, (cle, _, type_colonne) in enumerate(colonnes):
+                valeur = enregistrement.get(cle)
+                if isinstance(valeur, Decimal):
+                    valeur = float(valeur)  # cellule Excel : flottant, affiché au centime
+                elif isinstance(valeur, np.generic):
+                    valeur = valeur.item()
+                feuille.write(ligne, colonne, valeur, formats['total'] if total and type_colonne == 'texte'
+                              else formats[type_colonne])
+    workbook.close()
+    if isinstance(sortie, io.BytesIO):
+        sortie.seek(0)
+    return sortie
+
+
+# ==============================================================================
+# RÈGLEMENT ANNUEL (TRAITEMENT DE MASSE)
+# ==============================================================================
+
+def alertes_reglement(rapport, annee, jour):
+    """Alertes du règlement annuel : dépassement budget (critique), montants saisis à corriger"""
+    source = f"DGD {annee}"
+    operations = rapport[rapport['operation_id'] != 'TOTAL']
+    alertes = []
+    for ligne in operations[operations['depassement_budget']].itertuples():
+        alertes.append({
+            'operation_id': ligne.operation_id, 'type': 'DGD_DEPASSEMENT_BUDGET', 'niveau': 'CRITIQUE',
+            'message': f"DGD {annee} : dépassement du budget de {-ligne.marge_budget:,.2f} €",
+            'action_requise': "Arbitrage budgétaire ou avenant de financement", 'date': jour, 'source': source
+        })
+    for ligne in operations[operations['lots_incoherents'] > 0].itertuples():
+        alertes.append({
+            'operation_id': ligne.operation_id, 'type': 'DGD_ECART_SAISIE', 'niveau': 'WARNING',
+            'message': f"DGD {annee} : {ligne.lots_incoherents} lot(s) recalculé(s), écart de saisie "
+                       f"{ligne.ecart_saisie:+,.2f} €",
+            'action_requise': "Vérifier les quantités réelles et pénalités saisies", 'date': jour, 'source': source
+        })
+    return alertes
+
+
+def reglement_annuel(session, annee, jour=None, dry_run=False):
+    """
+    Règlement DGD de fin d'exercice pour tout le portefeuille, en un traitement :
+    recalcul de tous les lots, réécriture des lots incohérents, alertes mises en file (une transaction)
+    Retourne (bilan, rapport, corrections)
+    """
+    debut = time.perf_counter()
+    jour = jour or date.today()
+    registre = DgdLedger.from_session(session)
+    rapport = registre.rapprochement(annee)
+    corrections = registre.corrections()
+    alertes = alertes_reglement(rapport, annee, jour) if len(rapport) else []
+
+    total = rapport.iloc[-1] if len(rapport) else {}
+    bilan = {
+        'operations': len(registre.operation_ids()), 'lots': len(registre), 'lots_corriges': len(corrections),
+        'montant_dgd': total.get('montant_dgd', Decimal('0.00')),
+        'depassements': int(rapport['depassement_budget'].iloc[:-1].sum()) if len(rapport) else 0,
+        'alertes': len(alertes), 'alertes_en_file': 0
+    }
+    if not dry_run:
+        if len(corrections):
+            # Colonnes Numeric(14, 2) : valeurs recalculées écrites en Decimal, au centime
+            session.execute(update(DgdLot), [
+                {'id': int(lot['id']), 'plus_moins_value': lot['plus_moins_value_calculee'],
+                 'penalites': lot['penalites_retenues'], 'montant_final': lot['montant_final_calcule']}
+                for lot in corrections.to_dict('records')
+            ])
+            bump_db_version(session, 'dgd')
+        bilan['alertes_en_file'] = queue_alertes(session, alertes)
+        session.commit()
+
+    bilan['duree_s'] = round(time.perf_counter() - debut, 3)
+    return bilan, rapport, corrections
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Règlement DGD annuel du portefeuille")
+    parser.add_argument('--annee', type=int, help='Exercice réglé (défaut : année de la date de traitement)')
+    parser.add_argument('--date', type=date.fromisoformat, help='Date de traitement (défaut : aujourd\'hui)')
+    parser.add_argument('--rapport', help='Rapport de rapprochement xlsx (défaut : rapport_dgd_<annee>.xlsx)')
+    parser.add_argument('--db', help='URL de la base (défaut : OPCOPILOT_DB_URL)')
+    parser.add_argument('--dry-run', action='store_true', help='Calcule et écrit le rapport sans modifier la base')
+    args = parser.parse_args(argv)
+
+    jour = args.date or date.today()
+    annee = args.annee or jour.year
+
+    moteur = create_db_engine(args.db)
+    init_db(moteur)
+    with get_sessionmaker(moteur)() as session:
+        bilan, rapport, corrections = reglement_annuel(session, annee, jour, args.dry_run)
+    chemin = args.rapport or f"rapport_dgd_{annee}.xlsx"
+    rapport_excel(rapport, corrections, annee, chemin)
+
+    print(f"{'🔎' if args.dry_run else '✅'} Règlement DGD {annee} : {bilan['operations']} opération(s), "
+          f"{bilan['lots']} lot(s) • DGD {bilan['montant_dgd']:,.2f} € • {bilan['lots_corriges']} lot(s) "
+          f"{'à corriger' if args.dry_run else 'corrigé(s)'} • {bilan['depassements']} dépassement(s) budget "
+          f"• {bilan['alertes_en_file']} alerte(s) mise(s) en file • {bilan['duree_s']} s → {chemin}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Export Excel du planning - OPCOPILOT v4.0
+Phases, trimestres REM et avenants d'une opération (ou de tout un portefeuille, une feuille par
+opération) écrits en flux avec xlsxwriter en mode constant_memory : chaque ligne est vidée sur
+disque dès que la suivante commence : aucune ligne n'est conservée, seule la description de chaque
+feuille (~15 Ko) reste en mémoire jusqu'à l'assemblage. Les lignes sont écrites strictement dans
+l'ordre, une feuille après l'autre, et les données d'entrée sont consommées au fil de l'eau (générateur).
+
+Chaque feuille garde son fichier temporaire ouvert jusqu'à l'assemblage du classeur : un export
+portefeuille est donc borné par la limite de fichiers ouverts du processus (ulimit -n), relevée à
+la limite dure à l'ouverture du classeur (cf. limite_feuilles). Fichiers temporaires créés dans
+OPCOPILOT_EXPORT_TMPDIR si défini (sinon le répertoire temporaire du système).
+"""
+
+import io
+import os
+import re
+from datetime import date, datetime
+
+import xlsxwriter
+
+try:
+    import resource
+except ImportError:  # Windows : limite de fichiers ouverts non exposée
+    resource = None
+
+from opcopilot import persistence, schedule
+
+FEUILLE_SYNTHESE = 'Portefeuille'
+
+# Descripteurs laissés au reste du processus (base, modèles, sockets) sous la limite de fichiers ouverts
+RESERVE_FICHIERS = 64
+CARACTERES_INTERDITS = re.compile(r"[\[\]:*?/\\]")
+
+# Colonnes des sections (clé, en-tête, type) ; types : texte, date, montant, nombre, pourcentage
+COLONNES_PHASES = [
+    ('ordre', 'N°', 'nombre'),
+    ('nom', 'Phase', 'texte'),
+    ('statut', 'Statut', 'texte'),
+    ('date_debut_prevue', 'Début prévu', 'date'),
+    ('date_fin_prevue', 'Fin prévue', 'date'),
+    ('date_debut_reelle', 'Début réel', 'date'),
+    ('date_fin_reelle', 'Fin réelle', 'date'),
+    ('responsable', 'Responsable', 'texte'),
+    ('est_critique', 'Critique', 'texte')
+]
+
+COLONNES_REM = [
+    ('trimestre', 'Trimestre', 'texte'),
+    ('rem_projetee', 'REM projetée', 'montant'),
+    ('rem_realisee', 'REM réalisée', 'montant'),
+    ('ecart_rem', 'Écart REM', 'montant'),
+    ('depenses_projetees', 'Dépenses projetées', 'montant'),
+    ('depenses_facturees', 'Dépenses facturées', 'montant'),
+    ('avancement_rem', 'Avancement REM', 'pourcentage'),
+    ('avancement_travaux', 'Avancement travaux', 'pourcentage')
+]
+
+COLONNES_AVENANTS = [
+    ('numero', 'N°', 'texte'),
+    ('date', 'Date', 'date'),
+    ('motif', 'Motif', 'texte'),
+    ('description', 'Description', 'texte'),
+    ('impact_budget', 'Impact budget', 'montant'),
+    ('impact_delai', 'Impact délai (j)', 'nombre'),
+    ('statut', 'Statut', 'texte'),
+    ('validateur', 'Validateur', 'texte')
+]
+
+COLONNES_SYNTHESE = [
+    ('nom', 'Opération', 'lien'),
+    ('type_operation', 'Type', 'texte'),
+    ('aco_responsable', 'ACO', 'texte'),
+    ('commune', 'Commune', 'texte'),
+    ('statut', 'Statut', 'texte'),
+    ('avancement', 'Avancement', 'pourcentage'),
+    ('phases', 'Phases', 'nombre'),
+    ('phases_terminees', 'Terminées', 'nombre'),
+    ('phases_en_retard', 'En retard', 'nombre'),
+    ('rem_projetee', 'REM projetée', 'montant'),
+    ('rem_realisee', 'REM réalisée', 'montant'),
+    ('avenants', 'Avenants', 'nombre'),
+    ('impact_avenants', 'Impact avenants', 'montant')
+]
+
+# Largeurs communes aux trois sections d'une feuille opération (constant_memory : définies avant écriture)
+LARGEURS_OPERATION = [14, 42, 16, 16, 16, 16, 16, 24, 16]
+LARGEURS_SYNTHESE = [40, 20, 22, 18, 14, 12, 10, 10, 10, 14, 14, 10, 16]
+
+STATUTS_PHASE_TERMINEE = ('VALIDEE', 'TERMINEE', 'CLOTUREE')
+
+
+def _date(valeur):
+    if not valeur:
+        return None
+    if isinstance(valeur, datetime):
+        return valeur
+    if isinstance(valeur, date):
+        return datetime.combine(valeur, datetime.min.time())
+    try:
+        return datetime.fromisoformat(str(valeur)[:10])
+    except ValueError:
+        return None
+
+
+def nom_feuille(operation, utilises):
+    """Nom de feuille Excel valide et unique : « id - nom » sans caractères interdits, 31 caractères max"""
+    base = CARACTERES_INTERDITS.sub(' ', f"{operation.get('id', '')} - {operation.get('nom', '')}")
+    base = re.sub(r'\s+', ' ', base).strip().strip("'")[:31].rstrip().rstrip("'") or 'Opération'
+    nom, suffixe = base, 2
+    while nom.lower() in utilises or nom.lower() == FEUILLE_SYNTHESE.lower():
+        nom = f"{base[:31 - len(str(suffixe)) - 1].rstrip()}~{suffixe}"
+        suffixe += 1
+    utilises.add(nom.lower())
+    return nom
+
+
+def limite_feuilles():
+    """
+    Nombre maximal de feuilles d'un classeur (un fichier temporaire ouvert par feuille) : limite souple
+    de fichiers ouverts relevée à la limite dure, moins RESERVE_FICHIERS - None si non exposée
+    """
+    if resource is None:
+        return None
+    souple, dure = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if souple != dure:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (dure, dure))
+            souple = dure
+        except (ValueError, OSError):
+            pass
+    if souple == resource.RLIM_INFINITY:
+        return None
+    return max(souple - RESERVE_FICHIERS, 1)
+
+
+class PlanningWorkbook:
+    """Classeur de planning écrit en flux (une ligne après l'autre, une feuille après l'autre)"""
+
+    def __init__(self, sortie, synthese=False, aujourd_hui=None):
+        options = {'constant_memory': True, 'strings_to_urls': False}
+        if os.environ.get('OPCOPILOT_EXPORT_TMPDIR'):
+            options['tmpdir'] = os.environ['OPCOPILOT_EXPORT_TMPDIR']
+        self.workbook = xlsxwriter.Workbook(sortie, options)
+        self.max_feuilles = limite_feuilles()
+        self.aujourd_hui = _date(aujourd_hui or date.today())
+        self._feuilles = set()
+
+        ajouter = self.workbook.add_format
+        self.formats = {
+            'titre': ajouter({'bold': True, 'font_size': 14, 'font_color': '#1E3A8A'}),
+            'soustitre': ajouter({'italic': True, 'font_color': '#6B7280'}),
+            'section': ajouter({'bold': True, 'font_size': 12, 'font_color': '#8B5CF6'}),
+            'entete': ajouter({'bold': True, 'bg_color': '#EDE9FE', 'border': 1}),
+            'texte': None,
+            'date': ajouter({'num_format': 'dd/mm/yyyy'}),
+            'montant': ajouter({'num_format': '#,##0 €'}),
+            'nombre': ajouter({'num_format': '0'}),
+            'pourcentage': ajouter({'num_format': '0"%"'}),
+            'lien': ajouter({'font_color': '#2563EB', 'underline': 1})
+        }
+
+        # Feuille de synthèse créée en premier (premier onglet), remplie au fil des opérations
+        self._synthese = None
+        if synthese:
+            self._synthese = self.workbook.add_worksheet(FEUILLE_SYNTHESE)
+            self._synthese.freeze_panes(1, 1)
+            for colonne, largeur in enumerate(LARGEURS_SYNTHESE):
+                self._synthese.set_column(colonne, colonne, largeur)
+            self._ligne_synthese = self._entete(self._synthese, 0, COLONNES_SYNTHESE)
+
+    # --- Écriture typée (pas de détection de type par cellule) ---------------------
+
+    def _cellule(self, feuille, ligne, colonne, valeur, type_colonne):
+        if valeur is None or valeur == '':
+            return
+        if type_colonne == 'date':
+            jour = _date(valeur)
+            if jour is not None:
+                feuille.write_datetime(ligne, colonne, jour, self.formats['date'])
+                return
+        elif type_colonne in ('montant', 'nombre', 'pourcentage') and isinstance(valeur, (int, float)):
+            feuille.write_number(ligne, colonne, valeur, self.formats[type_colonne])
+            return
+        elif isinstance(valeur, bool):
+            valeur = 'Oui' if valeur else 'Non'
+        feuille.write_string(ligne, colonne, str(valeur))
+
+    def _entete(self, feuille, ligne, colonnes):
+        for colonne, (_, entete, _) in enumerate(colonnes):
+            feuille.write_string(ligne, colonne, entete, self.formats['entete'])
+        return ligne + 1
+
+    def _section(self, feuille, ligne, titre, colonnes, lignes):
+        """Titre, en-tête puis une ligne par élément ; retourne la ligne suivante (après une ligne vide)"""
+        feuille.write_string(ligne, 0, f"{titre} ({len(lignes)})", self.formats['section'])
+        ligne = self._entete(feuille, ligne + 1, colonnes)
+        for element in lignes:
+            for colonne, (cle, _, type_colonne) in enumerate(colonnes):
+                self._cellule(feuille, ligne, colonne, element.get(cle), type_colonne)
+            ligne += 1
+        return ligne + 1
+
+    # --- Feuilles ---------------------------------------------------------------
+
+    def ajouter_operation(self, operation, phases, trimestres, avenants):
+        """Feuille d'une opération (en-tête, phases, REM trimestrielle, avenants) + ligne de synthèse"""
+        if self.max_feuilles is not None and len(self._feuilles) >= self.max_feuilles:
+            raise ValueError(f"Export limité à {self.max_feuilles} opérations par classeur "
+                             f"(fichiers ouverts du processus, ulimit -n) : affiner les filtres")
+        nom = nom_feuille(operation, self._feuilles)
+        feuille = self.workbook.add_worksheet(nom)
+        for colonne, largeur in enumerate(LARGEURS_OPERATION):
+            feuille.set_column(colonne, colonne, largeur)
+
+        feuille.write_string(0, 0, f"{operation.get('nom', '')} - {operation.get('type_operation', '')}",
+                             self.formats['titre'])
+        feuille.write_string(1, 0, " • ".join(str(valeur) for valeur in (
+            operation.get('commune'), operation.get('aco_responsable'), operation.get('statut'),
+            f"{operation.get('avancement') or 0}%"
+        ) if valeur), self.formats['soustitre'])
+
+        ligne = self._section(feuille, 3, "Phases", COLONNES_PHASES, phases)
+        ligne = self._section(feuille, ligne, "REM trimestrielle", COLONNES_REM, trimestres)
+        self._section(feuille, ligne, "Avenants", COLONNES_AVENANTS, avenants)
+
+        if self._synthese is not None:
+            self._ligne_synthese_operation(nom, operation, phases, trimestres, avenants)
+        return nom
+
+    def _ligne_synthese_operation(self, nom, operation, phases, trimestres, avenants):
+        terminees = sum(1 for phase in phases if phase.get('statut') in STATUTS_PHASE_TERMINEE)
+        en_retard = sum(
+            1 for phase in phases
+            if phase.get('statut') not in STATUTS_PHASE_TERMINEE and not phase.get('date_fin_reelle')
+            and (_date(phase.get('date_fin_prevue')) or self.aujourd_hui) < self.aujourd_hui
+        )
+        valeurs = {
+            **operation,
+            'phases': len(phases),
+            'phases_terminees': terminees,
+            'phases_en_retard': en_retard,
+            'rem_projetee': sum(t.get('rem_projetee') or 0 for t in trimestres),
+            'rem_realisee': sum(t.get('rem_realisee') or 0 for t in trimestres),
+            'avenants': len(avenants),
+            'impact_avenants': sum(a.get('impact_budget') or 0 for a in avenants)
+        }
+        ligne = self._ligne_synthese
+        for colonne, (cle, _, type_colonne) in enumerate(COLONNES_SYNTHESE):
+            if type_colonne == 'lien':
+                cible = nom.replace("'", "''")
+                self._synthese.write_url(ligne, colonne, f"internal:'{cible}'!A1", self.formats['lien'],
+                                         string=str(valeurs.get(cle) or nom))
+            else:
+                self._cellule(self._synthese, ligne, colonne, valeurs.get(cle), type_colonne)
+        self._ligne_synthese += 1
+
+    def close(self):
+        if self._synthese is not None and self._ligne_synthese > 1:
+            self._synthese.autofilter(0, 0, self._ligne_synthese - 1, len(COLONNES_SYNTHESE) - 1)
+        self.workbook.close()
+
+
+# ==============================================================================
+# EXPORTS
+# ==============================================================================
+
+def export_operation(operation, phases, trimestres, avenants, sortie=None, aujourd_hui=None):
+    """Planning d'une opération → classeur xlsx (BytesIO par défaut, ou chemin / fichier)"""
+    sortie = io.BytesIO() if sortie is None else sortie
+    classeur = PlanningWorkbook(sortie, aujourd_hui=aujourd_hui)
+    classeur.ajouter_operation(operation, phases, trimestres, avenants)
+    classeur.close()
+    if isinstance(sortie, io.BytesIO):
+        sortie.seek(0)
+    return sortie
+
+
+def export_portefeuille(plannings, sortie=None, aujourd_hui=None):
+    """
+    Portefeuille → classeur xlsx : synthèse (liens vers les feuilles) puis une feuille par opération.
+    `plannings` est un itérable de (opération, phases, trimestres, avenants) consommé au fil de l'eau.
+    """
+    sortie = io.BytesIO() if sortie is None else sortie
+    classeur = PlanningWorkbook(sortie, synthese=True, aujourd_hui=aujourd_hui)
+    for operation, phases, trimestres, avenants in plannings:
+        classeur.ajouter_operation(operation, phases, trimestres, avenants)
+    classeur.close()
+    if isinstance(sortie, io.BytesIO):
+        sortie.seek(0)
+    return sortie
+
+
+# ==============================================================================
+# SOURCES (générateurs : une opération en mémoire à la fois)
+# ==============================================================================
+
+def plannings_demo(operations, demo_data, templates=None):
+    """(opération, phases, trimestres, avenants) depuis demo_data (planning template si aucune phase)"""
+    for operation in operations:
+        cle = f"operation_{operation['id']}"
+        phases = (demo_data.get('phases_demo') or {}).get(cle) or []
+        if not phases and templates is not None:
+            phases = schedule.generate_phases(templates, operation)
+        yield (operation, phases, (demo_data.get('rem_demo') or {}).get(cle, []),
+               (demo_data.get('avenants_demo') or {}).get(cle, []))
+
+
+def plannings_base(session, operations, templates=None):
+    """
+    (opération, phases, trimestres, avenants) depuis la base : les trois tables sont lues en flux,
+    triées par opération, et fusionnées avec les opérations (parcourues par identifiant croissant)
+    """
+    flux = [
+        persistence.iter_par_operation(session, persistence.Phase, persistence.Phase.ordre),
+        persistence.iter_par_operation(session, persistence.RemTrimestre,
+                                       persistence.RemTrimestre.annee, persistence.RemTrimestre.numero),
+        persistence.iter_par_operation(session, persistence.Avenant, persistence.Avenant.numero)
+    ]
+    courants = [next(iterateur, None) for iterateur in flux]
+
+    for operation in sorted(operations, key=lambda op: op['id']):
+        donnees = []
+        for position, iterateur in enumerate(flux):
+            # Avance chaque flux jusqu'à l'opération courante (opérations hors sélection ignorées)
+            while courants[position] is not None and courants[position][0] < operation['id']:
+                courants[position] = next(iterateur, None)
+            if courants[position] is not None and courants[position][0] == operation['id']:
+                donnees.append(courants[position][1])
+                courants[position] = next(iterateur, None)
+            else:
+                donnees.append([])
+        phases, trimestres, avenants = donnees
+        if not phases and templates is not None:
+            phases = schedule.generate_phases(templates, operation)
+        yield operation, phases, trimestres, avenants
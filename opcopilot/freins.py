@@ -0,0 +1,232 @@
+"""
+Registre des freins - OPCOPILOT v4.0
+Les freins (points de blocage) sont persistés dans la table `freins` ; le registre en mémoire
+maintient deux index mis à jour à chaque ouverture / clôture :
+- priorité : freins ouverts triés par (impact, ancienneté) → top N critiques sans tri à la lecture
+- vieillissement par responsable : nombre, somme et plus ancienne date d'ouverture des freins ouverts,
+  compteurs de résolution → statistiques par responsable sans parcourir les freins
+Le rapport hebdomadaire de tous les ACO est produit en une passe sur le registre.
+"""
+
+import threading
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from opcopilot.persistence import get_freins
+
+# Impacts par gravité décroissante
+IMPACTS = ('Critique', 'Majeur', 'Mineur')
+
+TYPES_FREIN = ('RETARD', 'BLOCAGE', 'ATTENTE', 'TECHNIQUE', 'FINANCIER', 'ADMINISTRATIF')
+
+
+def _datetime(valeur):
+    if not valeur:
+        return None
+    if isinstance(valeur, datetime):
+        return valeur
+    if isinstance(valeur, date):
+        return datetime.combine(valeur, datetime.min.time())
+    return datetime.fromisoformat(str(valeur))
+
+
+def _jours(debut, fin):
+    """Durée en jours (décimale) entre deux instants"""
+    return (fin - debut).total_seconds() / 86400
+
+
+class FreinRegistry:
+    """Registre des freins du portefeuille (ouverts indexés, clos comptés)"""
+
+    def __init__(self, freins, operations):
+        self._lock = threading.Lock()
+        self._operations = {op['id']: op for op in operations}
+        self._freins = {}
+        self._priorite = []  # clés triées (rang impact, date d'ouverture, id) des freins ouverts
+        self._ouverts_operation = {}  # opération → nombre de freins ouverts
+        self._vieillissement = {}  # responsable → {'ouverts', 'somme', 'ouvertures' (triées), 'clos', 'duree_resolution'}
+        for frein in freins:
+            self._ajouter(dict(frein))
+
+    @classmethod
+    def from_session(cls, session, operations):
+        """Registre depuis la table freins (une requête)"""
+        return cls(get_freins(session), operations)
+
+    @classmethod
+    def from_demo_data(cls, demo_data):
+        """Registre depuis freins_demo (identifiants attribués dans l'ordre du fichier)"""
+        freins = []
+        for cle, liste in (demo_data.get('freins_demo') or {}).items():
+            for frein in liste:
+                freins.append({**frein, 'id': len(freins) + 1, 'operation_id': int(cle.rsplit('_', 1)[-1]),
+                               'statut': 'CLOS' if frein.get('date_cloture') else 'OUVERT'})
+        return cls(freins, demo_data.get('operations_demo', []))
+
+    # --- Index ------------------------------------------------------------------
+
+    @staticmethod
+    def _cle(frein):
+        rang = IMPACTS.index(frein['impact']) if frein.get('impact') in IMPACTS else len(IMPACTS)
+        return rang, frein['date_ouverture'], frein['id']
+
+    def _stats(self, responsable):
+        return self._vieillissement.setdefault(responsable or '-', {
+            'ouverts': 0, 'somme': 0.0, 'ouvertures': [], 'clos': 0, 'duree_resolution': 0.0
+        })
+
+    def _ajouter(self, frein):
+        """Indexe un frein (verrou détenu ou construction)"""
+        frein['date_ouverture'] = _datetime(frein['date_ouverture'])
+        frein['date_cloture'] = _datetime(frein.get('date_cloture'))
+        op = self._operations.get(frein['operation_id'], {})
+        frein['operation'] = op.get('nom', '')
+        frein['aco'] = op.get('aco_responsable') or ''
+        self._freins[frein['id']] = frein
+
+        stats = self._stats(frein.get('responsable'))
+        if frein['date_cloture'] is None:
+            insort(self._priorite, self._cle(frein))
+            self._ouverts_operation[frein['operation_id']] = self._ouverts_operation.get(frein['operation_id'], 0) + 1
+            stats['ouverts'] += 1
+            stats['somme'] += frein['date_ouverture'].timestamp()
+            insort(stats['ouvertures'], frein['date_ouverture'])
+        else:
+            stats['clos'] += 1
+            stats['duree_resolution'] += _jours(frein['date_ouverture'], frein['date_cloture'])
+
+    # --- Mises à jour incrémentales -------------------------------------------------
+
+    def ouvrir(self, frein):
+        """Ajoute un frein créé en base (dict de persistence.add_frein)"""
+        with self._lock:
+            self._ajouter(dict(frein))
+
+    def clore(self, frein_id, date_cloture=None):
+        """Clôture un frein ouvert : retiré de l'index de priorité, compté dans les résolutions"""
+        with self._lock:
+            frein = self._freins.get(frein_id)
+            if frein is None or frein['date_cloture'] is not None:
+                return None
+            cle = self._cle(frein)
+            del self._priorite[bisect_left(self._priorite, cle)]
+            self._ouverts_operation[frein['operation_id']] -= 1
+
+            stats = self._stats(frein.get('responsable'))
+            stats['ouverts'] -= 1
+            stats['somme'] -= frein['date_ouverture'].timestamp()
+            del stats['ouvertures'][bisect_left(stats['ouvertures'], frein['date_ouverture'])]
+
+            frein['date_cloture'] = _datetime(date_cloture) or datetime.now()
+            frein['statut'] = 'CLOS'
+            stats['clos'] += 1
+            stats['duree_resolution'] += _jours(frein['date_ouverture'], frein['date_cloture'])
+            return frein
+
+    def next_id(self):
+        """Identifiant suivant (registre sans base de données)"""
+        with self._lock:
+            return max(self._freins, default=0) + 1
+
+    # --- Lecture --------------------------------------------------------------
+
+    def top(self, n=10, aco=None, impact=None):
+        """N freins ouverts les plus prioritaires (impact puis ancienneté) - parcours limité aux N premiers"""
+        resultat = []
+        with self._lock:
+            for _, _, frein_id in self._priorite:
+                frein = self._freins[frein_id]
+                if (aco is None or frein['aco'] == aco) and (impact is None or frein.get('impact') == impact):
+                    resultat.append(frein)
+                    if len(resultat) >= n:
+                        break
+        return resultat
+
+    def nb_ouverts(self, impact=None):
+        """Nombre de freins ouverts (d'un niveau d'impact) - O(log n)"""
+        with self._lock:
+            if impact is None:
+                return len(self._priorite)
+            rang = IMPACTS.index(impact)
+            return bisect_left(self._priorite, (rang + 1,)) - bisect_left(self._priorite, (rang,))
+
+    def nb_ouverts_operation(self, operation_id):
+        """Nombre de freins ouverts d'une opération"""
+        with self._lock:
+            return self._ouverts_operation.get(operation_id, 0)
+
+    def aging_stats(self, maintenant=None):
+        """Vieillissement par responsable (O(nombre de responsables)) : ouverts, âge moyen / max, résolution"""
+        maintenant = maintenant or datetime.now()
+        lignes = []
+        with self._lock:
+            for responsable, stats in sorted(self._vieillissement.items()):
+                ouverts = stats['ouverts']
+                lignes.append({
+                    'responsable': responsable,
+                    'ouverts': ouverts,
+                    'age_moyen_jours': round((maintenant.timestamp() - stats['somme'] / ouverts) / 86400, 1)
+                    if ouverts else 0.0,
+                    'age_max_jours': round(_jours(stats['ouvertures'][0], maintenant), 1) if ouverts else 0.0,
+                    'clos': stats['clos'],
+                    'resolution_moyenne_jours': round(stats['duree_resolution'] / stats['clos'], 1)
+                    if stats['clos'] else None
+                })
+        return sorted(lignes, key=lambda ligne: (-ligne['age_max_jours'], ligne['responsable']))
+
+    def weekly_report(self, debut_semaine, aco=None):
+        """
+        Rapport hebdomadaire de tous les ACO (ou d'un seul) en une passe :
+        une ligne par frein ouvert en fin de semaine ou ouvert / clos pendant la semaine
+        """
+        debut = _datetime(debut_semaine)
+        fin = debut + timedelta(days=7)
+        arrete = min(fin, datetime.now())  # Âges arrêtés à la fin de semaine (ou maintenant, semaine en cours)
+        lignes = []
+        with self._lock:
+            for frein in self._freins.values():
+                if aco is not None and frein['aco'] != aco:
+                    continue
+                ouverture, cloture = frein['date_ouverture'], frein['date_cloture']
+                if ouverture >= fin or (cloture is not None and cloture < debut):
+                    continue
+                if cloture is not None and cloture < fin:
+                    mouvement = 'CLOS'
+                else:
+                    mouvement = 'NOUVEAU' if ouverture >= debut else 'EN_STOCK'
+                lignes.append({
+                    'ACO': frein['aco'],
+                    'Opération': frein['operation'],
+                    'Phase': frein.get('phase') or '',
+                    'Type': frein.get('type'),
+                    'Impact': frein.get('impact'),
+                    'Responsable': frein.get('responsable'),
+                    'Action': frein.get('action'),
+                    'Ouverture': ouverture.strftime('%d/%m/%Y'),
+                    'Clôture': cloture.strftime('%d/%m/%Y') if cloture else '',
+                    'Âge (j)': round(max(_jours(ouverture, min(cloture or arrete, arrete)), 0), 1),
+                    'Mouvement': mouvement
+                })
+
+        rapport = pd.DataFrame(lignes, columns=[
+            'ACO', 'Opération', 'Phase', 'Type', 'Impact', 'Responsable', 'Action',
+            'Ouverture', 'Clôture', 'Âge (j)', 'Mouvement'
+        ])
+        rang = rapport['Impact'].map({impact: i for i, impact in enumerate(IMPACTS)}).fillna(len(IMPACTS))
+        return rapport.assign(_rang=rang).sort_values(['ACO', '_rang', 'Âge (j)'], ascending=[True, True, False]) \
+            .drop(columns='_rang').reset_index(drop=True)
+
+
+def synthese_rapport(rapport):
+    """Synthèse du rapport hebdomadaire par ACO (nouveaux, clos, stock, critiques)"""
+    if rapport.empty:
+        return pd.DataFrame(columns=['ACO', 'Nouveaux', 'Clos', 'Ouverts fin de semaine', 'Critiques ouverts'])
+    ouverts = rapport['Mouvement'] != 'CLOS'
+    return pd.DataFrame({
+        'Nouveaux': (rapport['Mouvement'] == 'NOUVEAU').groupby(rapport['ACO']).sum(),
+        'Clos': (rapport['Mouvement'] == 'CLOS').groupby(rapport['ACO']).sum(),
+        'Ouverts fin de semaine': ouverts.groupby(rapport['ACO']).sum(),
+        'Critiques ouverts': (ouverts & (rapport['Impact'] == 'Critique')).groupby(rapport['ACO']).sum()
+    }).reset_index()
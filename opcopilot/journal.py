@@ -0,0 +1,64 @@
+"""
+Journal des actions réalisées - OPCOPILOT v4.0
+Reconstitué à partir des enregistrements datés (phases terminées, MED envoyées ou résolues,
+avenants validés, réclamations GPA résolues), du plus récent au plus ancien.
+"""
+
+
+def _par_operation(demo_data, cle):
+    """(id opération, enregistrements) pour une section {'operation_<id>': [...]} de demo_data"""
+    for cle_operation, enregistrements in (demo_data.get(cle) or {}).items():
+        yield int(cle_operation.rsplit('_', 1)[-1]), enregistrements or []
+
+
+def journal_actions(demo_data, aco=None, limite=None):
+    """
+    Actions réalisées du portefeuille (ou des opérations d'un ACO) :
+    [{date, operation_id, operation, type_operation, titre, detail, icone}] triées par date décroissante
+    """
+    operations = {
+        op['id']: op for op in demo_data.get('operations_demo', [])
+        if aco is None or op.get('aco_responsable') == aco
+    }
+    actions = []
+
+    def ajouter(operation_id, date, titre, detail, icone='✅'):
+        op = operations.get(operation_id)
+        if op is None or not date:
+            return
+        actions.append({
+            'date': str(date),
+            'operation_id': operation_id,
+            'operation': op['nom'],
+            'type_operation': op.get('type_operation'),
+            'titre': f"{titre} - {op['nom']}",
+            'detail': detail,
+            'icone': icone
+        })
+
+    for operation_id, phases in _par_operation(demo_data, 'phases_demo'):
+        for phase in phases:
+            ajouter(operation_id, phase.get('date_fin_reelle'), f"Phase terminée : {phase.get('nom', '')}",
+                    f"Responsable {phase.get('responsable', '-')}")
+
+    for operation_id, meds in _par_operation(demo_data, 'med_demo'):
+        for med in meds:
+            ajouter(operation_id, med.get('date_envoi'), f"MED envoyée {med.get('reference', '')}",
+                    f"{med.get('destinataire', '')} : {med.get('motif', '')}", '📨')
+            ajouter(operation_id, med.get('date_resolution'), f"MED résolue {med.get('reference', '')}",
+                    f"{med.get('destinataire', '')} : {med.get('motif', '')}")
+
+    for operation_id, avenants in _par_operation(demo_data, 'avenants_demo'):
+        for avenant in avenants:
+            if avenant.get('statut') == 'VALIDE':
+                ajouter(operation_id, avenant.get('date'), f"Avenant {avenant.get('numero', '')} validé",
+                        f"{avenant.get('motif', '')} - {avenant.get('validateur', '')}")
+
+    for operation_id, reclamations in _par_operation(demo_data, 'gpa_demo'):
+        for reclamation in reclamations:
+            ajouter(operation_id, reclamation.get('date_resolution'),
+                    f"GPA résolue logement {reclamation.get('logement', '')}",
+                    f"{reclamation.get('type', '')} : {reclamation.get('description', '')}")
+
+    actions.sort(key=lambda action: action['date'], reverse=True)
+    return actions[:limite]
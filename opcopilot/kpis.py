@@ -0,0 +1,165 @@
+"""
+Indicateurs ACO - OPCOPILOT v4.0
+Les KPIs du tableau de bord (opérations actives, REM réalisée, freins, phases en retard...)
+sont agrégés par ACO depuis les opérations, les phases (résultat CPM) et les trimestres REM :
+contribution de chaque opération calculée en colonnes pandas (ou GROUP BY SQL), puis sommée
+par ACO dans un cache de synthèse. Une modification d'opération ne met à jour que sa contribution.
+"""
+
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+
+from opcopilot.persistence import RemTrimestre, parse_trimestre
+
+# Indicateurs additifs (sommés par ACO)
+KPI_FIELDS = (
+    'operations_actives', 'operations_cloturees', 'rem_realisee', 'rem_prevue',
+    'freins_actifs', 'phases_retard', 'echeances_semaine', 'validations_requises'
+)
+
+STATUTS_CLOTURES = ('CLOTUREE', 'ARCHIVEE')
+
+
+# ==============================================================================
+# AGRÉGATIONS PAR OPÉRATION
+# ==============================================================================
+
+def rem_par_operation(rem_data, annee):
+    """Trimestres REM au format rem_demo ({'operation_<id>': [...]}) → DataFrame REM de l'exercice par opération"""
+    lignes = [
+        (int(cle.rsplit('_', 1)[-1]), parse_trimestre(trimestre.get('trimestre', ''))[1],
+         trimestre.get('rem_realisee') or 0, trimestre.get('rem_projetee') or 0)
+        for cle, trimestres in (rem_data or {}).items()
+        for trimestre in trimestres
+    ]
+    rem = pd.DataFrame(lignes, columns=['operation_id', 'annee', 'rem_realisee', 'rem_prevue'])
+    return rem[rem['annee'] == annee].groupby('operation_id')[['rem_realisee', 'rem_prevue']].sum()
+
+
+def rem_par_operation_sql(session, annee):
+    """Même résultat que rem_par_operation, par GROUP BY en base"""
+    query = (select(RemTrimestre.operation_id,
+                    func.sum(RemTrimestre.rem_realisee).label('rem_realisee'),
+                    func.sum(RemTrimestre.rem_projetee).label('rem_prevue'))
+             .where(RemTrimestre.annee == annee)
+             .group_by(RemTrimestre.operation_id))
+    rem = pd.DataFrame(session.execute(query).all(), columns=['operation_id', 'rem_realisee', 'rem_prevue'])
+    return rem.set_index('operation_id')
+
+
+def phases_par_operation_kpis(cpm_resultats, aujourd_hui=None):
+    """Compteurs de phases par opération depuis le DataFrame portfolio_cpm"""
+    colonnes = ['phases_retard', 'echeances_semaine', 'validations_requises']
+    if cpm_resultats is None or cpm_resultats.empty:
+        return pd.DataFrame(columns=colonnes, index=pd.Index([], name='operation_id'))
+
+    aujourd_hui = pd.Timestamp(aujourd_hui or date.today())
+    ouvertes = ~cpm_resultats['terminee']
+    fin = cpm_resultats['fin_au_plus_tot']
+
+    compteurs = pd.DataFrame({
+        'operation_id': cpm_resultats['operation_id'],
+        'phases_retard': ouvertes & (cpm_resultats['retard_jours'] > 0),
+        'echeances_semaine': ouvertes & (fin >= aujourd_hui) & (fin <= aujourd_hui + timedelta(days=7)),
+        'validations_requises': cpm_resultats['statut'] == 'VALIDATION_REQUISE'
+    })
+    return compteurs.groupby('operation_id')[colonnes].sum()
+
+
+def operation_contributions(operations, rem, phases_kpis):
+    """
+    Contribution de chaque opération aux KPIs (une ligne par opération, colonnes KPI_FIELDS)
+    rem : DataFrame REM indexé par operation_id ; phases_kpis : sortie de phases_par_operation_kpis
+    """
+    ops = pd.DataFrame(
+        [(op['id'], op.get('aco_responsable') or '', op.get('statut'), op.get('freins_actifs') or 0)
+         for op in operations],
+        columns=['operation_id', 'aco_responsable', 'statut', 'freins_actifs']
+    ).set_index('operation_id')
+
+    cloturees = ops['statut'].isin(STATUTS_CLOTURES)
+    contributions = pd.DataFrame({
+        'aco_responsable': ops['aco_responsable'],
+        'operations_actives': (~cloturees).astype(int),
+        'operations_cloturees': cloturees.astype(int),
+        'freins_actifs': ops['freins_actifs'].where(~cloturees, 0)
+    }, index=ops.index)
+
+    contributions = contributions.join(rem, how='left').join(phases_kpis, how='left')
+    contributions[list(KPI_FIELDS)] = contributions[list(KPI_FIELDS)].fillna(0).astype(float)
+    return contributions[['aco_responsable', *KPI_FIELDS]]
+
+
+# ==============================================================================
+# CACHE DE SYNTHÈSE PAR ACO
+# ==============================================================================
+
+class KpiSummaryCache:
+    """
+    Synthèse KPI matérialisée par ACO
+    - construction : une agrégation groupée sur les contributions des opérations
+    - lecture : simple lookup (indépendant de la taille du portefeuille)
+    - mise à jour : on retire l'ancienne contribution de l'opération et on ajoute la nouvelle
+    """
+
+    def __init__(self, contributions, annee):
+        self.annee = annee
+        self._lock = threading.Lock()
+        self._contributions = {
+            operation_id: (aco, valeurs)
+            for operation_id, aco, valeurs in zip(
+                contributions.index, contributions['aco_responsable'],
+                contributions[list(KPI_FIELDS)].to_numpy()
+            )
+        }
+        sommes = contributions.groupby('aco_responsable')[list(KPI_FIELDS)].sum()
+        self._par_aco = {aco: valeurs for aco, valeurs in zip(sommes.index, sommes.to_numpy())}
+        self._total = contributions[list(KPI_FIELDS)].to_numpy().sum(axis=0) if len(contributions) \
+            else np.zeros(len(KPI_FIELDS))
+
+    def acos(self):
+        """ACO ayant au moins une opération"""
+        return sorted(self._par_aco)
+
+    def get(self, aco=None):
+        """KPIs d'un ACO (ou du portefeuille complet si aco est None)"""
+        with self._lock:
+            valeurs = self._total if aco is None else self._par_aco.get(aco, np.zeros(len(KPI_FIELDS)))
+            kpis = {field: int(round(valeur)) for field, valeur in zip(KPI_FIELDS, valeurs)}
+
+        kpis['taux_realisation_rem'] = round(100 * kpis['rem_realisee'] / kpis['rem_prevue']) \
+            if kpis['rem_prevue'] else 0
+        kpis['annee'] = self.annee
+        return kpis
+
+    def update_operation(self, operation_id, aco_responsable, **valeurs):
+        """Remplace la contribution d'une opération (valeurs absentes : inchangées)"""
+        with self._lock:
+            ancien_aco, anciennes = self._contributions.get(operation_id, (None, np.zeros(len(KPI_FIELDS))))
+            nouvelles = np.array([valeurs.get(field, anciennes[i]) for i, field in enumerate(KPI_FIELDS)],
+                                 dtype=float)
+            aco = aco_responsable if aco_responsable is not None else (ancien_aco or '')
+
+            if ancien_aco is not None:
+                self._par_aco[ancien_aco] = self._par_aco[ancien_aco] - anciennes
+            self._par_aco[aco] = self._par_aco.get(aco, np.zeros(len(KPI_FIELDS))) + nouvelles
+            self._total = self._total - anciennes + nouvelles
+            self._contributions[operation_id] = (aco, nouvelles)
+
+    def apply(self, contributions):
+        """Applique des contributions recalculées (sortie de operation_contributions sur quelques opérations)"""
+        for operation_id, ligne in contributions.iterrows():
+            self.update_operation(operation_id, ligne['aco_responsable'],
+                                  **{field: ligne[field] for field in KPI_FIELDS})
+
+    def remove_operation(self, operation_id):
+        """Retire une opération de la synthèse"""
+        with self._lock:
+            aco, anciennes = self._contributions.pop(operation_id, (None, None))
+            if aco is not None:
+                self._par_aco[aco] = self._par_aco[aco] - anciennes
+                self._total = self._total - anciennes
@@ -0,0 +1,52 @@
+"""
+Imports différés - OPCOPILOT v4.0
+Les bibliothèques lourdes (pandas, Plotly, SQLAlchemy, python-docx) et les moteurs qui en
+dépendent ne sont importés qu'au premier accès à un attribut : la page de connexion s'affiche
+sans charger les piles graphiques, ORM ou documentaires.
+"""
+
+import importlib
+import sys
+import threading
+
+
+class LazyModule:
+    """Module importé au premier accès d'attribut (import thread-safe, une seule fois)"""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with self.__dict__['_lock']:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = importlib.import_module(self.__dict__['_name'])
+                    self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attribut):
+        return getattr(self._load(), attribut)
+
+    def __setattr__(self, attribut, valeur):
+        setattr(self._load(), attribut, valeur)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        etat = 'chargé' if self.__dict__['_module'] is not None else 'différé'
+        return f"<LazyModule {self.__dict__['_name']} ({etat})>"
+
+
+def lazy_import(name):
+    """Proxy de module à import différé (module réel si déjà importé)"""
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def is_loaded(name):
+    """Module effectivement importé dans le processus"""
+    return name in sys.modules
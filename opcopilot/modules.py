@@ -0,0 +1,111 @@
+"""
+Hôte des modules opération - OPCOPILOT v4.0
+Seul le module affiché calcule sa vue ; chaque vue (modèle de données prêt à afficher)
+est mémorisée par (module, opération, version des données). Les autres modules peuvent être
+préchargés en tâche de fond, uniquement quand aucun calcul de premier plan n'est en cours.
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ModuleHost:
+    """
+    Cache LRU borné des vues de modules + préchargement en arrière-plan
+    - view() : vue en cache ou calculée immédiatement (module actif)
+    - prefetch() : calcul différé dans un thread, abandonné si un calcul de premier plan démarre
+    Les builders de préchargement ne doivent pas appeler Streamlit (ressources résolues par l'appelant).
+    """
+
+    def __init__(self, max_entries=256, workers=1):
+        self.max_entries = max_entries
+        self._views = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._foreground = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='opcopilot-prefetch')
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.skipped = 0
+
+    def view(self, module, operation_id, version, builder):
+        """Vue du module actif (lookup, ou calcul au premier plan)"""
+        cle = (module, operation_id, version)
+        with self._lock:
+            if cle in self._views:
+                self._views.move_to_end(cle)
+                self.hits += 1
+                return self._views[cle]
+            en_cours = self._pending.get(cle)
+            self._foreground += 1
+
+        try:
+            # Préchargement déjà lancé pour cette vue : on attend son résultat plutôt que de recalculer
+            if en_cours is not None and not en_cours.cancel():
+                resultat = en_cours.result()
+                if resultat is not None:
+                    with self._lock:
+                        self.hits += 1
+                    return resultat[0]
+            vue = builder()
+        finally:
+            with self._lock:
+                self._foreground -= 1
+
+        with self._lock:
+            self.misses += 1
+            self._store(cle, vue)
+        return vue
+
+    def prefetch(self, module, operation_id, version, builder):
+        """Planifie le calcul d'une vue en tâche de fond (sans effet si elle est en cache ou planifiée)"""
+        cle = (module, operation_id, version)
+        with self._lock:
+            if cle in self._views or cle in self._pending:
+                return
+            self._pending[cle] = self._executor.submit(self._run_prefetch, cle, builder)
+
+    def _run_prefetch(self, cle, builder):
+        """Calcul d'une vue préchargée, uniquement si l'hôte est inactif"""
+        try:
+            with self._lock:
+                if self._foreground:
+                    self.skipped += 1
+                    return None
+            vue = builder()
+            with self._lock:
+                self.prefetched += 1
+                self._store(cle, vue)
+            return (vue,)
+        finally:
+            with self._lock:
+                self._pending.pop(cle, None)
+
+    def _store(self, cle, vue):
+        self._views[cle] = vue
+        self._views.move_to_end(cle)
+        while len(self._views) > self.max_entries:
+            self._views.popitem(last=False)
+
+    def invalidate(self, operation_id=None):
+        """Invalide les vues d'une opération, ou toutes les vues"""
+        with self._lock:
+            if operation_id is None:
+                self._views.clear()
+            else:
+                for cle in [cle for cle in self._views if cle[1] == operation_id]:
+                    del self._views[cle]
+
+    def stats(self):
+        """Compteurs de l'hôte"""
+        return {
+            'vues': len(self._views),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'prefetched': self.prefetched,
+            'skipped': self.skipped,
+            'en_attente': len(self._pending)
+        }
@@ -0,0 +1,813 @@
+"""
+Persistance SQLite/SQLAlchemy - OPCOPILOT v4.0
+Tables indexées : opérations, phases, REM trimestrielles, avenants, MED,
+concessionnaires, lots DGD, réclamations GPA, freins et file d'alertes + import initial depuis demo_data.json
+Chaque écriture (application ou traitement de masse) incrémente la version des domaines de données
+qu'elle modifie (table meta) : chaque cache de l'application n'est indexé que sur les domaines qu'il lit.
+
+Usage CLI (import one-shot) :
+    python -m opcopilot.persistence data/demo_data.json [--replace]
+"""
+
+import json
+import os
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import (
+    create_engine, event, func, insert, select, update, Column, Integer, String, Float, Numeric, Date, DateTime,
+    Boolean, Text, ForeignKey, Index, UniqueConstraint
+)
+from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+
+DEFAULT_DB_URL = 'sqlite:///data/opcopilot.db'
+
+Base = declarative_base()
+
+# Colonnes communes des opérations (le reste est conservé dans `details`)
+OPERATION_COLUMNS = [
+    'nom', 'type_operation', 'aco_responsable', 'commune', 'statut', 'avancement',
+    'budget_total', 'rem_totale_prevue', 'nb_logements_total', 'freins_actifs',
+    'date_creation', 'date_debut_prevue', 'date_fin_prevue'
+]
+
+# ==============================================================================
+# MODÈLES
+# ==============================================================================
+
+class Operation(Base):
+    """Opération immobilière (OPP, VEFA, MANDAT_ETUDES, MANDAT_REALISATION, AMO)"""
+    __tablename__ = 'operations'
+
+    id = Column(Integer, primary_key=True)
+    nom = Column(String(200), nullable=False)
+    type_operation = Column(String(30), nullable=False, index=True)
+    aco_responsable = Column(String(100), index=True)
+    commune = Column(String(100), index=True)
+    statut = Column(String(30), index=True)
+    avancement = Column(Integer, default=0)
+    budget_total = Column(Float, default=0)
+    rem_totale_prevue = Column(Float, default=0)
+    nb_logements_total = Column(Integer, default=0)
+    freins_actifs = Column(Integer, default=0)
+    date_creation = Column(Date)
+    date_debut_prevue = Column(Date)
+    date_fin_prevue = Column(Date, index=True)
+    details = Column(Text)  # Champs spécifiques au type (JSON)
+
+    phases = relationship("Phase", back_populates="operation", cascade="all, delete-orphan",
+                          order_by="Phase.ordre")
+    rem_trimestres = relationship("RemTrimestre", back_populates="operation", cascade="all, delete-orphan",
+                                  order_by="[RemTrimestre.annee, RemTrimestre.numero]")
+    avenants = relationship("Avenant", back_populates="operation", cascade="all, delete-orphan")
+    meds = relationship("Med", back_populates="operation", cascade="all, delete-orphan")
+    concessionnaire_etapes = relationship("ConcessionnaireEtape", back_populates="operation",
+                                          cascade="all, delete-orphan")
+    dgd_lots = relationship("DgdLot", back_populates="operation", cascade="all, delete-orphan")
+    gpa_reclamations = relationship("GpaReclamation", back_populates="operation", cascade="all, delete-orphan")
+    freins = relationship("Frein", back_populates="operation", cascade="all, delete-orphan")
+    alertes = relationship("Alerte", back_populates="operation", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index('ix_operations_aco_statut', 'aco_responsable', 'statut'),
+    )
+
+    def to_dict(self):
+        """Restitue l'opération au format operations_demo"""
+        data = json.loads(self.details) if self.details else {}
+        data['id'] = self.id
+        for col in OPERATION_COLUMNS:
+            data[col] = _to_json_value(getattr(self, col))
+        return data
+
+
+class Phase(Base):
+    """Phase d'opération (timeline)"""
+    __tablename__ = 'phases'
+
+    id = Column(Integer, primary_key=True)
+    operation_id = Column(Integer, ForeignKey('operations.id'), nullable=False)
+    ordre = Column(Integer, nullable=False)
+    nom = Column(String(200), nullable=False)
+    statut = Column(String(30), index=True)
+    date_debut_prevue = Column(Date)
+    date_fin_prevue = Column(Date, index=True)
+    date_debut_reelle = Column(Date)
+    date_fin_reelle = Column(Date)
+    responsable = Column(String(100))
+    est_critique = Column(Boolean, default=False)
+
+    operation = relationship("Operation", back_populates="phases")
+
+    __table_args__ = (
+        Index('ix_phases_operation_ordre', 'operation_id', 'ordre'),
+    )
+
+    def to_dict(self):
+        return _row_to_dict(self, ['ordre', 'nom', 'statut', 'date_debut_prevue', 'date_fin_prevue',
+                                   'date_debut_reelle', 'date_fin_reelle', 'responsable', 'est_critique'])
+
+
+class RemTrimestre(Base):
+    """Trimestre REM (rémunération) d'une opération"""
+    __tablename__ = 'rem_trimestres'
+
+    id = Column(Integer, primary_key=True)
+    operation_id = Column(Integer, ForeignKey('operations.id'), nullable=False)
+    trimestre = Column(String(10), nullable=False)  # "T3 2024"
+    annee = Column(Integer, nullable=False)
+    numero = Column(Integer, nullable=False)
+    rem_projetee = Column(Float, default=0)
+    rem_realisee = Column(Float, default=0)
+    depenses_projetees = Column(Float, default=0)
+    depenses_facturees = Column(Float, default=0)
+    ecart_rem = Column(Float, default=0)
+    ecart_depenses = Column(Float, default=0)
+    avancement_rem = Column(Float, default=0)
+    avancement_travaux = Column(Float, default=0)
+
+    operation = relationship("Operation", back_populates="rem_trimestres")
+
+    __table_args__ = (
+        UniqueConstraint('operation_id', 'annee', 'numero', name='uq_rem_operation_trimestre'),
+        Index('ix_rem_annee_numero', 'annee', 'numero'),
+    )
+
+    def to_dict(self):
+        return _row_to_dict(self, ['trimestre', 'rem_projetee', 'rem_realisee', 'depenses_projetees',
+                                   'depenses_facturees', 'ecart_rem', 'ecart_depenses',
+                                   'avancement_rem', 'avancement_travaux'])
+
+
+class Avenant(Base):
+    """Avenant au marché"""
+    __tablename__ = 'avenants'
+
+    id = Column(Integer, primary_key=True)
+    operation_id = Column(Integer, ForeignKey('operations.id'), nullable=False, index=True)
+    numero = Column(String(30), nullable=False)
+    date = Column(Date)
+    motif = Column(String(200))
+    description = Column(Text)
+    impact_budget = Column(Float, default=0)
+    impact_delai = Column(Integer, default=0)
+    statut = Column(String(30), index=True)
+    validateur = Column(String(100))
+
+    operation = relationship("Operation", back_populates="avenants")
+
+    def to_dict(self):
+        return _row_to_dict(self, ['numero', 'date', 'motif', 'description', 'impact_budget',
+                                   'impact_delai', 'statut', 'validateur'])
+
+
+class Med(Base):
+    """Mise en demeure (MED)"""
+    __tablename__ = 'med'
+
+    id = Column(Integer, primary_key=True)
+    operation_id = Column(Integer, ForeignKey('operations.id'), nullable=False, index=True)
+    reference = Column(String(30), nullable=False, unique=True)
+    type = Column(String(30))
+    destinataire = Column(String(200), index=True)
+    motif = Column(String(200))
+    date_envoi = Column(Date, index=True)
+    delai_conformite = Column(Integer, default=0)
+    statut = Column(String(30), index=True)
+    relance_effectuee = Column(Boolean, default=False)
+    date_relance = Column(Date)
+    date_resolution = Column(Date)
+
+    operation = relationship("Operation", back_populates="meds")
+
+    def to_dict(self):
+        return _row_to_dict(self, ['reference', 'type', 'destinataire', 'motif', 'date_envoi',
+                                   'delai_conformite', 'statut', 'relance_effectuee', 'date_relance',
+                                   'date_resolution'])
+
+
+class ConcessionnaireEtape(Base):
+    """Étape de raccordement concessionnaire (EDF, EAU, FIBRE...)"""
+    __tablename__ = 'concessionnaire_etapes'
+
+    id = Column(Integer, primary_key=True)
+    operation_id = Column(Integer, ForeignKey('operations.id'), nullable=False)
+    concessionnaire = Column(String(50), nullable=False)
+    statut_global = Column(String(30))
+    ordre = Column(Integer, nullable=False)
+    nom = Column(String(200), nullable=False)
+    statut = Column(String(30), index=True)
+    date = Column(String(50))  # Date ISO ou libellé ("Semaine 35", "En attente retour")
+
+    operation = relationship("Operation", back_populates="concessionnaire_etapes")
+
+    __table_args__ = (
+        Index('ix_concess_operation_concessionnaire', 'operation_id', 'concessionnaire', 'ordre'),
+    )
+
+    def to_dict(self):
+        return _row_to_dict(self, ['nom', 'statut', 'date'])
+
+
+class DgdLot(Base):
+    """Lot du décompte général définitif (montants au centime, lus et écrits en Decimal)"""
+    __tablename__ = 'dgd_lots'
+
+    id = Column(Integer, primary_key=True)
+    operation_id = Column(Integer, ForeignKey('operations.id'), nullable=False, index=True)
+    nom = Column(String(100), nullable=False)
+    # Bases créées avec des colonnes Float : create_all ne les modifie pas, les valeurs restent lues en Decimal
+    marche_initial = Column(Numeric(14, 2), default=0)
+    quantites_reelles = Column(Float, default=100)
+    plus_moins_value = Column(Numeric(14, 2), default=0)
+    penalites = Column(Numeric(14, 2), default=0)
+    montant_final = Column(Numeric(14, 2), default=0)
+    statut = Column(String(40), index=True)
+
+    operation = relationship("Operation", back_populates="dgd_lots")
+
+    def to_dict(self):
+        return _row_to_dict(self, ['nom', 'marche_initial', 'quantites_reelles', 'plus_moins_value',
+                                   'penalites', 'montant_final', 'statut'])
+
+
+class GpaReclamation(Base):
+    """Réclamation en garantie de parfait achèvement"""
+    __tablename__ = 'gpa_reclamations'
+
+    id = Column(Integer, primary_key=True)
+    operation_id = Column(Integer, ForeignKey('operations.id'), nullable=False, index=True)
+    date = Column(Date, index=True)
+    logement = Column(String(20))
+    type = Column(String(50))
+    description = Column(Text)
+    locataire = Column(String(100))
+    statut = Column(String(30), index=True)
+    delai_intervention = Column(Integer, default=0)
+    entreprise = Column(String(100))
+    date_resolution = Column(Date)
+
+    operation = relationship("Operation", back_populates="gpa_reclamations")
+
+    def to_dict(self):
+        return _row_to_dict(self, ['date', 'logement', 'type', 'description', 'locataire', 'statut',
+                                   'delai_intervention', 'entreprise', 'date_resolution'])
+
+
+class Frein(Base):
+    """Frein (point de blocage) d'une opération, rattaché le cas échéant à une phase"""
+    __tablename__ = 'freins'
+
+    id = Column(Integer, primary_key=True)
+    operation_id = Column(Integer, ForeignKey('operations.id'), nullable=False, index=True)
+    phase_ordre = Column(Integer)
+    phase = Column(String(200))
+    type = Column(String(30))
+    impact = Column(String(20))
+    responsable = Column(String(100))
+    action = Column(String(200))
+    date_ouverture = Column(DateTime, nullable=False)
+    date_cloture = Column(DateTime)
+    statut = Column(String(20), default='OUVERT')
+
+    operation = relationship("Operation", back_populates="freins")
+
+    __table_args__ = (
+        Index('ix_freins_statut_impact', 'statut', 'impact', 'date_ouverture'),
+        Index('ix_freins_responsable_statut', 'responsable', 'statut'),
+    )
+
+    def to_dict(self):
+        return _row_to_dict(self, ['id', 'operation_id', 'phase_ordre', 'phase', 'type', 'impact', 'responsable',
+                                   'action', 'date_ouverture', 'date_cloture', 'statut'])
+
+
+class Alerte(Base):
+    """Alerte mise en file par un traitement de masse (ex. clôture trimestrielle REM)"""
+    __tablename__ = 'alertes'
+
+    id = Column(Integer, primary_key=True)
+    operation_id = Column(Integer, ForeignKey('operations.id'), nullable=False)
+    type = Column(String(30), nullable=False)  # FIN_TRIMESTRE, RETARD_SAISIE, ECART_CRITIQUE...
+    niveau = Column(String(20), nullable=False)  # CRITIQUE, WARNING, INFO
+    message = Column(String(300))
+    action_requise = Column(String(200))
+    date = Column(Date)
+    source = Column(String(50), nullable=False)  # "REM T3 2024"
+    statut = Column(String(20), default='NOUVELLE')
+
+    operation = relationship("Operation", back_populates="alertes")
+
+    __table_args__ = (
+        # Un traitement relancé ne duplique pas ses alertes
+        UniqueConstraint('operation_id', 'type', 'source', name='uq_alertes_operation_type_source'),
+        Index('ix_alertes_statut', 'statut'),
+    )
+
+    def to_dict(self):
+        return _row_to_dict(self, ['id', 'operation_id', 'type', 'niveau', 'message', 'action_requise',
+                                   'date', 'source', 'statut'])
+
+
+class Meta(Base):
+    """Métadonnées de la base (version de chaque domaine de données : version_<domaine> ; migrations appliquées)"""
+    __tablename__ = 'meta'
+
+    cle = Column(String(50), primary_key=True)
+    valeur = Column(Integer, nullable=False, default=0)
+
+
+# Domaines de données versionnés (le compteur freins_actifs des opérations relève du domaine freins)
+DOMAINES = ('operations', 'phases', 'rem', 'avenants', 'med', 'concessionnaires', 'dgd', 'gpa', 'freins', 'alertes')
+
+# Migrations de données déjà appliquées (clé Meta, valeur 1)
+MIGRATION_FREINS_DEMO = 'migration_freins_demo'
+
+
+def _cle_version(domaine):
+    if domaine not in DOMAINES:
+        raise KeyError(f"Domaine de données inconnu: {domaine}")
+    return f'version_{domaine}'
+
+
+# ==============================================================================
+# MOTEUR & SESSIONS
+# ==============================================================================
+
+def create_db_engine(db_url=None):
+    """Crée le moteur SQLAlchemy avec pool de connexions (à instancier une seule fois par processus)"""
+    db_url = db_url or os.environ.get('OPCOPILOT_DB_URL', DEFAULT_DB_URL)
+
+    if db_url.startswith('sqlite'):
+        engine = create_engine(
+            db_url,
+            connect_args={'check_same_thread': False},  # Sessions Streamlit multi-threads
+            pool_pre_ping=True
+        )
+
+        @event.listens_for(engine, "connect")
+        def _sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.close()
+    else:
+        engine = create_engine(db_url, pool_size=5, max_overflow=10, pool_pre_ping=True)
+
+    return engine
+
+
+def init_db(engine):
+    """Crée les tables et index manquants"""
+    Base.metadata.create_all(engine)
+    with get_sessionmaker(engine)() as session:
+        existantes = set(session.scalars(select(Meta.cle)))
+        manquantes = [cle for cle in map(_cle_version, DOMAINES) if cle not in existantes]
+        if manquantes:
+            session.add_all(Meta(cle=cle, valeur=0) for cle in manquantes)
+            session.commit()
+
+
+def get_db_versions(session):
+    """Version de chaque domaine de données ({domaine: version}) en une requête"""
+    valeurs = dict(session.execute(select(Meta.cle, Meta.valeur).where(Meta.cle.like('version_%'))).all())
+    return {domaine: valeurs.get(_cle_version(domaine), 0) for domaine in DOMAINES}
+
+
+def bump_db_version(session, *domaines):
+    """Incrémente la version des domaines écrits, dans la transaction de l'écriture (commit à la charge de l'appelant)"""
+    for cle in map(_cle_version, domaines):
+        if not session.execute(update(Meta).where(Meta.cle == cle).values(valeur=Meta.valeur + 1)).rowcount:
+            session.add(Meta(cle=cle, valeur=1))
+
+
+def get_sessionmaker(engine):
+    """Fabrique de sessions liée au moteur"""
+    return sessionmaker(bind=engine, expire_on_commit=False)
+
+
+# ==============================================================================
+# IMPORT DEPUIS demo_data.json
+# ==============================================================================
+
+def import_demo_data(session, demo_data, replace=False):
+    """
+    Import one-shot des données JSON vers la base
+    Ignoré si la base contient déjà des opérations (sauf replace=True) ; les freins d'une base
+    initialisée avant leur table sont importés par la migration explicite migrer_freins_demo
+    Retourne le nombre d'opérations importées
+    """
+    if session.scalar(select(func.count(Operation.id))):
+        if not replace:
+            return 0
+        for model in (Phase, RemTrimestre, Avenant, Med, ConcessionnaireEtape, DgdLot, GpaReclamation, Frein,
+                      Alerte, Operation):
+            session.query(model).delete()
+
+    operations = demo_data.get('operations_demo', [])
+
+    for op in operations:
+        session.add(operation_from_dict(op))
+
+    for key, phases in demo_data.get('phases_demo', {}).items():
+        operation_id = _operation_id(key)
+        for i, phase in enumerate(phases):
+            session.add(Phase(
+                operation_id=operation_id,
+                ordre=phase.get('ordre', i + 1),
+                nom=phase.get('nom', f'Phase {i + 1}'),
+                statut=phase.get('statut'),
+                date_debut_prevue=_parse_date(phase.get('date_debut_prevue')),
+                date_fin_prevue=_parse_date(phase.get('date_fin_prevue')),
+                date_debut_reelle=_parse_date(phase.get('date_debut_reelle')),
+                date_fin_reelle=_parse_date(phase.get('date_fin_reelle')),
+                responsable=phase.get('responsable'),
+                est_critique=bool(phase.get('est_critique', False))
+            ))
+
+    for key, trimestres in demo_data.get('rem_demo', {}).items():
+        operation_id = _operation_id(key)
+        for trimestre in trimestres:
+            numero, annee = parse_trimestre(trimestre['trimestre'])
+            session.add(RemTrimestre(
+                operation_id=operation_id, annee=annee, numero=numero,
+                **{k: v for k, v in trimestre.items() if hasattr(RemTrimestre, k)}
+            ))
+
+    for key, avenants in demo_data.get('avenants_demo', {}).items():
+        operation_id = _operation_id(key)
+        for avenant in avenants:
+            values = {k: v for k, v in avenant.items() if hasattr(Avenant, k)}
+            values['date'] = _parse_date(avenant.get('date'))
+            session.add(Avenant(operation_id=operation_id, **values))
+
+    for key, meds in demo_data.get('med_demo', {}).items():
+        operation_id = _operation_id(key)
+        for med in meds:
+            values = {k: v for k, v in med.items() if hasattr(Med, k)}
+            for champ in ('date_envoi', 'date_relance', 'date_resolution'):
+                values[champ] = _parse_date(med.get(champ))
+            session.add(Med(operation_id=operation_id, **values))
+
+    for key, concessionnaires in demo_data.get('concessionnaires_demo', {}).items():
+        operation_id = _operation_id(key)
+        for concessionnaire, suivi in concessionnaires.items():
+            for ordre, etape in enumerate(suivi.get('etapes', []), start=1):
+                session.add(ConcessionnaireEtape(
+                    operation_id=operation_id,
+                    concessionnaire=concessionnaire,
+                    statut_global=suivi.get('statut_global'),
+                    ordre=ordre,
+                    nom=etape['nom'],
+                    statut=etape.get('statut'),
+                    date=etape.get('date')
+                ))
+
+    for key, dgd in demo_data.get('dgd_demo', {}).items():
+        operation_id = _operation_id(key)
+        for lot in dgd.get('lots', []):
+            session.add(DgdLot(operation_id=operation_id,
+                               **{k: v for k, v in lot.items() if hasattr(DgdLot, k)}))
+
+    for key, reclamations in demo_data.get('gpa_demo', {}).items():
+        operation_id = _operation_id(key)
+        for reclamation in reclamations:
+            values = {k: v for k, v in reclamation.items() if hasattr(GpaReclamation, k)}
+            values['date'] = _parse_date(reclamation.get('date'))
+            values['date_resolution'] = _parse_date(reclamation.get('date_resolution'))
+            session.add(GpaReclamation(operation_id=operation_id, **values))
+
+    _import_freins(session, demo_data)
+    session.merge(Meta(cle=MIGRATION_FREINS_DEMO, valeur=1))
+
+    bump_db_version(session, *DOMAINES)
+    session.commit()
+    return len(operations)
+
+
+def migrer_freins_demo(session, demo_data):
+    """
+    Migration unique (clé Meta migration_freins_demo) : import de freins_demo dans une base
+    initialisée avant la table freins, si celle-ci est vide - retourne le nombre de freins importés
+    """
+    if session.get(Meta, MIGRATION_FREINS_DEMO) is not None:
+        return 0
+    nb = 0
+    if not session.scalar(select(func.count(Frein.id))):
+        _import_freins(session, demo_data)
+        nb = session.scalar(select(func.count(Frein.id)))
+        bump_db_version(session, 'freins')
+    session.add(Meta(cle=MIGRATION_FREINS_DEMO, valeur=1))
+    session.commit()
+    return nb
+
+
+def _import_freins(session, demo_data):
+    for key, freins in demo_data.get('freins_demo', {}).items():
+        operation_id = _operation_id(key)
+        for frein in freins:
+            values = {k: v for k, v in frein.items() if hasattr(Frein, k) and k != 'id'}
+            values['date_ouverture'] = _parse_datetime(frein.get('date_ouverture'))
+            values['date_cloture'] = _parse_datetime(frein.get('date_cloture'))
+            values['statut'] = 'CLOS' if values['date_cloture'] else 'OUVERT'
+            session.add(Frein(operation_id=operation_id, **values))
+
+    session.flush()
+    for key in demo_data.get('freins_demo', {}):
+        _sync_freins_actifs(session, _operation_id(key))
+
+
+def operation_from_dict(op):
+    """Construit une Operation ORM depuis un dict au format operations_demo"""
+    values = {col: op.get(col) for col in OPERATION_COLUMNS}
+    for champ in ('date_creation', 'date_debut_prevue', 'date_fin_prevue'):
+        values[champ] = _parse_date(values[champ])
+    details = {k: v for k, v in op.items() if k not in OPERATION_COLUMNS and k != 'id'}
+    return Operation(id=op.get('id'), details=json.dumps(details, ensure_ascii=False), **values)
+
+
+# ==============================================================================
+# REQUÊTES CIBLÉES
+# ==============================================================================
+
+def get_operation(session, operation_id):
+    """Opération par identifiant (dict) ou None"""
+    operation = session.get(Operation, operation_id)
+    return operation.to_dict() if operation else None
+
+
+def list_operations(session, **filtres):
+    """Opérations filtrées par égalité de colonnes (type_operation, statut, commune, aco_responsable...)"""
+    query = select(Operation)
+    for colonne, valeur in filtres.items():
+        if valeur is not None:
+            query = query.where(getattr(Operation, colonne) == valeur)
+    return [op.to_dict() for op in session.scalars(query.order_by(Operation.id))]
+
+
+def get_phases(session, operation_id):
+    """Phases d'une opération, triées par ordre"""
+    query = select(Phase).where(Phase.operation_id == operation_id).order_by(Phase.ordre)
+    return [phase.to_dict() for phase in session.scalars(query)]
+
+
+def get_all_phases(session):
+    """Phases de tout le portefeuille en une requête : {operation_id: [phases]}"""
+    resultat = {}
+    for phase in session.scalars(select(Phase).order_by(Phase.operation_id, Phase.ordre)):
+        resultat.setdefault(phase.operation_id, []).append(phase.to_dict())
+    return resultat
+
+
+def iter_par_operation(session, modele, *ordre, taille=1000):
+    """
+    (operation_id, [lignes]) de toute une table, lue en flux par blocs de `taille` lignes
+    (curseur serveur) et triée par opération : une seule opération en mémoire à la fois
+    """
+    query = select(modele).order_by(modele.operation_id, *ordre).execution_options(yield_per=taille)
+    courant, lignes = None, []
+    for ligne in session.scalars(query):
+        if ligne.operation_id != courant:
+            if lignes:
+                yield courant, lignes
+            courant, lignes = ligne.operation_id, []
+        lignes.append(ligne.to_dict())
+    if lignes:
+        yield courant, lignes
+
+
+def get_rem_trimestres(session, operation_id):
+    """Trimestres REM d'une opération, triés chronologiquement"""
+    query = (select(RemTrimestre).where(RemTrimestre.operation_id == operation_id)
+             .order_by(RemTrimestre.annee, RemTrimestre.numero))
+    return [trimestre.to_dict() for trimestre in session.scalars(query)]
+
+
+def get_avenants(session, operation_id):
+    """Avenants d'une opération"""
+    query = select(Avenant).where(Avenant.operation_id == operation_id).order_by(Avenant.numero)
+    return [avenant.to_dict() for avenant in session.scalars(query)]
+
+
+def get_meds(session, operation_id):
+    """Mises en demeure d'une opération"""
+    query = select(Med).where(Med.operation_id == operation_id).order_by(Med.date_envoi)
+    return [med.to_dict() for med in session.scalars(query)]
+
+
+def get_all_meds(session):
+    """Mises en demeure de tout le portefeuille en une requête (avec operation_id)"""
+    return [{**med.to_dict(), 'operation_id': med.operation_id}
+            for med in session.scalars(select(Med).order_by(Med.operation_id, Med.date_envoi))]
+
+
+def update_meds(session, modifications):
+    """
+    Met à jour plusieurs mises en demeure ({référence: valeurs}, ex. relances d'un envoi groupé)
+    en une transaction et une seule incrémentation de version - retourne le nombre de MED modifiées
+    """
+    if not modifications:
+        return 0
+    meds = session.scalars(select(Med).where(Med.reference.in_(list(modifications)))).all()
+    for med in meds:
+        for champ, valeur in modifications[med.reference].items():
+            if champ in ('date_envoi', 'date_relance', 'date_resolution'):
+                valeur = _parse_date(valeur)
+            if hasattr(Med, champ) and champ not in ('id', 'operation_id', 'reference'):
+                setattr(med, champ, valeur)
+    if meds:
+        bump_db_version(session, 'med')
+    session.commit()
+    return len(meds)
+
+
+def get_concessionnaires(session, operation_id):
+    """Suivi concessionnaires d'une opération au format concessionnaires_demo"""
+    query = (select(ConcessionnaireEtape).where(ConcessionnaireEtape.operation_id == operation_id)
+             .order_by(ConcessionnaireEtape.concessionnaire, ConcessionnaireEtape.ordre))
+    resultat = {}
+    for etape in session.scalars(query):
+        suivi = resultat.setdefault(etape.concessionnaire, {'statut_global': etape.statut_global, 'etapes': []})
+        suivi['etapes'].append(etape.to_dict())
+    return resultat
+
+
+def iter_concessionnaires(session, taille=1000):
+    """
+    (operation_id, suivi au format concessionnaires_demo) de tout le portefeuille,
+    lu en flux par blocs de `taille` lignes et trié par opération
+    """
+    query = (select(ConcessionnaireEtape)
+             .order_by(ConcessionnaireEtape.operation_id, ConcessionnaireEtape.concessionnaire,
+                       ConcessionnaireEtape.ordre)
+             .execution_options(yield_per=taille))
+    courant, resultat = None, {}
+    for etape in session.scalars(query):
+        if etape.operation_id != courant:
+            if resultat:
+                yield courant, resultat
+            courant, resultat = etape.operation_id, {}
+        suivi = resultat.setdefault(etape.concessionnaire, {'statut_global': etape.statut_global, 'etapes': []})
+        suivi['etapes'].append(etape.to_dict())
+    if resultat:
+        yield courant, resultat
+
+
+def get_dgd_lots(session, operation_id):
+    """Lots DGD d'une opération"""
+    query = select(DgdLot).where(DgdLot.operation_id == operation_id).order_by(DgdLot.id)
+    return [lot.to_dict() for lot in session.scalars(query)]
+
+
+def get_gpa_reclamations(session, operation_id):
+    """Réclamations GPA d'une opération"""
+    query = select(GpaReclamation).where(GpaReclamation.operation_id == operation_id).order_by(GpaReclamation.date)
+    return [reclamation.to_dict() for reclamation in session.scalars(query)]
+
+
+def get_freins(session, statut=None):
+    """Freins du portefeuille (tous, ou d'un statut OUVERT / CLOS) en une requête"""
+    query = select(Frein).order_by(Frein.id)
+    if statut is not None:
+        query = query.where(Frein.statut == statut)
+    return [frein.to_dict() for frein in session.scalars(query)]
+
+
+def add_frein(session, operation_id, **values):
+    """Déclare un frein (ouvert maintenant sauf date_ouverture fournie) - retourne le frein créé"""
+    values['date_ouverture'] = _parse_datetime(values.get('date_ouverture')) or datetime.now()
+    frein = Frein(operation_id=operation_id, statut='OUVERT',
+                  **{k: v for k, v in values.items() if hasattr(Frein, k) and k not in ('id', 'statut')})
+    session.add(frein)
+    session.flush()
+    _sync_freins_actifs(session, operation_id)
+    bump_db_version(session, 'freins')
+    session.commit()
+    return frein.to_dict()
+
+
+def close_frein(session, frein_id, date_cloture=None):
+    """Clôture un frein - retourne le frein mis à jour (None s'il n'existe pas)"""
+    frein = session.get(Frein, frein_id)
+    if frein is None:
+        return None
+    frein.date_cloture = _parse_datetime(date_cloture) or datetime.now()
+    frein.statut = 'CLOS'
+    session.flush()
+    _sync_freins_actifs(session, frein.operation_id)
+    bump_db_version(session, 'freins')
+    session.commit()
+    return frein.to_dict()
+
+
+def _sync_freins_actifs(session, operation_id):
+    """Compteur freins_actifs de l'opération aligné sur le registre"""
+    operation = session.get(Operation, operation_id)
+    if operation is not None:
+        operation.freins_actifs = session.scalar(
+            select(func.count(Frein.id)).where(Frein.operation_id == operation_id, Frein.statut == 'OUVERT')
+        )
+
+
+def queue_alertes(session, alertes):
+    """
+    Met en file des alertes ({operation_id, type, niveau, message, action_requise, date, source})
+    en un INSERT groupé ; celles déjà en file (même opération, type et source) sont ignorées.
+    La version du domaine alertes est incrémentée si des alertes sont ajoutées (moteur d'alertes rechargé).
+    Retourne le nombre d'alertes ajoutées (commit à la charge de l'appelant)
+    """
+    if not alertes:
+        return 0
+    existantes = set(session.execute(
+        select(Alerte.operation_id, Alerte.type, Alerte.source)
+        .where(Alerte.source.in_({a['source'] for a in alertes}))
+    ).all())
+    nouvelles = [a for a in alertes if (a['operation_id'], a['type'], a['source']) not in existantes]
+    if nouvelles:
+        session.execute(insert(Alerte), [{**a, 'date': _parse_date(a.get('date'))} for a in nouvelles])
+        bump_db_version(session, 'alertes')
+    return len(nouvelles)
+
+
+def get_alertes(session, statut='NOUVELLE'):
+    """Alertes en file (d'un statut, ou toutes si statut=None) en une requête"""
+    query = select(Alerte).order_by(Alerte.id)
+    if statut is not None:
+        query = query.where(Alerte.statut == statut)
+    return [alerte.to_dict() for alerte in session.scalars(query)]
+
+
+# ==============================================================================
+# UTILITAIRES
+# ==============================================================================
+
+def parse_trimestre(libelle):
+    """'T3 2024' → (3, 2024)"""
+    numero, annee = libelle.strip().split()
+    return int(numero.lstrip('Tt')), int(annee)
+
+
+def _operation_id(key):
+    """'operation_12' → 12"""
+    return int(str(key).rsplit('_', 1)[-1])
+
+
+def _parse_date(value):
+    """Chaîne ISO → date (None si vide ou non interprétable)"""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.fromisoformat(str(value)).date()
+    except ValueError:
+        return None
+
+
+def _parse_datetime(value):
+    """Chaîne ISO → datetime (None si vide ou non interprétable)"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _to_json_value(value):
+    """date → chaîne ISO, montant entier (ou Decimal) → int / float (format JSON d'origine), autres inchangées"""
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _row_to_dict(row, colonnes):
+    return {col: _to_json_value(getattr(row, col)) for col in colonnes}
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    source = args[0] if args else 'data/demo_data.json'
+
+    with open(source, 'r', encoding='utf-8') as f:
+        donnees = json.load(f)
+
+    moteur = create_db_engine()
+    init_db(moteur)
+    with get_sessionmaker(moteur)() as db_session:
+        if '--migrer-freins' in sys.argv:
+            nb = migrer_freins_demo(db_session, donnees)
+            print(f"✅ {nb} frein(s) importé(s) vers {moteur.url}")
+        else:
+            nb = import_demo_data(db_session, donnees, replace='--replace' in sys.argv)
+            print(f"✅ {nb} opération(s) importée(s) vers {moteur.url}" if nb
+                  else "ℹ️ Base déjà initialisée (utiliser --replace, ou --migrer-freins pour une base sans freins)")
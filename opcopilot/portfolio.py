@@ -0,0 +1,129 @@
+"""
+Requêtes portefeuille - OPCOPILOT v4.0
+Index secondaires (type_operation, statut, commune, aco_responsable) construits une fois
+par version de données : les combinaisons de filtres se résolvent par intersection d'ensembles,
+ou par WHERE SQL lorsque la base est disponible. Résultats triés et paginés.
+"""
+
+import math
+from collections import defaultdict
+
+from sqlalchemy import func, select
+
+from opcopilot.persistence import Operation
+
+INDEXED_FIELDS = ('type_operation', 'statut', 'commune', 'aco_responsable')
+
+# Critères de tri disponibles
+SORT_FIELDS = ('id', 'nom', 'avancement', 'budget_total', 'date_fin_prevue', 'commune', 'statut')
+
+
+class PortfolioIndex:
+    """Index en mémoire du portefeuille (à reconstruire à chaque nouvelle version des données)"""
+
+    def __init__(self, operations):
+        self.operations = list(operations)
+        self._index = {field: defaultdict(set) for field in INDEXED_FIELDS}
+        self._rangs = {}
+
+        for position, op in enumerate(self.operations):
+            for field in INDEXED_FIELDS:
+                self._index[field][op.get(field)].add(position)
+
+    def values(self, field):
+        """Valeurs distinctes d'un champ indexé (pour alimenter les filtres)"""
+        return sorted(v for v in self._index[field] if v is not None)
+
+    def count(self, field, value):
+        """Nombre d'opérations pour une valeur de champ indexé - O(1)"""
+        return len(self._index[field].get(value, ()))
+
+    def match(self, filtres):
+        """Positions des opérations satisfaisant tous les filtres (intersection, plus petit ensemble d'abord)"""
+        ensembles = []
+        for field, valeur in (filtres or {}).items():
+            if valeur is None:
+                continue
+            if field not in self._index:
+                raise KeyError(f"Champ non indexé: {field}")
+            ensembles.append(self._index[field].get(valeur, set()))
+
+        if not ensembles:
+            return set(range(len(self.operations)))
+
+        ensembles.sort(key=len)
+        resultat = set(ensembles[0])
+        for ensemble in ensembles[1:]:
+            resultat &= ensemble
+            if not resultat:
+                break
+        return resultat
+
+    def query(self, filtres=None, tri='id', descendant=False, page=1, page_size=None):
+        """
+        Opérations filtrées, triées et paginées - même ordre que la base : valeurs manquantes en fin
+        de liste dans les deux sens, égalités départagées par id croissant
+        """
+        rangs, signe = self._rang(tri), -1 if descendant else 1
+        positions = sorted(self.match(filtres),
+                           key=lambda i: (rangs[i] is None, signe * (rangs[i] or 0), self.operations[i].get('id')))
+        return _paginate(positions, len(positions), page, page_size, self.operations.__getitem__)
+
+    def _rang(self, tri):
+        """Rang de la valeur de chaque opération pour un critère de tri (None si absente, calculé une fois par index)"""
+        if tri not in SORT_FIELDS:
+            raise KeyError(f"Critère de tri inconnu: {tri}")
+        if tri not in self._rangs:
+            valeurs = sorted({op.get(tri) for op in self.operations} - {None})
+            rang_valeur = {valeur: rang for rang, valeur in enumerate(valeurs)}
+            self._rangs[tri] = [rang_valeur.get(op.get(tri)) for op in self.operations]
+        return self._rangs[tri]
+
+
+def query_operations_sql(session, filtres=None, tri='id', descendant=False, page=1, page_size=None):
+    """Même contrat que PortfolioIndex.query, résolu par WHERE / ORDER BY / LIMIT en base"""
+    if tri not in SORT_FIELDS:
+        raise KeyError(f"Critère de tri inconnu: {tri}")
+
+    conditions = [
+        getattr(Operation, field) == valeur
+        for field, valeur in (filtres or {}).items()
+        if valeur is not None
+    ]
+
+    total = session.scalar(select(func.count(Operation.id)).where(*conditions))
+
+    colonne_tri = getattr(Operation, tri)
+    query = (select(Operation).where(*conditions)
+             .order_by((colonne_tri.desc() if descendant else colonne_tri.asc()).nulls_last(), Operation.id))
+
+    if page_size:
+        page = _clamp_page(page, total, page_size)
+        query = query.offset((page - 1) * page_size).limit(page_size)
+
+    lignes = [op.to_dict() for op in session.scalars(query)]
+    return _paginate(range(len(lignes)), total, page, page_size, lignes.__getitem__, deja_pagine=True)
+
+
+def _paginate(positions, total, page, page_size, lire, deja_pagine=False):
+    """Découpe une page de résultats"""
+    if page_size:
+        page = _clamp_page(page, total, page_size)
+        nb_pages = max(1, math.ceil(total / page_size))
+        if not deja_pagine:
+            positions = positions[(page - 1) * page_size:page * page_size]
+    else:
+        page, nb_pages = 1, 1
+
+    return {
+        'operations': [lire(position) for position in positions],
+        'total': total,
+        'page': page,
+        'nb_pages': nb_pages,
+        'page_size': page_size
+    }
+
+
+def _clamp_page(page, total, page_size):
+    nb_pages = max(1, math.ceil(total / page_size))
+    return min(max(1, int(page)), nb_pages)
@@ -0,0 +1,305 @@
+"""
+Relances des responsables - OPCOPILOT v4.0
+Les freins ouverts et les MED hors délai (suivi des échéances MED) sont regroupés par
+responsable : un seul message consolidé par destinataire. L'envoi est asynchrone (pool borné de workers asyncio, nouvelles
+tentatives avec attente exponentielle) et tourne dans un thread dédié : la page n'attend pas
+la fin des envois.
+Transports : dossier spool (.eml, par défaut) ou SMTP (localhost:1025 par défaut, serveur de débogage local).
+"""
+
+import asyncio
+import os
+import re
+import smtplib
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+
+EXPEDITEUR_DEFAUT = 'opcopilot@spic-guadeloupe.fr'
+SPOOL_DEFAUT = os.path.join('data', 'relances')
+
+# Erreurs réessayées (réseau, serveur SMTP indisponible, disque temporairement plein...)
+ERREURS_TRANSITOIRES = (OSError, smtplib.SMTPException)
+
+
+def _date(valeur):
+    if not valeur:
+        return None
+    if isinstance(valeur, datetime):
+        return valeur.date()
+    if isinstance(valeur, date):
+        return valeur
+    try:
+        return date.fromisoformat(str(valeur)[:10])
+    except ValueError:
+        return None
+
+
+# ==============================================================================
+# REGROUPEMENT PAR RESPONSABLE
+# ==============================================================================
+
+def collecter_relances(freins_ouverts, meds_en_retard, operations, aco=None):
+    """
+    Freins ouverts et MED dont le délai de conformité est dépassé (MedTracker.en_retard),
+    regroupés par responsable : {responsable: {'freins': [...], 'meds': [...]}}
+    """
+    operations = {op['id']: op for op in operations if aco is None or op.get('aco_responsable') == aco}
+    groupes = {}
+
+    def groupe(responsable):
+        return groupes.setdefault(responsable or '-', {'freins': [], 'meds': []})
+
+    for frein in freins_ouverts:
+        if frein['operation_id'] in operations:
+            groupe(frein.get('responsable'))['freins'].append(frein)
+
+    for med in meds_en_retard:
+        if med['operation_id'] in operations:
+            groupe(med.get('destinataire'))['meds'].append(med)
+
+    return groupes
+
+
+def composer_messages(groupes, contacts, aujourd_hui=None, signature='OPCOPILOT'):
+    """
+    Un message par responsable ({destinataire, email, sujet, corps, nb_freins, nb_meds}) ;
+    les responsables sans adresse sont retournés à part
+    """
+    aujourd_hui = aujourd_hui or date.today()
+    messages, sans_contact = [], []
+
+    for responsable, elements in sorted(groupes.items()):
+        freins, meds = elements['freins'], elements['meds']
+        if not freins and not meds:
+            continue
+        email = (contacts or {}).get(responsable)
+        if not email:
+            sans_contact.append(responsable)
+            continue
+
+        lignes = [f"Bonjour {responsable},", ""]
+        if freins:
+            lignes.append(f"Freins ouverts sous votre responsabilité ({len(freins)}) :")
+            for frein in sorted(freins, key=lambda f: f['date_ouverture']):
+                ouverture = _date(frein['date_ouverture'])
+                lignes.append(
+                    f"  - [{frein.get('impact', '-')}] {frein.get('operation', '')} - "
+                    f"{frein.get('phase') or frein.get('type', '')} : {frein.get('action') or 'action à définir'} "
+                    f"(ouvert le {ouverture.strftime('%d/%m/%Y')}, {(aujourd_hui - ouverture).days} jours)"
+                )
+            lignes.append("")
+        if meds:
+            lignes.append(f"Mises en demeure hors délai ({len(meds)}) :")
+            for med in sorted(meds, key=lambda m: m['echeance']):
+                lignes.append(
+                    f"  - {med.get('reference', '')} {med['operation']} : {med.get('motif', '')} "
+                    f"(échéance {med['echeance'].strftime('%d/%m/%Y')}, {med['retard_jours']} jours de retard)"
+                )
+            lignes.append("")
+        lignes += ["Merci de nous indiquer les actions engagées.", "", signature]
+
+        messages.append({
+            'destinataire': responsable,
+            'email': email,
+            'sujet': f"Relance OPCOPILOT - {len(freins)} frein(s), {len(meds)} MED hors délai",
+            'corps': "\n".join(lignes),
+            'nb_freins': len(freins),
+            'nb_meds': len(meds)
+        })
+
+    return messages, sans_contact
+
+
+def _email(message, expediteur):
+    courriel = EmailMessage()
+    courriel['From'] = expediteur
+    courriel['To'] = message['email']
+    courriel['Subject'] = message['sujet']
+    courriel['Date'] = formatdate(localtime=True)
+    courriel['Message-ID'] = make_msgid(domain=expediteur.rsplit('@', 1)[-1])
+    courriel.set_content(message['corps'])
+    return courriel
+
+
+# ==============================================================================
+# TRANSPORTS
+# ==============================================================================
+
+class SmtpTransport:
+    """
+    Envoi SMTP (smtplib, exécuté hors de la boucle asyncio). Par défaut localhost:1025 :
+    python -m aiosmtpd -n -l localhost:1025 (pip install aiosmtpd) affiche les messages.
+    """
+
+    def __init__(self, host='localhost', port=1025, expediteur=EXPEDITEUR_DEFAUT,
+                 utilisateur=None, mot_de_passe=None, starttls=False, timeout=10):
+        self.host = host
+        self.port = port
+        self.expediteur = expediteur
+        self.utilisateur = utilisateur
+        self.mot_de_passe = mot_de_passe
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def _envoyer(self, message):
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.utilisateur:
+                smtp.login(self.utilisateur, self.mot_de_passe or '')
+            smtp.send_message(_email(message, self.expediteur))
+
+    async def send(self, message):
+        await asyncio.to_thread(self._envoyer, message)
+
+    def __str__(self):
+        return f"SMTP {self.host}:{self.port}"
+
+
+class SpoolTransport:
+    """Dépôt des messages en fichiers .eml dans un dossier (écriture atomique : .tmp puis renommage)"""
+
+    def __init__(self, dossier=SPOOL_DEFAUT, expediteur=EXPEDITEUR_DEFAUT):
+        self.dossier = dossier
+        self.expediteur = expediteur
+
+    def _envoyer(self, message):
+        os.makedirs(self.dossier, exist_ok=True)
+        nom = re.sub(r'[^A-Za-z0-9]+', '_', message['destinataire']).strip('_') or 'relance'
+        chemin = os.path.join(self.dossier, f"{datetime.now():%Y%m%d_%H%M%S}_{nom}_{uuid.uuid4().hex[:8]}.eml")
+        with open(chemin + '.tmp', 'wb') as f:
+            f.write(_email(message, self.expediteur).as_bytes())
+        os.replace(chemin + '.tmp', chemin)
+
+    async def send(self, message):
+        await asyncio.to_thread(self._envoyer, message)
+
+    def __str__(self):
+        return f"spool {self.dossier}"
+
+
+def transport_depuis_env(environ=None):
+    """
+    Transport configuré par l'environnement : OPCOPILOT_RELANCE_TRANSPORT = spool (défaut) | smtp,
+    OPCOPILOT_RELANCE_SPOOL, OPCOPILOT_SMTP_HOST / PORT / USER / PASSWORD / STARTTLS, OPCOPILOT_RELANCE_FROM
+    """
+    environ = os.environ if environ is None else environ
+    expediteur = environ.get('OPCOPILOT_RELANCE_FROM', EXPEDITEUR_DEFAUT)
+    mode = environ.get('OPCOPILOT_RELANCE_TRANSPORT', 'spool').lower()
+    if mode == 'smtp':
+        return SmtpTransport(
+            host=environ.get('OPCOPILOT_SMTP_HOST', 'localhost'),
+            port=int(environ.get('OPCOPILOT_SMTP_PORT', 1025)),
+            expediteur=expediteur,
+            utilisateur=environ.get('OPCOPILOT_SMTP_USER'),
+            mot_de_passe=environ.get('OPCOPILOT_SMTP_PASSWORD'),
+            starttls=environ.get('OPCOPILOT_SMTP_STARTTLS', '').lower() in ('1', 'true', 'oui')
+        )
+    if mode == 'spool':
+        return SpoolTransport(environ.get('OPCOPILOT_RELANCE_SPOOL', SPOOL_DEFAUT), expediteur)
+    raise ValueError(f"Transport de relance inconnu: {mode}")
+
+
+# ==============================================================================
+# ENVOI ASYNCHRONE
+# ==============================================================================
+
+class ReminderDispatcher:
+    """Envoi des messages par un pool borné de workers asyncio, avec nouvelles tentatives"""
+
+    def __init__(self, transport, workers=8, tentatives=3, attente=0.5):
+        self.transport = transport
+        self.workers = max(1, workers)
+        self.tentatives = max(1, tentatives)
+        self.attente = attente
+
+    async def _envoyer(self, message):
+        for tentative in range(1, self.tentatives + 1):
+            try:
+                await self.transport.send(message)
+                return {'statut': 'ENVOYE', 'tentatives': tentative, 'erreur': None}
+            except ERREURS_TRANSITOIRES as erreur:
+                if tentative == self.tentatives:
+                    return {'statut': 'ECHEC', 'tentatives': tentative, 'erreur': str(erreur) or type(erreur).__name__}
+                await asyncio.sleep(self.attente * 2 ** (tentative - 1))
+            except Exception as erreur:  # Message invalide (en-tête, adresse...) : échec sans nouvelle tentative
+                return {'statut': 'ECHEC', 'tentatives': tentative, 'erreur': str(erreur) or type(erreur).__name__}
+
+    async def dispatch(self, messages, suivi=None):
+        """Envoie tous les messages ; résultats dans l'ordre des messages ({destinataire, email, statut, ...})"""
+        file = asyncio.Queue()
+        for position, message in enumerate(messages):
+            file.put_nowait((position, message))
+        resultats = [None] * len(messages)
+
+        async def worker():
+            while True:
+                try:
+                    position, message = file.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                resultat = {'destinataire': message['destinataire'], 'email': message['email'],
+                            **await self._envoyer(message)}
+                resultats[position] = resultat
+                if suivi is not None:
+                    suivi.enregistrer(resultat)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.workers, len(messages)))))
+        return resultats
+
+    def start(self, messages, apres=None, sans_contact=()):
+        """
+        Lance l'envoi dans un thread dédié et retourne immédiatement le suivi (DispatchJob) ;
+        `apres(job)` est appelé dans ce thread une fois tous les messages traités
+        """
+        job = DispatchJob(len(messages), str(self.transport), sans_contact)
+        thread = threading.Thread(target=job.executer, args=(self, messages, apres), name='opcopilot-relances',
+                                  daemon=True)
+        thread.start()
+        return job
+
+
+class DispatchJob:
+    """Suivi d'un envoi en arrière-plan (lu par la page pendant l'envoi)"""
+
+    def __init__(self, total, transport='', sans_contact=()):
+        self._lock = threading.Lock()
+        self.total = total
+        self.transport = transport
+        self.sans_contact = list(sans_contact)  # responsables sans adresse (aucun message composé)
+        self.resultats = []
+        self.debut = time.perf_counter()
+        self.duree = None
+        self.erreur = None
+
+    def enregistrer(self, resultat):
+        with self._lock:
+            self.resultats.append(resultat)
+
+    def executer(self, dispatcher, messages, apres=None):
+        try:
+            asyncio.run(dispatcher.dispatch(messages, suivi=self))
+            if apres is not None:
+                apres(self)
+        except Exception as erreur:  # Erreur inattendue : conservée pour affichage
+            self.erreur = str(erreur)
+        finally:
+            self.duree = time.perf_counter() - self.debut
+
+    @property
+    def termine(self):
+        return self.duree is not None
+
+    def progression(self):
+        """(traités, envoyés, échecs)"""
+        with self._lock:
+            envoyes = sum(1 for r in self.resultats if r['statut'] == 'ENVOYE')
+            return len(self.resultats), envoyes, len(self.resultats) - envoyes
+
+    def echecs(self):
+        with self._lock:
+            return [r for r in self.resultats if r['statut'] != 'ENVOYE']
@@ -0,0 +1,192 @@
+"""
+Registre REM trimestriel - OPCOPILOT v4.0
+Tous les trimestres REM du portefeuille sont stockés dans un seul DataFrame colonnes
+(trié par opération puis trimestre) : écarts, cumuls, prévision glissante et consolidations
+portefeuille sont calculés en colonnes, sans boucle Python par opération.
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from opcopilot.persistence import RemTrimestre, parse_trimestre
+
+COLONNES_REM = [
+    'operation_id', 'trimestre', 'annee', 'numero',
+    'rem_projetee', 'rem_realisee', 'depenses_projetees', 'depenses_facturees'
+]
+
+MONTANTS_REM = ['rem_projetee', 'rem_realisee', 'depenses_projetees', 'depenses_facturees']
+
+# Nombre de trimestres saisis pris en compte dans la prévision glissante
+FENETRE_PREVISION = 4
+
+
+class RemLedger:
+    """Registre REM colonnes de tout le portefeuille (lecture seule, partagé entre sessions)"""
+
+    def __init__(self, trimestres, fenetre=FENETRE_PREVISION):
+        frame = pd.DataFrame(trimestres, columns=COLONNES_REM)
+        frame[MONTANTS_REM] = frame[MONTANTS_REM].fillna(0).astype(float)
+        frame[['operation_id', 'annee', 'numero']] = frame[['operation_id', 'annee', 'numero']].astype(int)
+        self.fenetre = fenetre
+        self.frame = _compute(frame.sort_values(['operation_id', 'annee', 'numero'], ignore_index=True), fenetre)
+
+        # Bornes de chaque opération dans le registre trié : lecture d'une opération en O(1)
+        ids, debuts, nombres = np.unique(self.frame['operation_id'].to_numpy(), return_index=True, return_counts=True)
+        self._bornes = {int(i): (int(d), int(d + n)) for i, d, n in zip(ids, debuts, nombres)}
+
+    @classmethod
+    def from_records(cls, rem_data, fenetre=FENETRE_PREVISION):
+        """Registre depuis rem_demo ({'operation_<id>': [trimestres]})"""
+        lignes = []
+        for cle, trimestres in (rem_data or {}).items():
+            operation_id = int(cle.rsplit('_', 1)[-1])
+            for trimestre in trimestres:
+                numero, annee = parse_trimestre(trimestre.get('trimestre', ''))
+                lignes.append([operation_id, trimestre.get('trimestre', ''), annee, numero,
+                               *(trimestre.get(colonne) for colonne in MONTANTS_REM)])
+        return cls(lignes, fenetre)
+
+    @classmethod
+    def from_session(cls, session, fenetre=FENETRE_PREVISION):
+        """Registre depuis la table rem_trimestres (une requête)"""
+        query = select(*(getattr(RemTrimestre, colonne) for colonne in COLONNES_REM))
+        return cls(session.execute(query).all(), fenetre)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def operation_ids(self):
+        return sorted(self._bornes)
+
+    def operation(self, operation_id):
+        """Trimestres d'une opération (tranche du registre)"""
+        debut, fin = self._bornes.get(int(operation_id), (0, 0))
+        return self.frame.iloc[debut:fin]
+
+    def exercice(self, aujourd_hui=None):
+        """Dernier exercice renseigné (au plus l'année en cours)"""
+        annee_courante = (aujourd_hui or date.today()).year
+        annees = self.frame['annee']
+        annees = annees[(annees > 0) & (annees <= annee_courante)]
+        return int(annees.max()) if len(annees) else annee_courante
+
+    def synthese_operation(self, operation_id):
+        """Cumuls et atterrissage d'une opération"""
+        trimestres = self.operation(operation_id)
+        if trimestres.empty:
+            return None
+        saisis = trimestres[trimestres['saisi']]
+        rem_projetee_saisie = saisis['rem_projetee'].sum()
+        return {
+            'rem_projetee': float(trimestres['rem_projetee'].sum()),
+            'rem_realisee': float(trimestres['rem_realisee'].sum()),
+            'taux_realisation': _pourcentage(saisis['rem_realisee'].sum(), rem_projetee_saisie),
+            'rem_atterrissage': float(trimestres['rem_prevision'].sum()),
+            'ecart_rem': float(saisis['ecart_rem'].sum()),
+            'ecart_depenses': float(saisis['ecart_depenses'].sum()),
+            'trimestres_saisis': len(saisis),
+            'trimestres': len(trimestres),
+            'dernier_trimestre': saisis['trimestre'].iloc[-1] if len(saisis) else None
+        }
+
+    def rollup(self, par='trimestre'):
+        """Consolidation portefeuille par trimestre ('trimestre') ou par exercice ('annee')"""
+        cles = ['annee', 'numero', 'trimestre'] if par == 'trimestre' else ['annee']
+        consolide = self.frame.groupby(cles, sort=True).agg(
+            rem_projetee=('rem_projetee', 'sum'),
+            rem_realisee=('rem_realisee', 'sum'),
+            rem_prevision=('rem_prevision', 'sum'),
+            depenses_projetees=('depenses_projetees', 'sum'),
+            depenses_facturees=('depenses_facturees', 'sum'),
+            ecart_rem=('ecart_rem', 'sum'),
+            ecart_depenses=('ecart_depenses', 'sum'),
+            operations=('operation_id', 'nunique'),
+            operations_saisies=('saisi', 'sum')
+        ).reset_index()
+        consolide['avancement_rem'] = _pourcentage(consolide['rem_realisee'], consolide['rem_projetee'])
+        return consolide
+
+    def quarter_end_report(self, annee, numero):
+        """
+        Rapport de fin de trimestre du portefeuille en une passe :
+        une ligne par opération (trimestre, cumul exercice, atterrissage) + ligne TOTAL
+        """
+        frame = self.frame
+        exercice = frame[(frame['annee'] == annee) & (frame['numero'] <= numero)]
+        if exercice.empty:
+            return pd.DataFrame()
+
+        par_operation = exercice.groupby('operation_id', sort=True)
+        cumul = par_operation[['rem_projetee', 'rem_realisee', 'ecart_rem']].sum().add_suffix('_cumul')
+        atterrissage = (frame[frame['annee'] == annee].groupby('operation_id')['rem_prevision'].sum()
+                        .rename('rem_atterrissage_exercice'))
+
+        trimestre = (exercice[exercice['numero'] == numero]
+                     .set_index('operation_id')[['rem_projetee', 'rem_realisee', 'ecart_rem', 'avancement_rem', 'saisi']])
+
+        rapport = cumul.join(trimestre, how='left').join(atterrissage, how='left')
+        rapport['saisi'] = rapport['saisi'].astype('boolean').fillna(False).astype(bool)
+        rapport = rapport.fillna(0)
+        rapport['avancement_rem'] = rapport['avancement_rem'].astype(int)
+        rapport['taux_cumul'] = _pourcentage(rapport['rem_realisee_cumul'], rapport['rem_projetee_cumul'])
+
+        total = rapport.drop(columns=['avancement_rem', 'taux_cumul', 'saisi']).sum()
+        total['avancement_rem'] = _pourcentage(total['rem_realisee'], total['rem_projetee'])
+        total['taux_cumul'] = _pourcentage(total['rem_realisee_cumul'], total['rem_projetee_cumul'])
+        total['saisi'] = bool(rapport['saisi'].all())
+
+        rapport = rapport.reset_index()
+        rapport.loc[len(rapport)] = {'operation_id': 'TOTAL', **total.to_dict()}
+        return rapport
+
+
+def _compute(frame, fenetre):
+    """Colonnes dérivées, en une passe vectorisée sur tout le registre"""
+    par_operation = frame.groupby('operation_id', sort=False)
+
+    # Un trimestre est saisi dès qu'une REM ou une dépense réalisée est renseignée
+    saisi = (frame['rem_realisee'] > 0) | (frame['depenses_facturees'] > 0)
+    frame['saisi'] = saisi
+
+    frame['ecart_rem'] = np.where(saisi, frame['rem_realisee'] - frame['rem_projetee'], 0.0)
+    frame['ecart_depenses'] = np.where(saisi, frame['depenses_facturees'] - frame['depenses_projetees'], 0.0)
+    frame['avancement_rem'] = np.where(saisi, _pourcentage(frame['rem_realisee'], frame['rem_projetee']), 0)
+    frame['avancement_travaux'] = np.where(
+        saisi, _pourcentage(frame['depenses_facturees'], frame['depenses_projetees']), 0
+    )
+
+    frame['rem_projetee_cumulee'] = par_operation['rem_projetee'].cumsum()
+    frame['rem_realisee_cumulee'] = par_operation['rem_realisee'].cumsum()
+    frame['taux_realisation_cumule'] = _pourcentage(frame['rem_realisee_cumulee'], frame['rem_projetee_cumulee'])
+
+    # Prévision glissante : ratio réalisé / projeté des `fenetre` derniers trimestres saisis,
+    # appliqué aux trimestres non encore saisis
+    realise_saisi = frame['rem_realisee'].where(saisi, 0.0)
+    projete_saisi = frame['rem_projetee'].where(saisi, 0.0)
+    rang_saisi = saisi.astype(int).groupby(frame['operation_id'], sort=False).cumsum()
+
+    cumul_realise = realise_saisi.groupby(frame['operation_id'], sort=False).cumsum()
+    cumul_projete = projete_saisi.groupby(frame['operation_id'], sort=False).cumsum()
+    saisis = frame.loc[saisi, ['operation_id']].assign(r=cumul_realise[saisi], p=cumul_projete[saisi])
+    decale = saisis.groupby('operation_id', sort=False)[['r', 'p']].shift(fenetre).fillna(0.0)
+    ratio_saisi = (saisis['r'] - decale['r']) / (saisis['p'] - decale['p']).replace(0.0, np.nan)
+
+    ratio = ratio_saisi.reindex(frame.index)
+    ratio = ratio.groupby(frame['operation_id'], sort=False).ffill().where(rang_saisi > 0).fillna(1.0)
+    frame['ratio_glissant'] = ratio.round(4)
+    frame['rem_prevision'] = np.where(saisi, frame['rem_realisee'], frame['rem_projetee'] * ratio).round(2)
+    return frame
+
+
+def _pourcentage(numerateur, denominateur):
+    """Pourcentage arrondi au plus proche, demi vers le haut (0 si dénominateur nul) - scalaire ou colonne"""
+    if np.isscalar(denominateur):
+        return int(np.floor(100 * numerateur / denominateur + 0.5)) if denominateur else 0
+    denominateur = np.asarray(denominateur, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        resultat = np.where(denominateur != 0, 100 * np.asarray(numerateur, dtype=float) / denominateur, 0.0)
+    return np.floor(resultat + 0.5).astype(int)
@@ -0,0 +1,140 @@
+"""
+Générateur de planning - OPCOPILOT v4.0
+Chaque template de phases (OPP 45, VEFA 25, MANDAT_REALISATION 21...) est précompilé une fois
+en tableaux colonnes (durées, décalages cumulés) ; le planning d'une opération est ensuite
+obtenu en une seule passe vectorisée depuis sa date_debut_prevue.
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Conversion des unités de durée en jours
+UNITES_DUREE = {'JOURS': 1, 'SEMAINES': 7, 'MOIS': 30}
+
+COLONNES_PLANNING = [
+    'ordre', 'nom', 'phase_type', 'date_debut_prevue', 'date_fin_prevue', 'duree_jours',
+    'statut', 'responsable', 'est_critique', 'est_jalon'
+]
+
+
+class CompiledTemplate:
+    """Template de phases compilé en colonnes NumPy"""
+
+    def __init__(self, type_operation, template):
+        phases = sorted(template.get('phases', []), key=lambda p: p.get('ordre', 0))
+
+        self.type_operation = type_operation
+        self.nom = template.get('nom', type_operation)
+        self.ordre = np.array([p.get('ordre', i + 1) for i, p in enumerate(phases)], dtype=np.int32)
+        self.noms = np.array([p['nom'] for p in phases], dtype=object)
+        self.phase_types = np.array([p.get('phase_type', '') for p in phases], dtype=object)
+        self.responsables = np.array([p.get('responsable_type', 'ACO') for p in phases], dtype=object)
+        self.est_critique = np.array([bool(p.get('est_critique', False)) for p in phases])
+        self.est_jalon = np.array([bool(p.get('est_jalon', False)) for p in phases])
+        self.durees = np.array([
+            p.get('duree_jours', 30) * UNITES_DUREE.get(p.get('unite_duree', 'JOURS'), 1)
+            for p in phases
+        ], dtype=np.int64)
+
+        # Décalage de chaque phase depuis le début de l'opération (enchaînement séquentiel)
+        self.decalages = np.concatenate([[0], np.cumsum(self.durees)[:-1]]) if len(phases) else self.durees
+        self.duree_totale = int(self.durees.sum())
+
+    def __len__(self):
+        return len(self.durees)
+
+    def dates(self, date_debut, aujourd_hui=None):
+        """Débuts, fins (datetime64[D]) et statuts de toutes les phases - arithmétique vectorisée"""
+        debut_operation = np.datetime64(str(pd.Timestamp(date_debut).date()), 'D')
+        aujourd_hui = np.datetime64(str(pd.Timestamp(aujourd_hui or date.today()).date()), 'D')
+
+        debuts = debut_operation + self.decalages.astype('timedelta64[D]')
+        fins = debuts + self.durees.astype('timedelta64[D]')
+
+        # Statut déduit de la date du jour
+        statuts = np.select(
+            [fins < aujourd_hui, debuts <= aujourd_hui],
+            ['VALIDEE', 'EN_COURS'],
+            default='NON_DEMARREE'
+        )
+        return debuts, fins, statuts
+
+    def schedule(self, date_debut, aujourd_hui=None):
+        """Planning daté (DataFrame, colonnes datetime64) - une seule passe vectorisée"""
+        debuts, fins, statuts = self.dates(date_debut, aujourd_hui)
+
+        return pd.DataFrame({
+            'ordre': self.ordre,
+            'nom': self.noms,
+            'phase_type': self.phase_types,
+            'date_debut_prevue': debuts.astype('datetime64[ns]'),
+            'date_fin_prevue': fins.astype('datetime64[ns]'),
+            'duree_jours': self.durees,
+            'statut': statuts,
+            'responsable': self.responsables,
+            'est_critique': self.est_critique,
+            'est_jalon': self.est_jalon
+        }, columns=COLONNES_PLANNING)
+
+    def phases(self, date_debut, aujourd_hui=None):
+        """Phases datées au format phases_demo (sans passer par un DataFrame, pour les traitements en masse)"""
+        debuts, fins, statuts = self.dates(date_debut, aujourd_hui)
+        return [
+            {
+                'ordre': int(ordre), 'nom': nom, 'date_debut_prevue': debut, 'date_fin_prevue': fin,
+                'statut': statut, 'responsable': responsable, 'est_critique': bool(critique)
+            }
+            for ordre, nom, debut, fin, statut, responsable, critique in zip(
+                self.ordre, self.noms, debuts.astype(str), fins.astype(str), statuts.tolist(),
+                self.responsables, self.est_critique
+            )
+        ]
+
+
+def compile_templates(templates):
+    """Compile tous les templates de phases (à faire une fois par version de templates_phases.json)"""
+    return {
+        type_operation: CompiledTemplate(type_operation, template)
+        for type_operation, template in templates.items()
+        if isinstance(template, dict)
+    }
+
+
+def generate_schedule(compiled_templates, operation, aujourd_hui=None):
+    """Planning d'une opération depuis son template (ancré sur date_debut_prevue, sinon aujourd'hui)"""
+    template = compiled_templates.get(operation.get('type_operation', 'OPP'))
+    if template is None or not len(template):
+        return pd.DataFrame(columns=COLONNES_PLANNING)
+
+    date_debut = pd.to_datetime(operation.get('date_debut_prevue'), errors='coerce')
+    if pd.isna(date_debut):
+        date_debut = pd.Timestamp(aujourd_hui or date.today())
+
+    return template.schedule(date_debut, aujourd_hui)
+
+
+def generate_phases(compiled_templates, operation, aujourd_hui=None):
+    """Comme generate_schedule, au format liste de phases (traitements portefeuille)"""
+    template = compiled_templates.get(operation.get('type_operation', 'OPP'))
+    if template is None or not len(template):
+        return []
+
+    try:
+        date_debut = date.fromisoformat(str(operation.get('date_debut_prevue'))[:10])
+    except ValueError:
+        date_debut = aujourd_hui or date.today()
+
+    return template.phases(date_debut, aujourd_hui)
+
+
+def schedule_to_phases(planning):
+    """DataFrame planning → liste de phases au format phases_demo (dates ISO)"""
+    if planning.empty:
+        return []
+    export = planning.assign(
+        date_debut_prevue=planning['date_debut_prevue'].dt.strftime('%Y-%m-%d'),
+        date_fin_prevue=planning['date_fin_prevue'].dt.strftime('%Y-%m-%d')
+    )
+    return export.to_dict('records')
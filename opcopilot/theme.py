@@ -0,0 +1,77 @@
+"""
+Feuille de style - OPCOPILOT v4.0
+Les sources CSS (opcopilot/styles/*.css) sont compilées une fois (concaténation + minification)
+en un fichier statique servi par Streamlit (server.enableStaticServing, dossier static/) :
+chaque rerun n'envoie plus qu'une balise <link> au lieu de tout le CSS.
+
+Prébuild (image Docker, déploiement) : python -m opcopilot.theme
+"""
+
+import hashlib
+import os
+import re
+import sys
+
+STYLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'styles')
+
+# Ordre de compilation (les règles suivantes surchargent les précédentes)
+SOURCES_CSS = ('theme.css', 'components.css')
+
+STATIC_DIR = 'static'
+STYLESHEET_NAME = 'opcopilot.css'
+
+
+def minify_css(css):
+    """Suppression des commentaires et des espaces superflus"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};:,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def compile_css(sources=SOURCES_CSS, styles_dir=STYLES_DIR):
+    """CSS compilé à partir des sources, dans l'ordre"""
+    parties = []
+    for source in sources:
+        with open(os.path.join(styles_dir, source), 'r', encoding='utf-8') as f:
+            parties.append(f.read())
+    return minify_css('\n'.join(parties))
+
+
+def css_version(css):
+    """Empreinte courte du CSS compilé (paramètre anti-cache du lien)"""
+    return hashlib.sha256(css.encode('utf-8')).hexdigest()[:12]
+
+
+def write_stylesheet(css, static_dir=STATIC_DIR, name=STYLESHEET_NAME):
+    """Écrit le CSS compilé dans le dossier statique (seulement s'il a changé) - retourne sa version"""
+    chemin = os.path.join(static_dir, name)
+    try:
+        with open(chemin, 'r', encoding='utf-8') as f:
+            if f.read() == css:
+                return css_version(css)
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(static_dir, exist_ok=True)
+    temporaire = f"{chemin}.tmp"
+    with open(temporaire, 'w', encoding='utf-8') as f:
+        f.write(css)
+    os.replace(temporaire, chemin)
+    return css_version(css)
+
+
+def stylesheet_link(version, name=STYLESHEET_NAME):
+    """Balise <link> vers la feuille servie par Streamlit (/app/static/...)"""
+    return f'<link rel="stylesheet" href="./app/static/{name}?v={version}">'
+
+
+def inline_style(css):
+    """Repli sans service statique : CSS intégré à la page"""
+    return f"<style>{css}</style>"
+
+
+if __name__ == "__main__":
+    css = compile_css()
+    version = write_stylesheet(css, sys.argv[1] if len(sys.argv) > 1 else STATIC_DIR)
+    print(f"{STYLESHEET_NAME} v{version} ({len(css) / 1024:.1f} Ko)")
@@ -0,0 +1,313 @@
+"""
+Timeline horizontale - construction vectorisée OPCOPILOT v4.0
+Chaque couche visuelle (segments, triangles, connecteurs, cercles, titres, descriptions)
+est un seul trace Plotly : nombre de traces constant quel que soit le nombre de phases.
+Les figures construites sont mémorisées dans un cache LRU indexé sur l'empreinte opération + phases.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Couleurs du dégradé (jaune → orange → rouge → violet → bleu)
+COULEURS_DEGRADE = [
+    "#FFD54F",  # Jaune
+    "#FF9800",  # Orange
+    "#F44336",  # Rouge
+    "#E91E63",  # Rose/Violet
+    "#673AB7",  # Violet
+    "#2E7D32"   # Bleu-vert foncé
+]
+
+
+def prepare_phase_dates(phases_data, now=None):
+    """
+    Validation et parsing vectorisé des dates de phases
+    - début manquant : maintenant + 30 jours par rang
+    - fin manquante ou antérieure au début : début + 30 jours
+    - date non interprétable : phase ignorée (comme la version phase par phase)
+    Retourne (phases_valides, dates_debut, dates_fin) avec dates en datetime64
+    """
+    phases = [phase for phase in phases_data if isinstance(phase, dict)]
+    if not phases:
+        return [], pd.Series(dtype='datetime64[ns]'), pd.Series(dtype='datetime64[ns]')
+
+    now = pd.Timestamp(now or datetime.now())
+    rangs = np.arange(len(phases))
+    un_mois = pd.Timedelta(days=30)
+
+    brut_debut = pd.Series([phase.get('date_debut_prevue') or None for phase in phases], dtype=object)
+    brut_fin = pd.Series([phase.get('date_fin_prevue') or None for phase in phases], dtype=object)
+
+    debut = pd.to_datetime(brut_debut, errors='coerce', format='mixed')
+    fin = pd.to_datetime(brut_fin, errors='coerce', format='mixed')
+
+    # Dates présentes mais invalides → phase écartée
+    invalides = (brut_debut.notna() & debut.isna()) | (brut_fin.notna() & fin.isna())
+
+    debut = debut.where(brut_debut.notna(), now + pd.to_timedelta(rangs * 30, unit='D'))
+    fin = fin.where(brut_fin.notna() & (fin >= debut), debut + un_mois)
+
+    garder = ~invalides.to_numpy()
+    phases_valides = [phase for phase, ok in zip(phases, garder) if ok]
+    return phases_valides, debut[garder].reset_index(drop=True), fin[garder].reset_index(drop=True)
+
+
+def create_timeline_batched(operation_data, phases_valides, dates_debut):
+    """Figure timeline en traces groupées (≈ 16 traces pour n'importe quel nombre de phases)"""
+    n = len(phases_valides)
+    x = np.arange(n, dtype=float)
+    indices_couleur = np.arange(n) % len(COULEURS_DEGRADE)
+    couleurs = np.array(COULEURS_DEGRADE)[indices_couleur]
+    en_haut = np.arange(n) % 2 == 0
+
+    fig = go.Figure()
+
+    # SEGMENTS DE BARRE + TRIANGLES (un trace par couleur, séparateurs NaN)
+    if n > 1:
+        segments = np.arange(n - 1)
+        for c, couleur in enumerate(COULEURS_DEGRADE):
+            debuts = segments[segments % len(COULEURS_DEGRADE) == c].astype(float)
+            if not len(debuts):
+                continue
+            fig.add_trace(go.Scatter(
+                x=_with_gaps(debuts, debuts + 1),
+                y=_with_gaps(np.zeros_like(debuts), np.zeros_like(debuts)),
+                mode='lines',
+                line=dict(width=20, color=couleur),
+                showlegend=False,
+                hoverinfo='skip'
+            ))
+
+        segment_pair = segments % 2 == 0
+        fig.add_trace(go.Scatter(
+            x=segments + 0.5,
+            y=np.where(segment_pair, 0.15, -0.15),
+            mode='markers',
+            marker=dict(
+                size=15,
+                color=couleurs[:-1],
+                symbol=np.where(segment_pair, 'triangle-up', 'triangle-down')
+            ),
+            showlegend=False,
+            hoverinfo='skip'
+        ))
+
+    y_cercle = np.where(en_haut, 0.8, -0.8)
+
+    # LIGNES VERTICALES DE CONNEXION (un trace par couleur)
+    y_ligne_debut = np.where(en_haut, 0.15, -0.15)
+    y_ligne_fin = y_cercle - np.where(en_haut, 0.25, -0.25)
+    for c, couleur in enumerate(COULEURS_DEGRADE):
+        masque = indices_couleur == c
+        if not masque.any():
+            continue
+        fig.add_trace(go.Scatter(
+            x=_with_gaps(x[masque], x[masque]),
+            y=_with_gaps(y_ligne_debut[masque], y_ligne_fin[masque]),
+            mode='lines',
+            line=dict(width=3, color=couleur),
+            showlegend=False,
+            hoverinfo='skip'
+        ))
+
+    # CERCLES AVEC DATES MM/YY
+    noms = [phase.get('nom', f'Phase {i + 1}') for i, phase in enumerate(phases_valides)]
+    statuts = [phase.get('statut', 'NON_DEMARREE') for phase in phases_valides]
+    numeros = np.arange(1, n + 1)
+
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=y_cercle,
+        mode='markers+text',
+        marker=dict(
+            size=80,
+            color=couleurs,
+            symbol='circle',
+            line=dict(width=5, color='white')
+        ),
+        text=dates_debut.dt.strftime('%m/%y').to_numpy(),
+        textfont=dict(size=16, color='white', family='Arial Bold'),
+        textposition='middle center',
+        customdata=np.column_stack([numeros, noms, dates_debut.dt.strftime('%d/%m/%Y').to_numpy()]),
+        showlegend=False,
+        hovertemplate="<b>Phase %{customdata[0]}</b><br>%{customdata[1]}<br>Date: %{customdata[2]}<extra></extra>"
+    ))
+
+    # TITRES
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=y_cercle + np.where(en_haut, 0.4, -0.4),
+        mode='text',
+        text=[f"<b>PHASE {i:02d}</b>" for i in numeros],
+        textfont=dict(size=15, color='#333333', family='Arial Black'),
+        textposition='middle center',
+        showlegend=False,
+        hoverinfo='skip'
+    ))
+
+    # DESCRIPTIONS
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=y_cercle + np.where(en_haut, 0.6, -0.6),
+        mode='text',
+        text=[f"{nom}<br><span style='color:#999999;font-size:10px'>Statut: {statut}</span>"
+              for nom, statut in zip(noms, statuts)],
+        textfont=dict(size=12, color='#666666', family='Arial'),
+        textposition='middle center',
+        showlegend=False,
+        hoverinfo='skip'
+    ))
+
+    operation_nom = operation_data.get('nom', 'Opération') if isinstance(operation_data, dict) else 'Opération'
+    fig.update_layout(**timeline_layout(operation_nom, n))
+    return fig, timeline_config(operation_nom)
+
+
+def timeline_layout(operation_nom, nb_phases):
+    """Layout timeline chronologique (espacement égal, pas durées)"""
+    return dict(
+        title={
+            'text': f"🗓️ Timeline Interactive - {operation_nom}",
+            'x': 0.5,
+            'xanchor': 'center',
+            'font': {'size': 22, 'color': '#333333', 'family': 'Arial Black'}
+        },
+        # Fond gris clair comme modèle
+        plot_bgcolor='rgba(240, 240, 240, 0.3)',
+        paper_bgcolor='#f5f5f5',
+
+        # SUPPRESSION COMPLÈTE AXE X (chronologie dans cercles)
+        xaxis=dict(
+            range=[-0.5, nb_phases - 0.5],  # Range pour espacement égal
+            visible=False,
+            showticklabels=False,
+            showgrid=False,
+            zeroline=False,
+            showline=False
+        ),
+        # AXE Y masqué mais fonctionnel pour alternance
+        yaxis=dict(
+            range=[-1.8, 1.8],
+            visible=False,
+            showgrid=False,
+            showticklabels=False,
+            zeroline=False,
+            showline=False
+        ),
+        height=600,
+        margin=dict(l=50, r=50, t=100, b=50),
+        hovermode='closest',
+        dragmode='pan',
+        font=dict(size=12, color='#333333', family='Arial'),
+        showlegend=False
+    )
+
+
+def timeline_config(operation_nom):
+    """Configuration de la barre d'outils Plotly"""
+    return {
+        'displayModeBar': True,
+        'modeBarButtonsToAdd': ['pan2d', 'zoomin2d', 'zoomout2d', 'resetScale2d'],
+        'modeBarButtonsToRemove': ['lasso2d', 'select2d', 'autoScale2d'],
+        'displaylogo': False,
+        'toImageButtonOptions': {
+            'format': 'png',
+            'filename': f"timeline_{operation_nom.replace(' ', '_')}",
+            'height': 500,
+            'width': 1200,
+            'scale': 2
+        }
+    }
+
+
+def _with_gaps(debuts, fins):
+    """Segments [début, fin] concaténés avec séparateur NaN (rupture de ligne Plotly)"""
+    return np.column_stack([debuts, fins, np.full(len(debuts), np.nan)]).ravel()
+
+
+def timeline_digest(operation_data, phases_data, jour=None):
+    """Empreinte stable (indépendante de l'ordre des clés) d'une opération et de ses phases (et du jour)"""
+    payload = json.dumps([operation_data, phases_data, jour], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TimelineFigureCache:
+    """
+    Cache LRU borné des figures timeline
+    - clé : empreinte opération + phases + jour (toute modification des phases change la clé ;
+      les dates manquantes sont placées à partir du jour courant)
+    - une seule entrée par opération : la version précédente est invalidée
+    Les figures sont partagées entre sessions et doivent être traitées en lecture seule.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._cle_par_operation = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_build(self, operation_data, phases_data, builder, jour=None):
+        """Figure en cache (simple lookup) ou construite via builder(operation, phases) -> (fig, config)"""
+        cle = timeline_digest(operation_data, phases_data, jour)
+
+        with self._lock:
+            if cle in self._entries:
+                self._entries.move_to_end(cle)
+                self.hits += 1
+                fig, config, _ = self._entries[cle]
+                return fig, config
+            self.misses += 1
+
+        fig, config = builder(operation_data, phases_data)
+
+        # Les timelines de repli (erreur, données vides) n'ont pas de config : pas de mise en cache
+        if not config:
+            return fig, config
+
+        operation_id = operation_data.get('id') if isinstance(operation_data, dict) else None
+
+        with self._lock:
+            ancienne_cle = self._cle_par_operation.get(operation_id)
+            if operation_id is not None and ancienne_cle and ancienne_cle != cle:
+                self._entries.pop(ancienne_cle, None)
+            if operation_id is not None:
+                self._cle_par_operation[operation_id] = cle
+
+            self._entries[cle] = (fig, config, operation_id)
+            while len(self._entries) > self.max_entries:
+                cle_evincee, (_, _, operation_evincee) = self._entries.popitem(last=False)
+                # Index inverse nettoyé avec l'entrée (sinon il croît sans borne)
+                if self._cle_par_operation.get(operation_evincee) == cle_evincee:
+                    del self._cle_par_operation[operation_evincee]
+                self.evictions += 1
+
+        return fig, config
+
+    def invalidate(self, operation_id=None):
+        """Invalide la timeline d'une opération, ou tout le cache"""
+        with self._lock:
+            if operation_id is None:
+                self._entries.clear()
+                self._cle_par_operation.clear()
+            else:
+                self._entries.pop(self._cle_par_operation.pop(operation_id, None), None)
+
+    def stats(self):
+        """Compteurs du cache"""
+        return {
+            'entrees': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,296 @@
+"""
+Moteur de workflows - OPCOPILOT v4.0
+Chaque workflow de workflow_modules.json (REM, avenants, MED, concessionnaires, DGD, GPA, clôture)
+est compilé une fois en table de transitions : étape suivante, délai, échéance cumulée restante,
+étapes SYSTEME à délai nul franchies automatiquement. Les instances (opération, workflow, objet)
+sont indexées par clé et par workflow : lecture de l'étape courante en O(1), transitions en masse
+(ex. ouverture de la saisie REM de tout le portefeuille en fin de trimestre) en une passe.
+"""
+
+import threading
+from datetime import date, datetime, timedelta
+
+from opcopilot.persistence import parse_trimestre
+
+STATUTS_RESOLUS = ('RESOLU', 'CLOS', 'CLOTURE', 'ANNULE')
+STATUTS_ETAPE_TERMINEE = ('VALIDEE', 'TERMINEE')
+
+# Étape courante déduite du statut des enregistrements de demo_data
+ETAPES_AVENANT = {'BROUILLON': 'Création avenant', 'EN_COURS': 'Validation technique'}
+ETAPES_GPA = {'SIGNALE': 'Analyse et diagnostic', 'EN_COURS': 'Intervention entreprise'}
+ETAPE_MED_ENVOYEE = 'Suivi et tracking'
+ETAPE_REM_SAISIE = 'Saisie données trimestrielles'
+
+
+def _date(valeur):
+    if not valeur:
+        return None
+    if isinstance(valeur, datetime):
+        return valeur.date()
+    if isinstance(valeur, date):
+        return valeur
+    try:
+        return date.fromisoformat(str(valeur)[:10])
+    except ValueError:
+        return None
+
+
+def _fin_trimestre(annee, numero):
+    return date(annee + numero // 4, numero % 4 * 3 + 1, 1) - timedelta(days=1)
+
+
+def trimestre_echu(jour=None):
+    """(libellé, date de fin) du dernier trimestre terminé à la date jour (ex. ('T3 2026', 2026-09-30))"""
+    jour = _date(jour) or date.today()
+    numero, annee = (jour.month - 1) // 3, jour.year
+    if numero == 0:
+        numero, annee = 4, annee - 1
+    return f"T{numero} {annee}", _fin_trimestre(annee, numero)
+
+
+class CompiledWorkflow:
+    """Définition de workflow compilée en tables indexées par position d'étape"""
+
+    def __init__(self, code, definition, etapes):
+        etapes = sorted(etapes, key=lambda e: e.get('ordre', 0))
+
+        self.code = code
+        self.nom = definition.get('nom', code)
+        self.noms = tuple(e['nom'] for e in etapes)
+        self.responsables = tuple(e.get('responsable', 'ACO') for e in etapes)
+        self.delais = tuple(int(e.get('delai_jours', e.get('delai_standard', 0)) or 0) for e in etapes)
+        self.positions = {nom: position for position, nom in enumerate(self.noms)}
+        self.positions.update({e.get('ordre'): position for position, e in enumerate(etapes) if 'ordre' in e})
+
+        # Étapes automatiques : exécutées par le système sans délai, franchies dès qu'elles sont atteintes
+        automatiques = [r == 'SYSTEME' and d == 0 for r, d in zip(self.responsables, self.delais)]
+
+        # arret[p] : première étape non automatique à partir de p (len = workflow terminé)
+        self.arret = [len(etapes)] * (len(etapes) + 1)
+        for position in range(len(etapes) - 1, -1, -1):
+            self.arret[position] = self.arret[position + 1] if automatiques[position] else position
+
+        # reste[p] : délai cumulé de l'étape p à la fin du workflow
+        self.reste = [0] * (len(etapes) + 1)
+        for position in range(len(etapes) - 1, -1, -1):
+            self.reste[position] = self.reste[position + 1] + self.delais[position]
+
+        self.duree_totale = self.reste[0]
+
+    def __len__(self):
+        return len(self.noms)
+
+    def position(self, etape):
+        """Position d'une étape (nom ou ordre)"""
+        return self.positions[etape]
+
+    def suivante(self, position):
+        """Position atteinte après validation de l'étape (étapes automatiques franchies)"""
+        return self.arret[min(position + 1, len(self.noms))]
+
+
+def compile_workflows(definitions):
+    """
+    Compile les workflows (une fois par version de workflow_modules.json) ; le workflow
+    concessionnaires donne un workflow par concessionnaire (workflow_concessionnaires.EDF...)
+    """
+    compiles = {}
+    for code, definition in definitions.items():
+        if not isinstance(definition, dict):
+            continue
+        if definition.get('etapes'):
+            compiles[code] = CompiledWorkflow(code, definition, definition['etapes'])
+        for concessionnaire, sous_workflow in (definition.get('concessionnaires') or {}).items():
+            sous_code = f"{code}.{concessionnaire}"
+            compiles[sous_code] = CompiledWorkflow(
+                sous_code, {'nom': f"{definition.get('nom', code)} - {concessionnaire}"}, sous_workflow['etapes']
+            )
+    return compiles
+
+
+class WorkflowEngine:
+    """
+    Instances de workflows du portefeuille, clé (operation_id, workflow, objet) ; objet distingue
+    plusieurs instances d'un même workflow sur une opération (référence MED, numéro d'avenant...)
+    """
+
+    def __init__(self, workflows):
+        self.workflows = workflows
+        self._lock = threading.Lock()
+        self._instances = {}
+        self._actives = {code: {} for code in workflows}  # workflow → clés des instances en cours (ordonnées)
+        self._par_operation = {}
+        self.transitions = 0
+
+    def __len__(self):
+        return len(self._instances)
+
+    # --- Transitions --------------------------------------------------------------
+
+    def _placer(self, instance, position, jour, delai=None):
+        """Positionne l'instance (verrou détenu) : étape, responsable, échéances (délai propre éventuel)"""
+        workflow = self.workflows[instance['workflow']]
+        cle = (instance['operation_id'], instance['workflow'], instance['objet'])
+        instance['position'] = position
+        instance['debut_etape'] = jour
+        if position >= len(workflow):
+            instance.update(etape=None, responsable=None, echeance=None, fin_prevue=jour, termine=True)
+            self._actives[instance['workflow']].pop(cle, None)
+        else:
+            delai = workflow.delais[position] if delai is None else delai
+            instance.update(
+                etape=workflow.noms[position],
+                responsable=workflow.responsables[position],
+                echeance=jour + timedelta(days=delai),
+                fin_prevue=jour + timedelta(days=delai + workflow.reste[position + 1]),
+                termine=False
+            )
+            self._actives[instance['workflow']][cle] = None
+        instance['historique'].append((instance['etape'] or 'Terminé', jour))
+
+    def _demarrer(self, operation_id, code, jour, objet, etape, delai=None):
+        workflow = self.workflows[code]
+        cle = (operation_id, code, objet)
+        instance = {'operation_id': operation_id, 'workflow': code, 'objet': objet, 'debut': jour, 'historique': []}
+        self._instances[cle] = instance
+        self._par_operation.setdefault(operation_id, {})[cle] = None
+        position = workflow.position(etape) if etape is not None else workflow.arret[0]
+        self._placer(instance, position, jour, delai)
+        return instance
+
+    def demarrer(self, operation_id, code, jour=None, objet=None, etape=None):
+        """Démarre (ou redémarre) une instance, à la première étape non automatique ou à l'étape donnée"""
+        with self._lock:
+            return self._demarrer(operation_id, code, _date(jour) or date.today(), objet, etape)
+
+    def avancer(self, operation_id, code, jour=None, objet=None):
+        """Valide l'étape courante d'une instance et passe à la suivante - O(1)"""
+        with self._lock:
+            instance = self._instances.get((operation_id, code, objet))
+            if instance is None or instance['termine']:
+                return instance
+            self._placer(instance, self.workflows[code].suivante(instance['position']), _date(jour) or date.today())
+            self.transitions += 1
+            return instance
+
+    def demarrer_lot(self, code, operation_ids, jour=None, objet=None):
+        """Démarre le workflow pour un lot d'opérations (ex. fin de trimestre REM) - une passe"""
+        jour = _date(jour) or date.today()
+        with self._lock:
+            for operation_id in operation_ids:
+                self._demarrer(operation_id, code, jour, objet, None)
+        return len(operation_ids)
+
+    def avancer_lot(self, code, jour=None, etape=None, objet=None):
+        """
+        Valide l'étape courante de toutes les instances en cours d'un workflow (ou de celles
+        arrêtées à `etape`, pour un `objet` donné) en une passe ; retourne le nombre de transitions
+        """
+        jour = _date(jour) or date.today()
+        workflow = self.workflows[code]
+        position = workflow.position(etape) if etape is not None else None
+        with self._lock:
+            cles = [
+                cle for cle in self._actives[code]
+                if (objet is None or cle[2] == objet)
+                and (position is None or self._instances[cle]['position'] == position)
+            ]
+            for cle in cles:
+                instance = self._instances[cle]
+                self._placer(instance, workflow.suivante(instance['position']), jour)
+            self.transitions += len(cles)
+        return len(cles)
+
+    # --- Lecture --------------------------------------------------------------
+
+    def instance(self, operation_id, code, objet=None):
+        """Instance (étape courante, responsable, échéances) - O(1)"""
+        with self._lock:
+            return self._instances.get((operation_id, code, objet))
+
+    def instances_operation(self, operation_id):
+        """Instances d'une opération, dans l'ordre de démarrage"""
+        with self._lock:
+            return [self._instances[cle] for cle in self._par_operation.get(operation_id, {})]
+
+    def en_cours(self, code=None):
+        """Instances en cours (d'un workflow, ou de tous)"""
+        codes = [code] if code is not None else list(self._actives)
+        with self._lock:
+            return [self._instances[cle] for c in codes for cle in self._actives[c]]
+
+    def en_retard(self, jour=None, code=None):
+        """Instances en cours dont l'échéance de l'étape courante est dépassée (plus ancienne d'abord)"""
+        jour = _date(jour) or date.today()
+        return sorted((i for i in self.en_cours(code) if i['echeance'] < jour), key=lambda i: i['echeance'])
+
+    def stats(self, jour=None):
+        """Instances en cours / en retard par workflow"""
+        jour = _date(jour) or date.today()
+        lignes = []
+        for code, workflow in self.workflows.items():
+            instances = self.en_cours(code)
+            lignes.append({
+                'workflow': code,
+                'nom': workflow.nom,
+                'etapes': len(workflow),
+                'duree_jours': workflow.duree_totale,
+                'en_cours': len(instances),
+                'en_retard': sum(1 for i in instances if i['echeance'] < jour)
+            })
+        return lignes
+
+    # --- Construction depuis les données ---------------------------------------------
+
+    @classmethod
+    def from_demo_data(cls, workflows, demo_data):
+        """
+        Instances déduites des enregistrements en cours : trimestres REM non saisis, avenants
+        non validés, MED en attente de réponse, réclamations GPA ouvertes, étapes concessionnaires
+        """
+        moteur = cls(workflows)
+
+        def demarrer(operation_id, code, jour, objet, etape, delai=None):
+            workflow = workflows.get(code)
+            if workflow is not None and jour is not None and etape in workflow.positions:
+                moteur._demarrer(operation_id, code, jour, objet, etape, delai)
+
+        for operation_id, trimestres in _par_operation(demo_data, 'rem_demo'):
+            for trimestre in trimestres:
+                numero, annee = parse_trimestre(trimestre.get('trimestre', ''))
+                if annee and numero and not trimestre.get('rem_realisee'):
+                    demarrer(operation_id, 'workflow_rem', _fin_trimestre(annee, numero), trimestre['trimestre'],
+                             ETAPE_REM_SAISIE)
+
+        for operation_id, avenants in _par_operation(demo_data, 'avenants_demo'):
+            for avenant in avenants:
+                demarrer(operation_id, 'workflow_avenants', _date(avenant.get('date')), avenant.get('numero'),
+                         ETAPES_AVENANT.get(avenant.get('statut')))
+
+        for operation_id, meds in _par_operation(demo_data, 'med_demo'):
+            for med in meds:
+                if med.get('statut') not in STATUTS_RESOLUS and not med.get('date_resolution'):
+                    # Suivi jusqu'à l'échéance de mise en conformité
+                    demarrer(operation_id, 'workflow_med', _date(med.get('date_envoi')), med.get('reference'),
+                             ETAPE_MED_ENVOYEE, med.get('delai_conformite') or 0)
+
+        for operation_id, reclamations in _par_operation(demo_data, 'gpa_demo'):
+            for reclamation in reclamations:
+                demarrer(operation_id, 'workflow_gpa', _date(reclamation.get('date')),
+                         reclamation.get('logement'), ETAPES_GPA.get(reclamation.get('statut')))
+
+        for operation_id, concessionnaires in _par_operation(demo_data, 'concessionnaires_demo'):
+            for concessionnaire, suivi in (concessionnaires or {}).items():
+                etapes = suivi.get('etapes', [])
+                validees = [_date(e.get('date')) for e in etapes if e.get('statut') in STATUTS_ETAPE_TERMINEE]
+                courante = next((e for e in etapes if e.get('statut') not in STATUTS_ETAPE_TERMINEE), None)
+                if courante is not None:
+                    demarrer(operation_id, f"workflow_concessionnaires.{concessionnaire}",
+                             max((d for d in validees if d), default=None), None, courante.get('nom'))
+
+        return moteur
+
+
+def _par_operation(demo_data, cle):
+    for cle_operation, enregistrements in (demo_data.get(cle) or {}).items():
+        yield int(cle_operation.rsplit('_', 1)[-1]), enregistrements or []
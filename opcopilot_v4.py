@@ -6,21 +6,40 @@ VERSION MODERNISÉE - Dégradé violet-bleu-vert
 """
 
 import streamlit as st
-st.cache_data.clear()
-st.cache_resource.clear()
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
 import json
 from datetime import datetime, timedelta
-import sqlite3
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-from docx import Document
 import os
 import hashlib
 
+from opcopilot.cache import DataCache
+from opcopilot.modules import ModuleHost
+from opcopilot.lazy import lazy_import
+from opcopilot import cards, theme
+
+# Imports différés : pandas, Plotly, SQLAlchemy et les moteurs ne sont chargés qu'à leur
+# première utilisation (la page de connexion n'en a pas besoin)
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+go = lazy_import('plotly.graph_objects')
+persistence = lazy_import('opcopilot.persistence')
+portfolio = lazy_import('opcopilot.portfolio')
+schedule = lazy_import('opcopilot.schedule')
+cpm = lazy_import('opcopilot.cpm')
+rem = lazy_import('opcopilot.rem')
+kpis = lazy_import('opcopilot.kpis')
+timeline = lazy_import('opcopilot.timeline')
+journal = lazy_import('opcopilot.journal')
+alerts = lazy_import('opcopilot.alerts')
+deadlines = lazy_import('opcopilot.deadlines')
+freins = lazy_import('opcopilot.freins')
+relances = lazy_import('opcopilot.relances')
+workflows = lazy_import('opcopilot.workflows')
+export = lazy_import('opcopilot.export')
+courriers = lazy_import('opcopilot.courriers')
+conformite = lazy_import('opcopilot.conformite')
+concessionnaires = lazy_import('opcopilot.concessionnaires')
+dgd = lazy_import('opcopilot.dgd')
+
 # Configuration page
 st.set_page_config(
     page_title="OPCOPILOT v4.0 - SPIC Guadeloupe",
@@ -29,663 +48,22 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# CSS personnalisé MODERNISÉ avec dégradé violet-bleu-vert
-st.markdown("""
-<style>
-    /* THÈME MODERNE VIOLET-BLEU-VERT - GLOBAL */
-    .stApp {
-        background-color: #F9FAFB !important;
-        font-family: 'Inter', 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-    }
-    
-    /* SUPPRESSION DU THÈME SOMBRE */
-    .stApp > div {
-        background-color: #F9FAFB !important;
-    }
-    
-    .main-header {
-        background: linear-gradient(135deg, #8B5CF6 0%, #3B82F6 50%, #10B981 100%);
-        color: white;
-        padding: 2rem;
-        border-radius: 15px;
-        margin-bottom: 2rem;
-        box-shadow: 0 10px 25px rgba(139, 92, 246, 0.2);
-        text-align: center;
-    }
-    
-    .main-header h1 {
-        margin: 0;
-        font-size: 2.5rem;
-        font-weight: 700;
-        text-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    
-    .main-header h2 {
-        margin: 0.5rem 0 0 0;
-        font-size: 1.5rem;
-        font-weight: 400;
-        opacity: 0.9;
-    }
-    
-    .main-header p {
-        margin: 0.5rem 0 0 0;
-        font-size: 1.1rem;
-        opacity: 0.8;
-    }
-    
-    /* PAGE DE CONNEXION - MODE CLAIR MODERNE */
-    .login-container {
-        background: white !important;
-        border-radius: 16px;
-        padding: 3rem;
-        box-shadow: 0 20px 50px rgba(139, 92, 246, 0.15);
-        border: 1px solid #E5E7EB;
-        max-width: 450px;
-        margin: 2rem auto;
-    }
-    
-    .login-title {
-        text-align: center;
-        color: #1F2937 !important;
-        font-size: 2.2rem;
-        font-weight: 700;
-        margin-bottom: 1rem;
-        background: linear-gradient(135deg, #8B5CF6, #3B82F6, #10B981);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        background-clip: text;
-    }
-    
-    .login-subtitle {
-        text-align: center;
-        color: #6B7280 !important;
-        font-size: 1rem;
-        margin-bottom: 2rem;
-        font-weight: 400;
-    }
-    
-    /* FORMULAIRES MODE CLAIR */
-    .stTextInput > div > div > input {
-        background-color: #F9FAFB !important;
-        border: 2px solid #E5E7EB !important;
-        border-radius: 10px !important;
-        color: #1F2937 !important;
-        padding: 0.75rem !important;
-        font-size: 1rem !important;
-        transition: all 0.3s ease !important;
-    }
-    
-    .stTextInput > div > div > input:focus {
-        border-color: #8B5CF6 !important;
-        box-shadow: 0 0 0 3px rgba(139, 92, 246, 0.1) !important;
-    }
-    
-    /* BOUTONS MODERNES DÉGRADÉ */
-    .stButton > button {
-        background: linear-gradient(135deg, #8B5CF6 0%, #3B82F6 50%, #10B981 100%) !important;
-        color: white !important;
-        border: none !important;
-        border-radius: 10px !important;
-        padding: 0.75rem 1.5rem !important;
-        font-weight: 600 !important;
-        font-size: 1rem !important;
-        transition: all 0.3s ease !important;
-        box-shadow: 0 8px 32px rgba(139, 92, 246, 0.25) !important;
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px) !important;
-        box-shadow: 0 12px 40px rgba(139, 92, 246, 0.35) !important;
-    }
-    
-    /* BOUTONS SECONDAIRES */
-    .stButton > button[kind="secondary"] {
-        background: white !important;
-        color: #8B5CF6 !important;
-        border: 2px solid #8B5CF6 !important;
-        box-shadow: 0 4px 12px rgba(139, 92, 246, 0.15) !important;
-    }
-    
-    .stButton > button[kind="secondary"]:hover {
-        background: linear-gradient(135deg, #8B5CF6 0%, #3B82F6 50%, #10B981 100%) !important;
-        color: white !important;
-    }
-    
-    .operation-card {
-        background: white;
-        border: 1px solid #E5E7EB;
-        border-radius: 15px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-        box-shadow: 0 8px 32px rgba(139, 92, 246, 0.1);
-        border-left: 4px solid;
-        border-image: linear-gradient(135deg, #8B5CF6, #3B82F6, #10B981) 1;
-        transition: all 0.3s ease;
-    }
-    
-    .operation-card:hover {
-        box-shadow: 0 12px 40px rgba(139, 92, 246, 0.2);
-        transform: translateY(-2px);
-    }
-    
-    .kpi-card {
-        background: white;
-        border: 1px solid #E5E7EB;
-        border-radius: 20px;
-        padding: 2rem;
-        text-align: center;
-        margin: 0.5rem;
-        box-shadow: 0 10px 40px rgba(139, 92, 246, 0.15);
-        border: 2px solid transparent;
-        background-clip: padding-box;
-        transition: all 0.4s ease;
-        cursor: pointer;
-        position: relative;
-        overflow: hidden;
-    }
-    
-    .kpi-card::before {
-        content: '';
-        position: absolute;
-        top: 0;
-        left: 0;
-        right: 0;
-        bottom: 0;
-        border-radius: 20px;
-        padding: 2px;
-        background: linear-gradient(135deg, #8B5CF6, #3B82F6, #10B981);
-        -webkit-mask: linear-gradient(#fff 0 0) content-box, linear-gradient(#fff 0 0);
-        -webkit-mask-composite: xor;
-        mask: linear-gradient(#fff 0 0) content-box, linear-gradient(#fff 0 0);
-        mask-composite: exclude;
-    }
-    
-    .kpi-card:hover {
-        box-shadow: 0 20px 60px rgba(139, 92, 246, 0.25);
-        transform: translateY(-5px) scale(1.02);
-    }
-    
-    .kpi-card.primary {
-        background: linear-gradient(135deg, #8B5CF6 0%, #3B82F6 50%, #10B981 100%);
-        color: white;
-        border: none;
-    }
-    
-    .kpi-card.primary::before {
-        display: none;
-    }
-    
-    .kpi-card.success {
-        background: linear-gradient(135deg, #10B981 0%, #059669 100%);
-        color: white;
-        border: none;
-    }
-    
-    .kpi-card.success::before {
-        display: none;
-    }
-    
-    .kpi-card.warning {
-        background: linear-gradient(135deg, #F59E0B 0%, #D97706 100%);
-        color: white;
-        border: none;
-    }
-    
-    .kpi-card.warning::before {
-        display: none;
-    }
-    
-    .kpi-card.danger {
-        background: linear-gradient(135deg, #EF4444 0%, #DC2626 100%);
-        color: white;
-        border: none;
-    }
-    
-    .kpi-card.danger::before {
-        display: none;
-    }
-    
-    .timeline-container {
-        background: white;
-        border-radius: 15px;
-        padding: 2rem;
-        margin: 1rem 0;
-        box-shadow: 0 8px 32px rgba(139, 92, 246, 0.15);
-        border-left: 4px solid;
-        border-image: linear-gradient(135deg, #8B5CF6, #3B82F6, #10B981) 1;
-    }
-    
-    .module-tab {
-        background: white;
-        border: 1px solid #E5E7EB;
-        border-radius: 10px;
-        padding: 1.5rem;
-        margin: 0.5rem;
-        border-left: 4px solid;
-        border-image: linear-gradient(135deg, #8B5CF6, #3B82F6, #10B981) 1;
-        box-shadow: 0 4px 16px rgba(139, 92, 246, 0.1);
-    }
-    
-    .alert-critical { 
-        background: #FEF2F2; 
-        border-left: 4px solid #EF4444; 
-        padding: 1rem;
-        margin: 0.5rem 0;
-        border-radius: 10px;
-        border: 1px solid #FECACA;
-    }
-    
-    .alert-warning { 
-        background: #FFFBEB; 
-        border-left: 4px solid #F59E0B; 
-        padding: 1rem;
-        margin: 0.5rem 0;
-        border-radius: 10px;
-        border: 1px solid #FED7AA;
-    }
-    
-    .alert-info { 
-        background: #EFF6FF; 
-        border-left: 4px solid #8B5CF6; 
-        padding: 1rem;
-        margin: 0.5rem 0;
-        border-radius: 10px;
-        border: 1px solid #BFDBFE;
-    }
-    
-    .metric-card {
-        background: white;
-        border: 1px solid #E5E7EB;
-        border-radius: 10px;
-        padding: 1.5rem;
-        text-align: center;
-        margin: 0.5rem;
-        box-shadow: 0 4px 16px rgba(139, 92, 246, 0.1);
-        border-left: 4px solid;
-        border-image: linear-gradient(135deg, #8B5CF6, #3B82F6, #10B981) 1;
-    }
-    
-    .sidebar-header {
-        background: linear-gradient(135deg, #8B5CF6 0%, #3B82F6 50%, #10B981 100%);
-        color: white;
-        padding: 1rem;
-        border-radius: 10px;
-        margin-bottom: 1rem;
-        text-align: center;
-        box-shadow: 0 4px 16px rgba(139, 92, 246, 0.2);
-    }
-    
-    .success-message {
-        background: #F0FDF4;
-        border: 1px solid #BBF7D0;
-        color: #166534;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-        font-weight: 500;
-        border-left: 4px solid #10B981;
-    }
-    
-    .error-message {
-        background: #FEF2F2;
-        border: 1px solid #FECACA;
-        color: #DC2626;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-        font-weight: 500;
-        border-left: 4px solid #EF4444;
-    }
-    
-    /* LABELS ET TEXTES */
-    .stMarkdown p, .stMarkdown h1, .stMarkdown h2, .stMarkdown h3 {
-        color: #1F2937 !important;
-    }
-    
-    /* SIDEBAR RESTAURÉE à l'état original */
-    .css-1d391kg {
-        background-color: #F8FAFC !important;
-    }
-    
-    .stSidebar {
-        background-color: #F8FAFC !important;
-    }
-    
-    /* MESSAGES STREAMLIT MODERNISÉS */
-    .stSuccess {
-        background: linear-gradient(135deg, #F0FDF4 0%, #ECFDF5 100%) !important;
-        border: 1px solid #BBF7D0 !important;
-        color: #166534 !important;
-        border-radius: 10px !important;
-        border-left: 4px solid #10B981 !important;
-    }
-    
-    .stError {
-        background: linear-gradient(135deg, #FEF2F2 0%, #FEF2F2 100%) !important;
-        border: 1px solid #FECACA !important;
-        color: #DC2626 !important;
-        border-radius: 10px !important;
-        border-left: 4px solid #EF4444 !important;
-    }
-    
-    .stWarning {
-        background: linear-gradient(135deg, #FFFBEB 0%, #FFFBEB 100%) !important;
-        border: 1px solid #FED7AA !important;
-        color: #D97706 !important;
-        border-radius: 10px !important;
-        border-left: 4px solid #F59E0B !important;
-    }
-    
-    .stInfo {
-        background: linear-gradient(135deg, #EFF6FF 0%, #DBEAFE 100%) !important;
-        border: 1px solid #BFDBFE !important;
-        color: #1E40AF !important;
-        border-radius: 10px !important;
-        border-left: 4px solid #8B5CF6 !important;
-    }
-    
-    /* STYLES KPIs UNIQUEMENT - COULEURS STRATÉGIQUES MÉTIER */
-    
-    /* KPI OPÉRATIONS - Bleu professionnel (confiance, stabilité) */
-    .kpi-operations {
-        background: linear-gradient(145deg, #3B82F6, #2563EB);
-        color: white;
-        width: 200px !important;
-        min-width: 200px !important;
-        max-width: 200px !important;
-        height: 200px !important;
-        min-height: 200px !important;
-        max-height: 200px !important;
-        border-radius: 20px;
-        padding: 1.5rem;
-        box-shadow: 0 10px 40px rgba(59, 130, 246, 0.3);
-        display: flex;
-        flex-direction: column;
-        justify-content: space-between;
-        transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-        cursor: pointer;
-        margin: 0.5rem;
-    }
-    
-    /* KPI REM - Vert performance (succès, croissance) */
-    .kpi-rem {
-        background: linear-gradient(145deg, #10B981, #059669);
-        color: white;
-        width: 200px !important;
-        min-width: 200px !important;
-        max-width: 200px !important;
-        height: 200px !important;
-        min-height: 200px !important;
-        max-height: 200px !important;
-        border-radius: 20px;
-        padding: 1.5rem;
-        box-shadow: 0 10px 40px rgba(16, 185, 129, 0.3);
-        display: flex;
-        flex-direction: column;
-        justify-content: space-between;
-        transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-        cursor: pointer;
-        margin: 0.5rem;
-    }
-    
-    /* KPI FREINS - Orange vigilance (attention, action requise) */
-    .kpi-freins {
-        background: linear-gradient(145deg, #F59E0B, #D97706);
-        color: white;
-        width: 200px !important;
-        min-width: 200px !important;
-        max-width: 200px !important;
-        height: 200px !important;
-        min-height: 200px !important;
-        max-height: 200px !important;
-        border-radius: 20px;
-        padding: 1.5rem;
-        box-shadow: 0 10px 40px rgba(245, 158, 11, 0.3);
-        display: flex;
-        flex-direction: column;
-        justify-content: space-between;
-        transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-        cursor: pointer;
-        margin: 0.5rem;
-    }
-    
-    /* KPI ÉCHÉANCES - Rouge urgence (priorité absolue) */
-    .kpi-echeances {
-        background: linear-gradient(145deg, #EF4444, #DC2626);
-        color: white;
-        width: 200px !important;
-        min-width: 200px !important;
-        max-width: 200px !important;
-        height: 200px !important;
-        min-height: 200px !important;
-        max-height: 200px !important;
-        border-radius: 20px;
-        padding: 1.5rem;
-        box-shadow: 0 10px 40px rgba(239, 68, 68, 0.3);
-        display: flex;
-        flex-direction: column;
-        justify-content: space-between;
-        transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-        cursor: pointer;
-        margin: 0.5rem;
-    }
-    
-    /* ICÔNES 3D MODERNES AVEC EFFETS */
-    .kpi-icon-operations {
-        background: linear-gradient(145deg, #60A5FA, #3B82F6);
-        width: 60px;
-        height: 60px;
-        border-radius: 16px;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        box-shadow: 
-            0 8px 16px rgba(0, 0, 0, 0.1),
-            inset 0 1px 2px rgba(255, 255, 255, 0.2);
-        margin: 0 auto 1rem auto;
-        position: relative;
-    }
-    
-    .kpi-icon-operations::before {
-        content: "📁";
-        font-size: 32px;
-        filter: drop-shadow(4px 4px 8px rgba(59, 130, 246, 0.6));
-    }
-    
-    .kpi-icon-rem {
-        background: linear-gradient(145deg, #34D399, #10B981);
-        width: 60px;
-        height: 60px;
-        border-radius: 16px;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        box-shadow: 
-            0 8px 16px rgba(0, 0, 0, 0.1),
-            inset 0 1px 2px rgba(255, 255, 255, 0.2);
-        margin: 0 auto 1rem auto;
-        position: relative;
-    }
-    
-    .kpi-icon-rem::before {
-        content: "€";
-        font-size: 32px;
-        color: #FFD700;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.5);
-        filter: drop-shadow(3px 3px 6px rgba(255, 215, 0, 0.8));
-        font-weight: bold;
-    }
-    
-    .kpi-icon-freins {
-        background: linear-gradient(145deg, #FBBF24, #F59E0B);
-        width: 60px;
-        height: 60px;
-        border-radius: 16px;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        box-shadow: 
-            0 8px 16px rgba(0, 0, 0, 0.1),
-            inset 0 1px 2px rgba(255, 255, 255, 0.2);
-        margin: 0 auto 1rem auto;
-        position: relative;
-    }
-    
-    .kpi-icon-freins::before {
-        content: "⚠️";
-        font-size: 32px;
-        filter: drop-shadow(3px 3px 6px rgba(245, 158, 11, 0.8));
-    }
-    
-    .kpi-icon-echeances {
-        background: linear-gradient(145deg, #F87171, #EF4444);
-        width: 60px;
-        height: 60px;
-        border-radius: 16px;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        box-shadow: 
-            0 8px 16px rgba(0, 0, 0, 0.1),
-            inset 0 1px 2px rgba(255, 255, 255, 0.2);
-        margin: 0 auto 1rem auto;
-        position: relative;
-    }
-    
-    .kpi-icon-echeances::before {
-        content: "📅";
-        font-size: 32px;
-        filter: drop-shadow(3px 3px 6px rgba(239, 68, 68, 0.8));
-    }
-    
-    /* BOUTONS UNIFORMES 45px */
-    .kpi-button {
-        background: rgba(255, 255, 255, 0.2) !important;
-        border: 1px solid rgba(255, 255, 255, 0.3) !important;
-        min-height: 45px !important;
-        max-height: 45px !important;
-        border-radius: 12px !important;
-        color: white !important;
-        font-weight: 600 !important;
-        margin-top: auto;
-        transition: all 0.3s ease;
-        padding: 0.5rem 1rem;
-    }
-    
-    .kpi-button:hover {
-        background: rgba(255, 255, 255, 0.3) !important;
-        transform: translateY(-2px);
-        box-shadow: 0 4px 12px rgba(0, 0, 0, 0.15);
-    }
-    
-    /* EFFETS HOVER CARDS */
-    .kpi-operations:hover, .kpi-rem:hover, .kpi-freins:hover, .kpi-echeances:hover {
-        transform: translateY(-8px);
-        box-shadow: 0 20px 60px rgba(0, 0, 0, 0.15);
-    }
-    
-    /* CONTENU CENTRÉ DANS LES CARDS */
-    .kpi-content {
-        flex-grow: 1;
-        display: flex;
-        flex-direction: column;
-        justify-content: center;
-        align-items: center;
-        text-align: center;
-        color: white !important;
-    }
-    
-    /* GROS CHIFFRE BLANC */
-    .kpi-value {
-        font-size: 2.5rem !important;
-        font-weight: bold !important;
-        color: white !important;
-        margin: 0.5rem 0 !important;
-        text-shadow: 0 2px 4px rgba(0, 0, 0, 0.3);
-    }
-    
-    /* LABEL PRINCIPAL BLANC */
-    .kpi-label {
-        font-size: 1rem !important;
-        font-weight: 600 !important;
-        color: white !important;
-        margin-bottom: 0.25rem !important;
-        text-shadow: 0 1px 2px rgba(0, 0, 0, 0.2);
-    }
-    
-    /* DÉTAIL BLANC */
-    .kpi-detail {
-        font-size: 0.875rem !important;
-        color: rgba(255, 255, 255, 0.9) !important;
-        margin-bottom: 1rem !important;
-        text-shadow: 0 1px 2px rgba(0, 0, 0, 0.2);
-    }
-    
-    /* Styles communs pour tous les KPIs */
-    .kpi-card {
-        width: 200px !important;
-        height: 200px !important;
-        border-radius: 20px;
-        padding: 1rem;
-        display: flex;
-        flex-direction: column;
-        align-items: center;
-        justify-content: space-between;
-        text-align: center;
-        margin: 0.5rem;
-        transition: all 0.3s ease;
-        cursor: pointer;
-    }
-    
-    .kpi-icon {
-        font-size: 2.5rem;
-        margin-bottom: 0.5rem;
-        text-shadow: 2px 2px 4px rgba(0, 0, 0, 0.2);
-    }
-    
-    .kpi-value {
-        font-size: 2rem;
-        font-weight: bold;
-        margin: 0.5rem 0;
-        text-shadow: 2px 2px 4px rgba(0, 0, 0, 0.2);
-    }
-    
-    .kpi-label {
-        font-size: 1rem;
-        font-weight: 500;
-        margin-top: 0.5rem;
-        line-height: 1.2;
-    }
-    
-    /* KPI OPÉRATIONS - Bleu */
-    .kpi-operations {
-        background: linear-gradient(145deg, #3B82F6, #2563EB);
-        color: white;
-        box-shadow: 0 10px 40px rgba(59, 130, 246, 0.3);
-    }
-    
-    /* KPI REM - Vert */
-    .kpi-rem {
-        background: linear-gradient(145deg, #10B981, #059669);
-        color: white;
-        box-shadow: 0 10px 40px rgba(16, 185, 129, 0.3);
-    }
-    
-    /* KPI FREINS - Orange */
-    .kpi-freins {
-        background: linear-gradient(145deg, #F59E0B, #D97706);
-        color: white;
-        box-shadow: 0 10px 40px rgba(245, 158, 11, 0.3);
-    }
-    
-    /* KPI ÉCHÉANCES - Rouge */
-    .kpi-echeances {
-        background: linear-gradient(145deg, #EF4444, #DC2626);
-        color: white;
-        box-shadow: 0 10px 40px rgba(239, 68, 68, 0.3);
-    }
-</style>
-""", unsafe_allow_html=True)
+# CSS personnalisé MODERNISÉ avec dégradé violet-bleu-vert (opcopilot/styles/*.css)
+@st.cache_resource
+def get_stylesheet():
+    """Feuille de style compilée une fois par processus : lien vers l'asset statique, sinon CSS intégré"""
+    css = theme.compile_css()
+    # static/ est versionné (.gitkeep) : Streamlit ne sert le dossier que s'il existe au démarrage ;
+    # la feuille (non versionnée) y est écrite au premier rendu si absente ou périmée
+    if st.get_option("server.enableStaticServing"):
+        try:
+            static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), theme.STATIC_DIR)
+            return theme.stylesheet_link(theme.write_stylesheet(css, static_dir))
+        except OSError:
+            pass
+    return theme.inline_style(css)
+
+st.markdown(get_stylesheet(), unsafe_allow_html=True)
 
 # ==============================================================================
 # SYSTÈME D'AUTHENTIFICATION CORRIGÉ
@@ -764,6 +142,8 @@ def init_session_state():
         st.session_state.selected_operation = None
     if 'selected_operation_id' not in st.session_state:
         st.session_state.selected_operation_id = None
+    if 'portefeuille_page' not in st.session_state:
+        st.session_state.portefeuille_page = 1
 
 def logout():
     """Déconnexion utilisateur"""
@@ -922,7 +302,9 @@ def page_admin():
     
     st.markdown("### 🔧 Administration OPCOPILOT")
     
-    tab_users, tab_stats, tab_config = st.tabs(["👥 Utilisateurs", "📊 Statistiques", "⚙️ Configuration"])
+    tab_users, tab_stats, tab_workflows, tab_config = st.tabs(
+        ["👥 Utilisateurs", "📊 Statistiques", "🔁 Workflows", "⚙️ Configuration"]
+    )
     
     with tab_users:
         st.markdown("#### Gestion des utilisateurs ACO")
@@ -968,6 +350,53 @@ def page_admin():
         
         with col_stat4:
             st.metric("Erreurs système", "0", delta="-2")
+        
+        # Cache de données partagé
+        st.markdown("#### 🗄️ Cache données")
+        cache_stats = get_data_cache().stats()
+        
+        col_cache1, col_cache2, col_cache3, col_cache4 = st.columns(4)
+        
+        with col_cache1:
+            st.metric("Hits", cache_stats['hits'])
+        
+        with col_cache2:
+            st.metric("Miss", cache_stats['misses'])
+        
+        with col_cache3:
+            st.metric("Rechargements", cache_stats['reloads'])
+        
+        with col_cache4:
+            st.metric("Taux de hit", f"{cache_stats['hit_ratio']}%")
+        
+        st.caption(" • ".join(f"{nom} v{version}" for nom, version in cache_stats['fichiers'].items()))
+        
+        timeline_stats = get_timeline_cache().stats()
+        st.caption(
+            f"Timelines en cache : {timeline_stats['entrees']}/{timeline_stats['max_entries']} • "
+            f"{timeline_stats['hits']} hits • {timeline_stats['misses']} miss • {timeline_stats['evictions']} évictions"
+        )
+        
+        module_stats = get_module_host().stats()
+        st.caption(
+            f"Vues modules en cache : {module_stats['vues']}/{module_stats['max_entries']} • "
+            f"{module_stats['hits']} hits • {module_stats['misses']} miss • {module_stats['prefetched']} préchargées"
+        )
+        
+        alert_stats = get_alert_engine().stats()
+        st.caption(
+            f"Moteur d'alertes : {alert_stats['alertes']} alertes ({alert_stats['candidates']} avant dédoublonnage) • "
+            f"{alert_stats['enregistrements']} enregistrements suivis • {alert_stats['evaluations']} évaluations de règles"
+        )
+        
+        if st.button("🔄 Vider le cache données"):
+            get_data_cache().invalidate()
+            get_timeline_cache().invalidate()
+            get_module_host().invalidate()
+            st.success("Cache données vidé")
+    
+    with tab_workflows:
+        render_admin_workflows()
     
     with tab_config:
         st.markdown("#### Configuration système")
@@ -979,16 +408,124 @@ def page_admin():
         if st.button("💾 Sauvegarder configuration"):
             st.success("Configuration sauvegardée")
 
+def render_admin_workflows():
+    """Instances de workflows du portefeuille et transitions en masse"""
+    st.markdown("#### Workflows du portefeuille")
+    
+    moteur = get_workflow_engine()
+    aujourd_hui = datetime.now().date()
+    
+    # Fin de trimestre : saisie REM ouverte pour toutes les opérations en une passe
+    trimestre, fin_trimestre = workflows.trimestre_echu(aujourd_hui)
+    if st.button(f"📅 Ouvrir la saisie REM {trimestre} (toutes opérations)", key="workflow_rem_trimestre"):
+        nb = moteur.demarrer_lot('workflow_rem', [op['id'] for op in load_operations_portefeuille()],
+                                 fin_trimestre, objet=trimestre)
+        st.success(f"✅ Workflow REM {trimestre} démarré pour {nb} opération(s)")
+    
+    col_workflow, col_etape, col_valider = st.columns([2, 2, 1])
+    
+    with col_workflow:
+        code = st.selectbox("Workflow", list(moteur.workflows), key="workflow_lot")
+    
+    with col_etape:
+        etape = st.selectbox("Étape", ["Toutes", *moteur.workflows[code].noms], key="workflow_lot_etape")
+    
+    with col_valider:
+        st.write("")
+        if st.button("⏭️ Valider en masse", key="workflow_lot_valider"):
+            nb = moteur.avancer_lot(code, aujourd_hui, etape=None if etape == "Toutes" else etape)
+            st.success(f"✅ {nb} instance(s) avancée(s)")
+    
+    # Tableaux après les transitions de ce passage
+    st.dataframe(pd.DataFrame(moteur.stats(aujourd_hui)).rename(columns={
+        'workflow': "Workflow", 'nom': "Nom", 'etapes': "Étapes", 'duree_jours': "Durée (j)",
+        'en_cours': "En cours", 'en_retard': "En retard"
+    }), use_container_width=True, hide_index=True)
+    st.caption(f"{len(moteur)} instance(s) • {moteur.transitions} transition(s) depuis le chargement")
+    
+    en_retard = moteur.en_retard(aujourd_hui)
+    if en_retard:
+        st.markdown("#### ⏰ Étapes en retard")
+        operations = {op['id']: op['nom'] for op in load_operations_portefeuille()}
+        st.dataframe(pd.DataFrame({
+            "Opération": [operations.get(instance['operation_id'], instance['operation_id']) for instance in en_retard],
+            "Workflow": [instance['workflow'] for instance in en_retard],
+            "Objet": [instance['objet'] or '-' for instance in en_retard],
+            "Étape": [instance['etape'] for instance in en_retard],
+            "Responsable": [instance['responsable'] for instance in en_retard],
+            "Échéance": [instance['echeance'].strftime('%d/%m/%Y') for instance in en_retard],
+            "Retard (j)": [(aujourd_hui - instance['echeance']).days for instance in en_retard]
+        }), use_container_width=True, hide_index=True)
+
 # ==============================================================================
 # 1. CONFIGURATION & CHARGEMENT DONNÉES (CRÉER DONNÉES DEMO SI NÉCESSAIRE)
 # ==============================================================================
 
-@st.cache_data
+DEMO_DATA_PATH = 'data/demo_data.json'
+TEMPLATES_PHASES_PATH = 'data/templates_phases.json'
+WORKFLOW_MODULES_PATH = 'data/workflow_modules.json'
+
+# Type MIME des exports Excel (constante locale : opcopilot.export n'est importé qu'au clic)
+MIME_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+@st.cache_resource
+def get_data_cache():
+    """Cache de données partagé entre sessions (invalidé uniquement si data/*.json change)"""
+    return DataCache()
+
+# Versions des domaines de données lues une fois par run (réinitialisé à chaque exécution du script ;
+# mis à jour après une écriture de ce run)
+VERSIONS_RUN = {}
+
+def get_data_versions():
+    """
+    Version de chaque domaine de données (opérations, phases, MED, freins...) : version de la base
+    (incrémentée par les écritures du domaine, traitements de masse compris) si elle est disponible,
+    sinon empreinte de demo_data.json pour tous les domaines
+    """
+    if not VERSIONS_RUN:
+        engine = get_db_engine()
+        if engine is not None:
+            with persistence.get_sessionmaker(engine)() as session:
+                VERSIONS_RUN.update(persistence.get_db_versions(session))
+        else:
+            VERSIONS_RUN.update(dict.fromkeys(persistence.DOMAINES, get_json_version()))
+    return VERSIONS_RUN
+
+def cle_donnees(*domaines):
+    """Clé de cache : versions des seuls domaines lus par le cache"""
+    versions = get_data_versions()
+    return "-".join(f"{domaine}{versions[domaine]}" for domaine in domaines)
+
+def ecrire_en_base(ecrire, *domaines):
+    """
+    Écriture en base (ecrire(session) → résultat ; la persistence incrémente la version des domaines écrits).
+    Retourne (résultat, a_jour) : a_jour si aucune autre écriture n'a eu lieu depuis le début du run ;
+    les objets en cache mis à jour de façon incrémentale par l'appelant sont alors réenregistrés
+    sous les nouvelles versions (getter(precedent=...)) au lieu d'être reconstruits
+    """
+    avant = dict(get_data_versions())
+    with get_db_session() as session:
+        resultat = ecrire(session)
+        apres = persistence.get_db_versions(session)
+    VERSIONS_RUN.clear()
+    VERSIONS_RUN.update(apres)
+    return resultat, apres == {domaine: version + (domaine in domaines) for domaine, version in avant.items()}
+
+def get_templates_version():
+    """Empreinte de templates_phases.json (plannings générés pour les opérations sans phases)"""
+    load_templates_phases()
+    return get_data_cache().version(TEMPLATES_PHASES_PATH)
+
+def get_json_version():
+    """Empreinte de demo_data.json (caches lus directement dans le JSON, quelle que soit la source)"""
+    load_demo_data()
+    return get_data_cache().version(DEMO_DATA_PATH)
+
 def load_demo_data():
     """Charge demo_data.json avec données de fallback"""
     try:
-        with open('data/demo_data.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return get_data_cache().get(DEMO_DATA_PATH)
     except FileNotFoundError:
         # Données de fallback si le fichier n'existe pas
         return create_fallback_demo_data()
@@ -1133,12 +670,10 @@ def create_fallback_demo_data():
         ]
     }
 
-@st.cache_data
 def load_templates_phases():
     """Charge templates_phases.json avec données de fallback"""
     try:
-        with open('data/templates_phases.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return get_data_cache().get(TEMPLATES_PHASES_PATH)
     except FileNotFoundError:
         # Template de fallback
         return {
@@ -1175,6 +710,372 @@ def load_templates_phases():
         st.error("❌ Erreur format JSON dans templates_phases.json")
         return {}
 
+def load_workflow_modules():
+    """Charge workflow_modules.json (aucun workflow si le fichier est absent)"""
+    try:
+        return get_data_cache().get(WORKFLOW_MODULES_PATH)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        st.error("❌ Erreur format JSON dans workflow_modules.json")
+        return {}
+
+@st.cache_resource
+def build_db_engine():
+    """
+    Moteur SQLAlchemy poolé créé une fois par processus + import initial depuis demo_data.json
+    (un échec lève une exception : non mis en cache, nouvelle tentative au run suivant)
+    """
+    engine = persistence.create_db_engine()
+    persistence.init_db(engine)
+    with persistence.get_sessionmaker(engine)() as session:
+        persistence.import_demo_data(session, load_demo_data())
+    return engine
+
+# Cause de l'indisponibilité de la base pendant ce run (réinitialisé à chaque exécution du script :
+# une seule tentative de connexion par run)
+DB_INDISPONIBLE = {}
+
+def get_db_engine():
+    """Moteur de la base, None si elle est indisponible (lecture JSON ; cause dans DB_INDISPONIBLE)"""
+    if DB_INDISPONIBLE:
+        return None
+    try:
+        return build_db_engine()
+    except Exception as e:
+        DB_INDISPONIBLE['erreur'] = str(e)
+        return None
+
+def get_db_session():
+    """Session base de données (None si la base est indisponible)"""
+    engine = get_db_engine()
+    if engine is None:
+        return None
+    return persistence.get_sessionmaker(engine)()
+
+def read_phases_operation(engine, demo_data, operation_id):
+    """Phases d'une opération sans appel Streamlit (utilisable en tâche de fond)"""
+    if engine is not None:
+        with persistence.get_sessionmaker(engine)() as session:
+            phases = persistence.get_phases(session, operation_id)
+        if phases:
+            return phases
+    
+    return demo_data.get('phases_demo', {}).get(f'operation_{operation_id}', [])
+
+@st.cache_resource(max_entries=2)
+def build_portfolio_index(data_version):
+    """Index secondaires du portefeuille, construits une fois par version de demo_data.json"""
+    return portfolio.PortfolioIndex(load_demo_data().get('operations_demo', []))
+
+def query_portefeuille(filtres, tri='id', descendant=False, page=1, page_size=None):
+    """Opérations filtrées/triées/paginées : WHERE SQL si la base est disponible, sinon index mémoire"""
+    session = get_db_session()
+    if session is not None:
+        with session:
+            return portfolio.query_operations_sql(session, filtres, tri, descendant, page, page_size)
+    
+    load_demo_data()
+    index = build_portfolio_index(get_data_cache().version(DEMO_DATA_PATH))
+    return index.query(filtres, tri, descendant, page, page_size)
+
+def export_planning_operation(engine, demo_data, operation, phases):
+    """Classeur xlsx du planning d'une opération (sans appel Streamlit : généré au clic)"""
+    cle = f"operation_{operation['id']}"
+    trimestres, avenants = [], []
+    if engine is not None:
+        with persistence.get_sessionmaker(engine)() as session:
+            trimestres = persistence.get_rem_trimestres(session, operation['id'])
+            avenants = persistence.get_avenants(session, operation['id'])
+    return export.export_operation(
+        operation, phases,
+        trimestres or demo_data.get('rem_demo', {}).get(cle, []),
+        avenants or demo_data.get('avenants_demo', {}).get(cle, [])
+    )
+
+def export_planning_portefeuille(engine, index, demo_data, templates, filtres, tri, descendant):
+    """
+    Classeur xlsx du portefeuille filtré, une feuille par opération (sans appel Streamlit : généré au clic).
+    Opérations et données lues en flux, classeur écrit ligne à ligne.
+    """
+    if engine is not None:
+        with persistence.get_sessionmaker(engine)() as session:
+            operations = portfolio.query_operations_sql(session, filtres, tri, descendant)['operations']
+            return export.export_portefeuille(export.plannings_base(session, operations, templates))
+    operations = index.query(filtres, tri, descendant)['operations']
+    return export.export_portefeuille(export.plannings_demo(operations, demo_data, templates))
+
+@st.cache_resource(max_entries=2)
+def build_compiled_templates(templates_version):
+    """Templates de phases précompilés en colonnes, une fois par version de templates_phases.json"""
+    return schedule.compile_templates(load_templates_phases())
+
+def get_compiled_templates():
+    """Templates compilés pour la version courante des données"""
+    load_templates_phases()
+    return build_compiled_templates(get_data_cache().version(TEMPLATES_PHASES_PATH))
+
+@st.cache_resource(max_entries=2)
+def build_compiled_workflows(workflows_version):
+    """Workflows compilés en tables de transitions, une fois par version de workflow_modules.json"""
+    return workflows.compile_workflows(load_workflow_modules())
+
+def get_compiled_workflows():
+    """Workflows compilés pour la version courante de workflow_modules.json"""
+    load_workflow_modules()
+    return build_compiled_workflows(get_data_cache().version(WORKFLOW_MODULES_PATH))
+
+@st.cache_resource(max_entries=2)
+def build_workflow_engine(json_version, workflows_version):
+    """Instances de workflows du portefeuille (partagées entre sessions, mises à jour en place)"""
+    return workflows.WorkflowEngine.from_demo_data(get_compiled_workflows(), load_demo_data())
+
+def get_workflow_engine():
+    """Moteur de workflows pour la version courante des données"""
+    get_compiled_workflows()
+    return build_workflow_engine(get_json_version(), get_data_cache().version(WORKFLOW_MODULES_PATH))
+
+def load_operations_portefeuille():
+    """Toutes les opérations (base si disponible, sinon demo_data.json)"""
+    session = get_db_session()
+    if session is not None:
+        with session:
+            return persistence.list_operations(session)
+    return load_demo_data().get('operations_demo', [])
+
+def load_phases_portefeuille(operations):
+    """Phases de toutes les opérations ({id: [phases]}), planning template pour celles sans phases"""
+    session = get_db_session()
+    if session is not None:
+        with session:
+            phases_par_operation = persistence.get_all_phases(session)
+    else:
+        phases_par_operation = {
+            int(cle.rsplit('_', 1)[-1]): phases
+            for cle, phases in load_demo_data().get('phases_demo', {}).items()
+        }
+    
+    templates = get_compiled_templates()
+    for op in operations:
+        if not phases_par_operation.get(op['id']):
+            phases_par_operation[op['id']] = schedule.generate_phases(templates, op)
+    return phases_par_operation
+
+@st.cache_resource(max_entries=2)
+def build_portfolio_cpm(versions, templates_version, jour):
+    """Chemin critique et marges de tout le portefeuille (une fois par version des opérations/phases et par jour)"""
+    operations = load_operations_portefeuille()
+    return cpm.portfolio_cpm(operations, load_phases_portefeuille(operations), aujourd_hui=jour)
+
+def get_portfolio_cpm():
+    """Résultat CPM portefeuille pour la version courante des opérations et phases"""
+    return build_portfolio_cpm(cle_donnees('operations', 'phases'), get_templates_version(),
+                               datetime.now().date().isoformat())
+
+@st.cache_resource(max_entries=2)
+def build_deadline_index(versions, templates_version, jour):
+    """Index des échéances ouvertes triées par date (une fois par version des domaines lus et par jour)"""
+    cpm_resultats, operations = get_portfolio_cpm(), load_operations_portefeuille()
+    session = get_db_session()
+    if session is not None:
+        with session:
+            return deadlines.DeadlineIndex.from_session(cpm_resultats, operations, session)
+    return deadlines.DeadlineIndex.from_demo_data(cpm_resultats, operations, load_demo_data())
+
+def get_deadline_index():
+    """Index des échéances pour la version courante des données"""
+    return build_deadline_index(cle_donnees('operations', 'phases', 'med', 'gpa', 'concessionnaires'),
+                                get_templates_version(), datetime.now().date().isoformat())
+
+@st.cache_resource(max_entries=2)
+def build_frein_registry(versions, _precedent=None):
+    """
+    Registre des freins indexé (priorité, vieillissement), chargé une fois par version des freins ;
+    _precedent : registre déjà à jour d'une écriture de ce processus, conservé sous la nouvelle version
+    """
+    if _precedent is not None:
+        return _precedent
+    session = get_db_session()
+    if session is not None:
+        with session:
+            return freins.FreinRegistry.from_session(session, persistence.list_operations(session))
+    return freins.FreinRegistry.from_demo_data(load_demo_data())
+
+def get_frein_registry(precedent=None):
+    """Registre des freins pour la version courante des données"""
+    return build_frein_registry(cle_donnees('operations', 'freins'), _precedent=precedent)
+
+@st.cache_resource(max_entries=2)
+def build_med_tracker(versions, _precedent=None):
+    """
+    Échéances de conformité et relances MED du portefeuille (tas), chargées une fois par version de données ;
+    _precedent : suivi déjà à jour d'une écriture de ce processus, conservé sous la nouvelle version
+    """
+    if _precedent is not None:
+        return _precedent
+    session = get_db_session()
+    if session is not None:
+        with session:
+            return conformite.MedTracker.from_session(session, persistence.list_operations(session))
+    return conformite.MedTracker.from_demo_data(load_demo_data())
+
+def get_med_tracker(precedent=None):
+    """Suivi MED pour la version courante des données"""
+    return build_med_tracker(cle_donnees('operations', 'med'), _precedent=precedent)
+
+@st.cache_resource(max_entries=2)
+def build_concessionnaire_matrix(versions, workflows_version):
+    """Matrice opération × concessionnaire × étape du portefeuille, construite une fois par version de données"""
+    definitions = load_workflow_modules().get('workflow_concessionnaires', {}).get('concessionnaires', {})
+    session = get_db_session()
+    if session is not None:
+        with session:
+            return concessionnaires.ConcessionnaireMatrix.from_session(
+                session, definitions, persistence.list_operations(session))
+    return concessionnaires.ConcessionnaireMatrix.from_demo_data(load_demo_data(), definitions)
+
+def get_concessionnaire_matrix():
+    """Matrice concessionnaires pour la version courante des données"""
+    load_workflow_modules()
+    return build_concessionnaire_matrix(cle_donnees('operations', 'concessionnaires'),
+                                        get_data_cache().version(WORKFLOW_MODULES_PATH))
+
+@st.cache_resource(max_entries=2)
+def build_dgd_ledger(versions):
+    """Registre DGD du portefeuille (lots recalculés au centime), construit une fois par version de données"""
+    session = get_db_session()
+    if session is not None:
+        with session:
+            return dgd.DgdLedger.from_session(session)
+    return dgd.DgdLedger.from_demo_data(load_demo_data())
+
+def get_dgd_ledger():
+    """Registre DGD pour la version courante des données"""
+    return build_dgd_ledger(cle_donnees('operations', 'dgd', 'avenants'))
+
+@st.cache_resource
+def get_reminder_dispatcher():
+    """Répartiteur de relances partagé (transport configuré par l'environnement)"""
+    return relances.ReminderDispatcher(relances.transport_depuis_env())
+
+@st.cache_resource(max_entries=1)
+def build_med_generator(workflows_version):
+    """Générateur de lettres MED (pool de processus persistant, modèles analysés une fois par processus)"""
+    definitions = load_workflow_modules().get('workflow_med', {}).get('templates_med', [])
+    return courriers.MedLetterGenerator(definitions=definitions)
+
+def get_med_generator():
+    """Générateur de lettres MED pour la version courante de workflow_modules.json"""
+    load_workflow_modules()
+    return build_med_generator(get_data_cache().version(WORKFLOW_MODULES_PATH))
+
+def load_rem_portefeuille(annee):
+    """REM de l'exercice par opération : GROUP BY en base, sinon agrégation de rem_demo"""
+    session = get_db_session()
+    if session is not None:
+        with session:
+            return kpis.rem_par_operation_sql(session, annee)
+    return kpis.rem_par_operation(load_demo_data().get('rem_demo', {}), annee)
+
+@st.cache_resource(max_entries=2)
+def build_rem_ledger(versions):
+    """Registre REM colonnes de tout le portefeuille (une fois par version de données)"""
+    session = get_db_session()
+    if session is not None:
+        with session:
+            return rem.RemLedger.from_session(session)
+    return rem.RemLedger.from_records(load_demo_data().get('rem_demo', {}))
+
+def get_rem_ledger():
+    """Registre REM pour la version courante des données"""
+    return build_rem_ledger(cle_donnees('rem'))
+
+@st.cache_resource(max_entries=2)
+def build_kpi_summary(versions, templates_version, jour, _precedent=None):
+    """
+    Synthèse KPI par ACO (une agrégation par version des domaines lus et par jour) ;
+    _precedent : synthèse déjà à jour d'une écriture de ce processus, conservée sous la nouvelle version
+    """
+    if _precedent is not None:
+        return _precedent
+    annee = get_rem_ledger().exercice(datetime.fromisoformat(jour).date())
+    operations = load_operations_portefeuille()
+    phases_kpis = kpis.phases_par_operation_kpis(get_portfolio_cpm(), aujourd_hui=jour)
+    contributions = kpis.operation_contributions(operations, load_rem_portefeuille(annee), phases_kpis)
+    return kpis.KpiSummaryCache(contributions, annee)
+
+def get_kpi_summary(precedent=None):
+    """Synthèse KPI pour la version courante des données"""
+    return build_kpi_summary(cle_donnees('operations', 'phases', 'rem', 'freins'), get_templates_version(),
+                             datetime.now().date().isoformat(), _precedent=precedent)
+
+NB_ACTIONS_DASHBOARD = 5
+
+@st.cache_resource(max_entries=2)
+def build_alert_engine(versions, json_version, workflows_version, _precedent=None):
+    """
+    Moteur d'alertes chargé une fois par version de données (ensuite : événements et passage des jours) ;
+    _precedent : moteur déjà à jour d'une écriture de ce processus, conservé sous la nouvelle version
+    """
+    if _precedent is not None:
+        return _precedent
+    aujourd_hui = datetime.now().date()
+    session = get_db_session()
+    if session is not None:
+        # Phases, MED, REM, GPA et alertes mises en file par les traitements de masse, lues en base
+        with session:
+            engine = alerts.AlertEngine.from_session(session, aujourd_hui)
+    else:
+        engine = alerts.AlertEngine.from_demo_data(load_demo_data(), aujourd_hui)
+    
+    # Instances de workflow en cours (moteur en mémoire)
+    instances = {}
+    for instance in get_workflow_engine().en_cours():
+        instances.setdefault(instance['operation_id'], []).append(dict(instance))
+    for operation_id, enregistrements in instances.items():
+        engine.replace_records('workflow', operation_id, enregistrements)
+    engine.process()
+    return engine
+
+def get_alert_engine(precedent=None):
+    """Moteur d'alertes à jour de la date courante (seules les échéances atteintes sont réévaluées)"""
+    get_compiled_workflows()
+    engine = build_alert_engine(cle_donnees('operations', 'phases', 'med', 'rem', 'gpa', 'alertes'),
+                                get_json_version(), get_data_cache().version(WORKFLOW_MODULES_PATH),
+                                _precedent=precedent)
+    engine.set_today(datetime.now().date())
+    return engine
+
+def refresh_alertes_operation(operation_id, operation_data=None, engine=None, **enregistrements):
+    """
+    Événements d'alerte après modification d'une opération (operation_data : nom, ACO, statut...)
+    ou de ses enregistrements (phase=[...], med=[...], rem=[...], gpa=[...], workflow=[...]) ;
+    engine fourni par les traitements hors script Streamlit (envoi des relances)
+    """
+    engine = engine or get_alert_engine()
+    if operation_data is not None:
+        engine.update_operation(operation_data)
+    for source, records in enregistrements.items():
+        engine.replace_records(source, operation_id, records)
+    engine.process()
+
+@st.cache_resource(max_entries=64)
+def build_journal_actions(json_version, aco):
+    """Journal des actions réalisées (par version de demo_data.json et par ACO)"""
+    return journal.journal_actions(load_demo_data(), aco=aco)
+
+def get_journal_actions(aco=None):
+    """Actions réalisées les plus récentes (tout le portefeuille si aco est None)"""
+    return build_journal_actions(get_json_version(), aco)
+
+def format_montant_court(montant):
+    """Montant abrégé pour les cartes KPI (1,2M€ / 485k€)"""
+    if abs(montant) >= 1_000_000:
+        return f"{montant / 1_000_000:.1f}M€".replace('.', ',')
+    if abs(montant) >= 1_000:
+        return f"{montant / 1_000:.0f}k€"
+    return f"{montant:.0f}€"
+
 def get_couleur_statut(statut):
     """Retourne la couleur selon le statut de phase"""
     couleurs = {
@@ -1193,12 +1094,17 @@ def get_couleur_statut(statut):
 # 2. TIMELINE HORIZONTALE OBLIGATOIRE (IDENTIQUE MAIS COULEURS MODERNISÉES)
 # ==============================================================================
 
-def create_timeline_horizontal(operation_data, phases_data):
+def create_timeline_horizontal(operation_data, phases_data, messages=None):
     """
     Timeline Plotly style INFOGRAPHIQUE MODERNE avec gestion d'erreur robuste
     Reproduit le style roadmap professionnel avec validation complète des données
     MODERNISÉE avec dégradé violet-bleu-vert
+    Une trace par couche visuelle (nombre de traces constant quel que soit le nombre de phases)
+    Sans appel Streamlit (constructeur de vue, tâche de fond) : les anomalies sont ajoutées
+    à `messages` en (niveau, texte) et affichées par l'onglet
     """
+    messages = messages if messages is not None else []
+    
     
     def create_empty_timeline():
         """Timeline vide en cas de données manquantes"""
@@ -1243,323 +1149,698 @@ def create_timeline_horizontal(operation_data, phases_data):
     try:
         # VALIDATION DONNÉES D'ENTRÉE
         if not operation_data:
-            st.warning("⚠️ Données d'opération manquantes")
+            messages.append(('warning', "⚠️ Données d'opération manquantes"))
             return create_empty_timeline()
         
         if not phases_data or len(phases_data) == 0:
-            st.info("ℹ️ Aucune phase définie pour cette opération")
+            messages.append(('info', "ℹ️ Aucune phase définie pour cette opération"))
             return create_empty_timeline()
         
         # Validation que phases_data est une liste
         if not isinstance(phases_data, list):
-            st.error("❌ Format de données phases incorrect")
+            messages.append(('error', "❌ Format de données phases incorrect"))
             return create_fallback_timeline("Format phases_data incorrect")
         
-        # PRÉPARATION DONNÉES SÉCURISÉE
-        fig = go.Figure()
-        
-        # Validation et préparation des dates
-        dates_debut = []
-        dates_fin = []
-        phases_valides = []
-        
-        for i, phase in enumerate(phases_data):
-            try:
-                # Vérification que phase est un dict
-                if not isinstance(phase, dict):
-                    continue
-                
-                # Gestion sécurisée des dates
-                date_debut_str = phase.get('date_debut_prevue')
-                date_fin_str = phase.get('date_fin_prevue')
-                
-                # Dates par défaut si manquantes
-                if not date_debut_str:
-                    debut = datetime.now() + timedelta(days=i*30)
-                else:
-                    debut = pd.to_datetime(date_debut_str)
-                
-                if not date_fin_str:
-                    fin = debut + timedelta(days=30)
-                else:
-                    fin = pd.to_datetime(date_fin_str)
-                
-                # Validation cohérence dates
-                if fin < debut:
-                    fin = debut + timedelta(days=30)
-                
-                dates_debut.append(debut)
-                dates_fin.append(fin)
-                phases_valides.append(phase)
-                
-            except Exception as e:
-                # Log de l'erreur mais continue avec les autres phases
-                st.warning(f"⚠️ Erreur phase {i+1}: {str(e)}")
-                continue
-        
-        # Vérification qu'on a au moins une phase valide
-        if not phases_valides:
-            st.error("❌ Aucune phase valide trouvée")
-            return create_fallback_timeline("Aucune phase valide")
-        
-        # Calcul des bornes temporelles
-        date_min = min(dates_debut)
-        date_max = max(dates_fin)
-        
-        # BARRE HORIZONTALE AVEC ESPACEMENT ÉGAL - Timeline chronologique
-        if len(phases_valides) > 1:
-            # Positions équidistantes (chronologie simple, pas durées)
-            x_positions = list(range(len(phases_valides)))
-            
-            # Couleurs du dégradé (jaune → orange → rouge → violet → bleu)
-            couleurs_degrade = [
-                "#FFD54F",  # Jaune
-                "#FF9800",  # Orange  
-                "#F44336",  # Rouge
-                "#E91E63",  # Rose/Violet
-                "#673AB7",  # Violet
-                "#2E7D32"   # Bleu-vert foncé
-            ]
-            
-            # Segments de la barre avec espacement égal
-            for i in range(len(phases_valides) - 1):
-                debut = x_positions[i]
-                fin = x_positions[i + 1]
-                
-                # Couleur du segment
-                couleur_segment = couleurs_degrade[i % len(couleurs_degrade)]
-                
-                # Segment de barre coloré
-                fig.add_trace(go.Scatter(
-                    x=[debut, fin],
-                    y=[0, 0],
-                    mode='lines',
-                    line=dict(width=20, color=couleur_segment),
-                    showlegend=False,
-                    hoverinfo='skip'
-                ))
-                
-                # Triangle/flèche sur la barre (style modèle)
-                milieu_segment = debut + (fin - debut) / 2
-                y_triangle = 0.15 if i % 2 == 0 else -0.15
-                fig.add_trace(go.Scatter(
-                    x=[milieu_segment],
-                    y=[y_triangle],
-                    mode='markers',
-                    marker=dict(
-                        size=15,
-                        color=couleur_segment,
-                        symbol='triangle-up' if i % 2 == 0 else 'triangle-down'
-                    ),
-                    showlegend=False,
-                    hoverinfo='skip'
-                ))
-        
-        # CERCLES AVEC DATES MM/YY - Espacement chronologique égal
-        for i, phase in enumerate(phases_valides):
-            try:
-                debut_date = dates_debut[i]  # Date réelle pour format MM/YY
-                x_pos = i  # Position équidistante (chronologique)
-                statut = phase.get('statut', 'NON_DEMARREE')
-                nom_phase = phase.get('nom', f'Phase {i+1}')
-                
-                # Couleur assortie au dégradé
-                couleurs_cercles = [
-                    "#FFD54F", "#FF9800", "#F44336", 
-                    "#E91E63", "#673AB7", "#2E7D32"
-                ]
-                couleur = couleurs_cercles[i % len(couleurs_cercles)]
-                
-                # Position alternée (PRÉSERVER espacement qui fonctionne)
-                est_en_haut = i % 2 == 0
-                y_cercle = 0.8 if est_en_haut else -0.8
-                y_ligne_debut = 0.15 if est_en_haut else -0.15
-                
-                # LIGNE VERTICALE DE CONNEXION (PRÉSERVÉE)
-                fig.add_trace(go.Scatter(
-                    x=[x_pos, x_pos],
-                    y=[y_ligne_debut, y_cercle - (0.25 if est_en_haut else -0.25)],
-                    mode='lines',
-                    line=dict(width=3, color=couleur),
-                    showlegend=False,
-                    hoverinfo='skip'
-                ))
-                
-                # FORMAT DATE MM/YY pour cercle
-                date_formatted = debut_date.strftime('%m/%y')  # Format 07/25, 01/26, etc.
-                
-                # CERCLE PRINCIPAL avec DATE INTÉGRÉE
-                fig.add_trace(go.Scatter(
-                    x=[x_pos],
-                    y=[y_cercle],
-                    mode='markers+text',
-                    marker=dict(
-                        size=80,  # Gros pour date complète
-                        color=couleur,
-                        symbol='circle',
-                        line=dict(width=5, color='white')
-                    ),
-                    text=[date_formatted],  # DATE MM/YY dans cercle
-                    textfont=dict(size=16, color='white', family='Arial Bold'),
-                    textposition='middle center',
-                    showlegend=False,
-                    hovertemplate=f"<b>Phase {i+1}</b><br>{nom_phase}<br>Date: {debut_date.strftime('%d/%m/%Y')}<extra></extra>"
-                ))
-                
-                # TITRE ET DESCRIPTION (ESPACEMENT PRÉSERVÉ)
-                # Afficher nom complet (non tronqué)
-                nom_complet = nom_phase  # Texte complet
-                
-                # Titre principal (position préservée)
-                y_titre = y_cercle + (0.4 if est_en_haut else -0.4)
-                fig.add_trace(go.Scatter(
-                    x=[x_pos],
-                    y=[y_titre],
-                    mode='text',
-                    text=[f"<b>PHASE {i+1:02d}</b>"],
-                    textfont=dict(size=15, color='#333333', family='Arial Black'),
-                    textposition='middle center',
-                    showlegend=False,
-                    hoverinfo='skip'
-                ))
-                
-                # Description complète (espacement préservé, texte complet)
-                y_desc = y_cercle + (0.6 if est_en_haut else -0.6)
-                fig.add_trace(go.Scatter(
-                    x=[x_pos],
-                    y=[y_desc],
-                    mode='text',
-                    text=[f"{nom_complet}<br><span style='color:#999999;font-size:10px'>Statut: {statut}</span>"],
-                    textfont=dict(size=12, color='#666666', family='Arial'),
-                    textposition='middle center',
-                    showlegend=False,
-                    hoverinfo='skip'
-                ))
-                    
-            except Exception as e:
-                st.warning(f"⚠️ Erreur phase {i+1}: {str(e)}")
-                continue
-        
-        # LAYOUT TIMELINE CHRONOLOGIQUE (espacement égal, pas durées)
-        operation_nom = operation_data.get('nom', 'Opération') if isinstance(operation_data, dict) else 'Opération'
-        
-        fig.update_layout(
-            title={
-                'text': f"🗓️ Timeline Interactive - {operation_nom}",
-                'x': 0.5,
-                'xanchor': 'center',
-                'font': {'size': 22, 'color': '#333333', 'family': 'Arial Black'}
-            },
-            # Fond gris clair comme modèle
-            plot_bgcolor='rgba(240, 240, 240, 0.3)',
-            paper_bgcolor='#f5f5f5',
-            
-            # SUPPRESSION COMPLÈTE AXE X (chronologie dans cercles)
-            xaxis=dict(
-                range=[-0.5, len(phases_valides) - 0.5],  # Range pour espacement égal
-                visible=False,        # Complètement invisible
-                showticklabels=False,
-                showgrid=False,
-                zeroline=False,
-                showline=False
-            ),
-            # AXE Y masqué mais fonctionnel pour alternance
-            yaxis=dict(
-                range=[-1.8, 1.8],    # Range préservée pour alternance
-                visible=False,        # Invisible
-                showgrid=False,
-                showticklabels=False,
-                zeroline=False,
-                showline=False
-            ),
-            height=600,  # Hauteur préservée
-            margin=dict(l=50, r=50, t=100, b=50),
-            hovermode='closest',
-            dragmode='pan',
-            font=dict(size=12, color='#333333', family='Arial'),
-            showlegend=False
-        )
-        
-        # Configuration outils
-        config = {
-            'displayModeBar': True,
-            'modeBarButtonsToAdd': ['pan2d', 'zoomin2d', 'zoomout2d', 'resetScale2d'],
-            'modeBarButtonsToRemove': ['lasso2d', 'select2d', 'autoScale2d'],
-            'displaylogo': False,
-            'toImageButtonOptions': {
-                'format': 'png',
-                'filename': f"timeline_{operation_nom.replace(' ', '_')}",
-                'height': 500,
-                'width': 1200,
-                'scale': 2
-            }
-        }
-        
-        return fig, config
+        # CONSTRUCTION VECTORISÉE (dates parsées en une passe, couches groupées)
+        phases_valides, dates_debut, _ = timeline.prepare_phase_dates(phases_data)
+        if not phases_valides:
+            messages.append(('error', "❌ Aucune phase valide trouvée"))
+            return create_fallback_timeline("Aucune phase valide")
+        return timeline.create_timeline_batched(operation_data, phases_valides, dates_debut)
         
     except Exception as e:
         # Gestion d'erreur globale
         error_msg = str(e)
-        st.error(f"❌ Erreur critique timeline: {error_msg}")
+        messages.append(('error', f"❌ Erreur critique timeline: {error_msg}"))
         return create_fallback_timeline(error_msg)
 
+@st.cache_resource
+def get_timeline_cache():
+    """Cache LRU des figures timeline partagé entre sessions"""
+    return timeline.TimelineFigureCache(max_entries=128)
+
 # ==============================================================================
 # 3. MODULES INTÉGRÉS PAR OPÉRATION (SIMPLIFIÉS POUR LA DÉMO)
 # ==============================================================================
 
-def module_rem(operation_id):
+@st.cache_resource
+def get_module_host():
+    """Hôte des modules opération (vues mémorisées + préchargement) partagé entre sessions"""
+    return ModuleHost(max_entries=256)
+
+def build_timeline_view(operation, phases_data, templates, timeline_cache, jour):
+    """Vue Timeline : phases (planning template si aucune), figure mémorisée et anomalies à afficher"""
+    # Si pas de phases spécifiques, planning généré depuis le template du type (vectorisé)
+    if not phases_data:
+        phases_data = schedule.schedule_to_phases(schedule.generate_schedule(templates, operation))
+    
+    if not phases_data:
+        return {'phases': [], 'figure': None, 'config': None, 'operation': operation, 'messages': []}
+    
+    messages = []
+    timeline_fig, config = timeline_cache.get_or_build(
+        operation, phases_data, lambda op, phases: create_timeline_horizontal(op, phases, messages=messages), jour
+    )
+    return {'phases': phases_data, 'figure': timeline_fig, 'config': config, 'operation': operation,
+            'messages': messages}
+
+def build_rem_view(ledger, operation_id):
+    """Vue REM : trimestres de l'opération, synthèse et consolidation portefeuille"""
+    trimestres = ledger.operation(operation_id)
+    if trimestres.empty:
+        return None
+    return {
+        'trimestres': trimestres,
+        'synthese': ledger.synthese_operation(operation_id),
+        'consolide': ledger.rollup(),
+        'fenetre': ledger.fenetre
+    }
+
+def build_med_view(tracker, operation):
+    """Vue MED : MED de l'opération (suivi des échéances), valeurs des lettres et tableau de suivi"""
+    meds = tracker.operation(operation.get('id'))
+    if not meds:
+        return None
+    lettres = [courriers.valeurs_lettre(med, operation) for med in meds]
+    return {
+        'lettres': lettres,
+        'tableau': pd.DataFrame([{
+            'Référence': lettre['reference'],
+            'Type': lettre['type_libelle'],
+            'Destinataire': lettre['destinataire'],
+            'Motif': lettre['motif'],
+            'Envoi': lettre['date_envoi'],
+            'Échéance': lettre['date_limite'],
+            'Délai': etat_delai_med(med),
+            'Prochaine relance': f"{med['prochaine_relance']:%d/%m/%Y} ({med['niveau_relance'].lower()})"
+            if med['prochaine_relance'] else '-',
+            'Statut': med.get('statut', '')
+        } for med, lettre in zip(meds, lettres)])
+    }
+
+def build_concessionnaires_view(matrice, operation_id):
+    """Vue Concess. : étapes de l'opération et avancement par concessionnaire, consolidation du portefeuille"""
+    vue = {'matrice': matrice, 'courantes': None, 'etapes': None, 'portefeuille': None}
+    etapes = matrice.operation(operation_id)
+    if not etapes.empty:
+        vue['courantes'] = matrice.courantes.loc[operation_id]
+        vue['etapes'] = pd.DataFrame({
+            'Concessionnaire': etapes['concessionnaire'],
+            'Étape': etapes['etape'],
+            'Statut': etapes['statut'],
+            'Date': etapes['date_libelle'].fillna('-'),
+            'Délai standard (j)': etapes['delai_standard'],
+            'Responsable': etapes['responsable'].fillna('')
+        })
+    if len(matrice):
+        # Opérations les moins avancées d'abord, opération courante toujours affichée
+        avancement = matrice.courantes['avancement'].groupby(level='operation_id').mean().sort_values()
+        operation_ids = list(avancement.index[:NB_OPERATIONS_HEATMAP])
+        if operation_id in avancement.index and operation_id not in operation_ids:
+            operation_ids[-1] = operation_id
+        vue['portefeuille'] = {
+            'operations': len(avancement),
+            'heatmap': heatmap_concessionnaires(matrice, operation_ids),
+            'synthese': matrice.synthese().rename(columns={
+                'concessionnaire': 'Concessionnaire', 'operations': 'Opérations', 'raccordees': 'Raccordées',
+                'avancement_moyen': 'Avancement moyen (%)', 'etape_frequente': 'Étape en cours la plus fréquente'
+            }),
+            'delais': matrice.delais_moyens()
+        }
+    return vue
+
+def build_dgd_view(registre, operation_id):
+    """Vue DGD : lots recalculés, ligne de rapprochement et avenants de l'opération"""
+    lots = registre.lots(operation_id)
+    if lots.empty:
+        return None
+    return {
+        'synthese': registre.synthese_operation(operation_id),
+        'lots': pd.DataFrame({
+            'Lot': lots['nom'],
+            'Statut': lots['statut'],
+            'Marché initial': lots['marche_initial'].astype(float),
+            'Quantités (%)': lots['quantites_reelles'] / 100,
+            'Plus/moins-value': lots['plus_moins_value_calculee'].astype(float),
+            'Pénalités': lots['penalites_retenues'].astype(float),
+            'Montant final': lots['montant_final_calcule'].astype(float),
+            'Montant saisi': lots['montant_final'].astype(float),
+            'Écart': lots['ecart_saisie'].astype(float)
+        }),
+        'avenants': registre.avenants_operation(operation_id)
+    }
+
+def operation_view_builders(operation):
+    """
+    Constructeurs de vue des modules d'une opération
+    Les ressources partagées sont résolues ici (thread Streamlit) : les constructeurs
+    eux-mêmes n'appellent pas Streamlit et peuvent tourner en tâche de fond.
+    """
+    operation_id = operation.get('id')
+    engine = get_db_engine()
+    demo_data = load_demo_data()
+    templates = get_compiled_templates()
+    timeline_cache = get_timeline_cache()
+    ledger = get_rem_ledger()
+    tracker = get_med_tracker()
+    matrice = get_concessionnaire_matrix()
+    registre = get_dgd_ledger()
+    jour = datetime.now().date().isoformat()
+    
+    return {
+        'timeline': lambda: build_timeline_view(
+            operation, read_phases_operation(engine, demo_data, operation_id), templates, timeline_cache, jour
+        ),
+        'rem': lambda: build_rem_view(ledger, operation_id),
+        'med': lambda: build_med_view(tracker, operation),
+        'concessionnaires': lambda: build_concessionnaires_view(matrice, operation_id),
+        'dgd': lambda: build_dgd_view(registre, operation_id)
+    }
+
+def module_timeline(operation_id, view=None):
+    """Module Timeline intégré dans l'opération"""
+    st.markdown("### 📅 Timeline Horizontale - Gestion des Phases")
+    
+    # Anomalies relevées à la construction de la vue (hors thread Streamlit)
+    for niveau, texte in (view or {}).get('messages', []):
+        {'info': st.info, 'warning': st.warning, 'error': st.error}[niveau](texte)
+    
+    # Affichage timeline horizontale
+    if view and view['phases']:
+        if view['figure']:
+            st.plotly_chart(view['figure'], use_container_width=True, config=view['config'])
+            
+            # Gestion des phases
+            st.markdown("#### 🔧 Gestion des Phases")
+            
+            col_phase1, col_phase2, col_phase3, col_phase4 = st.columns(4)
+            
+            with col_phase1:
+                if st.button("➕ Ajouter Phase"):
+                    st.success("✅ Interface d'ajout de phase")
+            
+            with col_phase2:
+                if st.button("✏️ Modifier Phase"):
+                    st.info("🔄 Mode modification activé")
+            
+            with col_phase3:
+                if st.button("⚠️ Signaler Frein"):
+                    st.warning("🚨 Frein signalé sur phase sélectionnée")
+            
+            with col_phase4:
+                # Classeur généré au clic, hors du script : la page n'attend pas l'export
+                engine = get_db_engine()
+                demo_data = load_demo_data()
+                operation, phases = view['operation'], view['phases']
+                st.download_button(
+                    "📊 Exporter Planning",
+                    data=lambda: export_planning_operation(engine, demo_data, operation, phases),
+                    file_name=f"planning_{operation_id}.xlsx",
+                    mime=MIME_XLSX,
+                    on_click="ignore",
+                    key=f"export_planning_{operation_id}"
+                )
+    else:
+        st.warning("⚠️ Aucune phase définie pour cette opération")
+
+def module_rem(operation_id, view=None):
     """Module REM intégré dans l'opération"""
     st.markdown("### 💰 Module REM - Suivi Trimestriel")
-    st.info("📊 Module REM en cours de développement - Version complète disponible prochainement")
+    render_workflows_operation(operation_id, 'workflow_rem')
+    
+    if view is None:
+        st.info("📊 Aucun trimestre REM saisi pour cette opération")
+        return
+    
+    trimestres = view['trimestres']
+    synthese = view['synthese']
+    
+    col_rem1, col_rem2, col_rem3, col_rem4 = st.columns(4)
+    
+    with col_rem1:
+        st.metric("REM projetée", f"{synthese['rem_projetee']:,.0f} €")
+    
+    with col_rem2:
+        st.metric("REM réalisée", f"{synthese['rem_realisee']:,.0f} €",
+                  delta=f"{synthese['ecart_rem']:+,.0f} €")
+    
+    with col_rem3:
+        st.metric("Taux de réalisation", f"{synthese['taux_realisation']}%",
+                  help=f"{synthese['trimestres_saisis']}/{synthese['trimestres']} trimestres saisis")
+    
+    with col_rem4:
+        st.metric("Atterrissage prévisionnel", f"{synthese['rem_atterrissage']:,.0f} €",
+                  help=f"Trimestres non saisis projetés au ratio des {view['fenetre']} derniers trimestres saisis")
+    
+    # Projeté vs réalisé par trimestre, cumul et prévision
+    fig_rem = go.Figure()
+    fig_rem.add_trace(go.Bar(
+        x=trimestres['trimestre'], y=trimestres['rem_projetee'],
+        name='REM projetée', marker_color='#C4B5FD'
+    ))
+    fig_rem.add_trace(go.Bar(
+        x=trimestres['trimestre'], y=trimestres['rem_realisee'],
+        name='REM réalisée', marker_color='#8B5CF6'
+    ))
+    fig_rem.add_trace(go.Scatter(
+        x=trimestres['trimestre'], y=trimestres['rem_prevision'].cumsum(),
+        name='Cumul prévisionnel', mode='lines+markers',
+        line=dict(color='#10B981', width=3, dash='dot')
+    ))
+    fig_rem.add_trace(go.Scatter(
+        x=trimestres['trimestre'], y=trimestres['rem_realisee_cumulee'],
+        name='Cumul réalisé', mode='lines+markers',
+        line=dict(color='#3B82F6', width=3)
+    ))
+    fig_rem.update_layout(
+        barmode='group',
+        yaxis=dict(title="REM (€)"),
+        height=400,
+        hovermode='x unified',
+        plot_bgcolor='rgba(139, 92, 246, 0.02)',
+        paper_bgcolor='#f9fafb'
+    )
+    st.plotly_chart(fig_rem, use_container_width=True)
+    
+    df_rem = pd.DataFrame({
+        "Trimestre": trimestres['trimestre'],
+        "REM projetée": trimestres['rem_projetee'],
+        "REM réalisée": trimestres['rem_realisee'],
+        "Écart REM": trimestres['ecart_rem'],
+        "Avancement REM": trimestres['avancement_rem'],
+        "Dépenses projetées": trimestres['depenses_projetees'],
+        "Dépenses facturées": trimestres['depenses_facturees'],
+        "Écart dépenses": trimestres['ecart_depenses'],
+        "Avancement travaux": trimestres['avancement_travaux'],
+        "Prévision REM": trimestres['rem_prevision']
+    })
+    format_euros = st.column_config.NumberColumn(format="%.0f €")
+    format_pourcent = st.column_config.NumberColumn(format="%d%%")
+    st.dataframe(df_rem, use_container_width=True, hide_index=True, column_config={
+        "REM projetée": format_euros, "REM réalisée": format_euros, "Écart REM": format_euros,
+        "Dépenses projetées": format_euros, "Dépenses facturées": format_euros,
+        "Écart dépenses": format_euros, "Prévision REM": format_euros,
+        "Avancement REM": format_pourcent, "Avancement travaux": format_pourcent
+    })
+    
+    with st.expander("📈 Consolidation portefeuille par trimestre"):
+        consolide = view['consolide']
+        st.dataframe(pd.DataFrame({
+            "Trimestre": consolide['trimestre'],
+            "Opérations": consolide['operations'],
+            "Saisies": consolide['operations_saisies'],
+            "REM projetée": consolide['rem_projetee'],
+            "REM réalisée": consolide['rem_realisee'],
+            "Prévision REM": consolide['rem_prevision'],
+            "Avancement REM": consolide['avancement_rem']
+        }), use_container_width=True, hide_index=True, column_config={
+            "REM projetée": format_euros, "REM réalisée": format_euros,
+            "Prévision REM": format_euros, "Avancement REM": format_pourcent
+        })
 
-def module_avenants(operation_id):
+def render_workflows_operation(operation_id, code):
+    """Instances en cours d'un workflow sur l'opération (étape, responsable, échéance) et validation d'étape"""
+    moteur = get_workflow_engine()
+    instances = [
+        instance for instance in moteur.instances_operation(operation_id)
+        if instance['workflow'].split('.')[0] == code and not instance['termine']
+    ]
+    if not instances:
+        return
+    
+    aujourd_hui = datetime.now().date()
+    st.markdown("#### 🔁 Workflow en cours")
+    st.dataframe(pd.DataFrame({
+        "Objet": [instance['objet'] or instance['workflow'].partition('.')[2] or '-' for instance in instances],
+        "Étape": [instance['etape'] for instance in instances],
+        "Responsable": [instance['responsable'] for instance in instances],
+        "Depuis": [instance['debut_etape'].strftime('%d/%m/%Y') for instance in instances],
+        "Échéance": [instance['echeance'].strftime('%d/%m/%Y') for instance in instances],
+        "Fin prévue": [instance['fin_prevue'].strftime('%d/%m/%Y') for instance in instances],
+        "Statut": ["🔴 En retard" if instance['echeance'] < aujourd_hui else "🟢 Dans les délais"
+                   for instance in instances]
+    }), use_container_width=True, hide_index=True)
+    
+    col_instance, col_valider = st.columns([3, 1])
+    
+    with col_instance:
+        position = st.selectbox(
+            "Instance", range(len(instances)), key=f"workflow_instance_{code}", label_visibility="collapsed",
+            format_func=lambda i: f"{instances[i]['objet'] or instances[i]['workflow']} - {instances[i]['etape']}"
+        )
+    
+    with col_valider:
+        if st.button("✅ Valider l'étape", key=f"workflow_avancer_{code}"):
+            instance = instances[position]
+            moteur.avancer(operation_id, instance['workflow'], aujourd_hui, instance['objet'])
+            refresh_alertes_operation(operation_id, workflow=[
+                dict(instance) for instance in moteur.instances_operation(operation_id) if not instance['termine']
+            ])
+            st.rerun()
+
+def module_avenants(operation_id, view=None):
     """Module Avenants intégré dans l'opération"""
     st.markdown("### 📝 Module Avenants")
     st.info("📝 Module Avenants en cours de développement - Version complète disponible prochainement")
+    render_workflows_operation(operation_id, 'workflow_avenants')
 
-def module_med(operation_id):
+def module_med(operation_id, view=None):
     """Module MED Automatisé intégré dans l'opération"""
     st.markdown("### ⚖️ Module MED Automatisé")
-    st.info("⚖️ Module MED en cours de développement - Version complète disponible prochainement")
+    render_workflows_operation(operation_id, 'workflow_med')
+    
+    if view is None:
+        st.info("⚖️ Aucune mise en demeure émise pour cette opération")
+    else:
+        lettres = view['lettres']
+        st.dataframe(view['tableau'], use_container_width=True, hide_index=True)
+        
+        col_lettre, col_telecharger = st.columns([3, 1])
+        with col_lettre:
+            position = st.selectbox("Lettre", range(len(lettres)), key=f"med_lettre_{operation_id}",
+                                    format_func=lambda i: f"{lettres[i]['reference']} - {lettres[i]['destinataire']}",
+                                    label_visibility="collapsed")
+        with col_telecharger:
+            # Lettre rendue au clic, hors du script (modèle déjà analysé dans ce processus)
+            generateur, valeurs = get_med_generator(), lettres[position]
+            st.download_button(
+                "📄 Lettre Word",
+                data=lambda: generateur.generer(valeurs)[1],
+                file_name=courriers.nom_fichier(valeurs),
+                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                on_click="ignore",
+                key=f"med_telecharger_{operation_id}",
+                use_container_width=True
+            )
+    
+    render_lot_med()
+
+def etat_delai_med(med):
+    """Libellé du délai de conformité d'une MED du suivi"""
+    if not med['ouverte']:
+        return "✅ Clos"
+    if med['retard_jours']:
+        return f"🔴 Dépassé de {med['retard_jours']} j"
+    return f"🟠 {med['jours_restants']} j restants" if med['jours_restants'] <= 7 else f"🟢 {med['jours_restants']} j restants"
+
+def render_lot_med():
+    """Lot mensuel des lettres MED du portefeuille : généré en arrière-plan, téléchargé en zip"""
+    st.markdown("#### 📦 Lot mensuel des mises en demeure")
+    # MED du suivi des échéances (table med si la base est disponible, sinon med_demo)
+    meds = get_med_tracker().meds()
+    mois = courriers.mois_disponibles(meds)
+    if not mois:
+        st.caption("Aucune mise en demeure émise")
+        return
+    
+    user_data = st.session_state.user_data
+    aco = None if user_data.get('role') == 'ADMIN' else user_data.get('nom')
+    
+    col_mois, col_generer = st.columns([3, 1])
+    with col_mois:
+        annee, numero = st.selectbox("Mois d'envoi", mois, format_func=lambda m: f"{m[1]:02d}/{m[0]}",
+                                     key="med_lot_mois", label_visibility="collapsed")
+    with col_generer:
+        en_cours = st.session_state.get('med_lot') is not None and not st.session_state.med_lot.termine
+        if st.button("📦 Générer le lot", key="med_lot_generer", disabled=en_cours, use_container_width=True):
+            lettres = courriers.lettres_du_mois(meds, load_operations_portefeuille(), annee, numero, aco=aco)
+            st.session_state.med_lot = get_med_generator().start(lettres)
+            st.session_state.med_lot.mois = f"{annee}-{numero:02d}"
+    
+    if st.session_state.get('med_lot') is not None:
+        render_suivi_lot_med()
+
+def render_suivi_lot_med():
+    """Résultat du lot de lettres MED (avancement rafraîchi seul tant que la génération tourne)"""
+    job = st.session_state.med_lot
+    if not job.termine:
+        render_progression_lot_med()
+        return
+    
+    _, generees, echecs = job.progression()
+    if job.erreur:
+        st.error(f"❌ Génération interrompue : {job.erreur}")
+        return
+    if job.total == 0:
+        st.info("ℹ️ Aucune mise en demeure envoyée ce mois-ci")
+        return
+    if echecs:
+        st.warning(f"⚠️ {generees} lettre(s) générée(s), {echecs} échec(s)")
+        st.dataframe(pd.DataFrame(job.echecs), use_container_width=True, hide_index=True)
+    else:
+        st.success(f"📄 {generees} lettre(s) générée(s) en {job.duree:.1f} s")
+    st.download_button(
+        "📥 Télécharger le lot (zip)",
+        data=job.archive,
+        file_name=f"MED_{job.mois}.zip",
+        mime="application/zip",
+        on_click="ignore",
+        key="med_lot_telecharger"
+    )
+
+@st.fragment(run_every=1)
+def render_progression_lot_med():
+    """Barre d'avancement (seul ce fragment est réexécuté) ; page complète rafraîchie à la fin du lot"""
+    job = st.session_state.med_lot
+    if job.termine:
+        st.rerun()
+    traitees, _, _ = job.progression()
+    st.progress(traitees / job.total if job.total else 1.0,
+                text=f"📄 Génération des lettres MED : {traitees}/{job.total}")
+
+NB_OPERATIONS_HEATMAP = 40
 
-def module_concessionnaires(operation_id):
+def module_concessionnaires(operation_id, view=None):
     """Module Concessionnaires intégré dans l'opération"""
     st.markdown("### 🔌 Module Concessionnaires")
-    st.info("🔌 Module Concessionnaires en cours de développement - Version complète disponible prochainement")
+    render_workflows_operation(operation_id, 'workflow_concessionnaires')
+    
+    if view['etapes'] is None:
+        st.info("🔌 Aucun raccordement concessionnaire suivi pour cette opération")
+    else:
+        courantes = view['courantes']
+        colonnes = st.columns(len(courantes))
+        for col, (concessionnaire, suivi) in zip(colonnes, courantes.iterrows()):
+            with col:
+                st.metric(concessionnaire, f"{suivi['avancement']:.0f}%",
+                          help=f"{suivi['validees']}/{suivi['etapes']} étapes validées")
+                st.caption("✅ Raccordé" if suivi['raccordee'] else f"➡️ {suivi['etape']} ({suivi['statut'].lower()})")
+        
+        st.dataframe(view['etapes'], use_container_width=True, hide_index=True)
+    
+    render_matrice_concessionnaires(view)
+
+def render_matrice_concessionnaires(view):
+    """Vue portefeuille : heatmap des statuts, opérations en attente d'une étape, délais moyens"""
+    st.markdown("#### 🗺️ Avancement concessionnaires du portefeuille")
+    portefeuille = view['portefeuille']
+    if portefeuille is None:
+        st.caption("Aucune étape concessionnaire dans le portefeuille")
+        return
+    
+    matrice = view['matrice']
+    if portefeuille['operations'] > NB_OPERATIONS_HEATMAP:
+        st.caption(f"{NB_OPERATIONS_HEATMAP} opérations les moins avancées sur {portefeuille['operations']}")
+    st.plotly_chart(portefeuille['heatmap'], use_container_width=True)
+    
+    st.dataframe(portefeuille['synthese'], use_container_width=True, hide_index=True)
+    
+    st.markdown("#### ⏳ Opérations en attente d'une étape")
+    col_concessionnaire, col_etape = st.columns(2)
+    with col_concessionnaire:
+        concessionnaire = st.selectbox("Concessionnaire", matrice.concessionnaires(), key="concess_attente")
+    with col_etape:
+        etapes = matrice.etapes(concessionnaire)
+        etape = st.selectbox("Étape", etapes, index=len(etapes) - 1, key=f"concess_attente_etape_{concessionnaire}")
+    attente = matrice.en_attente(concessionnaire, etape)
+    if attente.empty:
+        st.success(f"✅ Aucune opération en attente : {concessionnaire} - {etape}")
+    else:
+        st.dataframe(pd.DataFrame({
+            'Opération': attente['operation'],
+            'Statut étape': attente['statut'],
+            'Étape en cours': attente['etape'].fillna('-'),
+            'Statut en cours': attente['statut_courante'].fillna('-'),
+            'Dernière validation': attente['derniere_validation'].dt.strftime('%d/%m/%Y').fillna('-'),
+            'Attente (j)': attente['attente_jours']
+        }), use_container_width=True, hide_index=True)
+    
+    st.markdown("#### ⏱️ Délais constatés par étape")
+    delais = portefeuille['delais']
+    if delais.empty:
+        st.caption("Pas encore assez d'étapes validées pour mesurer des délais")
+    else:
+        st.dataframe(delais.round(1).rename(columns={
+            'concessionnaire': 'Concessionnaire', 'etape': 'Étape', 'operations': 'Opérations',
+            'delai_moyen': 'Moyen (j)', 'delai_median': 'Médian (j)', 'delai_max': 'Max (j)',
+            'delai_standard': 'Standard (j)', 'ecart_standard': 'Écart (j)'
+        }), use_container_width=True, hide_index=True)
 
-def module_dgd(operation_id):
+def heatmap_concessionnaires(matrice, operation_ids):
+    """Heatmap opérations × étapes, une couleur par statut (cases vides : étape absente)"""
+    codes = matrice.matrice(operation_ids).reindex(operation_ids)
+    abscisses = [f"{concessionnaire} · {etape}" for concessionnaire, etape in codes.columns]
+    ordonnees = [f"{matrice.noms.get(i, i)}" for i in codes.index]
+    libelles = codes.apply(lambda colonne: colonne.map(concessionnaires.LIBELLES_CODE)).fillna('')
+    
+    nb_codes = len(concessionnaires.COULEURS_CODE)
+    echelle = []
+    for code, couleur in concessionnaires.COULEURS_CODE.items():
+        echelle += [[code / nb_codes, couleur], [(code + 1) / nb_codes, couleur]]
+    
+    fig = go.Figure(go.Heatmap(
+        z=codes.to_numpy(dtype=float), x=abscisses, y=ordonnees, text=libelles.to_numpy(),
+        zmin=-0.5, zmax=nb_codes - 0.5, colorscale=echelle, xgap=2, ygap=2,
+        hovertemplate="%{y}<br>%{x}<br><b>%{text}</b><extra></extra>",
+        colorbar=dict(tickvals=list(concessionnaires.LIBELLES_CODE),
+                      ticktext=list(concessionnaires.LIBELLES_CODE.values()))
+    ))
+    fig.update_layout(
+        height=max(250, 120 + 28 * len(ordonnees)),
+        margin=dict(l=10, r=10, t=30, b=10),
+        xaxis=dict(side='top', tickangle=-45),
+        yaxis=dict(autorange='reversed'),
+        plot_bgcolor='white',
+        paper_bgcolor='white'
+    )
+    return fig
+
+def module_dgd(operation_id, view=None):
     """Module DGD intégré dans l'opération"""
     st.markdown("### 📊 Module DGD - Décompte Général Définitif")
-    st.info("📊 Module DGD en cours de développement - Version complète disponible prochainement")
+    render_workflows_operation(operation_id, 'workflow_dgd')
+    
+    if view is None:
+        st.info("📊 Aucun lot DGD saisi pour cette opération")
+    else:
+        synthese = view['synthese']
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Marché initial", f"{synthese['marche_initial']:,.2f} €")
+        with col2:
+            st.metric("Plus/moins-values", f"{synthese['plus_moins_values']:+,.2f} €",
+                      help=f"Pénalités retenues : {synthese['penalites']:,.2f} €")
+        with col3:
+            st.metric("DGD", f"{synthese['montant_dgd']:,.2f} €", delta=f"{synthese['ecart_pourcentage']:+.1f}%",
+                      delta_color="inverse", help=f"Avenants validés : {synthese['avenants_valides']:,.2f} €")
+        with col4:
+            st.metric("Marge budget", f"{synthese['marge_budget']:,.2f} €",
+                      help=f"Après avenants en attente : {synthese['marge_apres_avenants']:,.2f} €")
+        
+        format_euros = st.column_config.NumberColumn(format="%.2f €")
+        st.dataframe(view['lots'], use_container_width=True, hide_index=True, column_config={
+            colonne: format_euros for colonne in
+            ['Marché initial', 'Plus/moins-value', 'Pénalités', 'Montant final', 'Montant saisi', 'Écart']
+        })
+        
+        if synthese['lots_incoherents']:
+            st.warning(f"⚠️ {synthese['lots_incoherents']} lot(s) dont le montant saisi diffère du recalcul "
+                       f"(écart {synthese['ecart_saisie']:+,.2f} €) - corrigé(s) au règlement annuel")
+        if synthese['penalites_plafonnees']:
+            st.caption(f"Pénalités plafonnées à {dgd.PLAFOND_PENALITES} % du marché initial du lot")
+        if synthese['depassement_budget']:
+            st.error(f"🚨 Dépassement du budget de l'opération : {-synthese['marge_budget']:,.2f} €")
+        
+        avenants = view['avenants']
+        if not avenants.empty:
+            st.markdown("#### 📝 Avenants")
+            st.dataframe(pd.DataFrame({
+                'N°': avenants['numero'],
+                'Date': avenants['date'].dt.strftime('%d/%m/%Y').fillna('-'),
+                'Motif': avenants['motif'],
+                'Impact': avenants['impact_budget'].astype(float),
+                'Statut': avenants['statut'],
+                'Pris en compte': avenants['applique']
+            }), use_container_width=True, hide_index=True, column_config={'Impact': format_euros})
+    
+    render_reglement_dgd(get_dgd_ledger())
 
-def module_gpa(operation_id):
+def render_reglement_dgd(registre):
+    """Rapprochement DGD / budget du portefeuille pour un exercice, téléchargé en xlsx (généré au clic)"""
+    st.markdown("#### 🧾 Règlement annuel du portefeuille")
+    if not len(registre):
+        st.caption("Aucun lot DGD dans le portefeuille")
+        return
+    annees = sorted({datetime.now().year, *registre.avenants['date'].dt.year.dropna().astype(int)}, reverse=True)
+    col_annee, col_rapport = st.columns([1, 2])
+    with col_annee:
+        annee = st.selectbox("Exercice", annees, key="dgd_exercice", label_visibility="collapsed")
+    rapport = registre.rapprochement(annee)
+    total = rapport.iloc[-1]
+    with col_rapport:
+        st.download_button(
+            f"📥 Rapport de rapprochement {annee} (Excel)",
+            data=lambda: dgd.rapport_excel(rapport, registre.corrections(), annee),
+            file_name=f"rapport_dgd_{annee}.xlsx",
+            mime=MIME_XLSX,
+            on_click="ignore",
+            key="dgd_rapport",
+            use_container_width=True
+        )
+    st.caption(f"{len(rapport) - 1} opération(s) • DGD {total['montant_dgd']:,.2f} € • "
+               f"{int(rapport['depassement_budget'].iloc[:-1].sum())} dépassement(s) budget • "
+               f"{total['lots_incoherents']} lot(s) à corriger - écriture en base : python -m opcopilot.dgd --annee {annee}")
+
+def module_gpa(operation_id, view=None):
     """Module GPA intégré dans l'opération"""
     st.markdown("### 🛡️ Module GPA - Garantie Parfait Achèvement")
     st.info("🛡️ Module GPA en cours de développement - Version complète disponible prochainement")
+    render_workflows_operation(operation_id, 'workflow_gpa')
 
-def module_cloture(operation_id):
+def module_cloture(operation_id, view=None):
     """Module Clôture intégré dans l'opération"""
     st.markdown("### ✅ Module Clôture - Finalisation Opération")
     st.info("✅ Module Clôture en cours de développement - Version complète disponible prochainement")
+    render_workflows_operation(operation_id, 'workflow_cloture')
 
 # ==============================================================================
 # 4. NAVIGATION ACO-CENTRIQUE
 # ==============================================================================
 
+def render_delais_med(aco):
+    """Délais de conformité MED (lus dans le tas d'échéances) et envoi des relances programmées"""
+    suivi = get_med_tracker()
+    stats = suivi.stats(datetime.now().date(), aco=aco)
+    
+    st.markdown("### ⚖️ Délais de Conformité MED")
+    col_med1, col_med2, col_med3, col_med4 = st.columns(4)
+    with col_med1:
+        st.metric("MED ouvertes", stats['ouvertes'])
+    with col_med2:
+        st.metric("Délais dépassés", stats['en_retard'])
+    with col_med3:
+        st.metric("Échéance ≤ 7 jours", stats['a_echeance'])
+    with col_med4:
+        envoi = st.session_state.get('relances_med_envoi')
+        if st.button(f"📨 Envoyer {stats['relances_dues']} relance(s) due(s)", key="relances_med",
+                     disabled=not stats['relances_dues'] or (envoi is not None and not envoi.termine),
+                     use_container_width=True):
+            st.session_state.relances_med_envoi = lancer_relances_med(suivi, aco)
+    
+    if st.session_state.get('relances_med_envoi') is not None:
+        render_suivi_relances('relances_med_envoi')
+
 def page_dashboard():
     """Dashboard principal avec KPIs ACO INTERACTIFS MODERNISÉS"""
     
     # Chargement données
     demo_data = load_demo_data()
-    kpis_data = demo_data.get('kpis_aco_demo', {})
     activite_data = demo_data.get('activite_mensuelle_demo', {})
-    alertes_data = demo_data.get('alertes_demo', [])
     
     user_data = st.session_state.user_data
     nom_aco = user_data.get('nom', 'ACO')
     
+    # KPIs agrégés (lookup dans la synthèse par ACO ; vue portefeuille pour l'administrateur)
+    kpi_summary = get_kpi_summary()
+    kpis_data = kpi_summary.get(None if user_data.get('role') == 'ADMIN' else nom_aco)
+    
+    nb_operations = kpis_data['operations_actives']
+    rem_total_formatted = format_montant_court(kpis_data['rem_realisee'])
+    nb_freins = kpis_data['freins_actifs']
+    nb_echeances = kpis_data['echeances_semaine']
+    
     st.markdown(f"""
-    <div class="main-header">
+    <div class="main-header page-dashboard">
         <h1>🏗️ OPCOPILOT v4.0 - Tableau de Bord Opérationnel</h1>
         <h2>Mon Tableau de Bord - {nom_aco}</h2>
         <p>Interface de Gestion d'Opérations • SPIC Guadeloupe</p>
@@ -1571,242 +1852,65 @@ def page_dashboard():
     
     with st.container():
         st.markdown(f"""
-        <div style="display: flex; justify-content: center; align-items: center; flex-wrap: wrap; gap: 1rem;">
+        <div class="kpi-row">
             <div class="kpi-card primary">
-                <div style="font-size: 3rem; margin-bottom: 1rem;">📁</div>
-                <div style="font-size: 2.5rem; font-weight: bold;">{nb_operations}</div>
-                <div style="font-size: 1.2rem; margin-top: 0.5rem;">Opérations en cours</div>
+                <div class="kpi-card-icon">📁</div>
+                <div class="kpi-card-value">{nb_operations}</div>
+                <div class="kpi-card-label">Opérations en cours</div>
             </div>
             
             <div class="kpi-card success">
-                <div style="font-size: 3rem; margin-bottom: 1rem;">€</div>
-                <div style="font-size: 2.5rem; font-weight: bold;">{rem_total_formatted}</div>
-                <div style="font-size: 1.2rem; margin-top: 0.5rem;">REM Total</div>
+                <div class="kpi-card-icon">€</div>
+                <div class="kpi-card-value">{rem_total_formatted}</div>
+                <div class="kpi-card-label">REM Réalisée {kpis_data['annee']}</div>
             </div>
             
             <div class="kpi-card warning">
-                <div style="font-size: 3rem; margin-bottom: 1rem;">⚠️</div>
-                <div style="font-size: 2.5rem; font-weight: bold;">{nb_freins}</div>
-                <div style="font-size: 1.2rem; margin-top: 0.5rem;">Points de blocage</div>
+                <div class="kpi-card-icon">⚠️</div>
+                <div class="kpi-card-value">{nb_freins}</div>
+                <div class="kpi-card-label">Points de blocage</div>
             </div>
             
             <div class="kpi-card danger">
-                <div style="font-size: 3rem; margin-bottom: 1rem;">📅</div>
-                <div style="font-size: 2.5rem; font-weight: bold;">{nb_echeances}</div>
-                <div style="font-size: 1.2rem; margin-top: 0.5rem;">Échéances à venir</div>
+                <div class="kpi-card-icon">📅</div>
+                <div class="kpi-card-value">{nb_echeances}</div>
+                <div class="kpi-card-label">Échéances 7 jours</div>
             </div>
         </div>
         """, unsafe_allow_html=True)
     
-    # Alertes et actions MODERNISÉES ET SIMPLIFIÉES
-    st.markdown("### 🚨 Alertes et Actions Prioritaires")
+    col_kpi1, col_kpi2, col_kpi3, col_kpi4 = st.columns(4)
+    with col_kpi1:
+        st.metric(f"Taux réalisation REM {kpis_data['annee']}", f"{kpis_data['taux_realisation_rem']}%")
+    with col_kpi2:
+        st.metric("Phases en retard", kpis_data['phases_retard'])
+    with col_kpi3:
+        st.metric("Validations requises", kpis_data['validations_requises'])
+    with col_kpi4:
+        st.metric("Opérations clôturées", kpis_data['operations_cloturees'])
     
-    # CSS simplifié pour actions réalisées uniquement
-    st.markdown("""
-    <style>
-    /* SIDEBAR RESTAURÉE à l'état original */
-    .css-1d391kg {
-        background-color: #F8FAFC !important;
-    }
+    aco_filtre = None if user_data.get('role') == 'ADMIN' else nom_aco
+    render_delais_med(aco_filtre)
     
-    .stSidebar {
-        background-color: #F8FAFC !important;
-    }
+    # Alertes et actions : une section = un seul st.markdown (gabarits précompilés)
+    st.markdown("### 🚨 Alertes et Actions Prioritaires")
     
-    /* ACTIONS RÉALISÉES - VERT FORCÉ (pas violet) */
-    .stButton > button[data-testid="baseButton-primary"] {
-        background: linear-gradient(145deg, #D1FAE5, #10B981) !important;
-        border: none !important;
-        border-left: 4px solid #10B981 !important;
-        border-radius: 15px !important;
-        padding: 1rem !important;
-        box-shadow: 0 4px 15px rgba(16, 185, 129, 0.15) !important;
-        transition: all 0.3s ease !important;
-        width: 100% !important;
-        color: white !important;
-        font-weight: 600 !important;
-        text-align: left !important;
-        white-space: pre-line !important;
-    }
-    
-    .stButton > button[data-testid="baseButton-primary"]:hover {
-        transform: translateY(-2px) !important;
-        box-shadow: 0 6px 20px rgba(16, 185, 129, 0.25) !important;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    alert_engine = get_alert_engine()
+    alertes = alert_engine.alertes(aco_filtre)
     
     col_alert1, col_alert2 = st.columns(2)
     
     with col_alert1:
         st.markdown("#### Alertes Critiques")
-        
-        # ALERTE 1 - CRITIQUE ROUGE (Card seule, sans bouton)
-        st.markdown("""
-        <div style="background: linear-gradient(145deg, #FEE2E2, #FECACA); 
-                    border-left: 4px solid #EF4444; 
-                    border-radius: 15px; 
-                    padding: 1.25rem; 
-                    margin: 0.75rem 0; 
-                    box-shadow: 0 6px 20px rgba(239, 68, 68, 0.15); 
-                    cursor: pointer; 
-                    transition: all 0.3s ease;"
-             onmouseover="this.style.transform='translateY(-3px)'; this.style.boxShadow='0 8px 30px rgba(239, 68, 68, 0.25)'"
-             onmouseout="this.style.transform='translateY(0px)'; this.style.boxShadow='0 6px 20px rgba(239, 68, 68, 0.15)'">
-            <div style="font-weight: 700; font-size: 1.1rem; color: #DC2626; margin-bottom: 0.5rem;">🏗️ COUR CHARNEAU</div>
-            <div style="color: #DC2626; margin: 0.5rem 0; font-size: 0.95rem;">Retard MOE 5 jours sur phase LBU</div>
-            <div style="color: #DC2626; font-style: italic; font-size: 0.9rem; opacity: 0.9;">Action: Relance urgente MOE</div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # ALERTE 2 - ATTENTION JAUNE (Card seule, sans bouton)
-        st.markdown("""
-        <div style="background: linear-gradient(145deg, #FEF3C7, #FDE68A); 
-                    border-left: 4px solid #F59E0B; 
-                    border-radius: 15px; 
-                    padding: 1.25rem; 
-                    margin: 0.75rem 0; 
-                    box-shadow: 0 6px 20px rgba(245, 158, 11, 0.15); 
-                    cursor: pointer; 
-                    transition: all 0.3s ease;"
-             onmouseover="this.style.transform='translateY(-3px)'; this.style.boxShadow='0 8px 30px rgba(245, 158, 11, 0.25)'"
-             onmouseout="this.style.transform='translateY(0px)'; this.style.boxShadow='0 6px 20px rgba(245, 158, 11, 0.15)'">
-            <div style="font-weight: 700; font-size: 1.1rem; color: #D97706; margin-bottom: 0.5rem;">🏠 VEFA BELCOURT</div>
-            <div style="color: #D97706; margin: 0.5rem 0; font-size: 0.95rem;">Validation promoteur en attente</div>
-            <div style="color: #D97706; font-style: italic; font-size: 0.9rem; opacity: 0.9;">Action: RDV programmé cette semaine</div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # ALERTE 3 - INFORMATION BLEU CLAIR (Card seule, sans bouton)
-        st.markdown("""
-        <div style="background: linear-gradient(145deg, #DBEAFE, #BFDBFE); 
-                    border-left: 4px solid #3B82F6; 
-                    border-radius: 15px; 
-                    padding: 1.25rem; 
-                    margin: 0.75rem 0; 
-                    box-shadow: 0 6px 20px rgba(59, 130, 246, 0.15); 
-                    cursor: pointer; 
-                    transition: all 0.3s ease;"
-             onmouseover="this.style.transform='translateY(-3px)'; this.style.boxShadow='0 8px 30px rgba(59, 130, 246, 0.25)'"
-             onmouseout="this.style.transform='translateY(0px)'; this.style.boxShadow='0 6px 20px rgba(59, 130, 246, 0.15)'">
-            <div style="font-weight: 700; font-size: 1.1rem; color: #2563EB; margin-bottom: 0.5rem;">🏗️ RÉSIDENCE SOLEIL</div>
-            <div style="color: #2563EB; margin: 0.5rem 0; font-size: 0.95rem;">Phase Travaux en cours - bon avancement</div>
-            <div style="color: #2563EB; font-style: italic; font-size: 0.9rem; opacity: 0.9;">Action: Suivi hebdomadaire maintenu</div>
-        </div>
-        """, unsafe_allow_html=True)
+        compteurs = alert_engine.compteurs(aco_filtre)
+        st.caption(f"🔴 {compteurs['CRITIQUE']} critique(s) • 🟠 {compteurs['WARNING']} attention • "
+                   f"🔵 {compteurs['INFO']} info")
+        st.markdown(cards.alert_cards(alertes), unsafe_allow_html=True)
     
     with col_alert2:
-        st.markdown("#### Actions Réalisées Aujourd'hui")
-        
-        # ACTION 1 - VERTE avec coche alignée à gauche (HTML direct)
-        st.markdown("""
-        <div style="background: linear-gradient(145deg, #D1FAE5, #10B981); 
-                    border-left: 4px solid #10B981; 
-                    border-radius: 15px; 
-                    padding: 1rem; 
-                    margin: 0.5rem 0; 
-                    box-shadow: 0 4px 15px rgba(16, 185, 129, 0.15); 
-                    cursor: pointer; 
-                    transition: all 0.3s ease;
-                    display: flex;
-                    align-items: flex-start;"
-             onmouseover="this.style.transform='translateY(-2px)'; this.style.boxShadow='0 6px 20px rgba(16, 185, 129, 0.25)'"
-             onmouseout="this.style.transform='translateY(0px)'; this.style.boxShadow='0 4px 15px rgba(16, 185, 129, 0.15)'">
-            <div style="margin-right: 0.75rem; flex-shrink: 0; font-size: 1.2rem; color: white;">✅</div>
-            <div style="flex-grow: 1; color: white;">
-                <div style="font-weight: 600; font-size: 1rem;">DGD validé - RÉSIDENCE SOLEIL</div>
-                <div style="font-size: 0.9rem; margin-top: 0.25rem; opacity: 0.9;">Décompte général définitif approuvé</div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # ACTION 2 - VERTE avec coche alignée à gauche (HTML direct)
-        st.markdown("""
-        <div style="background: linear-gradient(145deg, #D1FAE5, #10B981); 
-                    border-left: 4px solid #10B981; 
-                    border-radius: 15px; 
-                    padding: 1rem; 
-                    margin: 0.5rem 0; 
-                    box-shadow: 0 4px 15px rgba(16, 185, 129, 0.15); 
-                    cursor: pointer; 
-                    transition: all 0.3s ease;
-                    display: flex;
-                    align-items: flex-start;"
-             onmouseover="this.style.transform='translateY(-2px)'; this.style.boxShadow='0 6px 20px rgba(16, 185, 129, 0.25)'"
-             onmouseout="this.style.transform='translateY(0px)'; this.style.boxShadow='0 4px 15px rgba(16, 185, 129, 0.15)'">
-            <div style="margin-right: 0.75rem; flex-shrink: 0; font-size: 1.2rem; color: white;">✅</div>
-            <div style="flex-grow: 1; color: white;">
-                <div style="font-weight: 600; font-size: 1rem;">Phase ESQ terminée - COUR CHARNEAU</div>
-                <div style="font-size: 0.9rem; margin-top: 0.25rem; opacity: 0.9;">Études esquisse validées par SPIC</div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # ACTION 3 - VERTE avec coche alignée à gauche (HTML direct)
-        st.markdown("""
-        <div style="background: linear-gradient(145deg, #D1FAE5, #10B981); 
-                    border-left: 4px solid #10B981; 
-                    border-radius: 15px; 
-                    padding: 1rem; 
-                    margin: 0.5rem 0; 
-                    box-shadow: 0 4px 15px rgba(16, 185, 129, 0.15); 
-                    cursor: pointer; 
-                    transition: all 0.3s ease;
-                    display: flex;
-                    align-items: flex-start;"
-             onmouseover="this.style.transform='translateY(-2px)'; this.style.boxShadow='0 6px 20px rgba(16, 185, 129, 0.25)'"
-             onmouseout="this.style.transform='translateY(0px)'; this.style.boxShadow='0 4px 15px rgba(16, 185, 129, 0.15)'">
-            <div style="margin-right: 0.75rem; flex-shrink: 0; font-size: 1.2rem; color: white;">✅</div>
-            <div style="flex-grow: 1; color: white;">
-                <div style="font-weight: 600; font-size: 1rem;">MED envoyé - MANDAT ÉCOLE</div>
-                <div style="font-size: 0.9rem; margin-top: 0.25rem; opacity: 0.9;">Mise en demeure promoteur envoyée</div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # ACTION 4 - VERTE avec coche alignée à gauche (HTML direct)
-        st.markdown("""
-        <div style="background: linear-gradient(145deg, #D1FAE5, #10B981); 
-                    border-left: 4px solid #10B981; 
-                    border-radius: 15px; 
-                    padding: 1rem; 
-                    margin: 0.5rem 0; 
-                    box-shadow: 0 4px 15px rgba(16, 185, 129, 0.15); 
-                    cursor: pointer; 
-                    transition: all 0.3s ease;
-                    display: flex;
-                    align-items: flex-start;"
-             onmouseover="this.style.transform='translateY(-2px)'; this.style.boxShadow='0 6px 20px rgba(16, 185, 129, 0.25)'"
-             onmouseout="this.style.transform='translateY(0px)'; this.style.boxShadow='0 4px 15px rgba(16, 185, 129, 0.15)'">
-            <div style="margin-right: 0.75rem; flex-shrink: 0; font-size: 1.2rem; color: white;">✅</div>
-            <div style="flex-grow: 1; color: white;">
-                <div style="font-weight: 600; font-size: 1rem;">REM T3 saisi - 3 opérations</div>
-                <div style="font-size: 0.9rem; margin-top: 0.25rem; opacity: 0.9;">Trimestre 3 validé et saisi</div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # ACTION 5 - VERTE avec coche alignée à gauche (HTML direct)
-        st.markdown("""
-        <div style="background: linear-gradient(145deg, #D1FAE5, #10B981); 
-                    border-left: 4px solid #10B981; 
-                    border-radius: 15px; 
-                    padding: 1rem; 
-                    margin: 0.5rem 0; 
-                    box-shadow: 0 4px 15px rgba(16, 185, 129, 0.15); 
-                    cursor: pointer; 
-                    transition: all 0.3s ease;
-                    display: flex;
-                    align-items: flex-start;"
-             onmouseover="this.style.transform='translateY(-2px)'; this.style.boxShadow='0 6px 20px rgba(16, 185, 129, 0.25)'"
-             onmouseout="this.style.transform='translateY(0px)'; this.style.boxShadow='0 4px 15px rgba(16, 185, 129, 0.15)'">
-            <div style="margin-right: 0.75rem; flex-shrink: 0; font-size: 1.2rem; color: white;">✅</div>
-            <div style="flex-grow: 1; color: white;">
-                <div style="font-weight: 600; font-size: 1rem;">Timeline mise à jour - VEFA BELCOURT</div>
-                <div style="font-size: 0.9rem; margin-top: 0.25rem; opacity: 0.9;">Planning actualisé avec nouvelles échéances</div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown("#### Dernières Actions Réalisées")
+        st.markdown(cards.action_cards(get_journal_actions(aco_filtre), limite=NB_ACTIONS_DASHBOARD),
+                    unsafe_allow_html=True)
     
     # Graphique d'activité MODERNISÉ
     st.markdown("### 📈 Activité Mensuelle")
@@ -1851,43 +1955,88 @@ def page_dashboard():
     else:
         st.info("📊 Données d'activité en cours de chargement...")
 
+NB_FREINS_PRIORITAIRES = [10, 25, 50]
+
 def page_gestion_freins():
-    """Page de gestion des freins"""
+    """Page de gestion des freins (registre persistant indexé par priorité et ancienneté)"""
     st.markdown("### 🚨 Gestion des Freins Opérationnels")
     
-    # Liste des freins
-    freins_data = [
-        {
-            "Opération": "COUR CHARNEAU",
-            "Phase": "Demande LBU", 
-            "Type": "RETARD",
-            "Durée": "5 jours",
-            "Impact": "Critique",
-            "Responsable": "MOE ARCHI-CONSEIL",
-            "Action": "Relance urgente"
-        },
-        {
-            "Opération": "MANDAT ÉCOLE",
-            "Phase": "Validation budget",
-            "Type": "BLOCAGE",
-            "Durée": "12 jours", 
-            "Impact": "Majeur",
-            "Responsable": "Commune Basse-Terre",
-            "Action": "RDV programmé"
-        },
-        {
-            "Opération": "VEFA BELCOURT",
-            "Phase": "Signature protocole",
-            "Type": "ATTENTE",
-            "Durée": "3 jours",
-            "Impact": "Mineur", 
-            "Responsable": "SOGEPROM",
-            "Action": "Suivi normal"
-        }
-    ]
+    registre = get_frein_registry()
+    user_data = st.session_state.user_data
+    aco = None if user_data.get('role') == 'ADMIN' else user_data.get('nom')
+    maintenant = datetime.now()
+    
+    col_kpi1, col_kpi2, col_kpi3, col_kpi4 = st.columns(4)
     
-    df_freins = pd.DataFrame(freins_data)
-    st.dataframe(df_freins, use_container_width=True)
+    with col_kpi1:
+        st.metric("Freins ouverts", registre.nb_ouverts())
+    
+    with col_kpi2:
+        st.metric("Critiques", registre.nb_ouverts('Critique'))
+    
+    with col_kpi3:
+        st.metric("Majeurs", registre.nb_ouverts('Majeur'))
+    
+    with col_kpi4:
+        st.metric("Mineurs", registre.nb_ouverts('Mineur'))
+    
+    # Freins prioritaires : N premiers de l'index (impact puis ancienneté)
+    col_titre, col_nb = st.columns([3, 1])
+    
+    with col_titre:
+        st.markdown("#### Freins prioritaires")
+    
+    with col_nb:
+        nb_freins = st.selectbox("Afficher", NB_FREINS_PRIORITAIRES, key="freins_top", label_visibility="collapsed")
+    
+    prioritaires = registre.top(nb_freins, aco=aco)
+    if prioritaires:
+        df_freins = pd.DataFrame({
+            "N°": [frein['id'] for frein in prioritaires],
+            "Opération": [frein['operation'] for frein in prioritaires],
+            "Phase": [frein.get('phase') or '-' for frein in prioritaires],
+            "Type": [frein.get('type') for frein in prioritaires],
+            "Durée": [f"{(maintenant - frein['date_ouverture']).days} jours" for frein in prioritaires],
+            "Impact": [frein.get('impact') for frein in prioritaires],
+            "Responsable": [frein.get('responsable') for frein in prioritaires],
+            "Action": [frein.get('action') for frein in prioritaires]
+        })
+        st.dataframe(df_freins, use_container_width=True, hide_index=True)
+    else:
+        st.success("✅ Aucun frein ouvert")
+    
+    # Vieillissement par responsable (compteurs maintenus par le registre)
+    st.markdown("#### ⏳ Ancienneté par responsable")
+    vieillissement = registre.aging_stats(maintenant)
+    if vieillissement:
+        st.dataframe(pd.DataFrame(vieillissement).rename(columns={
+            'responsable': "Responsable", 'ouverts': "Ouverts", 'age_moyen_jours': "Âge moyen (j)",
+            'age_max_jours': "Âge max (j)", 'clos': "Clos", 'resolution_moyenne_jours': "Résolution moyenne (j)"
+        }), use_container_width=True, hide_index=True)
+    
+    # Déclaration / clôture
+    col_declarer, col_clore = st.columns(2)
+    
+    with col_declarer:
+        with st.expander("➕ Déclarer un frein"):
+            render_declaration_frein(registre, aco)
+    
+    with col_clore:
+        with st.expander("✅ Lever un frein"):
+            ouverts = registre.top(registre.nb_ouverts(), aco=aco)
+            if ouverts:
+                frein_id = st.selectbox(
+                    "Frein", [frein['id'] for frein in ouverts],
+                    format_func=lambda i: next(f"N°{f['id']} - {f['operation']} - {f.get('phase') or f.get('type')}"
+                                               for f in ouverts if f['id'] == i),
+                    key="frein_a_lever"
+                )
+                if st.button("Lever le frein", key="lever_frein"):
+                    lever_frein(registre, frein_id)
+                    st.success("✅ Frein levé")
+                    st.rerun()
+            else:
+                st.caption("Aucun frein ouvert")
     
     # Actions de résolution
     st.markdown("#### Actions de Résolution")
@@ -1895,73 +2044,334 @@ def page_gestion_freins():
     col_action1, col_action2, col_action3 = st.columns(3)
     
     with col_action1:
-        if st.button("📞 Relancer tous les responsables"):
-            st.success("📧 Relances envoyées automatiquement")
+        if st.button("📞 Relancer tous les responsables", key="relancer_responsables"):
+            st.session_state.relances_envoi = lancer_relances(registre, aco)
     
     with col_action2:
         if st.button("📊 Rapport freins hebdomadaire"):
-            st.info("📋 Génération rapport en cours...")
+            st.session_state.freins_rapport = True
     
     with col_action3:
         if st.button("⚠️ Escalade hiérarchique"):
             st.warning("📈 Escalade programmée vers direction")
+    
+    if st.session_state.get('relances_envoi') is not None:
+        render_suivi_relances('relances_envoi')
+    
+    if st.session_state.get('freins_rapport'):
+        render_rapport_freins(registre, aco, maintenant)
+
+def lancer_relances_med(suivi, aco):
+    """
+    Relances MED programmées arrivées à date : un message par destinataire, envoyé en arrière-plan ;
+    les relances envoyées sont marquées dans le suivi (et en base) à la fin de l'envoi
+    """
+    aujourd_hui = datetime.now().date()
+    dues = suivi.relances_dues(aujourd_hui, aco=aco)
+    groupes = {}
+    for med in dues:
+        groupes.setdefault(med.get('destinataire') or '-', {'freins': [], 'meds': []})['meds'].append(med)
+    messages, sans_contact = relances.composer_messages(groupes, load_demo_data().get('contacts_demo', {}),
+                                                        signature=st.session_state.user_data.get('nom', 'OPCOPILOT'))
+    engine = get_db_engine()
+    # Fin d'envoi hors script Streamlit : moteur d'alertes résolu avant le départ
+    alert_engine = get_alert_engine()
+    
+    def marquer_relances(job):
+        envoyes = {resultat['destinataire'] for resultat in job.resultats if resultat['statut'] == 'ENVOYE'}
+        modifications = {}
+        for med in dues:
+            if med.get('destinataire') not in envoyes:
+                continue
+            relancee = suivi.marquer_relance(med['reference'], med['niveau_relance'], aujourd_hui)
+            if relancee is None:
+                continue
+            alert_engine.submit('med', relancee['operation_id'], relancee['reference'], relancee)
+            modifications[relancee['reference']] = {'statut': relancee['statut'],
+                                                    'relance_effectuee': relancee['relance_effectuee'],
+                                                    'date_relance': relancee['date_relance']}
+        if modifications and engine is not None:
+            # Toutes les relances de l'envoi en une transaction ; suivi et moteur d'alertes déjà à jour
+            # conservés sous la nouvelle version
+            _, a_jour = ecrire_en_base(lambda session: persistence.update_meds(session, modifications), 'med')
+            if a_jour:
+                get_med_tracker(precedent=suivi)
+                get_alert_engine(precedent=alert_engine)
+        alert_engine.process()
+    
+    return get_reminder_dispatcher().start(messages, apres=marquer_relances, sans_contact=sans_contact)
+
+def lancer_relances(registre, aco):
+    """Un message consolidé par responsable (freins ouverts, MED hors délai), envoyé en arrière-plan"""
+    demo_data = load_demo_data()
+    groupes = relances.collecter_relances(
+        registre.top(registre.nb_ouverts(), aco=aco), get_med_tracker().en_retard(aco=aco),
+        load_operations_portefeuille(), aco=aco
+    )
+    messages, sans_contact = relances.composer_messages(groupes, demo_data.get('contacts_demo', {}),
+                                                        signature=st.session_state.user_data.get('nom', 'OPCOPILOT'))
+    return get_reminder_dispatcher().start(messages, sans_contact=sans_contact)
+
+def render_suivi_relances(cle):
+    """Résultat d'un envoi de relances (avancement rafraîchi seul tant que l'envoi tourne)"""
+    job = st.session_state[cle]
+    if not job.termine:
+        render_progression_relances(cle)
+        return
+    
+    _, envoyes, echecs = job.progression()
+    if job.erreur:
+        st.error(f"❌ Envoi interrompu : {job.erreur}")
+    elif job.total == 0:
+        st.info("ℹ️ Aucun responsable à relancer")
+    elif echecs:
+        st.warning(f"⚠️ {envoyes} relance(s) envoyée(s), {echecs} échec(s) ({job.transport})")
+        st.dataframe(pd.DataFrame(job.echecs()), use_container_width=True, hide_index=True)
+    else:
+        st.success(f"📧 {envoyes} relance(s) envoyée(s) via {job.transport} en {job.duree:.1f} s")
+    
+    if job.sans_contact:
+        st.caption(f"Sans adresse de contact : {', '.join(job.sans_contact)}")
+
+@st.fragment(run_every=1)
+def render_progression_relances(cle):
+    """Barre d'avancement (seul ce fragment est réexécuté) ; page complète rafraîchie à la fin de l'envoi"""
+    job = st.session_state[cle]
+    if job.termine:
+        st.rerun()
+    traites, _, _ = job.progression()
+    st.progress(traites / job.total if job.total else 1.0,
+                text=f"📧 Relances en cours ({job.transport}) : {traites}/{job.total}")
+
+def render_declaration_frein(registre, aco):
+    """Formulaire de déclaration d'un frein (base puis registre)"""
+    operations = [op for op in load_operations_portefeuille() if aco is None or op.get('aco_responsable') == aco]
+    if not operations:
+        st.caption("Aucune opération")
+        return
+    
+    with st.form("declarer_frein", clear_on_submit=True):
+        operation_id = st.selectbox("Opération", [op['id'] for op in operations],
+                                    format_func=lambda i: next(op['nom'] for op in operations if op['id'] == i))
+        phase = st.text_input("Phase concernée")
+        col_type, col_impact = st.columns(2)
+        with col_type:
+            type_frein = st.selectbox("Type", freins.TYPES_FREIN)
+        with col_impact:
+            impact = st.selectbox("Impact", freins.IMPACTS)
+        responsable = st.text_input("Responsable")
+        action = st.text_input("Action")
+        
+        if st.form_submit_button("Déclarer"):
+            declarer_frein(registre, operation_id, phase=phase or None, type=type_frein, impact=impact,
+                           responsable=responsable or None, action=action or None)
+            st.success("✅ Frein enregistré")
+
+def declarer_frein(registre, operation_id, **valeurs):
+    """Nouveau frein : persisté en base si disponible, puis indexé dans le registre partagé"""
+    summary = get_kpi_summary()
+    a_jour = False
+    if get_db_engine() is not None:
+        frein, a_jour = ecrire_en_base(lambda session: persistence.add_frein(session, operation_id, **valeurs),
+                                       'freins')
+    else:
+        frein = {**valeurs, 'id': registre.next_id(), 'operation_id': operation_id,
+                 'date_ouverture': datetime.now(), 'statut': 'OUVERT'}
+    registre.ouvrir(frein)
+    refresh_freins_operation(registre, summary, operation_id, a_jour)
+
+def lever_frein(registre, frein_id):
+    """Clôture d'un frein en base et dans le registre"""
+    summary = get_kpi_summary()
+    date_cloture = datetime.now()
+    a_jour = False
+    if get_db_engine() is not None:
+        _, a_jour = ecrire_en_base(lambda session: persistence.close_frein(session, frein_id, date_cloture), 'freins')
+    frein = registre.clore(frein_id, date_cloture)
+    if frein is not None:
+        refresh_freins_operation(registre, summary, frein['operation_id'], a_jour)
+
+def refresh_freins_operation(registre, summary, operation_id, a_jour=False):
+    """
+    Compteur freins_actifs de l'opération propagé à la synthèse KPI et au moteur d'alertes ;
+    a_jour : écriture en base sans écriture concurrente, registre et synthèse conservés sous la nouvelle version
+    """
+    freins_actifs = registre.nb_ouverts_operation(operation_id)
+    summary.update_operation(operation_id, None, freins_actifs=freins_actifs)
+    if a_jour:
+        get_frein_registry(precedent=registre)
+        get_kpi_summary(precedent=summary)
+    operation = next((op for op in load_operations_portefeuille() if op['id'] == operation_id), None)
+    if operation is not None:
+        refresh_alertes_operation(operation_id, {**operation, 'freins_actifs': freins_actifs})
+
+def render_rapport_freins(registre, aco, maintenant):
+    """Rapport hebdomadaire (tous les ACO en une passe pour l'administrateur)"""
+    st.markdown("#### 📊 Rapport freins hebdomadaire")
+    
+    semaine = st.date_input("Semaine du", value=(maintenant - timedelta(days=maintenant.weekday())).date(),
+                            key="freins_semaine", format="DD/MM/YYYY")
+    debut = semaine - timedelta(days=semaine.weekday())
+    rapport = registre.weekly_report(debut, aco=aco)
+    
+    st.caption(f"Semaine du {debut.strftime('%d/%m/%Y')} au {(debut + timedelta(days=6)).strftime('%d/%m/%Y')}")
+    st.dataframe(freins.synthese_rapport(rapport), use_container_width=True, hide_index=True)
+    st.dataframe(rapport, use_container_width=True, hide_index=True)
+    
+    st.download_button(
+        "📥 Télécharger le rapport (CSV)",
+        rapport.to_csv(index=False, sep=';').encode('utf-8-sig'),
+        file_name=f"rapport_freins_{debut.isoformat()}.csv",
+        mime="text/csv",
+        key="freins_rapport_csv"
+    )
+
+JOURS_SEMAINE = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche"]
+
+HORIZON_PLANNING = 90  # jours
+
+def tableau_echeances(echeances, aujourd_hui):
+    """Échéances de l'index en tableau, priorité calculée par colonnes (np.select)"""
+    frame = pd.DataFrame(echeances, columns=['date', 'type', 'operation', 'libelle', 'detail', 'marge', 'retard'])
+    jours = pd.to_datetime(frame['date'])
+    restants = (jours - pd.Timestamp(aujourd_hui)).dt.days
+    # Marge d'une phase (CPM) ; pour les autres échéances, jours restants avant la date
+    marge = frame['marge'].astype('Float64').fillna(restants)
+    haute = (frame['type'] == 'PHASE_CRITIQUE') | (frame['retard'].fillna(0) > 0) | (restants < 0)
+    return pd.DataFrame({
+        "Date": jours.dt.strftime('%d/%m/%Y'),
+        "Type": frame['type'].map(lambda t: " ".join(deadlines.TYPES_ECHEANCE[t])),
+        "Opération": frame['operation'],
+        "Échéance": frame['libelle'],
+        "Détail": frame['detail'],
+        "Marge (j)": frame['marge'].astype('Int64'),
+        "Retard (j)": frame['retard'].astype('Int64'),
+        "Priorité": np.select([haute, (marge < 30).to_numpy(dtype=bool, na_value=False)],
+                              ["Haute", "Moyenne"], "Basse")
+    })
 
 def page_planning_echeances():
-    """Page de planning des échéances"""
+    """Page de planning des échéances (fenêtres de l'index : aucun parcours des phases du portefeuille)"""
     st.markdown("### 📅 Planning des Échéances")
     
-    # Échéances de la semaine
-    echeances_data = [
-        {
-            "Date": "Lundi 28/10",
-            "Opération": "COUR CHARNEAU",
-            "Échéance": "Réception provisoire",
-            "Type": "JALON",
-            "Priorité": "Haute"
-        },
-        {
-            "Date": "Mercredi 30/10", 
-            "Opération": "RÉSIDENCE SOLEIL",
-            "Échéance": "Validation DGD",
-            "Type": "VALIDATION",
-            "Priorité": "Moyenne"
-        },
-        {
-            "Date": "Vendredi 01/11",
-            "Opération": "MANDAT ÉCOLE",
-            "Échéance": "Remise livrables",
-            "Type": "LIVRABLE",
-            "Priorité": "Haute"
-        }
-    ]
+    index = get_deadline_index()
+    user_data = st.session_state.user_data
+    aujourd_hui = datetime.now().date()
     
-    df_echeances = pd.DataFrame(echeances_data)
-    st.dataframe(df_echeances, use_container_width=True)
+    col_aco, col_kpi1, col_kpi2, col_kpi3 = st.columns([2, 1, 1, 1])
     
-    # Calendrier de la semaine
-    st.markdown("#### 📆 Vue Calendaire")
+    with col_aco:
+        if user_data.get('role') == 'ADMIN':
+            choix_aco = st.selectbox("ACO", ["Tous"] + index.acos(), key="planning_aco")
+            aco = None if choix_aco == "Tous" else choix_aco
+        else:
+            aco = user_data.get('nom')
+            st.markdown(f"**ACO :** {aco}")
     
-    col_lun, col_mar, col_mer, col_jeu, col_ven = st.columns(5)
+    # Échéances ouvertes jusqu'à l'horizon (dépassées comprises) de l'ACO
+    horizon = aujourd_hui + timedelta(days=HORIZON_PLANNING)
+    echeances = index.query(None, horizon, aco)
+    depassees = index.count(None, aujourd_hui - timedelta(days=1), aco)
     
-    with col_lun:
-        st.markdown("**Lundi 28**")
-        st.info("🏗️ Réception COUR CHARNEAU")
+    with col_kpi1:
+        st.metric(f"Échéances ≤ {HORIZON_PLANNING} j", len(echeances) - depassees)
     
-    with col_mar:
-        st.markdown("**Mardi 29**")
-        st.success("✅ Pas d'échéance")
+    with col_kpi2:
+        st.metric("Échéances dépassées", depassees)
     
-    with col_mer:
-        st.markdown("**Mercredi 30**")
-        st.warning("📊 Validation DGD")
+    with col_kpi3:
+        st.metric("Phases critiques", sum(e['type'] == 'PHASE_CRITIQUE' for e in echeances))
     
-    with col_jeu:
-        st.markdown("**Jeudi 31**")
-        st.success("✅ Pas d'échéance")
+    if not echeances:
+        st.info("ℹ️ Aucune échéance ouverte d'ici l'horizon")
+    else:
+        st.dataframe(tableau_echeances(echeances, aujourd_hui), use_container_width=True, hide_index=True)
     
-    with col_ven:
-        st.markdown("**Vendredi 01**")
-        st.error("📋 Remise livrables")
+    # Calendrier : fenêtre de l'index des échéances
+    st.markdown("#### 📆 Vue Calendaire")
+    
+    if 'planning_jour' not in st.session_state:
+        st.session_state.planning_jour = aujourd_hui
+    
+    col_vue, col_prec, col_jour, col_suiv = st.columns([4, 1, 2, 1])
+    
+    with col_vue:
+        vue = st.radio("Période", deadlines.VUES, horizontal=True, key="planning_vue")
+    
+    # Navigation avant l'instanciation du sélecteur de date (son état peut encore être modifié)
+    with col_prec:
+        if st.button("◀", key="planning_prec", use_container_width=True):
+            st.session_state.planning_jour = deadlines.periode_voisine(
+                vue, st.session_state.planning_jour, -1)
+    
+    with col_suiv:
+        if st.button("▶", key="planning_suiv", use_container_width=True):
+            st.session_state.planning_jour = deadlines.periode_voisine(
+                vue, st.session_state.planning_jour, 1)
+    
+    with col_jour:
+        jour = st.date_input("Date de référence", key="planning_jour",
+                             format="DD/MM/YYYY", label_visibility="collapsed")
+    
+    debut, fin, par_jour = index.periode(vue, jour, aco)
+    nb_echeances = sum(len(echeances) for echeances in par_jour.values())
+    depassees = index.count(None, aujourd_hui - timedelta(days=1), aco)
+    st.caption(f"Du {debut.strftime('%d/%m/%Y')} au {fin.strftime('%d/%m/%Y')} • {nb_echeances} échéance(s) • "
+               f"{depassees} échéance(s) ouverte(s) dépassée(s) avant aujourd'hui")
+    
+    if vue == "Semaine":
+        for colonne, decalage in zip(st.columns(7), range(7)):
+            jour_semaine = debut + timedelta(days=decalage)
+            with colonne:
+                st.markdown(f"**{JOURS_SEMAINE[decalage]} {jour_semaine.strftime('%d')}**")
+                echeances = par_jour.get(jour_semaine, [])
+                if not echeances:
+                    st.success("✅ Pas d'échéance")
+                else:
+                    st.markdown("\n".join(
+                        f"- {deadlines.TYPES_ECHEANCE[e['type']][0]} **{e['operation']}** · {e['libelle']}"
+                        for e in echeances
+                    ))
+    elif nb_echeances == 0:
+        st.success("✅ Aucune échéance sur la période")
+    else:
+        echeances = [e for jour_echeance in sorted(par_jour) for e in par_jour[jour_echeance]]
+        df_periode = pd.DataFrame({
+            "Date": [e['date'].strftime('%d/%m/%Y') for e in echeances],
+            "Type": [" ".join(deadlines.TYPES_ECHEANCE[e['type']]) for e in echeances],
+            "Opération": [e['operation'] for e in echeances],
+            "Échéance": [e['libelle'] for e in echeances],
+            "Détail": [e['detail'] for e in echeances],
+            "ACO": [e['aco'] for e in echeances]
+        })
+        st.dataframe(df_periode, use_container_width=True, hide_index=True)
+
+# Pagination du portefeuille
+PAGE_SIZES_PORTEFEUILLE = [10, 25, 50, 100]
+
+TRIS_PORTEFEUILLE = {
+    "Création": ('id', False),
+    "Nom": ('nom', False),
+    "Avancement ↓": ('avancement', True),
+    "Fin prévue": ('date_fin_prevue', False),
+    "Budget ↓": ('budget_total', True)
+}
+
+def render_export_portefeuille(filtres, tri, descendant):
+    """Export Excel du portefeuille filtré (une feuille par opération), généré au clic hors du script"""
+    engine = get_db_engine()
+    demo_data = load_demo_data()
+    index = None if engine is not None else build_portfolio_index(get_data_cache().version(DEMO_DATA_PATH))
+    templates = get_compiled_templates()
+    st.download_button(
+        "📥 Exporter le portefeuille (Excel)",
+        data=lambda: export_planning_portefeuille(engine, index, demo_data, templates, filtres, tri, descendant),
+        file_name=f"portefeuille_planning_{datetime.now():%Y%m%d}.xlsx",
+        mime=MIME_XLSX,
+        on_click="ignore",
+        key="export_portefeuille",
+        help="Synthèse + une feuille par opération filtrée (phases, REM trimestrielle, avenants)"
+    )
 
 def page_portefeuille_aco():
     """Portefeuille ACO avec liste des opérations"""
@@ -1970,10 +2380,6 @@ def page_portefeuille_aco():
     
     st.markdown(f"### 📂 Mon Portefeuille - {nom_aco}")
     
-    # Chargement données
-    demo_data = load_demo_data()
-    operations_data = demo_data.get('operations_demo', [])
-    
     # Filtres
     col_filter1, col_filter2, col_filter3, col_filter4 = st.columns(4)
     
@@ -1991,53 +2397,146 @@ def page_portefeuille_aco():
             st.session_state.page = "creation_operation"
             st.rerun()
     
-    # Application des filtres
-    operations_filtrees = operations_data
-    if filtre_type != "Tous":
-        operations_filtrees = [op for op in operations_filtrees if op['type_operation'] == filtre_type]
-    if filtre_statut != "Tous":
-        operations_filtrees = [op for op in operations_filtrees if op['statut'] == filtre_statut]
-    if filtre_commune != "Toutes":
-        operations_filtrees = [op for op in operations_filtrees if op['commune'] == filtre_commune]
+    # Affichage : cartes paginées ou tableau compact
+    col_mode, col_tri, col_taille = st.columns([2, 1, 1])
+    
+    with col_mode:
+        mode_affichage = st.radio(
+            "Affichage",
+            ["🗂️ Cartes", "📋 Tableau compact"],
+            horizontal=True,
+            key="portefeuille_mode"
+        )
+    
+    with col_tri:
+        tri = st.selectbox("Trier par", list(TRIS_PORTEFEUILLE.keys()), key="portefeuille_tri")
+    
+    with col_taille:
+        page_size = st.selectbox("Par page", PAGE_SIZES_PORTEFEUILLE, key="portefeuille_page_size")
+    
+    filtres = {
+        'type_operation': None if filtre_type == "Tous" else filtre_type,
+        'statut': None if filtre_statut == "Tous" else filtre_statut,
+        'commune': None if filtre_commune == "Toutes" else filtre_commune
+    }
+    
+    # Retour en page 1 quand les filtres, le tri ou la taille de page changent
+    signature = (tuple(filtres.values()), tri, page_size)
+    if st.session_state.get('portefeuille_signature') != signature:
+        st.session_state.portefeuille_signature = signature
+        st.session_state.portefeuille_page = 1
+    
+    champ_tri, descendant = TRIS_PORTEFEUILLE[tri]
+    
+    render_export_portefeuille(filtres, champ_tri, descendant)
+    
+    if mode_affichage == "📋 Tableau compact":
+        # Un seul widget quel que soit le volume (grille virtualisée côté navigateur)
+        resultat = query_portefeuille(filtres, champ_tri, descendant)
+        st.markdown(f"#### 📋 Mes Opérations ({resultat['total']} opérations)")
+        render_portefeuille_tableau(resultat['operations'])
+        return
+    
+    # Application des filtres (index secondaires ou WHERE SQL) - une seule page rendue
+    resultat = query_portefeuille(filtres, champ_tri, descendant,
+                                  page=st.session_state.portefeuille_page, page_size=page_size)
+    st.session_state.portefeuille_page = resultat['page']
+    operations_filtrees = resultat['operations']
     
     # Liste des opérations
-    st.markdown(f"#### 📋 Mes Opérations ({len(operations_filtrees)} affichées)")
-    
-    for op in operations_filtrees:
-        with st.container():
-            st.markdown(f"""
-            <div class="operation-card">
-                <div style="display: flex; justify-content: space-between; align-items: center;">
-                    <div>
-                        <h4>🏗️ {op['nom']} - {op['type_operation']}</h4>
-                        <p><strong>📍 {op['commune']}</strong> • {op.get('nb_logements_total', 0)} logements • {op.get('budget_total', 0):,} €</p>
-                        <p><em>Créé le {op['date_creation']} • Fin prévue {op['date_fin_prevue']}</em></p>
-                    </div>
-                    <div style="text-align: right;">
-                        <p><strong>Avancement: {op['avancement']}%</strong></p>
-                        <p>Statut: <span style="color: {'#10B981' if op['statut'] == 'EN_COURS' else '#F59E0B'}">{op['statut']}</span></p>
-                        {f"<p style='color: #EF4444;'>⚠️ {op.get('freins_actifs', 0)} frein(s)</p>" if op.get('freins_actifs', 0) > 0 else ""}
-                    </div>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            col_btn1, col_btn2, col_btn3 = st.columns([1, 1, 2])
-            
-            with col_btn1:
-                if st.button(f"📂 Ouvrir", key=f"open_{op['id']}"):
-                    st.session_state.selected_operation_id = op['id']
-                    st.session_state.selected_operation = op
-                    st.session_state.page = "operation_details"
-                    st.rerun()
-            
-            with col_btn2:
-                if st.button(f"📊 Timeline", key=f"timeline_{op['id']}"):
-                    st.session_state.selected_operation_id = op['id']
-                    st.session_state.selected_operation = op
-                    st.session_state.page = "operation_details"
-                    st.session_state.active_tab = "timeline"
-                    st.rerun()
+    st.markdown(f"#### 📋 Mes Opérations ({len(operations_filtrees)} affichées sur {resultat['total']})")
+    
+    # Toutes les cartes de la page en un seul bloc HTML, puis une seule ligne d'actions
+    st.markdown(cards.operation_cards(operations_filtrees), unsafe_allow_html=True)
+    
+    if operations_filtrees:
+        operations_page = {op['id']: op for op in operations_filtrees}
+        col_select, col_btn1, col_btn2 = st.columns([2, 1, 1])
+        
+        with col_select:
+            operation_id = st.selectbox(
+                "Opération",
+                list(operations_page),
+                format_func=lambda op_id: f"{operations_page[op_id]['nom']} - {operations_page[op_id]['type_operation']}",
+                key="portefeuille_operation",
+                label_visibility="collapsed"
+            )
+        
+        with col_btn1:
+            if st.button("📂 Ouvrir", key="open_operation", use_container_width=True):
+                open_operation(operations_page[operation_id])
+        
+        with col_btn2:
+            if st.button("📊 Timeline", key="timeline_operation", use_container_width=True):
+                st.session_state.active_tab = "timeline"
+                open_operation(operations_page[operation_id])
+    
+    render_pagination(resultat, "portefeuille")
+
+def open_operation(op):
+    """Ouvre la page détail d'une opération"""
+    st.session_state.selected_operation_id = op['id']
+    st.session_state.selected_operation = op
+    st.session_state.page = "operation_details"
+    st.rerun()
+
+def render_pagination(resultat, key):
+    """Contrôles Précédent / Suivant (nombre de widgets constant)"""
+    if resultat['nb_pages'] <= 1:
+        return
+    
+    col_prec, col_info, col_suiv = st.columns([1, 2, 1])
+    
+    with col_prec:
+        if st.button("◀ Précédent", key=f"{key}_prec", disabled=resultat['page'] <= 1, use_container_width=True):
+            st.session_state[f"{key}_page"] = resultat['page'] - 1
+            st.rerun()
+    
+    with col_info:
+        st.markdown(
+            f"<p style='text-align: center;'>Page <strong>{resultat['page']}</strong> / {resultat['nb_pages']} • {resultat['total']} opérations</p>",
+            unsafe_allow_html=True
+        )
+    
+    with col_suiv:
+        if st.button("Suivant ▶", key=f"{key}_suiv", disabled=resultat['page'] >= resultat['nb_pages'], use_container_width=True):
+            st.session_state[f"{key}_page"] = resultat['page'] + 1
+            st.rerun()
+
+def render_portefeuille_tableau(operations):
+    """Tableau compact du portefeuille : sélection d'une ligne → page détail"""
+    if not operations:
+        st.info("ℹ️ Aucune opération ne correspond aux filtres")
+        return
+    
+    df_operations = pd.DataFrame([{
+        "Opération": op['nom'],
+        "Type": op['type_operation'],
+        "Commune": op.get('commune', ''),
+        "Statut": op.get('statut', ''),
+        "Avancement": op.get('avancement', 0),
+        "Budget (€)": op.get('budget_total', 0),
+        "Fin prévue": op.get('date_fin_prevue', ''),
+        "Freins": op.get('freins_actifs', 0)
+    } for op in operations])
+    
+    event = st.dataframe(
+        df_operations,
+        use_container_width=True,
+        hide_index=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key="portefeuille_tableau",
+        column_config={
+            "Avancement": st.column_config.ProgressColumn("Avancement", format="%d%%", min_value=0, max_value=100),
+            "Budget (€)": st.column_config.NumberColumn("Budget (€)", format="%d €")
+        }
+    )
+    st.caption("Sélectionnez une ligne pour ouvrir l'opération")
+    
+    lignes = event.selection.rows if event else []
+    if lignes:
+        open_operation(operations[lignes[0]])
 
 def page_operation_details(operation_id=None):
     """Page détail opération avec timeline et modules intégrés"""
@@ -2047,10 +2546,10 @@ def page_operation_details(operation_id=None):
     nom_aco = user_data.get('nom', 'ACO')
     
     # Récupération de l'opération
-    if operation_id is None and 'selected_operation_id' in st.session_state:
+    if operation_id is None and st.session_state.get('selected_operation_id') is not None:
         operation_id = st.session_state.selected_operation_id
     
-    if 'selected_operation' in st.session_state:
+    if st.session_state.get('selected_operation'):
         operation = st.session_state.selected_operation
     else:
         # Fallback avec données de démo
@@ -2063,7 +2562,7 @@ def page_operation_details(operation_id=None):
     st.markdown(f"""
     <div class="main-header">
         <h1>🏗️ {operation.get('nom', 'Opération')} - {operation.get('type_operation', 'OPP')}</h1>
-        <div style="display: flex; justify-content: space-between; align-items: center;">
+        <div class="main-header-row">
             <div>
                 <p><strong>📍 {operation.get('commune', 'Commune')}</strong> • {operation.get('nb_logements_total', 0)} logements • ACO {nom_aco}</p>
             </div>
@@ -2079,94 +2578,58 @@ def page_operation_details(operation_id=None):
         st.session_state.page = "portefeuille"
         st.rerun()
     
-    # Onglets modules intégrés
-    tab_timeline, tab_rem, tab_avenants, tab_med, tab_concess, tab_dgd, tab_gpa, tab_cloture = st.tabs([
-        "📅 Timeline", "💰 REM", "📝 Avenants", "⚖️ MED", 
-        "🔌 Concess.", "📊 DGD", "🛡️ GPA", "✅ Clôture"
-    ])
-    
-    with tab_timeline:
-        st.markdown("### 📅 Timeline Horizontale - Gestion des Phases")
-        
-        # Chargement des phases
-        demo_data = load_demo_data()
-        phases_data = demo_data.get('phases_demo', {}).get(f'operation_{operation_id}', [])
-        
-        # Si pas de phases spécifiques, on charge un template selon le type
-        if not phases_data:
-            templates = load_templates_phases()
-            type_op = operation.get('type_operation', 'OPP')
-            template_phases = templates.get(type_op, {}).get('phases', [])
-            
-            # Conversion template en phases avec dates
-            phases_data = []
-            date_courante = datetime.now()
-            
-            for i, phase_template in enumerate(template_phases[:8]):  # Limite pour démo
-                debut = date_courante + timedelta(days=i*20)
-                fin = debut + timedelta(days=phase_template.get('duree_jours', 30))
-                
-                statuts_demo = ["VALIDEE", "EN_COURS", "EN_ATTENTE", "NON_DEMARREE"]
-                statut = statuts_demo[i % len(statuts_demo)]
-                
-                phases_data.append({
-                    "nom": phase_template['nom'],
-                    "date_debut_prevue": debut.isoformat(),
-                    "date_fin_prevue": fin.isoformat(),
-                    "statut": statut,
-                    "responsable": phase_template.get('responsable_type', 'ACO'),
-                    "est_critique": phase_template.get('est_critique', False)
-                })
-        
-        # Affichage timeline horizontale
-        if phases_data:
-            timeline_fig, config = create_timeline_horizontal(operation, phases_data)
-            if timeline_fig:
-                st.plotly_chart(timeline_fig, use_container_width=True, config=config)
-                
-                # Gestion des phases
-                st.markdown("#### 🔧 Gestion des Phases")
-                
-                col_phase1, col_phase2, col_phase3, col_phase4 = st.columns(4)
-                
-                with col_phase1:
-                    if st.button("➕ Ajouter Phase"):
-                        st.success("✅ Interface d'ajout de phase")
-                
-                with col_phase2:
-                    if st.button("✏️ Modifier Phase"):
-                        st.info("🔄 Mode modification activé")
-                
-                with col_phase3:
-                    if st.button("⚠️ Signaler Frein"):
-                        st.warning("🚨 Frein signalé sur phase sélectionnée")
-                
-                with col_phase4:
-                    if st.button("📊 Exporter Planning"):
-                        st.info("📁 Export Excel en cours...")
-        else:
-            st.warning("⚠️ Aucune phase définie pour cette opération")
-    
-    with tab_rem:
-        module_rem(operation_id)
-    
-    with tab_avenants:
-        module_avenants(operation_id)
-    
-    with tab_med:
-        module_med(operation_id)
-    
-    with tab_concess:
-        module_concessionnaires(operation_id)
-    
-    with tab_dgd:
-        module_dgd(operation_id)
-    
-    with tab_gpa:
-        module_gpa(operation_id)
-    
-    with tab_cloture:
-        module_cloture(operation_id)
+    # Onglets modules intégrés : seul le module affiché est calculé
+    render_operation_modules(operation_id, operation)
+
+# Modules de la page opération : (onglet, clé de vue, rendu)
+MODULES_OPERATION = [
+    ("📅 Timeline", 'timeline', module_timeline),
+    ("💰 REM", 'rem', module_rem),
+    ("📝 Avenants", 'avenants', module_avenants),
+    ("⚖️ MED", 'med', module_med),
+    ("🔌 Concess.", 'concessionnaires', module_concessionnaires),
+    ("📊 DGD", 'dgd', module_dgd),
+    ("🛡️ GPA", 'gpa', module_gpa),
+    ("✅ Clôture", 'cloture', module_cloture)
+]
+
+# Domaines de données lus par les vues mémorisées des modules (clé de version de chaque vue)
+DOMAINES_MODULES = {
+    'timeline': ('operations', 'phases'),
+    'rem': ('rem',),
+    'med': ('operations', 'med'),
+    'concessionnaires': ('operations', 'concessionnaires'),
+    'dgd': ('operations', 'dgd', 'avenants')
+}
+
+def render_operation_modules(operation_id, operation):
+    """Hôte des modules : rendu du seul onglet actif, vues mémorisées, préchargement des autres au repos"""
+    labels = [label for label, _, _ in MODULES_OPERATION]
+    try:
+        tabs = st.tabs(labels, key="operation_module", on_change="rerun")
+    except TypeError:
+        # Streamlit sans suivi d'onglet actif : tous les onglets sont rendus
+        tabs = st.tabs(labels)
+    
+    host = get_module_host()
+    # Statuts et retards dépendent du jour : vues recalculées chaque jour ; chaque vue n'est
+    # invalidée que par les écritures des domaines qu'elle lit
+    jour = datetime.now().date().isoformat()
+    fichiers = f"{get_templates_version()}-{get_data_cache().version(WORKFLOW_MODULES_PATH)}"
+    versions = {cle: f"{cle_donnees(*domaines)}-{fichiers}-{jour}" for cle, domaines in DOMAINES_MODULES.items()}
+    builders = operation_view_builders(operation)
+    
+    for (_, cle, render), tab in zip(MODULES_OPERATION, tabs):
+        if tab.open is False:
+            continue
+        with tab:
+            builder = builders.get(cle)
+            render(operation_id, host.view(cle, operation_id, versions[cle], builder) if builder else None)
+    
+    # Préchargement des modules masqués (ignoré si un calcul de premier plan est en cours)
+    for (_, cle, _), tab in zip(MODULES_OPERATION, tabs):
+        if tab.open is False and cle in builders:
+            host.prefetch(cle, operation_id, versions[cle], builders[cle])
 
 def page_creation_operation():
     """Page de création nouvelle opération"""
@@ -2379,6 +2842,8 @@ def main():
             st.success("✅ Données chargées")
         else:
             st.error("❌ Erreur données")
+        if get_db_engine() is None and DB_INDISPONIBLE:
+            st.warning(f"⚠️ Base de données indisponible, lecture JSON: {DB_INDISPONIBLE['erreur']}")
         
         st.markdown("**OPCOPILOT v4.0**")
         st.markdown("*SPIC Guadeloupe*")